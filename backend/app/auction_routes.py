@@ -12,6 +12,7 @@ import os
 import uuid
 from pathlib import Path
 
+from . import queries
 from .db import SessionLocal, Auction, AuctionBid, AuctionMessage, KartotekaUser, Product, CardCatalog
 from .auction_schemas import (
     AuctionCreate, AuctionUpdate, AuctionRead, AuctionDetail, 
@@ -187,17 +188,8 @@ def list_auctions(
     - **page**: Page number (default: 1)
     - **per_page**: Items per page (default: 20, max: 100)
     """
-    query = db.query(Auction)
-    
-    # Filter by status
-    if status:
-        query = query.filter(Auction.status == status)
-    
-    # Order by end_time (soonest first for active, newest first for others)
-    if status == "active":
-        query = query.order_by(Auction.end_time.asc())
-    else:
-        query = query.order_by(desc(Auction.created_at))
+    # Soonest end first for active auctions, newest first for others
+    query = queries.auction_listing(db, status)
     
     # Get total count
     total = query.count()
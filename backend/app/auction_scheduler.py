@@ -2,7 +2,8 @@ import asyncio
 import traceback
 from datetime import datetime
 from sqlalchemy import desc
-from .db import SessionLocal, Auction, AuctionBid, Product
+from . import queries
+from .db import SessionLocal, ReadSessionLocal, run_write, Auction, AuctionBid, Product
 from .settings import settings
 from .shoper import ShoperClient
 from .websocket import manager
@@ -104,6 +105,41 @@ async def publish_winning_auction(auction: Auction, winning_bid: AuctionBid):
         traceback.print_exc()
     return None
 
+def _end_auction(db, auction_id: int, now: datetime):
+    """Mark an expired auction as ended (runs on the DB writer thread).
+
+    Returns detached copies of the auction and its highest bid, or
+    ``(None, None)`` when the auction was already closed elsewhere.
+    """
+    auction = db.query(Auction).filter(Auction.id == auction_id, Auction.status == "active").first()
+    if auction is None:
+        return None, None
+    
+    # Find the highest bid
+    highest_bid = db.query(AuctionBid).filter(
+        AuctionBid.auction_id == auction.id
+    ).order_by(desc(AuctionBid.amount)).first()
+    
+    auction.status = "ended"
+    auction.ended_at = now
+    if highest_bid:
+        auction.winner_kartoteka_user_id = highest_bid.kartoteka_user_id
+        auction.current_price = highest_bid.amount # Ensure final price is set
+    
+    db.flush()
+    # Detach with loaded state so the caller can use them after commit
+    db.expunge(auction)
+    if highest_bid:
+        db.expunge(highest_bid)
+    return auction, highest_bid
+
+
+def _set_published_shoper_id(db, auction_id: int, shoper_id: int) -> None:
+    auction = db.get(Auction, auction_id)
+    if auction is not None:
+        auction.published_shoper_id = shoper_id
+
+
 async def auction_scheduler_task():
     """
     Background task that periodically checks for expired auctions
@@ -115,65 +151,50 @@ async def auction_scheduler_task():
         try:
             await asyncio.sleep(10)  # Check every 10 seconds
             
-            db = SessionLocal()
+            now = datetime.utcnow()
+            db = ReadSessionLocal()
             try:
-                now = datetime.utcnow()
-                
                 # Find active auctions that have passed their end time
-                expired_auctions = db.query(Auction).filter(
-                    Auction.status == "active",
-                    Auction.end_time <= now
-                ).all()
+                expired_ids = [aid for (aid,) in queries.expired_auction_ids(db, now).all()]
+            finally:
+                db.close()
                 
-                if not expired_auctions:
-                    continue
-                    
-                print(f"🕒 Found {len(expired_auctions)} expired auctions. Processing...")
+            if not expired_ids:
+                continue
                 
-                for auction in expired_auctions:
-                    try:
-                        # Find the highest bid
-                        highest_bid = db.query(AuctionBid).filter(
-                            AuctionBid.auction_id == auction.id
-                        ).order_by(desc(AuctionBid.amount)).first()
+            print(f"🕒 Found {len(expired_ids)} expired auctions. Processing...")
+            
+            for auction_id in expired_ids:
+                try:
+                    # Status change goes through the writer; Shoper/WebSocket calls happen outside it
+                    auction, highest_bid = await run_write(_end_auction, auction_id, now)
+                    if auction is None:
+                        continue
+                    
+                    if highest_bid:
+                        print(f"✅ Auction #{auction.id} ended. Winner: User {highest_bid.kartoteka_user_id} with {highest_bid.amount}")
                         
-                        auction.status = "ended"
-                        auction.ended_at = now
+                        # Broadcast WebSocket update
+                        await manager.broadcast({
+                            "type": "auction_ended",
+                            "auction_id": auction.id,
+                            "winner_id": highest_bid.kartoteka_user_id,
+                            "price": highest_bid.amount,
+                            "reason": "time_expired"
+                        })
                         
-                        if highest_bid:
-                            auction.winner_kartoteka_user_id = highest_bid.kartoteka_user_id
-                            auction.current_price = highest_bid.amount # Ensure final price is set
-                            print(f"✅ Auction #{auction.id} ended. Winner: User {highest_bid.kartoteka_user_id} with {highest_bid.amount}")
-                            
-                            # Broadcast WebSocket update
-                            await manager.broadcast({
-                                "type": "auction_ended",
-                                "auction_id": auction.id,
-                                "winner_id": highest_bid.kartoteka_user_id,
-                                "price": highest_bid.amount,
-                                "reason": "time_expired"
-                            })
-                            
-                            # Publish to Shoper if enabled
-                            if auction.auto_publish_to_shoper:
-                                shoper_id = await publish_winning_auction(auction, highest_bid)
-                                if shoper_id:
-                                    auction.published_shoper_id = shoper_id
-                                    
-                        else:
-                            print(f"❌ Auction #{auction.id} ended with no bids.")
-                            
-                    except Exception as e:
-                        print(f"⚠️ Error processing auction #{auction.id}: {e}")
-                        traceback.print_exc()
+                        # Publish to Shoper if enabled
+                        if auction.auto_publish_to_shoper:
+                            shoper_id = await publish_winning_auction(auction, highest_bid)
+                            if shoper_id:
+                                await run_write(_set_published_shoper_id, auction.id, shoper_id)
+                                
+                    else:
+                        print(f"❌ Auction #{auction.id} ended with no bids.")
                         
-                db.commit()
-                
-            except Exception as e:
-                print(f"❌ Error in auction scheduler loop: {e}")
-                traceback.print_exc()
-            finally:
-                db.close()
+                except Exception as e:
+                    print(f"⚠️ Error processing auction #{auction_id}: {e}")
+                    traceback.print_exc()
                 
         except asyncio.CancelledError:
             print("🛑 Auction scheduler stopped.")
@@ -1,17 +1,23 @@
 from __future__ import annotations
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Text, event
+from typing import Any, Callable
+
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Text, UniqueConstraint, Index, event
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from sqlalchemy.engine import Engine
 
 from .settings import settings
 
 
+_is_sqlite = settings.database_url.startswith("sqlite")
+
 connect_args = {}
-if settings.database_url.startswith("sqlite"):
+if _is_sqlite:
     # Allow usage across threads and increase lock wait timeout
-    connect_args = {"check_same_thread": False, "timeout": 15}
+    connect_args = {"check_same_thread": False, "timeout": max(1, settings.sqlite_busy_timeout_ms // 1000)}
 
 engine: Engine = create_engine(
     settings.database_url,
@@ -20,25 +26,106 @@ engine: Engine = create_engine(
     pool_pre_ping=True,
 )
 
-if settings.database_url.startswith("sqlite"):
-    # Apply SQLite pragmas for better concurrency
+# Separate engine for reporting/read-only endpoints. With WAL these
+# connections read a consistent snapshot without blocking the writer.
+read_engine: Engine = create_engine(
+    settings.database_url,
+    connect_args=connect_args,
+    future=True,
+    pool_pre_ping=True,
+)
+
+# Journal mode actually in effect (WAL may fall back to DELETE)
+journal_mode: str | None = None
+
+
+def _apply_sqlite_pragmas(dbapi_connection, read_only: bool = False) -> None:
+    global journal_mode
+    cursor = dbapi_connection.cursor()
+    try:
+        wanted = (settings.sqlite_journal_mode or "WAL").upper()
+        try:
+            mode = cursor.execute(f"PRAGMA journal_mode={wanted}").fetchone()[0]
+        except Exception:
+            mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+        if str(mode).upper() != wanted:
+            # WAL needs shared memory next to the DB file; some volumes
+            # (network/bind mounts on Windows hosts) don't support it.
+            try:
+                mode = cursor.execute("PRAGMA journal_mode=DELETE").fetchone()[0]
+            except Exception:
+                pass
+            if journal_mode is None:
+                print(f"⚠️  SQLite journal_mode={wanted} not supported on this volume, using {mode}")
+        journal_mode = str(mode).lower()
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kib)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+if _is_sqlite:
     @event.listens_for(engine, "connect")
     def _set_sqlite_pragma(dbapi_connection, connection_record):  # type: ignore
         try:
-            cursor = dbapi_connection.cursor()
-            # Use DELETE mode instead of WAL to avoid permission issues
-            cursor.execute("PRAGMA journal_mode=DELETE")
-            cursor.execute("PRAGMA synchronous=NORMAL")
-            cursor.execute("PRAGMA busy_timeout=5000")
-            cursor.close()
-        except Exception:
-            pass
+            _apply_sqlite_pragmas(dbapi_connection)
+        except Exception as e:
+            print(f"⚠️  Could not apply SQLite pragmas: {e}")
+
+    @event.listens_for(read_engine, "connect")
+    def _set_sqlite_read_pragma(dbapi_connection, connection_record):  # type: ignore
+        try:
+            _apply_sqlite_pragmas(dbapi_connection, read_only=True)
+        except Exception as e:
+            print(f"⚠️  Could not apply SQLite pragmas: {e}")
+
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+# Read-only sessions for reporting endpoints (writes raise "attempt to write a readonly database")
+ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False, future=True)
+
+# Single writer thread: background jobs queue their writes here so they are
+# serialized instead of competing for the SQLite write lock.
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
+
+def _run_write_job(fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    db = SessionLocal()
+    try:
+        result = fn(db, *args, **kwargs)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def run_write(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run ``fn(session, *args, **kwargs)`` on the writer thread and commit.
+
+    Meant for background jobs (order poller, price updater, auction
+    scheduler). Objects loaded inside ``fn`` are detached afterwards, so
+    return plain values.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_writer, _run_write_job, fn, args, kwargs)
+
+
 Base = declarative_base()
 
 
 class Scan(Base):
     __tablename__ = "scans"
+    __table_args__ = (
+        Index("ix_scans_publish_status", "publish_status"),
+        Index("ix_scans_session_selected", "session_id", "selected_candidate_id"),
+        Index("ix_scans_published_shoper_id", "published_shoper_id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     filename = Column(String(255), nullable=True)
@@ -190,6 +277,12 @@ class Fingerprint(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_category_updated", "category_id", "updated_at"),
+        Index("ix_products_name", "name"),
+        Index("ix_products_code", "code"),
+        Index("ix_products_updated_at", "updated_at"),
+    )
     id = Column(Integer, primary_key=True)
     shoper_id = Column(Integer, unique=True, index=True, nullable=False)
     code = Column(String(128), nullable=True)
@@ -261,6 +354,10 @@ class BatchScanItem(Base):
     Contains all fields needed for full card analysis like single scan.
     """
     __tablename__ = "batch_scan_items"
+    __table_args__ = (
+        Index("ix_batch_items_batch_status_publish", "batch_id", "status", "publish_status"),
+        Index("ix_batch_items_publish_processed", "publish_status", "processed_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     batch_id = Column(Integer, ForeignKey("batch_scans.id", ondelete="CASCADE"), nullable=False, index=True)
     
@@ -384,6 +481,69 @@ class FurgonetkaShipment(Base):
     response_payload = Column(Text, nullable=True)  # JSON
 
 
+class ShoperOrder(Base):
+    """
+    Local copy of Shoper orders, kept in sync incrementally by the order poller.
+    Serves /orders and /orders/{id} without calling Shoper for unchanged orders.
+    """
+    __tablename__ = "shoper_orders"
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, unique=True, index=True, nullable=False)  # Shoper order ID
+    date = Column(String(32), nullable=True, index=True)
+    status_id = Column(Integer, nullable=True)
+    user_id = Column(Integer, nullable=True)
+    total = Column(Float, nullable=True)
+    items_count = Column(Integer, nullable=True)
+    cost = Column(Float, nullable=True)  # Sum of item purchase prices (known once details are synced)
+
+    # Hash of the raw Shoper summary - used to detect orders changed in Shoper
+    fingerprint = Column(String(64), nullable=True)
+    summary_json = Column(Text, nullable=False)  # Normalized row as returned by /orders
+    detail_json = Column(Text, nullable=True)  # Normalized row with items + buyer
+
+    synced_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    detail_synced_at = Column(DateTime, nullable=True)
+
+
+class ShoperOrderCoverage(Base):
+    """
+    Order ID range whose Shoper orders are all in the local store.
+    Ranges are merged as the poller and /orders backfill fill the gaps.
+    """
+    __tablename__ = "shoper_order_coverage"
+    id = Column(Integer, primary_key=True)
+    lo_id = Column(Integer, nullable=False)  # 0 = down to the oldest order
+    hi_id = Column(Integer, nullable=False)  # order_store.NEWEST = up to the newest order
+
+
+class SalesMetrics(Base):
+    """
+    Running sales aggregates (single row). Adjusted incrementally whenever the
+    order store changes and recomputed by the periodic reconcile task.
+    """
+    __tablename__ = "sales_metrics"
+    id = Column(Integer, primary_key=True)
+    orders_count = Column(Integer, default=0, nullable=False)
+    sold_count = Column(Integer, default=0, nullable=False)
+    sold_value_pln = Column(Float, default=0.0, nullable=False)
+    users_count = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    reconciled_at = Column(DateTime, nullable=True)
+
+
+class ReportDailyCount(Base):
+    """
+    Daily rollup of event counts (e.g. scans per day) for /reports.
+    Maintained incrementally by the mapper events in reporting.py.
+    """
+    __tablename__ = "report_daily_counts"
+    __table_args__ = (UniqueConstraint("metric", "day", name="uq_report_daily_metric_day"),)
+    id = Column(Integer, primary_key=True)
+    metric = Column(String(32), nullable=False)
+    day = Column(String(10), nullable=False)  # YYYY-MM-DD (UTC)
+    count = Column(Integer, default=0, nullable=False)
+
+
 # ========== AUCTIONS & BIDS (Integration with Kartoteka App) ==========
 
 class KartotekaUser(Base):
@@ -407,6 +567,9 @@ class Auction(Base):
     Managed from admin panel, visible in Kartoteka App.
     """
     __tablename__ = "auctions"
+    __table_args__ = (
+        Index("ix_auctions_status_end_time", "status", "end_time"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     
     # Link to existing product in shop (if already in Shoper)
@@ -571,6 +734,9 @@ def init_db():
         "inventory": [
             ("purchase_price", "FLOAT"),
         ],
+        "shoper_orders": [
+            ("cost", "FLOAT"),
+        ],
         "auctions": [
             ("product_id", "INTEGER"),
             ("catalog_id", "INTEGER"),
@@ -594,3 +760,13 @@ def init_db():
                         conn.exec_driver_sql(f'ALTER TABLE {table_name} ADD COLUMN {col_name} {col_type}')
             except Exception as e:
                 print(f"Could not migrate table {table_name}: {e}")
+
+    # create_all() only creates indexes together with new tables; add any
+    # index declared on the models that an existing database is missing.
+    with engine.begin() as conn:
+        for table in Base.metadata.tables.values():
+            for index in table.indexes:
+                try:
+                    index.create(bind=conn, checkfirst=True)
+                except Exception as e:
+                    print(f"Could not create index {index.name}: {e}")
@@ -6,7 +6,7 @@ from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 import shutil
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 import httpx
 import json
 import os
@@ -22,13 +22,17 @@ from .analysis.fingerprint import compute_fingerprint, pack_ndarray, unpack_ndar
 from .providers import get_provider, PokemonTCGProvider
 import httpx
 from .pricing import extract_prices_from_payload, compute_price_pln, list_variant_prices
-from .db import init_db, SessionLocal, Scan, ScanCandidate, Product, Fingerprint, Session, CardCatalog, InventoryItem, BatchScanItem
+from .db import init_db, SessionLocal, ReadSessionLocal, run_write, Scan, ScanCandidate, Product, Fingerprint, Session, CardCatalog, InventoryItem, BatchScanItem
 from sqlalchemy import func
 from .db import Session as ScanSession
 from .shoper import ShoperClient, upsert_products, publish_scan_to_shoper, build_shoper_payload, _category_name_from_id, get_shoper_categories, _get_related_products_from_category, build_product_attributes_payload
 from rapidfuzz import fuzz
 from .attributes import map_detected_to_shoper_attributes, simplify_attributes, simplify_categories
 from .db import PushSubscription
+from . import order_store
+from . import reporting
+from . import query_plan
+from . import queries
 from .warehouse import get_storage_summary, get_next_free_location, NoFreeLocationError, location_to_index, parse_warehouse_code, get_used_indices, get_next_free_location_for_batch
 from pywebpush import webpush, WebPushException
 import asyncio
@@ -366,9 +370,8 @@ async def get_box_details(box_key: str):
         all_codes = []
         
         # From Scans (published only)
-        scan_codes = db.query(Scan.warehouse_code, Scan.detected_name, Scan.detected_set, Scan.price_pln_final).filter(
-            Scan.warehouse_code.isnot(None),
-            Scan.publish_status == 'published'
+        scan_codes = queries.warehouse_scan_codes(
+            db, Scan.warehouse_code, Scan.detected_name, Scan.detected_set, Scan.price_pln_final
         ).all()
         
         # From InventoryItems
@@ -412,7 +415,7 @@ async def get_box_details(box_key: str):
             ).all()
             
             # Filter out products that already have a scan/location
-            scan_product_ids = {s.published_shoper_id for s in db.query(Scan.published_shoper_id).filter(Scan.published_shoper_id.isnot(None)).all()}
+            scan_product_ids = {s.published_shoper_id for s in queries.scanned_product_ids(db).all()}
             
             premium_row1_products = []
             for prod in products_without_location:
@@ -851,54 +854,53 @@ async def _auto_update_prices_task():
             await asyncio.sleep(interval_seconds)
             print(f"Starting scheduled price update...")
             
-            db = SessionLocal()
+            db = ReadSessionLocal()
             try:
                 # Get all catalog entries that need updating
-                entries = db.query(CardCatalog).limit(500).all()
-                
-                if not entries:
-                    print("No catalog entries to update")
+                entries = db.query(CardCatalog.id, CardCatalog.provider_id).limit(500).all()
+            finally:
+                db.close()
+            
+            if not entries:
+                print("No catalog entries to update")
+                continue
+            
+            provider = get_provider()
+            updates: dict[int, dict] = {}
+            
+            for entry_id, provider_id in entries:
+                try:
+                    details = await provider.details(provider_id)
+                    updates[entry_id] = _extract_prices_for_catalog(details)
+                    
+                    # Small delay to avoid rate limiting
+                    await asyncio.sleep(0.5)
+                    
+                except Exception as e:
+                    print(f"Failed to update catalog entry {entry_id}: {e}")
                     continue
-                
-                provider = get_provider()
+            
+            def _apply_price_updates(db) -> int:
                 updated_count = 0
-                
-                for entry in entries:
-                    try:
-                        details = await provider.details(entry.provider_id)
-                        prices_data = _extract_prices_for_catalog(details)
-                        
-                        changed = False
-                        if prices_data.get("price_normal_eur") is not None and prices_data["price_normal_eur"] != entry.price_normal_eur:
-                            entry.price_normal_eur = prices_data["price_normal_eur"]
+                for entry in db.query(CardCatalog).filter(CardCatalog.id.in_(list(updates))).all():
+                    prices_data = updates[entry.id]
+                    changed = False
+                    for field in ("price_normal_eur", "price_holo_eur", "price_reverse_eur"):
+                        if prices_data.get(field) is not None and prices_data[field] != getattr(entry, field):
+                            setattr(entry, field, prices_data[field])
                             changed = True
-                        if prices_data.get("price_holo_eur") is not None and prices_data["price_holo_eur"] != entry.price_holo_eur:
-                            entry.price_holo_eur = prices_data["price_holo_eur"]
-                            changed = True
-                        if prices_data.get("price_reverse_eur") is not None and prices_data["price_reverse_eur"] != entry.price_reverse_eur:
-                            entry.price_reverse_eur = prices_data["price_reverse_eur"]
-                            changed = True
-                        
-                        if changed:
-                            entry.prices_updated_at = datetime.utcnow()
-                            updated_count += 1
-                        
-                        # Small delay to avoid rate limiting
-                        await asyncio.sleep(0.5)
-                        
-                    except Exception as e:
-                        print(f"Failed to update catalog entry {entry.id}: {e}")
-                        continue
-                
-                db.commit()
-                print(f"Price update completed: {updated_count}/{len(entries)} entries updated")
-                
-                # TODO: Sync updated prices to Shoper products
-                # This would iterate over Product entries linked to updated CardCatalog entries
-                # and call Shoper API to update prices
-                
-            finally:
-                db.close()
+                    if changed:
+                        entry.prices_updated_at = datetime.utcnow()
+                        updated_count += 1
+                return updated_count
+            
+            # Single write through the serialized writer instead of holding a session during API calls
+            updated_count = await run_write(_apply_price_updates) if updates else 0
+            print(f"Price update completed: {updated_count}/{len(entries)} entries updated")
+            
+            # TODO: Sync updated prices to Shoper products
+            # This would iterate over Product entries linked to updated CardCatalog entries
+            # and call Shoper API to update prices
                 
         except Exception as e:
             print(f"Price auto-update task error: {e}")
@@ -953,6 +955,7 @@ async def _on_startup():
     if settings.shoper_auto_sync_on_startup:
         await _sync_products_if_needed(force=True)
     asyncio.create_task(check_for_new_orders())
+    asyncio.create_task(_reconcile_sales_metrics_task())
     
     # Start price auto-update background task
     if getattr(settings, 'price_auto_update_enabled', False):
@@ -967,6 +970,12 @@ async def _on_startup():
     
     # Migrate purchase_price for existing products
     _migrate_purchase_prices()
+
+    # Seed the daily report rollups on first start
+    try:
+        reporting.backfill_daily_counts()
+    except Exception as e:
+        print(f"❌ Failed to backfill report rollups: {e}")
 
 
 @app.post("/notifications/subscribe")
@@ -1064,10 +1073,16 @@ async def check_for_new_orders():
     Background task that checks for new orders every 60 seconds.
     Uses persistent file storage to track last processed order ID.
     Only fetches NEW orders since last check (FAST!).
+
+    Also keeps the local order store in sync: new orders are stored as they
+    arrive and every ORDER_STORE_RECHECK_POLLS polls the most recent page is
+    compared against stored fingerprints so that orders edited in Shoper get
+    refreshed.
     """
     # Load last processed order ID from file (persistent across restarts)
     last_order_id = read_last_order_id()
     print(f"📋 Order monitoring started. Last processed order ID: {last_order_id}")
+    poll_no = 0
 
     while True:
         await asyncio.sleep(60)  # Check every 60 seconds
@@ -1076,6 +1091,7 @@ async def check_for_new_orders():
                 continue
 
             client = ShoperClient(settings.shoper_base_url, settings.shoper_access_token)
+            poll_no += 1
             
             # OPTIMIZED: Fetch only NEW orders since last check
             # This is MUCH faster than fetching all orders!
@@ -1084,6 +1100,24 @@ async def check_for_new_orders():
                 limit=50  # Max 50 new orders per check
             )
 
+            # Persist new orders (with details) in the local order store.
+            # An empty result may be a swallowed error, so it proves nothing.
+            if new_orders:
+                try:
+                    await _store_fetched_orders(client, new_orders, limit=50, above=last_order_id)
+                except Exception as store_err:
+                    print(f"⚠️  Could not store new orders locally: {store_err}")
+
+            # Pick up status/amount changes made directly in Shoper
+            if poll_no % ORDER_STORE_RECHECK_POLLS == 0:
+                try:
+                    recent = await client.fetch_recent_orders(limit=50)
+                    changed = await _store_fetched_orders(client, recent, limit=50)
+                    if changed:
+                        print(f"🔄 Refreshed {changed} changed order(s) in local store")
+                except Exception as recheck_err:
+                    print(f"⚠️  Order store recheck failed: {recheck_err}")
+
             if new_orders:
                 # Find the highest order ID
                 max_order_id = last_order_id
@@ -1116,14 +1150,10 @@ async def check_for_new_orders():
                     for order in truly_new_orders:
                         order_id = order.get("order_id") or order.get("id")
                         
-                        # Fetch full order details (with items, buyer info)
+                        # Full order details (with items, buyer info) - served from the local store
                         try:
-                            detailed_order = await client.fetch_order_detail(order_id)
-                            if detailed_order:
-                                # Normalize to same format as list_orders endpoint
-                                # We need buyer info and items for rich notification
-                                normalized = await get_order_details(order_id)
-                                
+                            normalized = await get_order_details(order_id, refresh=False)
+                            if isinstance(normalized, dict):
                                 # Send Web Push (browser)
                                 db = SessionLocal()
                                 try:
@@ -1160,6 +1190,9 @@ async def check_for_new_orders():
             traceback.print_exc()
 
 
+# Every N polls (~N minutes) re-check the newest page of orders for changes
+ORDER_STORE_RECHECK_POLLS = 5
+
 # File-based persistence for last order ID
 LAST_ORDER_ID_FILE = Path(settings.upload_dir).parent / "last_order_id.txt"
 
@@ -1283,58 +1316,61 @@ async def send_rich_order_notification(order: dict) -> None:
 # In-memory timestamp of last product sync
 _last_products_sync_ts: float | None = None
 _products_sync_in_progress: bool = False
-_sales_cache: dict | None = None
 _taxonomy_cache: dict[str, dict] = {}
-_orders_cache: dict | None = None
-_orders_cache_ts: float | None = None
 
 async def _get_sales_metrics():
-    global _sales_cache
-    now = time.time()
-    ttl = max(1, int(getattr(settings, 'sales_metrics_ttl_minutes', 5))) * 60
-    if _sales_cache and (now - _sales_cache.get('ts', 0) < ttl):
-        return _sales_cache.get('data')
-    sold_count = 0
-    sold_value_pln = 0.0
-    users_count = None
+    """Return running sales aggregates from the local order store.
+
+    Never calls Shoper - totals are kept up to date by the order poller and
+    corrected by ``_reconcile_sales_metrics_task``.
+    """
+    db = ReadSessionLocal()
     try:
-        if settings.shoper_base_url and settings.shoper_access_token:
-            client = ShoperClient(settings.shoper_base_url, settings.shoper_access_token)
-            orders = await client.fetch_all_orders(limit=200)
-            for o in orders:
-                c = o.get("total_products")
-                if c is None:
-                    products = (
-                        o.get("products")
-                        or o.get("items")
-                        or o.get("orders_products")
-                        or o.get("order_products")
-                        or []
-                    )
-                    if isinstance(products, dict):
-                        products = products.get("items") or products.get("list") or []
-                    # Avoid fetching per-order products here for speed
-                    try:
-                        c = sum(int(p.get("quantity") or p.get("qty") or p.get("count") or 0) for p in (products or []) if isinstance(p, dict))
-                    except Exception:
-                        c = 0
-                try:
-                    sold_count += int(c or 0)
-                except Exception:
-                    pass
-                try:
-                    val = o.get("sum") or o.get("total_gross") or o.get("total") or o.get("amount")
-                    if val is not None:
-                        sold_value_pln += float(str(val).replace(",", "."))
-                except Exception:
-                    pass
-            users = await client.fetch_all_users(limit=200)
-            users_count = len(users)
+        return order_store.get_sales_metrics(db)
     except Exception:
-        pass
-    data = {"sold_count": sold_count, "sold_value_pln": sold_value_pln, "users_count": users_count}
-    _sales_cache = {"ts": now, "data": data}
-    return data
+        return {"sold_count": 0, "sold_value_pln": 0.0, "users_count": None}
+    finally:
+        db.close()
+
+
+async def _reconcile_sales_metrics():
+    """Sync recently edited/missing orders into the store and recompute sales totals exactly.
+
+    Only the newest ``sales_metrics_reconcile_orders`` orders are re-read from
+    Shoper; the totals themselves are rebuilt from the whole local store.
+    """
+    if not settings.shoper_base_url or not settings.shoper_access_token:
+        return
+    client = ShoperClient(settings.shoper_base_url, settings.shoper_access_token)
+    window = max(1, min(int(getattr(settings, 'sales_metrics_reconcile_orders', 250)), 250))
+    orders = await client.fetch_recent_orders(limit=window)
+    changed = await _store_fetched_orders(client, orders, limit=window)
+    users_count = None
+    try:
+        # With limit=1 the page count equals the number of users
+        meta = await client.fetch_users_page(page=1, limit=1)
+        users_count = meta.get("pages")
+        if users_count is None:
+            users_count = len(await client.fetch_all_users(limit=200))
+    except Exception as e:
+        print(f"⚠️  Could not count Shoper users: {e}")
+    def _recompute(db) -> tuple[int, int, float]:
+        row = order_store.recompute_sales_metrics(db, users_count=users_count)
+        return row.orders_count, row.sold_count, row.sold_value_pln
+
+    orders_count, sold_count, sold_value = await run_write(_recompute)
+    print(f"📊 Sales metrics reconciled: {orders_count} orders, {sold_count} items, {sold_value:.2f} PLN ({changed} order(s) refreshed)")
+
+
+async def _reconcile_sales_metrics_task():
+    """Background task: reconcile sales metrics at startup and then periodically."""
+    interval = max(1, int(getattr(settings, 'sales_metrics_reconcile_minutes', 60))) * 60
+    while True:
+        try:
+            await _reconcile_sales_metrics()
+        except Exception as e:
+            print(f"❌ Sales metrics reconcile failed: {e}")
+        await asyncio.sleep(interval)
 
 def _tax_cache_get(key: str):
     now = time.time()
@@ -2825,13 +2861,7 @@ async def confirm_candidate(payload: ConfirmRequest):
 def list_scans(limit: int = 20, session_id: int | None = None):
     db = SessionLocal()
     try:
-        q = db.query(Scan)
-        if session_id is not None:
-            try:
-                q = q.filter(Scan.session_id == int(session_id))
-            except Exception:
-                pass
-        rows = q.order_by(Scan.id.desc()).limit(max(1, min(limit, 200))).all()
+        rows = queries.scan_history(db, session_id).limit(max(1, min(limit, 200))).all()
         items: list[ScanHistoryItem] = []
         for s in rows:
             selected = None
@@ -2896,27 +2926,12 @@ async def list_products(limit: int = 50, page: int = 1, category_id: int | None
             print(f"Error loading categories from ids_dump.json: {e}")
             pass
 
-        query = db.query(Product)
-        if category_id is not None:
-            query = query.filter(Product.category_id == category_id)
-        if q:
-            like = f"%{q}%"
-            query = query.filter(Product.name.ilike(like))
+        query = queries.product_listing(db, category_id=category_id, q=q)
 
         # Get total count after filters
         total_count = query.count()
 
-        sort_map = {
-            "name": Product.name,
-            "price": Product.price,
-            "stock": Product.stock,
-            "updated_at": Product.updated_at,
-        }
-        col = sort_map.get((sort or "").lower(), Product.updated_at)
-        if (order or "").lower() == "desc":
-            query = query.order_by(col.desc().nullslast())
-        else:
-            query = query.order_by(col.asc().nullslast())
+        query = queries.order_product_listing(query, sort, order)
         
         safe_limit = max(1, min(limit, 500))
         safe_page = max(1, page)
@@ -3754,7 +3769,7 @@ async def publish_session(session_id: int):
     published = 0
     failed = 0
     try:
-        scans = db.query(Scan).filter(Scan.session_id == session_id, Scan.selected_candidate_id.isnot(None)).all()
+        scans = queries.selected_scans(db, session_id).all()
         for s in scans:
             cand = db.get(ScanCandidate, s.selected_candidate_id)
             if not cand:
@@ -4043,11 +4058,24 @@ async def debug_get_shoper_product(product_id: int):
         return JSONResponse({"error": f"Product {product_id} not found"}, status_code=404)
 
 
+@app.get("/debug/query-plans")
+def debug_query_plans():
+    """Run EXPLAIN QUERY PLAN on the hot endpoint queries and flag full table scans."""
+    if not settings.database_url.startswith("sqlite"):
+        return JSONResponse({"error": "Query plan check is only available for SQLite"}, status_code=400)
+    db = ReadSessionLocal()
+    try:
+        report = query_plan.check_query_plans(db)
+        return {"ok": all(r["ok"] for r in report), "queries": report}
+    finally:
+        db.close()
+
+
 @app.get("/sessions/{session_id}/publish/preview")
 def publish_preview(session_id: int):
     db = SessionLocal()
     try:
-        scans = db.query(Scan).filter(Scan.session_id == session_id, Scan.selected_candidate_id.isnot(None)).all()
+        scans = queries.selected_scans(db, session_id).all()
         payloads: list[dict] = []
         for s in scans:
             cand = db.get(ScanCandidate, s.selected_candidate_id)
@@ -4075,251 +4103,376 @@ async def import_inventory_csv(file: UploadFile = File(...)):
  
 
 
+async def _normalize_order(
+    client: ShoperClient,
+    o: dict,
+    detailed: bool = False,
+    db=None,
+    prod_cache_by_code: dict | None = None,
+    prod_cache_by_id: dict | None = None,
+) -> dict:
+    """Normalize a raw Shoper order into the compact shape used by the UI.
+
+    With ``detailed`` the row also carries simplified items (enriched from
+    local products) and buyer info; missing embedded products are fetched
+    from Shoper for this order only.
+    """
+    if prod_cache_by_code is None:
+        prod_cache_by_code = {}
+    if prod_cache_by_id is None:
+        prod_cache_by_id = {}
+    oid = o.get("order_id") or o.get("id") or o.get("orderId")
+    ts = o.get("date") or o.get("created_at") or o.get("add_date") or o.get("createdAt")
+    total = (o.get("sum") or o.get("total_gross") or o.get("total") or o.get("amount") or 0)
+    # prefer explicit total_products field when present
+    items_count = o.get("total_products")
+    if items_count is None:
+        products = o.get("products") or o.get("items") or o.get("orders_products") or []
+        if isinstance(products, dict):
+            products = products.get("items") or products.get("list") or []
+        try:
+            items_count = sum(int(p.get("quantity") or p.get("qty") or p.get("count") or 0) for p in (products or []) if isinstance(p, dict))
+        except Exception:
+            items_count = None
+    # Status info
+    st = o.get("status") or {}
+    st_name = None
+    try:
+        tr = st.get("translations")
+        if isinstance(tr, dict):
+            # Prefer configured language code
+            lang = getattr(settings, "default_language_code", None) or "pl_PL"
+            tr_lang = tr.get(lang)
+            if isinstance(tr_lang, dict):
+                st_name = tr_lang.get("name")
+            if not st_name:
+                # fallback: first entry
+                for _k, _v in tr.items():
+                    if isinstance(_v, dict) and _v.get("name"):
+                        st_name = _v.get("name")
+                        break
+    except Exception:
+        pass
+    st_type = (st.get("type") if isinstance(st, dict) else None) or o.get("status_type")
+    st_id = (st.get("status_id") if isinstance(st, dict) else None) or o.get("status_id")
+    st_color = (st.get("color") if isinstance(st, dict) else None)
+
+    # Extract user info
+    user_info = {}
+    try:
+        user = o.get("user")
+        if isinstance(user, dict):
+            user_info = {
+                "firstname": user.get("firstname"),
+                "lastname": user.get("lastname"),
+                "email": user.get("email") or o.get("email"),
+            }
+        elif o.get("email"):
+            user_info = {"email": o.get("email")}
+    except Exception:
+        pass
+
+    row = {
+        "id": oid,
+        "date": ts,
+        "total": total,
+        "items_count": items_count,
+        "delivery_date": o.get("delivery_date"),
+        "status": {"type": st_type, "id": st_id, "color": st_color, "name": st_name},
+        "user": user_info,
+    }
+    if not detailed:
+        return row
+
+    # Attach simplified items if present
+    prods = (
+        o.get("products")
+        or o.get("orders_products")
+        or o.get("order_products")
+        or o.get("items")
+        or []
+    )
+    if isinstance(prods, dict):
+        prods = prods.get("items") or prods.get("list") or []
+    # Fallback: fetch per-order products if empty
+    if (not prods) and oid is not None:
+        try:
+            prods = await client.fetch_order_products(oid)
+        except Exception:
+            prods = []
+    simp: list[dict] = []
+    if isinstance(prods, list):
+        def _emit(pobj: dict):
+            if not isinstance(pobj, dict):
+                return
+            name = pobj.get("name") or pobj.get("product_name") or pobj.get("title")
+            code = pobj.get("code") or pobj.get("sku") or pobj.get("product_code")
+            pid = pobj.get("product_id") or pobj.get("id")
+            qty = pobj.get("quantity") or pobj.get("qty") or pobj.get("count") or 0
+            price = pobj.get("price") or pobj.get("price_gross") or pobj.get("sum") or pobj.get("amount")
+            # concatenate options to name if present
+            try:
+                topts = pobj.get("text_options")
+                if isinstance(topts, list) and topts:
+                    optstr = ", ".join([str(x.get("value")) for x in topts if isinstance(x, dict) and x.get("value")])
+                    if optstr:
+                        name = f"{name} ({optstr})"
+            except Exception:
+                pass
+            try:
+                qty = int(qty)
+            except Exception:
+                try:
+                    qty = int(float(str(qty).replace(",", ".")))
+                except Exception:
+                    qty = 0
+            try:
+                price = float(str(price).replace(",", ".")) if price is not None else None
+            except Exception:
+                price = None
+            # Enrich with image/permalink/purchase_price via local products when possible
+            image_url = None
+            permalink = None
+            purchase_price = None
+            try:
+                if code and code in prod_cache_by_code:
+                    image_url, permalink, purchase_price = prod_cache_by_code.get(code) or (None, None, None)
+                elif isinstance(pid, int) and pid in prod_cache_by_id:
+                    image_url, permalink, purchase_price = prod_cache_by_id.get(pid) or (None, None, None)
+                elif db is not None:
+                    if code:
+                        pr = queries.product_by_code(db, code).first()
+                        if pr:
+                            image_url = _product_image_url(pr)
+                            permalink = pr.permalink
+                            purchase_price = float(pr.purchase_price) if pr.purchase_price else None
+                            prod_cache_by_code[code] = (image_url, permalink, purchase_price)
+                    if (image_url is None) and isinstance(pid, int):
+                        pr2 = db.query(Product).filter(Product.shoper_id == pid).first()
+                        if pr2:
+                            image_url = _product_image_url(pr2)
+                            permalink = pr2.permalink
+                            purchase_price = float(pr2.purchase_price) if pr2.purchase_price else None
+                            prod_cache_by_id[pid] = (image_url, permalink, purchase_price)
+            except Exception:
+                pass
+            simp.append({
+                "name": name,
+                "code": code,
+                "product_id": pid,
+                "quantity": qty,
+                "price": price,
+                "image": image_url,
+                "permalink": permalink,
+                "purchase_price": purchase_price,
+            })
+
+        for p in prods:
+            _emit(p)
+            # flatten children if any
+            try:
+                ch = p.get("children")
+                if isinstance(ch, list):
+                    for c in ch:
+                        _emit(c)
+            except Exception:
+                pass
+    # Buyer basic info
+    buyer = {"email": o.get("email")}
+    try:
+        b = o.get("billing_address") or {}
+        d = o.get("delivery_address") or {}
+        src = b or d or {}
+        buyer.update({
+            "firstname": src.get("firstname"),
+            "lastname": src.get("lastname"),
+            "phone": src.get("phone"),
+            "city": src.get("city"),
+            "postcode": src.get("postcode"),
+            "street1": src.get("street1"),
+            "country": src.get("country") or src.get("country_code"),
+        })
+    except Exception:
+        pass
+    row["items"] = simp
+    row["buyer"] = buyer
+    return row
+
+
+async def _store_orders(client: ShoperClient, raw_orders: list[dict], detailed: bool = True, only_changed: bool = True) -> int:
+    """Normalize raw Shoper orders and persist them in the local order store.
+
+    With ``only_changed`` orders whose fingerprint matches the stored copy are
+    skipped, so Shoper is only asked for products of new or changed orders.
+    """
+    pending: list[tuple[dict, dict]] = []
+    db = ReadSessionLocal()
+    try:
+        prod_cache_by_code: dict = {}
+        prod_cache_by_id: dict = {}
+        for o in raw_orders or []:
+            if not isinstance(o, dict):
+                continue
+            if only_changed and not order_store.is_changed(db, o):
+                continue
+            row = await _normalize_order(client, o, detailed=detailed, db=db, prod_cache_by_code=prod_cache_by_code, prod_cache_by_id=prod_cache_by_id)
+            pending.append((row, o))
+    finally:
+        db.close()
+    if not pending:
+        return 0
+
+    def _persist(db) -> int:
+        stored = 0
+        for row, o in pending:
+            if order_store.upsert_order(db, row, raw=o, detailed=detailed) is not None:
+                stored += 1
+        return stored
+
+    stored = await run_write(_persist)
+    return stored
+
+
+def _order_ids(raw_orders: list[dict]) -> list[int]:
+    ids: list[int] = []
+    for o in raw_orders or []:
+        try:
+            ids.append(int(o.get("order_id") or o.get("id")))
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return ids
+
+
+async def _store_fetched_orders(
+    client: ShoperClient,
+    raw_orders: list[dict],
+    limit: int,
+    above: int | None = None,
+    below: int | None = None,
+    detailed: bool = True,
+) -> int:
+    """Store one newest-first Shoper fetch and record the order ID range it covers.
+
+    ``above``/``below`` are the exclusive ID bounds the fetch was filtered on.
+    """
+    stored = await _store_orders(client, raw_orders, detailed=detailed)
+    lo, hi = order_store.fetched_range(_order_ids(raw_orders), limit, above=above, below=below)
+    await run_write(order_store.note_coverage, lo, hi)
+    return stored
+
+
+# Largest Shoper page requested by the /orders backfill, and pages per request
+ORDER_BACKFILL_BATCH = 250
+ORDER_BACKFILL_MAX_FETCHES = 10
+
+
+async def _backfill_orders(client: ShoperClient, top: int, needed: int, detailed: bool) -> None:
+    """Fetch older orders until the gap-free stored run ending at ``top`` holds ``needed`` orders.
+
+    Stops once the run reaches the oldest order. A run that does not contain
+    ``top`` at all (e.g. the poller stored newer orders after a gap) is
+    refilled from ``top`` downwards, so pages never skip unseen orders.
+    """
+    for _ in range(ORDER_BACKFILL_MAX_FETCHES):
+        db = SessionLocal()
+        try:
+            lo = order_store.covered_from(db, top)
+            have = order_store.count_between(db, lo, top) if lo is not None else 0
+        finally:
+            db.close()
+        if lo is not None and (lo == 0 or have >= needed):
+            return
+        batch = min(max(needed - have, 1), ORDER_BACKFILL_BATCH)
+        if lo is None and top >= order_store.NEWEST:
+            items = await client.fetch_recent_orders(limit=batch)
+            await _store_fetched_orders(client, items, limit=batch, detailed=detailed)
+        else:
+            below = lo if lo is not None else top + 1
+            items = await client.fetch_orders_before(below, limit=batch)
+            await _store_fetched_orders(client, items, limit=batch, below=below, detailed=detailed)
+
+
+# Shoper detail requests in flight at once when /orders fills in details
+ORDER_DETAIL_CONCURRENCY = 5
+
+
+async def _fetch_order_details(client: ShoperClient, order_ids: list[int]) -> list[dict]:
+    """Fetch raw order details, at most ``ORDER_DETAIL_CONCURRENCY`` at a time.
+
+    Failed orders are logged and left out; they keep their summary and are
+    asked for again on the next detailed read.
+    """
+    sem = asyncio.Semaphore(ORDER_DETAIL_CONCURRENCY)
+
+    async def _fetch(oid: int):
+        async with sem:
+            return await client.fetch_order_detail(oid)
+
+    results = await asyncio.gather(*(_fetch(oid) for oid in order_ids), return_exceptions=True)
+    details = []
+    for oid, result in zip(order_ids, results):
+        if isinstance(result, Exception):
+            print(f"Failed to fetch details of order #{oid}: {result}")
+        elif result:
+            details.append(result)
+    return details
+
+
 @app.get("/orders")
 async def list_orders(
     limit: int = 20, 
     page: int | None = None, 
+    cursor: int | None = Query(default=None, description="Return orders with ID lower than this (from X-Next-Cursor)"),
     detailed: bool = Query(default=False),
     auto_sync_furgonetka: bool = Query(default=True, description="Sync with Furgonetka in background")
 ):
-    """Fetch orders with caching and pagination support.
+    """Serve orders from the local order store with pagination support.
     
     Args:
         limit: Number of orders per page (default: 20, max: 250)
-        page: Page number (optional, defaults to fetch all)
+        page: Page number (optional, offset-based)
+        cursor: Keyset cursor - order ID to continue below (preferred over page)
         detailed: Include full order details (items, buyer info)
         auto_sync_furgonetka: Trigger background sync with Furgonetka
     
     Returns:
-        List of normalized order objects
+        List of normalized order objects, newest first. The ``X-Next-Cursor``
+        header carries the cursor for the next page.
     """
-    global _orders_cache, _orders_cache_ts
-    
     if not settings.shoper_base_url or not settings.shoper_access_token:
         return []
     
-    # Cache key based on parameters
-    cache_key = f"orders_{limit}_{page}_{detailed}"
-    now = time.time()
-    
-    # Different TTL for detailed vs simple requests
-    # Detailed requests are slower so cache longer, but refresh more often to get new order details
-    ttl = 120 if detailed else 300  # 2 min for detailed, 5 min for simple
+    limit = max(1, min(int(limit or 20), 250))
+    offset = (max(1, int(page)) - 1) * limit if (page is not None and cursor is None) else 0
+    client = ShoperClient(settings.shoper_base_url, settings.shoper_access_token)
     
-    # Check cache for both detailed and simple requests
-    if _orders_cache is not None and _orders_cache_ts is not None:
-        if now - _orders_cache_ts < ttl and cache_key in _orders_cache:
-            return _orders_cache[cache_key]
+    # Backfill from Shoper only where the store has no gap-free run of orders
+    # for the requested window (cold start, or history the poller never saw)
+    top = cursor - 1 if cursor is not None else order_store.NEWEST
+    try:
+        await _backfill_orders(client, top, needed=offset + limit, detailed=detailed)
+    except Exception as e:
+        print(f"Order store backfill failed: {e}")
+
+    db = SessionLocal()
+    try:
+        rows = order_store.list_rows(db, limit=limit, before_id=cursor, offset=offset)
+    finally:
+        db.close()
     
-    client = ShoperClient(settings.shoper_base_url, settings.shoper_access_token)
-    if page is not None:
-        meta = await client.fetch_orders_page(page=max(1, int(page or 1)), limit=max(1, min(int(limit or 20), 250)))
-        items = meta.get("items") or []
-    else:
-        # OPTIMIZED: Use fetch_recent_orders instead of fetch_all_orders
-        # This fetches only ONE page, respecting the limit!
-        items = await client.fetch_recent_orders(limit=max(1, min(int(limit or 20), 250)))
-    # Normalize a compact shape for UI
-    out = []
-    # Optional product cache and DB session for enrichment
-    prod_cache_by_code: dict[str, tuple[str|None, str|None, float|None]] = {}
-    prod_cache_by_id: dict[int, tuple[str|None, str|None, float|None]] = {}
-    db = SessionLocal() if detailed else None
-    for o in items:
-        oid = o.get("order_id") or o.get("id") or o.get("orderId")
-        ts = o.get("date") or o.get("created_at") or o.get("add_date") or o.get("createdAt")
-        total = (o.get("sum") or o.get("total_gross") or o.get("total") or o.get("amount") or 0)
-        # prefer explicit total_products field when present
-        items_count = o.get("total_products")
-        if items_count is None:
-            products = o.get("products") or o.get("items") or o.get("orders_products") or []
-            if isinstance(products, dict):
-                products = products.get("items") or products.get("list") or []
-            try:
-                items_count = sum(int(p.get("quantity") or p.get("qty") or p.get("count") or 0) for p in (products or []) if isinstance(p, dict))
-            except Exception:
-                items_count = None
-        # Status info
-        st = o.get("status") or {}
-        st_name = None
-        try:
-            tr = st.get("translations")
-            if isinstance(tr, dict):
-                # Prefer configured language code
-                lang = getattr(settings, "default_language_code", None) or "pl_PL"
-                tr_lang = tr.get(lang)
-                if isinstance(tr_lang, dict):
-                    st_name = tr_lang.get("name")
-                if not st_name:
-                    # fallback: first entry
-                    for _k, _v in tr.items():
-                        if isinstance(_v, dict) and _v.get("name"):
-                            st_name = _v.get("name")
-                            break
-        except Exception:
-            pass
-        st_type = (st.get("type") if isinstance(st, dict) else None) or o.get("status_type")
-        st_id = (st.get("status_id") if isinstance(st, dict) else None) or o.get("status_id")
-        st_color = (st.get("color") if isinstance(st, dict) else None)
-
-        # Extract user info
-        user_info = {}
-        try:
-            user = o.get("user")
-            if isinstance(user, dict):
-                user_info = {
-                    "firstname": user.get("firstname"),
-                    "lastname": user.get("lastname"),
-                    "email": user.get("email") or o.get("email"),
-                }
-            elif o.get("email"):
-                user_info = {"email": o.get("email")}
-        except Exception:
-            pass
-        
-        row = {
-            "id": oid,
-            "date": ts,
-            "total": total,
-            "items_count": items_count,
-            "delivery_date": o.get("delivery_date"),
-            "status": {"type": st_type, "id": st_id, "color": st_color, "name": st_name},
-            "user": user_info,
-        }
-        if detailed:
-            # Attach simplified items if present
-            prods = (
-                o.get("products")
-                or o.get("orders_products")
-                or o.get("order_products")
-                or o.get("items")
-                or []
-            )
-            if isinstance(prods, dict):
-                prods = prods.get("items") or prods.get("list") or []
-            # Fallback: fetch per-order products if empty
-            if (not prods) and oid is not None:
-                try:
-                    prods = await client.fetch_order_products(oid)
-                except Exception:
-                    prods = []
-            simp: list[dict] = []
-            if isinstance(prods, list):
-                def _emit(pobj: dict):
-                    if not isinstance(pobj, dict):
-                        return
-                    name = pobj.get("name") or pobj.get("product_name") or pobj.get("title")
-                    code = pobj.get("code") or pobj.get("sku") or pobj.get("product_code")
-                    pid = pobj.get("product_id") or pobj.get("id")
-                    qty = pobj.get("quantity") or pobj.get("qty") or pobj.get("count") or 0
-                    price = pobj.get("price") or pobj.get("price_gross") or pobj.get("sum") or pobj.get("amount")
-                    # concatenate options to name if present
-                    try:
-                        topts = pobj.get("text_options")
-                        if isinstance(topts, list) and topts:
-                            optstr = ", ".join([str(x.get("value")) for x in topts if isinstance(x, dict) and x.get("value")])
-                            if optstr:
-                                name = f"{name} ({optstr})"
-                    except Exception:
-                        pass
-                    try:
-                        qty = int(qty)
-                    except Exception:
-                        try:
-                            qty = int(float(str(qty).replace(",", ".")))
-                        except Exception:
-                            qty = 0
-                    try:
-                        price = float(str(price).replace(",", ".")) if price is not None else None
-                    except Exception:
-                        price = None
-                    # Enrich with image/permalink/purchase_price via local products when possible
-                    image_url = None
-                    permalink = None
-                    purchase_price = None
-                    try:
-                        if code and code in prod_cache_by_code:
-                            cached = prod_cache_by_code.get(code)
-                            if cached and len(cached) == 3:
-                                image_url, permalink, purchase_price = cached
-                            else:
-                                image_url, permalink = cached or (None, None)
-                        elif isinstance(pid, int) and pid in prod_cache_by_id:
-                            cached = prod_cache_by_id.get(pid)
-                            if cached and len(cached) == 3:
-                                image_url, permalink, purchase_price = cached
-                            else:
-                                image_url, permalink = cached or (None, None)
-                        elif db is not None:
-                            if code:
-                                pr = db.query(Product).filter(Product.code == code).first()
-                                if pr:
-                                    image_url = _product_image_url(pr)
-                                    permalink = pr.permalink
-                                    purchase_price = float(pr.purchase_price) if pr.purchase_price else None
-                                    prod_cache_by_code[code] = (image_url, permalink, purchase_price)
-                            if (image_url is None) and isinstance(pid, int):
-                                pr2 = db.query(Product).filter(Product.shoper_id == pid).first()
-                                if pr2:
-                                    image_url = _product_image_url(pr2)
-                                    permalink = pr2.permalink
-                                    purchase_price = float(pr2.purchase_price) if pr2.purchase_price else None
-                                    prod_cache_by_id[pid] = (image_url, permalink, purchase_price)
-                    except Exception:
-                        pass
-                    simp.append({
-                        "name": name,
-                        "code": code,
-                        "product_id": pid,
-                        "quantity": qty,
-                        "price": price,
-                        "image": image_url,
-                        "permalink": permalink,
-                        "purchase_price": purchase_price,
-                    })
-
-                for p in prods:
-                    _emit(p)
-                    # flatten children if any
-                    try:
-                        ch = p.get("children")
-                        if isinstance(ch, list):
-                            for c in ch:
-                                _emit(c)
-                    except Exception:
-                        pass
-            # Buyer basic info
-            buyer = {"email": o.get("email")}
-            try:
-                b = o.get("billing_address") or {}
-                d = o.get("delivery_address") or {}
-                src = b or d or {}
-                buyer.update({
-                    "firstname": src.get("firstname"),
-                    "lastname": src.get("lastname"),
-                    "phone": src.get("phone"),
-                    "city": src.get("city"),
-                    "postcode": src.get("postcode"),
-                    "street1": src.get("street1"),
-                    "country": src.get("country") or src.get("country_code"),
-                })
-            except Exception:
-                pass
-            row["items"] = simp
-            row["buyer"] = buyer
-        out.append(row)
-    if db is not None:
-        try:
-            db.close()
-        except Exception:
-            pass
+    # Fill in details for stored orders that only have a summary so far
+    if detailed:
+        missing = [r.order_id for r in rows if not r.detail_json]
+        if missing:
+            raw_missing = await _fetch_order_details(client, missing)
+            await _store_orders(client, raw_missing, detailed=True, only_changed=False)
+            db = SessionLocal()
+            try:
+                rows = order_store.list_rows(db, limit=limit, before_id=cursor, offset=offset)
+            finally:
+                db.close()
     
-    # Update cache (only for non-detailed to keep it fast)
-    if not detailed:
-        if _orders_cache is None:
-            _orders_cache = {}
-        _orders_cache[cache_key] = out
-        _orders_cache_ts = now
+    out = [order_store.load(r, detailed=detailed) for r in rows]
     
     # Trigger background sync with Furgonetka
     if auto_sync_furgonetka and out:
@@ -4331,7 +4484,10 @@ async def list_orders(
         except Exception as e:
             print(f"Failed to trigger Furgonetka sync: {e}")
 
-    return out
+    headers = {}
+    if len(rows) == limit:
+        headers["X-Next-Cursor"] = str(rows[-1].order_id)
+    return JSONResponse(out, headers=headers)
 
 
 @app.get("/orders/statuses")
@@ -4379,11 +4535,24 @@ async def get_order_statuses():
 
 
 @app.get("/orders/{order_id}")
-async def get_order_details(order_id: int):
-    """Fetch detailed information for a specific order."""
+async def get_order_details(order_id: int, refresh: bool = Query(default=False)):
+    """Return detailed information for a specific order.
+
+    Served from the local order store; Shoper is only asked when the order
+    has no stored details yet or ``refresh`` is set.
+    """
     if not settings.shoper_base_url or not settings.shoper_access_token:
         return JSONResponse({"error": "Shoper configuration missing"}, status_code=400)
     
+    if not refresh:
+        db = SessionLocal()
+        try:
+            rec = order_store.get_row(db, order_id)
+            if rec is not None and rec.detail_json:
+                return order_store.load(rec, detailed=True)
+        finally:
+            db.close()
+    
     client = ShoperClient(settings.shoper_base_url, settings.shoper_access_token)
     try:
         # Fetch single order with all details
@@ -4391,200 +4560,14 @@ async def get_order_details(order_id: int):
         if not order_data:
             return JSONResponse({"error": "Order not found"}, status_code=404)
         
-        # Normalize using the same logic as list_orders
-        # Process as a list with one item to reuse normalization
         db = SessionLocal()
-        prod_cache_by_code: dict[str, tuple[str|None, str|None]] = {}
-        prod_cache_by_id: dict[int, tuple[str|None, str|None]] = {}
-        
         try:
-            o = order_data
-            oid = o.get("order_id") or o.get("id") or o.get("orderId")
-            ts = o.get("date") or o.get("created_at") or o.get("add_date") or o.get("createdAt")
-            total = (o.get("sum") or o.get("total_gross") or o.get("total") or o.get("amount") or 0)
-            
-            # Extract items count
-            items_count = o.get("total_products")
-            if items_count is None:
-                products = o.get("products") or o.get("items") or o.get("orders_products") or []
-                if isinstance(products, dict):
-                    products = products.get("items") or products.get("list") or []
-                try:
-                    items_count = sum(int(p.get("quantity") or p.get("qty") or p.get("count") or 0) for p in (products or []) if isinstance(p, dict))
-                except Exception:
-                    items_count = None
-            
-            # Status info
-            st = o.get("status") or {}
-            st_name = None
-            try:
-                tr = st.get("translations")
-                if isinstance(tr, dict):
-                    lang = getattr(settings, "default_language_code", None) or "pl_PL"
-                    tr_lang = tr.get(lang)
-                    if isinstance(tr_lang, dict):
-                        st_name = tr_lang.get("name")
-                    if not st_name:
-                        for _k, _v in tr.items():
-                            if isinstance(_v, dict) and _v.get("name"):
-                                st_name = _v.get("name")
-                                break
-            except Exception:
-                pass
-            st_type = (st.get("type") if isinstance(st, dict) else None) or o.get("status_type")
-            st_id = (st.get("status_id") if isinstance(st, dict) else None) or o.get("status_id")
-            st_color = (st.get("color") if isinstance(st, dict) else None)
-            
-            # Extract user info
-            user_info = {}
-            try:
-                user = o.get("user")
-                if isinstance(user, dict):
-                    user_info = {
-                        "firstname": user.get("firstname"),
-                        "lastname": user.get("lastname"),
-                        "email": user.get("email") or o.get("email"),
-                    }
-                elif o.get("email"):
-                    user_info = {"email": o.get("email")}
-            except Exception:
-                pass
-            
-            # Build basic row
-            row = {
-                "id": oid,
-                "date": ts,
-                "total": total,
-                "items_count": items_count,
-                "delivery_date": o.get("delivery_date"),
-                "status": {"type": st_type, "id": st_id, "color": st_color, "name": st_name},
-                "user": user_info,
-            }
-            
-            # Attach detailed items
-            prods = (
-                o.get("products")
-                or o.get("orders_products")
-                or o.get("order_products")
-                or o.get("items")
-                or []
-            )
-            if isinstance(prods, dict):
-                prods = prods.get("items") or prods.get("list") or []
-            
-            # Fallback: fetch per-order products if empty
-            if (not prods) and oid is not None:
-                try:
-                    prods = await client.fetch_order_products(oid)
-                except Exception:
-                    prods = []
-            
-            simp: list[dict] = []
-            if isinstance(prods, list):
-                def _emit(pobj: dict):
-                    if not isinstance(pobj, dict):
-                        return
-                    name = pobj.get("name") or pobj.get("product_name") or pobj.get("title")
-                    code = pobj.get("code") or pobj.get("sku") or pobj.get("product_code")
-                    pid = pobj.get("product_id") or pobj.get("id")
-                    qty = pobj.get("quantity") or pobj.get("qty") or pobj.get("count") or 0
-                    price = pobj.get("price") or pobj.get("price_gross") or pobj.get("sum") or pobj.get("amount")
-                    
-                    # Concatenate options to name if present
-                    try:
-                        topts = pobj.get("text_options")
-                        if isinstance(topts, list) and topts:
-                            optstr = ", ".join([str(x.get("value")) for x in topts if isinstance(x, dict) and x.get("value")])
-                            if optstr:
-                                name = f"{name} ({optstr})"
-                    except Exception:
-                        pass
-                    
-                    try:
-                        qty = int(qty)
-                    except Exception:
-                        try:
-                            qty = int(float(str(qty).replace(",", ".")))
-                        except Exception:
-                            qty = 0
-                    try:
-                        price = float(str(price).replace(",", ".")) if price is not None else None
-                    except Exception:
-                        price = None
-                    
-                    # Enrich with image/permalink via local products when possible
-                    image_url = None
-                    permalink = None
-                    try:
-                        if code and code in prod_cache_by_code:
-                            image_url, permalink = prod_cache_by_code.get(code) or (None, None)
-                        elif isinstance(pid, int) and pid in prod_cache_by_id:
-                            image_url, permalink = prod_cache_by_id.get(pid) or (None, None)
-                        elif db is not None:
-                            if code:
-                                pr = db.query(Product).filter(Product.code == code).first()
-                                if pr:
-                                    image_url = _product_image_url(pr)
-                                    permalink = pr.permalink
-                                    prod_cache_by_code[code] = (image_url, permalink)
-                            if (image_url is None) and isinstance(pid, int):
-                                pr2 = db.query(Product).filter(Product.shoper_id == pid).first()
-                                if pr2:
-                                    image_url = _product_image_url(pr2)
-                                    permalink = pr2.permalink
-                                    prod_cache_by_id[pid] = (image_url, permalink)
-                    except Exception:
-                        pass
-                    
-                    simp.append({
-                        "name": name,
-                        "code": code,
-                        "product_id": pid,
-                        "quantity": qty,
-                        "price": price,
-                        "image": image_url,
-                        "permalink": permalink,
-                    })
-                
-                for p in prods:
-                    _emit(p)
-                    # flatten children if any
-                    try:
-                        ch = p.get("children")
-                        if isinstance(ch, list):
-                            for c in ch:
-                                _emit(c)
-                    except Exception:
-                        pass
-            
-            # Buyer basic info
-            buyer = {"email": o.get("email")}
-            try:
-                b = o.get("billing_address") or {}
-                d = o.get("delivery_address") or {}
-                src = b or d or {}
-                buyer.update({
-                    "firstname": src.get("firstname"),
-                    "lastname": src.get("lastname"),
-                    "phone": src.get("phone"),
-                    "city": src.get("city"),
-                    "postcode": src.get("postcode"),
-                    "street1": src.get("street1"),
-                    "country": src.get("country") or src.get("country_code"),
-                })
-            except Exception:
-                pass
-            
-            row["items"] = simp
-            row["buyer"] = buyer
-            
+            row = await _normalize_order(client, order_data, detailed=True, db=db)
+            order_store.upsert_order(db, row, raw=order_data, detailed=True)
+            db.commit()
             return row
         finally:
-            if db is not None:
-                try:
-                    db.close()
-                except Exception:
-                    pass
+            db.close()
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
@@ -4605,10 +4588,24 @@ async def update_order_status(order_id: int, payload: dict):
     if result.get("error"):
         return JSONResponse(result, status_code=result.get("status_code", 500))
     
-    # Invalidate orders cache
-    global _orders_cache, _orders_cache_ts
-    _orders_cache = None
-    _orders_cache_ts = None
+    # Refetch the order so the store gets Shoper's full status object
+    # (type, colour, translated name), not just the new id
+    try:
+        order_data = await client.fetch_order_detail(order_id)
+        if not order_data:
+            raise ValueError("order not returned")
+        db = ReadSessionLocal()
+        try:
+            row = await _normalize_order(client, order_data, detailed=True, db=db)
+        finally:
+            db.close()
+        await run_write(order_store.upsert_order, row, raw=order_data, detailed=True)
+    except Exception as e:
+        print(f"Failed to refetch order #{order_id} after status change: {e}")
+        try:
+            await run_write(order_store.update_status, order_id, status_id)
+        except Exception as e:
+            print(f"Failed to mark order #{order_id} for refetch in local store: {e}")
     
     return result
 
@@ -4623,18 +4620,21 @@ async def list_users(limit: int = 200, page: int | None = None):
         items = meta.get("items") or []
     else:
         items = await client.fetch_all_users(limit=max(1, min(int(limit or 200), 250)))
-    # Fetch orders to annotate whether user purchased anything
+    # Annotate whether user purchased anything (from the local order store)
     orders_user_ids = set()
+    db = SessionLocal()
     try:
-        orders = await client.fetch_all_orders(limit=200)
-        for o in orders or []:
-            uid = o.get("user_id")
-            if uid is not None:
-                orders_user_ids.add(uid)
+        orders_user_ids = order_store.customer_user_ids(db)
     except Exception:
         pass
+    finally:
+        db.close()
     out = []
     for u in items:
+        try:
+            has_orders = int(u.get("user_id") or u.get("id")) in orders_user_ids
+        except (TypeError, ValueError):
+            has_orders = False
         out.append({
             "user_id": u.get("user_id") or u.get("id"),
             "login": u.get("login"),  # kept for compatibility, UI may hide it
@@ -4645,103 +4645,24 @@ async def list_users(limit: int = 200, page: int | None = None):
             "email": u.get("email"),
             "active": u.get("active"),
             "newsletter": u.get("newsletter"),
-            "has_orders": (u.get("user_id") or u.get("id")) in orders_user_ids,
+            "has_orders": has_orders,
         })
     return out
 
 
 @app.get("/stats")
 async def stats():
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
-        total_scans = db.query(func.count(Scan.id)).scalar() or 0
-        scans_ready = db.query(func.count(Scan.id)).filter(Scan.selected_candidate_id.isnot(None)).scalar() or 0
-        scans_published = db.query(func.count(Scan.id)).filter(Scan.publish_status == "published").scalar() or 0
+        counts = reporting.scan_counts(db)
+        total_scans = counts["total_scans"]
+        scans_ready = counts["scans_ready"]
+        scans_published = counts["scans_published"]
         total_products = db.query(func.count(Product.id)).scalar() or 0
         
-        # Recent activity: Combined Scans and BatchScanItems (published)
-        # Fetch top 10 from each to ensure we get the true top 10 combined
-        
-        # 1. Recent Scans
-        scan_rows = db.query(Scan).filter(Scan.publish_status == "published").order_by(Scan.id.desc()).limit(10).all()
-        
-        # 2. Recent Batch Items
-        batch_rows = db.query(BatchScanItem).filter(BatchScanItem.publish_status == "published").order_by(BatchScanItem.processed_at.desc()).limit(10).all()
-        
-        combined_recent = []
-        
-        # Process Scans
-        for s in scan_rows:
-            image_url = None
-            if s.selected_candidate_id:
-                cand = db.get(ScanCandidate, s.selected_candidate_id)
-                if cand:
-                    image_url = cand.image
-            if not image_url:
-                first_cand = db.query(ScanCandidate).filter(ScanCandidate.scan_id == s.id).first()
-                if first_cand:
-                    image_url = first_cand.image
-            if not image_url and s.stored_path:
-                image_url = f"/uploads/{Path(s.stored_path).name}"
-            
-            permalink = None
-            if s.published_shoper_id:
-                product = db.query(Product).filter(Product.shoper_id == s.published_shoper_id).first()
-                if product:
-                    permalink = product.permalink
-            
-            combined_recent.append({
-                "type": "scan",
-                "id": s.id,
-                "date": s.created_at,
-                "created_at": s.created_at.isoformat(),
-                "name": s.detected_name,
-                "set": s.detected_set,
-                "number": s.detected_number,
-                "priced": bool(s.price_pln_final is not None),
-                "image": image_url,
-                "price_pln_final": s.price_pln_final,
-                "permalink": permalink,
-            })
-            
-        # Process Batch Items
-        for b in batch_rows:
-            image_url = None
-            if b.matched_image:
-                image_url = b.matched_image
-            elif b.stored_path:
-                image_url = f"/uploads/{Path(b.stored_path).name}"
-                
-            permalink = None
-            if b.published_shoper_id:
-                product = db.query(Product).filter(Product.shoper_id == b.published_shoper_id).first()
-                if product:
-                    permalink = product.permalink
-            
-            # Use processed_at or fallback to now if missing
-            date_val = b.processed_at or datetime.utcnow()
-            
-            combined_recent.append({
-                "type": "batch_item",
-                "id": b.id,
-                "date": date_val,
-                "created_at": date_val.isoformat(),
-                "name": b.matched_name or b.detected_name,
-                "set": b.matched_set or b.detected_set,
-                "number": b.matched_number or b.detected_number,
-                "priced": bool(b.price_pln_final is not None),
-                "image": image_url,
-                "price_pln_final": b.price_pln_final,
-                "permalink": permalink,
-            })
-            
-        # Sort by date descending and take top 10
-        combined_recent.sort(key=lambda x: x["date"], reverse=True)
-        recent = combined_recent[:10]
-        
-        # Remove raw date object before returning
-        for r in recent:
-            r.pop("date", None)
+        # Recent activity: Combined Scans and BatchScanItems (published),
+        # candidate images and permalinks joined in SQL
+        recent = reporting.recent_published(db, limit=10)
 
         # Augment with external API metrics if configured
         metrics = await _get_sales_metrics()
@@ -4751,34 +4672,12 @@ async def stats():
         users_count = metrics.get("users_count")
 
         # Inventory stats (from all products in shop)
-        # Calculate total cost and value (price × stock)
-        total_inventory_cost = 0.0
-        total_inventory_value = 0.0
-        products_counted = 0
-        products_without_purchase_price = 0
-        
-        products_in_stock = db.query(Product).filter(Product.stock > 0).all()
-        for product in products_in_stock:
-            stock = int(product.stock or 0)
-            price = float(product.price or 0.0)
-            purchase_price = float(product.purchase_price or 0.0)
-            
-            # If purchase_price is not set, calculate it dynamically
-            if not purchase_price and price:
-                products_without_purchase_price += 1
-                # Use rarity from linked catalog or estimate from price
-                rarity = None
-                if product.catalog_id:
-                    catalog_entry = db.get(CardCatalog, product.catalog_id)
-                    if catalog_entry:
-                        rarity = catalog_entry.rarity
-                purchase_price = _calculate_purchase_cost(rarity, price)
-            
-            if purchase_price > 0:
-                products_counted += 1
-            
-            total_inventory_cost += stock * purchase_price
-            total_inventory_value += stock * price
+        # Total cost and value (price × stock) aggregated in SQL
+        inv = reporting.inventory_cost_value(db, _calculate_purchase_cost)
+        total_inventory_cost = inv["total_inventory_cost"]
+        total_inventory_value = inv["total_inventory_value"]
+        products_counted = inv["products_counted"]
+        products_without_purchase_price = inv["products_without_purchase_price"]
         
         # Debug logging
         if products_without_purchase_price > 0:
@@ -4806,25 +4705,20 @@ async def stats():
 
 @app.get("/reports")
 async def reports(range_days: int | None = None, low_stock_threshold: int = 1, top_n: int = 10):
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         # Metrics
-        total_products = db.query(func.count(Product.id)).scalar() or 0
-        total_scans = db.query(func.count(Scan.id)).scalar() or 0
-        scans_ready = db.query(func.count(Scan.id)).filter(Scan.selected_candidate_id.isnot(None)).scalar() or 0
-        scans_published = db.query(func.count(Scan.id)).filter(Scan.publish_status == "published").scalar() or 0
-
-        # Inventory numbers
-        rows_inv = db.query(Product.stock, Product.price).all()
-        inv_units = 0
-        inv_value = 0.0
-        for st, pr in rows_inv:
-            s = int(st or 0)
-            p = float(pr or 0.0)
-            inv_units += s
-            inv_value += s * p
-
-        # Build date keys
+        counts = reporting.scan_counts(db)
+        total_scans = counts["total_scans"]
+        scans_ready = counts["scans_ready"]
+        scans_published = counts["scans_published"]
+
+        # Inventory numbers (SUM(stock), SUM(stock*price) in SQL)
+        inv = reporting.inventory_totals(db)
+        total_products = inv["total_products"]
+        inv_units = inv["inventory_units"]
+        inv_value = inv["inventory_value_pln"]
+
         # Build daily key series (if range specified use that many days, else 30 for charts only)
         if range_days is not None:
             try:
@@ -4833,33 +4727,13 @@ async def reports(range_days: int | None = None, low_stock_threshold: int = 1, t
                 days = 30
         else:
             days = 30
-        today = datetime.utcnow().date()
-        start = today - timedelta(days=days - 1)
-        keys = [(start + timedelta(days=i)).isoformat() for i in range(days)]
-
-        # Products per day (by updated_at)
-        prod_rows = db.query(Product.updated_at).filter(Product.updated_at.isnot(None)).all()
-        prod_map: dict[str, int] = {k: 0 for k in keys}
-        for (dt,) in prod_rows:
-            try:
-                d = (dt.date() if hasattr(dt, 'date') else dt).isoformat()
-                if d in prod_map:
-                    prod_map[d] += 1
-            except Exception:
-                continue
-        products_per_day = [{"date": k, "count": prod_map[k]} for k in keys]
+        keys = reporting.day_keys(days)
 
-        # Scans per day (by created_at)
-        scan_rows = db.query(Scan.created_at).all()
-        scan_map: dict[str, int] = {k: 0 for k in keys}
-        for (dt,) in scan_rows:
-            try:
-                d = (dt.date() if hasattr(dt, 'date') else dt).isoformat()
-                if d in scan_map:
-                    scan_map[d] += 1
-            except Exception:
-                continue
-        scans_per_day = [{"date": k, "count": scan_map[k]} for k in keys]
+        # Products per day (by updated_at) - grouped in SQL over the window only
+        products_per_day = reporting.products_per_day(db, keys)
+
+        # Scans per day (by created_at) - read from the daily rollup table
+        scans_per_day = reporting.daily_series(db, reporting.SCANS_METRIC, keys)
 
         # Category breakdown (top N)
         # Start with fallback categories
@@ -4914,23 +4788,20 @@ async def reports(range_days: int | None = None, low_stock_threshold: int = 1, t
             for r in low_stock_rows
         ]
 
-        # Top value products (price * stock)
-        rows_all = db.query(Product).all()
-        enriched = []
-        for r in rows_all:
-            s = int(r.stock or 0)
-            p = float(r.price or 0.0)
-            enriched.append({
+        # Top value products (price * stock), ordered and limited in SQL
+        top_value = [
+            {
                 "id": r.id,
                 "code": r.code,
                 "name": r.name,
-                "stock": s,
-                "price": p,
+                "stock": int(r.stock or 0),
+                "price": float(r.price or 0.0),
                 "permalink": r.permalink,
                 "image": _product_image_url(r),
-                "value": s * p,
-            })
-        top_value = sorted(enriched, key=lambda x: x["value"], reverse=True)[: max(1, min(50, int(top_n)))]
+                "value": int(r.stock or 0) * float(r.price or 0.0),
+            }
+            for r in reporting.top_value_products(db, max(1, min(50, int(top_n))))
+        ]
 
         # External API metrics — reuse cached sales/users (fast and spójne z Panelem)
         metrics = await _get_sales_metrics()
@@ -4938,115 +4809,8 @@ async def reports(range_days: int | None = None, low_stock_threshold: int = 1, t
         sold_count = metrics.get("sold_count", 0)
         users_count = metrics.get("users_count")
         
-        # Sales over time (revenue, quantity, cost, profit per day)
-        sales_per_day = []
-        if settings.shoper_base_url and settings.shoper_access_token:
-            try:
-                client = ShoperClient(settings.shoper_base_url, settings.shoper_access_token)
-                orders = await client.fetch_all_orders(limit=500)
-                
-                # Initialize sales map with all dates in range
-                sales_map: dict[str, dict[str, float | int]] = {
-                    k: {"revenue": 0.0, "quantity": 0, "cost": 0.0, "profit": 0.0} 
-                    for k in keys
-                }
-                
-                for order in orders:
-                    try:
-                        # Parse order date
-                        order_date_str = order.get("date") or order.get("date_add")
-                        if not order_date_str:
-                            continue
-                        
-                        # Handle different date formats
-                        if isinstance(order_date_str, str):
-                            try:
-                                order_date = datetime.fromisoformat(order_date_str.replace('Z', '+00:00')).date()
-                            except:
-                                try:
-                                    order_date = datetime.strptime(order_date_str.split(' ')[0], '%Y-%m-%d').date()
-                                except:
-                                    continue
-                        else:
-                            order_date = order_date_str.date()
-                        
-                        order_date_key = order_date.isoformat()
-                        
-                        if order_date_key not in sales_map:
-                            continue
-                        
-                        # Revenue
-                        total = order.get("sum") or order.get("total_gross") or order.get("total") or order.get("amount") or 0
-                        try:
-                            revenue = float(str(total).replace(",", "."))
-                            sales_map[order_date_key]["revenue"] += revenue
-                        except:
-                            pass
-                        
-                        # Quantity and cost - try multiple approaches
-                        items = order.get("products") or order.get("items") or order.get("orders_products") or order.get("order_products") or []
-                        if isinstance(items, dict):
-                            items = items.get("items") or items.get("list") or []
-                        
-                        # If no items found in order, try fetching them separately
-                        if not items:
-                            order_id = order.get("order_id") or order.get("id")
-                            if order_id:
-                                try:
-                                    items = await client.fetch_order_products(int(order_id))
-                                except:
-                                    items = []
-                        
-                        for item in items:
-                            if not isinstance(item, dict):
-                                continue
-                            
-                            qty = int(item.get("quantity") or item.get("qty") or item.get("count") or 0)
-                            sales_map[order_date_key]["quantity"] += qty
-                            
-                            # Try to get purchase cost from Product
-                            product_code = item.get("code")
-                            if product_code and qty > 0:
-                                product = db.query(Product).filter(Product.code == product_code).first()
-                                if product and product.purchase_price:
-                                    sales_map[order_date_key]["cost"] += qty * float(product.purchase_price)
-                    except Exception as e:
-                        print(f"Error processing order for sales_per_day: {e}")
-                        continue
-                
-                # Calculate profit for each day after all orders processed
-                for k, v in sales_map.items():
-                    v["profit"] = v["revenue"] - v["cost"]
-                
-                # Convert to list
-                sales_per_day = [
-                    {
-                        "date": k,
-                        "revenue": round(v["revenue"], 2),
-                        "quantity": int(v["quantity"]),
-                        "cost": round(v["cost"], 2),
-                        "profit": round(v["profit"], 2),
-                    }
-                    for k, v in sales_map.items()
-                ]
-                
-                # Debug: Log summary
-                total_qty = sum(v["quantity"] for v in sales_map.values())
-                total_rev = sum(v["revenue"] for v in sales_map.values())
-                total_cost = sum(v["cost"] for v in sales_map.values())
-                print(f"📊 Sales data: {len(orders)} orders, {total_qty} cards sold, {total_rev:.2f} PLN revenue, {total_cost:.2f} PLN cost")
-                if total_qty == 0:
-                    print(f"⚠️ WARNING: No card quantities found in {len(orders)} orders!")
-                    # Sample first order to debug structure
-                    if orders:
-                        print(f"🔍 Sample order keys: {list(orders[0].keys())}")
-                        items_test = orders[0].get("products") or orders[0].get("items") or []
-                        print(f"🔍 Sample order products type: {type(items_test)}, length: {len(items_test) if isinstance(items_test, (list, dict)) else 'N/A'}")
-            except Exception as e:
-                print(f"❌ Error fetching sales_per_day: {e}")
-                import traceback
-                traceback.print_exc()
-                sales_per_day = []
+        # Sales over time (revenue, quantity, cost, profit per day) from the local order store
+        sales_per_day = order_store.sales_per_day(db, keys)
 
         return {
             "metrics": {
@@ -5203,10 +4967,7 @@ async def batch_analyze_next(batch_id: int):
             return JSONResponse({"error": "Batch not found"}, status_code=404)
         
         # Find next pending item
-        next_item = db.query(BatchScanItem).filter(
-            BatchScanItem.batch_id == batch_id,
-            BatchScanItem.status == "pending"
-        ).first()
+        next_item = queries.next_pending_batch_item(db, batch_id).first()
         
         if not next_item:
             # All items processed
@@ -5772,11 +5533,7 @@ async def batch_publish(batch_id: int, request: Request):
         item_ids = data.get("item_ids")  # Optional: publish only selected
         
         # Get items to publish
-        query = db.query(BatchScanItem).filter(
-            BatchScanItem.batch_id == batch_id,
-            BatchScanItem.status == "success",
-            BatchScanItem.publish_status.is_(None)
-        )
+        query = queries.batch_publish_candidates(db, batch_id)
         if item_ids:
             query = query.filter(BatchScanItem.id.in_(item_ids))
         
@@ -0,0 +1,302 @@
+"""
+Local order store backed by the ``shoper_orders`` table.
+
+Orders are normalized once (see ``main._normalize_order``) and kept here so
+that the /orders endpoints can be served from SQLite. The order poller feeds
+new and changed orders in; everything else is read locally.
+
+``shoper_order_coverage`` records which order ID ranges are known to be
+stored without gaps, so /orders can tell a page it can serve locally from
+one that skips orders the store has never seen.
+
+The single ``sales_metrics`` row holds running totals (orders, items sold,
+sold value) that are adjusted by every upsert, so dashboards never have to
+walk the order history.
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from . import queries
+from .db import ShoperOrder, ShoperOrderCoverage, SalesMetrics
+
+
+def _to_int(v: Any) -> int | None:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(v: Any) -> float | None:
+    try:
+        return float(str(v).replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+
+
+def order_fingerprint(raw: dict) -> str:
+    """Stable hash of a raw Shoper order summary, used to detect changes."""
+    st = raw.get("status") or {}
+    relevant = {
+        "status_id": (st.get("status_id") if isinstance(st, dict) else None) or raw.get("status_id"),
+        "status_date": raw.get("status_date"),
+        "sum": raw.get("sum") or raw.get("total_gross") or raw.get("total"),
+        "paid": raw.get("paid"),
+        "delivery_date": raw.get("delivery_date"),
+        "edition_date": raw.get("edition_date") or raw.get("updated_at"),
+    }
+    blob = json.dumps(relevant, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def get_row(db: Session, order_id: int) -> ShoperOrder | None:
+    return db.query(ShoperOrder).filter(ShoperOrder.order_id == order_id).first()
+
+
+def is_changed(db: Session, raw: dict) -> bool:
+    """Return True when the raw order is unknown locally or differs from the stored copy."""
+    oid = _to_int(raw.get("order_id") or raw.get("id"))
+    if oid is None:
+        return False
+    row = get_row(db, oid)
+    return row is None or row.fingerprint != order_fingerprint(raw)
+
+
+def upsert_order(db: Session, row: dict, raw: dict | None = None, detailed: bool = False) -> ShoperOrder | None:
+    """Insert or update a normalized order row. Caller commits."""
+    oid = _to_int(row.get("id"))
+    if oid is None:
+        return None
+    rec = get_row(db, oid)
+    is_new = rec is None
+    if rec is None:
+        rec = ShoperOrder(order_id=oid)
+        db.add(rec)
+    old_total = rec.total or 0.0
+    old_items = rec.items_count or 0
+
+    summary = {k: v for k, v in row.items() if k not in ("items", "buyer")}
+    rec.date = str(row.get("date")) if row.get("date") is not None else None
+    rec.status_id = _to_int((row.get("status") or {}).get("id"))
+    rec.total = _to_float(row.get("total"))
+    rec.items_count = _to_int(row.get("items_count"))
+    if detailed:
+        rec.cost = _items_cost(row.get("items"))
+    if raw is not None:
+        fingerprint = order_fingerprint(raw)
+        if not detailed and rec.fingerprint != fingerprint:
+            # Stored details describe an older version of the order
+            rec.detail_json = None
+            rec.detail_synced_at = None
+        user_id = _to_int(raw.get("user_id"))
+        if user_id is not None:
+            rec.user_id = user_id
+        rec.fingerprint = fingerprint
+    rec.summary_json = json.dumps(summary, default=str)
+    rec.synced_at = datetime.utcnow()
+    if detailed:
+        rec.detail_json = json.dumps(row, default=str)
+        rec.detail_synced_at = rec.synced_at
+
+    _apply_sales_delta(
+        db,
+        orders=1 if is_new else 0,
+        items=(rec.items_count or 0) - old_items,
+        value=(rec.total or 0.0) - old_total,
+    )
+    return rec
+
+
+def _items_cost(items: Any) -> float | None:
+    if not isinstance(items, list):
+        return None
+    cost = 0.0
+    for it in items:
+        if isinstance(it, dict) and it.get("purchase_price"):
+            cost += (_to_int(it.get("quantity")) or 0) * float(it["purchase_price"])
+    return cost
+
+
+def update_status(db: Session, order_id: int, status_id: int) -> bool:
+    """Record a status change whose new order could not be refetched. Caller commits.
+
+    Only the status id is known here, not Shoper's full status object, so
+    the stored details are dropped and the fingerprint cleared: the next
+    detailed read and the next poll fetch the order again.
+    """
+    rec = get_row(db, order_id)
+    if rec is None:
+        return False
+    rec.status_id = _to_int(status_id)
+    rec.detail_json = None
+    rec.detail_synced_at = None
+    rec.fingerprint = None
+    rec.synced_at = datetime.utcnow()
+    return True
+
+
+def load(rec: ShoperOrder, detailed: bool = False) -> dict:
+    if detailed and rec.detail_json:
+        return json.loads(rec.detail_json)
+    return json.loads(rec.summary_json)
+
+
+def list_rows(
+    db: Session,
+    limit: int = 20,
+    before_id: int | None = None,
+    offset: int = 0,
+) -> list[ShoperOrder]:
+    """Return stored orders newest first, keyset-paginated on ``order_id``."""
+    q = db.query(ShoperOrder)
+    if before_id is not None:
+        q = q.filter(ShoperOrder.order_id < before_id)
+    q = q.order_by(ShoperOrder.order_id.desc())
+    if offset:
+        q = q.offset(offset)
+    return q.limit(limit).all()
+
+
+# --- Coverage ---
+
+# Upper bound of a range that reaches the newest order
+NEWEST = 2**62
+
+
+def fetched_range(
+    order_ids: list[int],
+    limit: int,
+    above: int | None = None,
+    below: int | None = None,
+) -> tuple[int, int]:
+    """ID range fully covered by one newest-first Shoper fetch.
+
+    ``above``/``below`` are the exclusive ID bounds the fetch was filtered
+    on (none for the most recent page). A short page reaches the lower
+    bound; a full one only reaches its oldest order.
+    """
+    hi = below - 1 if below is not None else NEWEST
+    lo = above + 1 if above is not None else 0
+    if order_ids and len(order_ids) >= limit:
+        lo = min(order_ids)
+    return lo, hi
+
+
+def note_coverage(db: Session, lo: int, hi: int) -> None:
+    """Record that every order with ``lo <= order_id <= hi`` is stored. Caller commits."""
+    if lo > hi:
+        return
+    for rng in db.query(ShoperOrderCoverage).all():
+        # Overlapping or touching ranges merge into one
+        if rng.lo_id <= hi + 1 and lo <= rng.hi_id + 1:
+            lo = min(lo, rng.lo_id)
+            hi = max(hi, rng.hi_id)
+            db.delete(rng)
+    db.add(ShoperOrderCoverage(lo_id=lo, hi_id=hi))
+    db.flush()
+
+
+def covered_from(db: Session, top: int) -> int | None:
+    """Lowest ID of the gap-free range containing ``top``, or None if ``top`` is not covered."""
+    rng = (
+        db.query(ShoperOrderCoverage)
+        .filter(ShoperOrderCoverage.lo_id <= top, ShoperOrderCoverage.hi_id >= top)
+        .first()
+    )
+    return rng.lo_id if rng is not None else None
+
+
+def count_between(db: Session, lo: int, hi: int) -> int:
+    return (
+        db.query(func.count(ShoperOrder.id))
+        .filter(ShoperOrder.order_id >= lo, ShoperOrder.order_id <= hi)
+        .scalar()
+        or 0
+    )
+
+
+# --- Sales aggregates ---
+
+def _metrics_row(db: Session) -> SalesMetrics:
+    row = db.get(SalesMetrics, 1)
+    if row is None:
+        row = SalesMetrics(id=1, orders_count=0, sold_count=0, sold_value_pln=0.0)
+        db.add(row)
+        # Flush so later db.get() calls in this session see the row (autoflush is off)
+        db.flush()
+    return row
+
+
+def _apply_sales_delta(db: Session, orders: int = 0, items: int = 0, value: float = 0.0) -> None:
+    """Add to the running totals in one UPDATE, so concurrent writers never lose a delta."""
+    if not (orders or items or value):
+        return
+    stmt = (
+        update(SalesMetrics)
+        .where(SalesMetrics.id == 1)
+        .values(
+            orders_count=func.coalesce(SalesMetrics.orders_count, 0) + orders,
+            sold_count=func.coalesce(SalesMetrics.sold_count, 0) + items,
+            sold_value_pln=func.coalesce(SalesMetrics.sold_value_pln, 0.0) + value,
+            updated_at=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session="fetch")
+    )
+    if db.execute(stmt).rowcount == 0:
+        _metrics_row(db)
+        db.execute(stmt)
+
+
+def get_sales_metrics(db: Session) -> dict:
+    row = db.get(SalesMetrics, 1)
+    if row is None:
+        return {"sold_count": 0, "sold_value_pln": 0.0, "users_count": None}
+    return {
+        "sold_count": int(row.sold_count or 0),
+        "sold_value_pln": float(row.sold_value_pln or 0.0),
+        "users_count": row.users_count,
+    }
+
+
+def recompute_sales_metrics(db: Session, users_count: int | None = None) -> SalesMetrics:
+    """Rebuild the running totals from the stored orders (drift correction). Caller commits."""
+    orders, items, value = db.query(
+        func.count(ShoperOrder.id),
+        func.sum(func.coalesce(ShoperOrder.items_count, 0)),
+        func.sum(func.coalesce(ShoperOrder.total, 0.0)),
+    ).one()
+    row = _metrics_row(db)
+    row.orders_count = int(orders or 0)
+    row.sold_count = int(items or 0)
+    row.sold_value_pln = float(value or 0.0)
+    if users_count is not None:
+        row.users_count = users_count
+    row.updated_at = row.reconciled_at = datetime.utcnow()
+    return row
+
+
+def sales_per_day(db: Session, keys: list[str]) -> list[dict]:
+    """Revenue, quantity, cost and profit per order day for the ``keys`` window."""
+    rows = queries.orders_per_day(db, keys[0]).all()
+    by_day = {str(d): (float(r or 0.0), int(q or 0), float(c or 0.0)) for d, r, q, c in rows if d}
+    out = []
+    for k in keys:
+        revenue, quantity, cost = by_day.get(k, (0.0, 0, 0.0))
+        out.append({
+            "date": k,
+            "revenue": round(revenue, 2),
+            "quantity": quantity,
+            "cost": round(cost, 2),
+            "profit": round(revenue - cost, 2),
+        })
+    return out
+
+
+def customer_user_ids(db: Session) -> set[int]:
+    rows = db.query(ShoperOrder.user_id).filter(ShoperOrder.user_id.isnot(None)).distinct().all()
+    return {uid for (uid,) in rows}
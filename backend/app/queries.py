@@ -0,0 +1,183 @@
+"""
+ORM query builders for the hot endpoint and background-job queries.
+
+Endpoints, reporting helpers and jobs build these queries here and
+``query_plan.HOT_QUERIES`` explains the very same builders, so the plan
+check follows the code instead of a hand-kept copy. Builders return an
+unexecuted ``Query``; callers add pagination and pick ``.all()``,
+``.first()`` or ``.count()``.
+"""
+from datetime import datetime
+
+from sqlalchemy import desc, func, or_
+from sqlalchemy.orm import Query, Session, aliased
+
+from .db import Scan, ScanCandidate, BatchScanItem, Product, Auction, ShoperOrder
+
+
+# --- Scans ---
+
+def scan_history(db: Session, session_id: int | None = None) -> Query:
+    """Scans, newest first, optionally limited to one scan session."""
+    q = db.query(Scan)
+    if session_id is not None:
+        q = q.filter(Scan.session_id == session_id)
+    return q.order_by(Scan.id.desc())
+
+
+def selected_scans(db: Session, session_id: int) -> Query:
+    """Scans of a session with a chosen candidate (ready to publish)."""
+    return db.query(Scan).filter(Scan.session_id == session_id, Scan.selected_candidate_id.isnot(None))
+
+
+def scanned_product_ids(db: Session) -> Query:
+    """Distinct Shoper product ids that were published from a scan."""
+    return db.query(Scan.published_shoper_id).filter(Scan.published_shoper_id.isnot(None)).distinct()
+
+
+def recent_published_scans(db: Session, limit: int) -> Query:
+    """Latest published scans with the selected image, first candidate image and permalink."""
+    selected = aliased(ScanCandidate)
+    first_image = (
+        db.query(ScanCandidate.image)
+        .filter(ScanCandidate.scan_id == Scan.id)
+        .order_by(ScanCandidate.id.asc())
+        .limit(1)
+        .correlate(Scan)
+        .scalar_subquery()
+    )
+    return (
+        db.query(Scan, selected.image, first_image, Product.permalink)
+        .outerjoin(selected, selected.id == Scan.selected_candidate_id)
+        .outerjoin(Product, Product.shoper_id == Scan.published_shoper_id)
+        .filter(Scan.publish_status == "published")
+        .order_by(Scan.id.desc())
+        .limit(limit)
+    )
+
+
+# --- Warehouse codes ---
+
+def warehouse_scan_codes(db: Session, *columns, only_published: bool = True) -> Query:
+    """Warehouse codes held by scans (``columns`` default to the code alone)."""
+    q = db.query(*(columns or (Scan.warehouse_code,))).filter(Scan.warehouse_code.isnot(None))
+    if only_published:
+        q = q.filter(Scan.publish_status == "published")
+    return q
+
+
+def warehouse_batch_codes(db: Session, *columns, only_published: bool = True) -> Query:
+    """Warehouse codes held by batch items; a Shoper id also counts as published."""
+    q = db.query(*(columns or (BatchScanItem.warehouse_code,))).filter(BatchScanItem.warehouse_code.isnot(None))
+    if only_published:
+        q = q.filter(or_(
+            BatchScanItem.publish_status == "published",
+            BatchScanItem.published_shoper_id.isnot(None),
+        ))
+    return q
+
+
+# --- Batch scans ---
+
+def next_pending_batch_item(db: Session, batch_id: int) -> Query:
+    return db.query(BatchScanItem).filter(
+        BatchScanItem.batch_id == batch_id,
+        BatchScanItem.status == "pending",
+    )
+
+
+def batch_publish_candidates(db: Session, batch_id: int) -> Query:
+    """Successfully matched batch items that were not published yet."""
+    return db.query(BatchScanItem).filter(
+        BatchScanItem.batch_id == batch_id,
+        BatchScanItem.status == "success",
+        BatchScanItem.publish_status.is_(None),
+    )
+
+
+def recent_published_batch_items(db: Session, limit: int) -> Query:
+    """Latest published batch items with the product permalink."""
+    return (
+        db.query(BatchScanItem, Product.permalink)
+        .outerjoin(Product, Product.shoper_id == BatchScanItem.published_shoper_id)
+        .filter(BatchScanItem.publish_status == "published")
+        .order_by(BatchScanItem.processed_at.desc())
+        .limit(limit)
+    )
+
+
+# --- Products ---
+
+PRODUCT_SORT_COLUMNS = {
+    "name": Product.name,
+    "price": Product.price,
+    "stock": Product.stock,
+    "updated_at": Product.updated_at,
+}
+
+
+def product_listing(db: Session, category_id: int | None = None, q: str | None = None) -> Query:
+    """Products filtered like ``GET /products`` (unordered, so it can be counted)."""
+    query = db.query(Product)
+    if category_id is not None:
+        query = query.filter(Product.category_id == category_id)
+    if q:
+        query = query.filter(Product.name.ilike(f"%{q}%"))
+    return query
+
+
+def order_product_listing(query: Query, sort: str | None = None, order: str = "asc") -> Query:
+    """Apply the ``GET /products`` sort (``updated_at`` unless ``sort`` names a known column)."""
+    col = PRODUCT_SORT_COLUMNS.get((sort or "").lower(), Product.updated_at)
+    if (order or "").lower() == "desc":
+        return query.order_by(col.desc().nullslast())
+    return query.order_by(col.asc().nullslast())
+
+
+def product_by_code(db: Session, code: str) -> Query:
+    return db.query(Product).filter(Product.code == code)
+
+
+def products_updated_per_day(db: Session, since: datetime) -> Query:
+    """``(day, count)`` of products by the day of their last update since ``since``."""
+    day_col = func.date(Product.updated_at)
+    return (
+        db.query(day_col, func.count(Product.id))
+        .filter(Product.updated_at.isnot(None))
+        .filter(Product.updated_at >= since)
+        .group_by(day_col)
+    )
+
+
+# --- Orders ---
+
+def orders_per_day(db: Session, since: str) -> Query:
+    """``(day, revenue, quantity, cost)`` of stored Shoper orders from ``since`` on."""
+    day_col = func.date(ShoperOrder.date)
+    return (
+        db.query(
+            day_col,
+            func.sum(func.coalesce(ShoperOrder.total, 0.0)),
+            func.sum(func.coalesce(ShoperOrder.items_count, 0)),
+            func.sum(func.coalesce(ShoperOrder.cost, 0.0)),
+        )
+        .filter(ShoperOrder.date >= since)
+        .group_by(day_col)
+    )
+
+
+# --- Auctions ---
+
+def expired_auction_ids(db: Session, now: datetime) -> Query:
+    """Ids of active auctions whose end time has passed."""
+    return db.query(Auction.id).filter(Auction.status == "active", Auction.end_time <= now)
+
+
+def auction_listing(db: Session, status: str | None = None) -> Query:
+    """Auctions for ``GET /auctions``: soonest end first when active, newest first otherwise."""
+    query = db.query(Auction)
+    if status:
+        query = query.filter(Auction.status == status)
+    if status == "active":
+        return query.order_by(Auction.end_time.asc())
+    return query.order_by(desc(Auction.created_at))
@@ -0,0 +1,137 @@
+"""
+EXPLAIN QUERY PLAN advisor for the hot backend queries.
+
+Each entry in ``HOT_QUERIES`` builds the ORM query behind an endpoint or
+background job through the same ``queries`` helper the endpoint uses.
+``check_query_plans`` runs ``EXPLAIN QUERY PLAN`` on them and flags full
+table scans (``SCAN <table>`` without an index), so a missing or dropped
+index shows up in ``/debug/query-plans`` and in
+``scripts/check_query_plans.py`` (non-zero exit code) instead of as a slow
+dashboard.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy.orm import Query, Session
+
+from . import queries
+
+
+@dataclass(frozen=True)
+class HotQuery:
+    name: str
+    build: Callable[[Session], Query]
+    # Set when a full scan is inherent to the query (e.g. substring search)
+    allow_scan: str | None = None
+
+
+# Sample arguments only; the plans do not depend on the values.
+HOT_QUERIES: list[HotQuery] = [
+    HotQuery(
+        "GET /scans?session_id",
+        lambda db: queries.scan_history(db, session_id=1).limit(50),
+    ),
+    HotQuery(
+        "session publish (selected scans)",
+        lambda db: queries.selected_scans(db, 1),
+    ),
+    HotQuery(
+        "GET /stats recent published scans",
+        lambda db: queries.recent_published_scans(db, 10),
+    ),
+    HotQuery(
+        "warehouse used codes (scans)",
+        lambda db: queries.warehouse_scan_codes(db),
+    ),
+    HotQuery(
+        "warehouse products with scans",
+        lambda db: queries.scanned_product_ids(db),
+    ),
+    HotQuery(
+        "batch next pending item",
+        lambda db: queries.next_pending_batch_item(db, 1).limit(1),
+    ),
+    HotQuery(
+        "batch publish candidates",
+        lambda db: queries.batch_publish_candidates(db, 1),
+    ),
+    HotQuery(
+        "GET /stats recent published batch items",
+        lambda db: queries.recent_published_batch_items(db, 10),
+    ),
+    HotQuery(
+        "warehouse used codes (batch items)",
+        lambda db: queries.warehouse_batch_codes(db),
+        allow_scan="batch items are scanned once per location lookup; OR over two nullable columns",
+    ),
+    HotQuery(
+        "GET /products?category_id",
+        lambda db: queries.order_product_listing(queries.product_listing(db, category_id=1), "updated_at", "desc").limit(50),
+    ),
+    HotQuery(
+        "GET /products?sort=name",
+        lambda db: queries.order_product_listing(queries.product_listing(db), "name").limit(50),
+    ),
+    HotQuery(
+        "GET /products?q",
+        lambda db: queries.product_listing(db, q="pikachu").limit(50),
+        allow_scan="substring ILIKE cannot use a b-tree index",
+    ),
+    HotQuery(
+        "product by code",
+        lambda db: queries.product_by_code(db, "PKM-1").limit(1),
+    ),
+    HotQuery(
+        "GET /reports products per day",
+        lambda db: queries.products_updated_per_day(db, datetime.utcnow() - timedelta(days=30)),
+    ),
+    HotQuery(
+        "auction scheduler expired auctions",
+        lambda db: queries.expired_auction_ids(db, datetime.utcnow()),
+    ),
+    HotQuery(
+        "GET /auctions?status=active",
+        lambda db: queries.auction_listing(db, "active").limit(20),
+    ),
+    HotQuery(
+        "GET /reports sales per day",
+        lambda db: queries.orders_per_day(db, "2024-01-01"),
+    ),
+]
+
+
+def explain(db: Session, query: Query) -> list[str]:
+    """Return the ``detail`` column of ``EXPLAIN QUERY PLAN`` for an ORM query."""
+    conn = db.connection()
+    compiled = query.statement.compile(dialect=conn.dialect)
+    params = compiled.construct_params()
+    positional = tuple(params[name] for name in (compiled.positiontup or []))
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", positional).fetchall()
+    return [str(row[-1]) for row in rows]
+
+
+def full_scans(plan: list[str]) -> list[str]:
+    """Plan steps that read a whole table (``SCAN x`` without ``USING ... INDEX``)."""
+    out = []
+    for step in plan:
+        s = step.strip()
+        if s.startswith("SCAN ") and "USING" not in s and "CONSTANT ROW" not in s:
+            out.append(s)
+    return out
+
+
+def check_query_plans(db: Session) -> list[dict]:
+    """Explain every hot query and report full table scans."""
+    report = []
+    for hq in HOT_QUERIES:
+        entry = {"name": hq.name, "plan": [], "full_scans": [], "ok": True, "note": hq.allow_scan}
+        try:
+            entry["plan"] = explain(db, hq.build(db))
+            entry["full_scans"] = full_scans(entry["plan"])
+            entry["ok"] = not entry["full_scans"] or bool(hq.allow_scan)
+        except Exception as e:
+            entry["ok"] = False
+            entry["error"] = str(e)
+        report.append(entry)
+    return report
@@ -0,0 +1,242 @@
+"""
+SQL-side aggregations for the /stats and /reports dashboards.
+
+Counts over history (scans per day) are kept in the ``report_daily_counts``
+rollup table, which is updated incrementally by mapper events on insert and
+delete and backfilled once from the scans table. Aggregates over current
+inventory (products) are bounded by the catalogue size and are computed with
+plain ``GROUP BY``/``SUM`` queries instead of Python loops.
+"""
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import event, func, case
+from sqlalchemy.orm import Session
+
+from . import queries
+from .db import (
+    engine,
+    Scan,
+    Product,
+    CardCatalog,
+    ReportDailyCount,
+)
+
+SCANS_METRIC = "scans"
+
+
+# --- Rollup maintenance ---
+
+def _day_key(value) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)[:10]
+
+
+def _bump_daily_count(connection, metric: str, day: str | None, delta: int) -> None:
+    """Add ``delta`` to the rollup row for (metric, day), creating it if needed."""
+    if not day:
+        return
+    table = ReportDailyCount.__table__
+    res = connection.execute(
+        table.update()
+        .where(table.c.metric == metric, table.c.day == day)
+        .values(count=table.c.count + delta)
+    )
+    if res.rowcount == 0 and delta > 0:
+        connection.execute(table.insert().values(metric=metric, day=day, count=delta))
+
+
+@event.listens_for(Scan, "after_insert")
+def _scan_inserted(mapper, connection, target):  # type: ignore
+    _bump_daily_count(connection, SCANS_METRIC, _day_key(target.created_at), 1)
+
+
+@event.listens_for(Scan, "after_delete")
+def _scan_deleted(mapper, connection, target):  # type: ignore
+    _bump_daily_count(connection, SCANS_METRIC, _day_key(target.created_at), -1)
+
+
+def backfill_daily_counts() -> None:
+    """Build the scans rollup from the scans table once (no-op when already populated)."""
+    table = ReportDailyCount.__table__
+    with engine.begin() as conn:
+        exists = conn.execute(
+            table.select().where(table.c.metric == SCANS_METRIC).limit(1)
+        ).first()
+        if exists:
+            return
+        day_col = func.date(Scan.created_at)
+        rows = conn.execute(
+            Scan.__table__.select()
+            .with_only_columns(day_col, func.count(Scan.id))
+            .where(Scan.created_at.isnot(None))
+            .group_by(day_col)
+        ).all()
+        if rows:
+            conn.execute(
+                table.insert(),
+                [{"metric": SCANS_METRIC, "day": d, "count": int(c)} for d, c in rows if d],
+            )
+
+
+# --- Read helpers ---
+
+def day_keys(days: int) -> list[str]:
+    today = datetime.utcnow().date()
+    start = today - timedelta(days=days - 1)
+    return [(start + timedelta(days=i)).isoformat() for i in range(days)]
+
+
+def daily_series(db: Session, metric: str, keys: list[str]) -> list[dict]:
+    """Read a per-day series for ``keys`` from the rollup table."""
+    rows = (
+        db.query(ReportDailyCount.day, ReportDailyCount.count)
+        .filter(ReportDailyCount.metric == metric)
+        .filter(ReportDailyCount.day >= keys[0], ReportDailyCount.day <= keys[-1])
+        .all()
+    )
+    counts = {d: int(c or 0) for d, c in rows}
+    return [{"date": k, "count": counts.get(k, 0)} for k in keys]
+
+
+def products_per_day(db: Session, keys: list[str]) -> list[dict]:
+    """Products grouped by the day of their last update, within the ``keys`` window."""
+    rows = queries.products_updated_per_day(db, datetime.fromisoformat(keys[0])).all()
+    counts = {str(d): int(c or 0) for d, c in rows if d}
+    return [{"date": k, "count": counts.get(k, 0)} for k in keys]
+
+
+def scan_counts(db: Session) -> dict:
+    """Total, ready and published scan counts in a single query."""
+    total, ready, published = db.query(
+        func.count(Scan.id),
+        func.sum(case((Scan.selected_candidate_id.isnot(None), 1), else_=0)),
+        func.sum(case((Scan.publish_status == "published", 1), else_=0)),
+    ).one()
+    return {
+        "total_scans": int(total or 0),
+        "scans_ready": int(ready or 0),
+        "scans_published": int(published or 0),
+    }
+
+
+def inventory_totals(db: Session) -> dict:
+    """Product count, units in stock and stock value (``SUM(stock*price)``)."""
+    stock = func.coalesce(Product.stock, 0)
+    price = func.coalesce(Product.price, 0.0)
+    count, units, value = db.query(
+        func.count(Product.id),
+        func.sum(stock),
+        func.sum(stock * price),
+    ).one()
+    return {
+        "total_products": int(count or 0),
+        "inventory_units": int(units or 0),
+        "inventory_value_pln": float(value or 0.0),
+    }
+
+
+def inventory_cost_value(db: Session, purchase_cost_fn) -> dict:
+    """Cost and value of products in stock.
+
+    Products with a stored purchase_price are summed in SQL; the remaining
+    ones (normally none after the startup migration) get their cost from
+    ``purchase_cost_fn(rarity, price)`` using a single catalog join.
+    """
+    stock = func.coalesce(Product.stock, 0)
+    price = func.coalesce(Product.price, 0.0)
+    has_cost = func.coalesce(Product.purchase_price, 0.0) != 0
+
+    value, cost, counted = (
+        db.query(
+            func.sum(stock * price),
+            func.sum(case((has_cost, stock * Product.purchase_price), else_=0.0)),
+            func.sum(case((Product.purchase_price > 0, 1), else_=0)),
+        )
+        .filter(Product.stock > 0)
+        .one()
+    )
+    total_value = float(value or 0.0)
+    total_cost = float(cost or 0.0)
+    products_counted = int(counted or 0)
+
+    missing = (
+        db.query(Product.stock, Product.price, CardCatalog.rarity)
+        .outerjoin(CardCatalog, CardCatalog.id == Product.catalog_id)
+        .filter(Product.stock > 0)
+        .filter(func.coalesce(Product.purchase_price, 0.0) == 0)
+        .filter(func.coalesce(Product.price, 0.0) != 0)
+        .all()
+    )
+    for st, pr, rarity in missing:
+        purchase_price = purchase_cost_fn(rarity, float(pr or 0.0))
+        if purchase_price > 0:
+            products_counted += 1
+        total_cost += int(st or 0) * purchase_price
+
+    return {
+        "total_inventory_cost": total_cost,
+        "total_inventory_value": total_value,
+        "products_counted": products_counted,
+        "products_without_purchase_price": len(missing),
+    }
+
+
+def top_value_products(db: Session, limit: int) -> list[Product]:
+    value = func.coalesce(Product.stock, 0) * func.coalesce(Product.price, 0.0)
+    return db.query(Product).order_by(value.desc()).limit(limit).all()
+
+
+def recent_published(db: Session, limit: int = 10) -> list[dict]:
+    """Most recently published scans and batch items, with images and permalinks joined in."""
+    scan_rows = queries.recent_published_scans(db, limit).all()
+    batch_rows = queries.recent_published_batch_items(db, limit).all()
+
+    combined = []
+    for s, selected_image, fallback_image, permalink in scan_rows:
+        image_url = selected_image or fallback_image
+        if not image_url and s.stored_path:
+            image_url = f"/uploads/{Path(s.stored_path).name}"
+        combined.append({
+            "type": "scan",
+            "id": s.id,
+            "date": s.created_at,
+            "created_at": s.created_at.isoformat(),
+            "name": s.detected_name,
+            "set": s.detected_set,
+            "number": s.detected_number,
+            "priced": bool(s.price_pln_final is not None),
+            "image": image_url,
+            "price_pln_final": s.price_pln_final,
+            "permalink": permalink if s.published_shoper_id else None,
+        })
+    for b, permalink in batch_rows:
+        image_url = b.matched_image
+        if not image_url and b.stored_path:
+            image_url = f"/uploads/{Path(b.stored_path).name}"
+        # Use processed_at or fallback to now if missing
+        date_val = b.processed_at or datetime.utcnow()
+        combined.append({
+            "type": "batch_item",
+            "id": b.id,
+            "date": date_val,
+            "created_at": date_val.isoformat(),
+            "name": b.matched_name or b.detected_name,
+            "set": b.matched_set or b.detected_set,
+            "number": b.matched_number or b.detected_number,
+            "priced": bool(b.price_pln_final is not None),
+            "image": image_url,
+            "price_pln_final": b.price_pln_final,
+            "permalink": permalink if b.published_shoper_id else None,
+        })
+
+    combined.sort(key=lambda x: x["date"], reverse=True)
+    recent = combined[:limit]
+    for r in recent:
+        r.pop("date", None)
+    return recent
@@ -10,6 +10,11 @@ class Settings(BaseSettings):
     upload_dir: str = Field(default="/app/storage/uploads")
     allowed_origins: str = Field(default="*")  # comma separated
     database_url: str = Field(default="sqlite:////app/storage/app.db")
+    # SQLite tuning (see db.py). WAL falls back to DELETE when the volume can't support it.
+    sqlite_journal_mode: str = Field(default="WAL", alias="SQLITE_JOURNAL_MODE")
+    sqlite_busy_timeout_ms: int = Field(default=15000, alias="SQLITE_BUSY_TIMEOUT_MS")
+    sqlite_cache_size_kib: int = Field(default=20000, alias="SQLITE_CACHE_SIZE_KIB")
+    sqlite_mmap_size: int = Field(default=268435456, alias="SQLITE_MMAP_SIZE")  # bytes, 0 disables
     eur_pln_rate: float = Field(default=4.3)
     price_multiplier: float = Field(default=1.23)
 
@@ -27,7 +32,9 @@ class Settings(BaseSettings):
     shoper_categories_path: str = Field(default="/categories", alias="SHOPER_CATEGORIES_PATH")
     shoper_languages_path: str = Field(default="/languages", alias="SHOPER_LANGUAGES_PATH")
     shoper_availability_path: str = Field(default="/availability", alias="SHOPER_AVAILABILITY_PATH")
-    sales_metrics_ttl_minutes: int = Field(default=5, alias="SALES_METRICS_TTL_MINUTES")
+    sales_metrics_ttl_minutes: int = Field(default=5, alias="SALES_METRICS_TTL_MINUTES")  # Deprecated: metrics are now kept incrementally
+    sales_metrics_reconcile_minutes: int = Field(default=60, alias="SALES_METRICS_RECONCILE_MINUTES")
+    sales_metrics_reconcile_orders: int = Field(default=250, alias="SALES_METRICS_RECONCILE_ORDERS")  # Newest orders re-read per reconcile (max 250)
     shoper_image_base: str | None = Field(default=None, alias="SHOPER_IMAGE_BASE")
     shoper_auto_sync_on_startup: bool = Field(default=True)
     shoper_sync_ttl_minutes: int = Field(default=15)
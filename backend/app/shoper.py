@@ -717,6 +717,51 @@ class ShoperClient:
             print(f"Error fetching orders since {since_id}: {e}")
             return []
 
+    async def fetch_orders_before(self, before_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Fetch orders with ID lower than before_id, newest first.
+        Counterpart of fetch_orders_since used to page backwards through history.
+        
+        Args:
+            before_id: Fetch orders with order_id < this value
+            limit: Maximum number of orders to return
+        
+        Returns:
+            List of older orders, sorted by ID descending
+
+        Raises on HTTP errors: an empty list always means there are no older
+        orders, which the order store records as complete history.
+        """
+        headers = {"Authorization": f"Bearer {self.token}", "Accept": "application/json"}
+        url = f"{self.base_url}{settings.shoper_orders_path}"
+        params = {
+            "limit": min(limit, 250),
+            "order": "DESC",
+            "sort": "order_id",
+            "with": "products,buyer",
+            "filters[order_id][to]": before_id - 1,
+        }
+        async with httpx.AsyncClient(timeout=30) as client:
+            r = await client.get(url, params=params, headers=headers)
+            r.raise_for_status()
+            data = r.json()
+        if isinstance(data, dict):
+            items = data.get("list") or data.get("items") or data.get("data") or []
+        elif isinstance(data, list):
+            items = data
+        else:
+            items = []
+        # Client-side guard in case the filter is ignored
+        filtered = []
+        for order in items:
+            order_id = order.get("order_id") or order.get("id")
+            try:
+                if int(order_id) < before_id:
+                    filtered.append(order)
+            except (ValueError, TypeError):
+                continue
+        return filtered
+
     async def fetch_users_page(self, page: int = 1, limit: int = 100) -> Dict[str, Any]:
         headers = {"Authorization": f"Bearer {self.token}", "Accept": "application/json"}
         url = f"{self.base_url}{settings.shoper_users_path}"
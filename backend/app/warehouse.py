@@ -9,9 +9,8 @@ import re
 from pathlib import Path
 
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-
 from . import db as models
+from . import queries
 from .settings import settings
 
 # --- Configuration (from storage_config.py) ---
@@ -164,23 +163,14 @@ def get_used_indices(db: Session, only_published: bool = True) -> set[int]:
                     used_indices.add(index)
 
     # Check Scans - only published ones to avoid reserving codes for abandoned scans
-    scan_query = db.query(models.Scan.warehouse_code).filter(models.Scan.warehouse_code.isnot(None))
-    if only_published:
-        scan_query = scan_query.filter(models.Scan.publish_status == 'published')
-    _process_query(scan_query.all())
+    _process_query(queries.warehouse_scan_codes(db, only_published=only_published).all())
     
     # Check Inventory Items - always count these as they represent actual stock
     _process_query(db.query(models.InventoryItem.warehouse_code).filter(models.InventoryItem.warehouse_code.isnot(None)).all())
     
     # Check Batch Scan Items - only published ones
-    batch_query = db.query(models.BatchScanItem.warehouse_code).filter(models.BatchScanItem.warehouse_code.isnot(None))
-    if only_published:
-        # Check if published OR if we have a shoper ID (which implies publication)
-        batch_query = batch_query.filter(or_(
-            models.BatchScanItem.publish_status == 'published',
-            models.BatchScanItem.published_shoper_id.isnot(None)
-        ))
-    _process_query(batch_query.all())
+    # A Shoper ID also counts as published
+    _process_query(queries.warehouse_batch_codes(db, only_published=only_published).all())
     
     return used_indices
 
@@ -224,9 +214,7 @@ def get_storage_summary(db: Session) -> dict:
     products_without_scans_count = 0
     try:
         products_count = db.query(models.Product).filter(models.Product.stock > 0).count()
-        scans_with_products = db.query(models.Scan.published_shoper_id).filter(
-            models.Scan.published_shoper_id.isnot(None)
-        ).distinct().count()
+        scans_with_products = queries.scanned_product_ids(db).count()
         products_without_scans_count = max(0, products_count - scans_with_products)
     except:
         pass
@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+"""Crawler cen w tle + lokalna baza produktów (SQLite).
+
+``/search`` nie odpytuje już sklepów: zapytanie trafia na listę śledzonych,
+a wyniki są czytane z ``ceny.sqlite``. :class:`Crawler` co ``CRAWL_INTERVAL``
+sekund odświeża zapytania starsze niż ``REFRESH_AFTER``, z limitem
+grzecznościowym na domenę (jedno żądanie naraz, ``POLITENESS_DELAY`` sekund
+przerwy). Wpisy starsze niż ``STALE_AFTER`` są oznaczane jako nieaktualne.
+Zapytania, których nikt nie szukał od ``FORGET_AFTER`` sekund, przestają być
+śledzone (zapisane oferty zostają w bazie).
+
+Tryb offline: ``FixtureFetcher`` serwuje zapisane strony HTML z katalogu
+``fixtures`` (``manifest.json`` mapuje URL -> plik), np.::
+
+    python crawler.py --offline --query "evolving skies booster"
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from bs4 import BeautifulSoup
+
+DB_FILE = 'ceny.sqlite'
+LEGACY_DB_FILE = 'produkty_db.json'
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+CRAWL_INTERVAL = 60          # co ile sekund crawler sprawdza kolejkę
+REFRESH_AFTER = 30 * 60      # po ilu sekundach zapytanie jest odświeżane
+STALE_AFTER = 2 * 60 * 60    # po ilu sekundach wynik jest oznaczany jako nieaktualny
+FORGET_AFTER = 7 * 24 * 60 * 60  # po ilu sekundach bez wyszukiwania zapytanie przestaje być śledzone
+POLITENESS_DELAY = 2.0       # minimalny odstęp między żądaniami do jednej domeny
+MAX_ITEMS = 6                # ile wyników wyszukiwania sprawdzamy w sklepie
+
+NOT_FOUND_ERROR = "Nie znaleziono (filtrowanie)"
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept-Language": "pl-PL,pl;q=0.9,en-US;q=0.8,en;q=0.7"
+}
+
+# --- FUNKCJE POMOCNICZE ---
+
+def normalize_name(text):
+    """Małe litery, bez polskich znaków i interpunkcji - klucz do indeksu."""
+    text = unicodedata.normalize("NFKD", text or "").replace("ł", "l").replace("Ł", "L")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+def clean_price(text):
+    if not text: return 0.0
+    # Usuwamy wszystko co nie jest cyfrą lub przecinkiem/kropką
+    clean = re.sub(r'[^\d,.]', '', str(text))
+    clean = clean.replace(',', '.')
+    try:
+        val = float(clean.strip('.'))
+        return val
+    except ValueError:
+        return 0.0
+
+def make_search_url(url_template, query):
+    # Standardowe kodowanie spacje -> +
+    query_plus = urllib.parse.quote_plus(query)
+    # Specjalne dla TCG Love (przecinki zamiast spacji w parametrze url=)
+    query_commas = urllib.parse.quote(query.replace(" ", ","))
+
+    url = url_template.replace("{query}", query_plus)
+    url = url.replace("{query_commas}", query_commas)
+    return url
+
+def domain_of(url):
+    host = urllib.parse.urlparse(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+# --- LOGIKA FILTROWANIA ---
+
+def is_valid_match(title, query):
+    title_lower = title.lower()
+    query_lower = query.lower()
+
+    # 1. Sprawdzenie słów kluczowych
+    query_words = query_lower.split()
+    significant_words = [w for w in query_words if len(w) > 2]
+
+    if significant_words:
+        matches = 0
+        for word in significant_words:
+            if word in title_lower:
+                matches += 1
+        # Musi pasować większość słów
+        if matches < len(significant_words) * 0.5:
+             return False, "Nie pasuje do nazwy"
+
+    # 2. SŁOWA ZAKAZANE
+    # Dodano 'break', 'kushi', 'live' aby wykluczyć te oferty zgodnie z życzeniem
+    exclusion_list = [
+        "box", "display", "bundle", "etb", "elite trainer box", "zestaw", "case",
+        "puszka", "tin", "album", "poster", "collection",
+        "break", "kushi", "live", "otwieranie", "otwieramy"
+    ]
+
+    user_wants_excluded = any(ex in query_lower for ex in exclusion_list)
+
+    if not user_wants_excluded:
+        found_forbidden = [word for word in exclusion_list if word in title_lower]
+        if found_forbidden:
+            return False, f"Wykluczone słowo: {found_forbidden[0]}"
+
+    return True, "OK"
+
+# --- POBIERANIE STRON ---
+
+class HttpFetcher:
+    """Pobieranie przez współdzieloną sesję ``requests`` (pula połączeń)."""
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+
+    def __call__(self, url, timeout):
+        resp = self.session.get(url, timeout=timeout)
+        return resp.status_code, resp.content
+
+
+class FixtureFetcher:
+    """Zapisane strony HTML zamiast sieci (testy, tryb ``--offline``)."""
+
+    def __init__(self, directory=FIXTURES_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, 'manifest.json'), 'r', encoding='utf-8') as f:
+            self.pages = json.load(f)
+
+    def __call__(self, url, timeout):
+        name = self.pages.get(url)
+        if not name:
+            return 404, b""
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            return 200, f.read()
+
+
+class DomainThrottle:
+    """Jedno żądanie naraz na domenę i co najmniej ``delay`` sekund przerwy."""
+
+    def __init__(self, delay=POLITENESS_DELAY, clock=time.monotonic, sleep=time.sleep):
+        self.delay = delay
+        self._clock = clock
+        self._sleep = sleep
+        self._guard = threading.Lock()
+        self._locks = {}
+        self._last = {}
+
+    @contextmanager
+    def slot(self, domain):
+        with self._guard:
+            lock = self._locks.setdefault(domain, threading.Lock())
+        with lock:
+            wait = self._last.get(domain, float("-inf")) + self.delay - self._clock()
+            if wait > 0:
+                self._sleep(wait)
+            try:
+                yield
+            finally:
+                self._last[domain] = self._clock()
+
+# --- SILNIK WYSZUKIWANIA ---
+
+def empty_result(shop):
+    return {
+        "shop_name": shop['name'],
+        "domain": shop['domain'],
+        "found": False,
+        "product_name": "Brak produktu / Niedostępny",
+        "price": 0.0,
+        "link": "#",
+        "error": None,
+        "available": False
+    }
+
+def product_price(shop, soup_product):
+    val = 0.0
+    selectors = shop['price_selector'].split(',')
+    price_el = None
+    for sel in selectors:
+        price_el = soup_product.select_one(sel.strip())
+        if price_el: break
+
+    if price_el:
+        if price_el.has_attr('content'):
+            val = clean_price(price_el['content'])
+        else:
+            val = clean_price(price_el.get_text(strip=True))
+
+    # Fallbacki
+    if val == 0.0:
+        fallback = soup_product.select_one(".woocommerce-Price-amount bdi")
+        if fallback: val = clean_price(fallback.get_text(strip=True))
+    if val == 0.0:
+        fallback = soup_product.select_one(".price__value")
+        if fallback: val = clean_price(fallback.get_text(strip=True))
+    if val == 0.0:
+        meta = soup_product.select_one("meta[property='product:price:amount']")
+        if meta and meta.has_attr('content'): val = clean_price(meta['content'])
+    return val
+
+def process_shop(shop, query, fetch):
+    """Wynik jednego sklepu; ``fetch(url, timeout)`` zwraca ``(status, bytes)``."""
+    result = empty_result(shop)
+
+    try:
+        search_url = make_search_url(shop['search_url'], query)
+        # Timeout nieco dłuższy dla bezpieczeństwa
+        status, content = fetch(search_url, 15)
+
+        if status != 200:
+            result['error'] = f"Błąd HTTP {status}"
+            return result
+
+        soup = BeautifulSoup(content, 'html.parser')
+
+        item_selector = shop.get('item_selector')
+        items = []
+
+        if item_selector:
+            items = soup.select(item_selector)
+        else:
+            # Fallback
+            link_el = soup.select_one(shop['link_selector'])
+            if link_el: items = [link_el.parent]
+
+        if not items:
+            return result
+
+        # Pętla po wynikach (szukamy pierwszego pasującego)
+        for item in items[:MAX_ITEMS]:
+            # 1. Tytuł
+            title_selector = shop.get('title_selector', shop['link_selector'])
+            title_el = item.select_one(title_selector)
+            if not title_el: continue
+
+            title_text = title_el.get_text(strip=True)
+
+            # 2. Filtr
+            is_valid, msg = is_valid_match(title_text, query)
+            if not is_valid: continue
+
+            # 3. Link
+            link_el = item.select_one(shop['link_selector'])
+            if not link_el and item.name == 'a': link_el = item
+            if not link_el: link_el = item.find('a')
+            if not link_el or not link_el.has_attr('href'): continue
+
+            product_url = link_el['href']
+            if not product_url.startswith("http"):
+                base_domain = shop['domain']
+                path = product_url.lstrip('/')
+                product_url = f"https://{base_domain}/{path}"
+
+            # 4. Sprawdzenie dostępności NA LIŚCIE
+            is_available = True
+            stock_class = shop.get('stock_check_class')
+            if stock_class:
+                item_classes = item.get('class', [])
+                if stock_class in item_classes:
+                    is_available = False
+                # Czasami klasa jest głębiej
+                elif item.select_one(f".{stock_class}"):
+                    is_available = False
+
+            # 5. Karta produktu - świeża cena i status
+            try:
+                status, content = fetch(product_url, 10)
+                if status != 200: continue
+                soup_product = BeautifulSoup(content, 'html.parser')
+
+                # (Czasami lista kłamie, karta mówi prawdę)
+                if shop.get('stock_selector'):
+                    oos_el = soup_product.select_one(shop['stock_selector'])
+                    if oos_el: is_available = False
+
+                val = product_price(shop, soup_product)
+                if val > 0:
+                    result['found'] = True
+                    result['product_name'] = title_text
+                    result['link'] = product_url
+                    result['price'] = val
+                    result['available'] = is_available
+                    result['error'] = None
+                    return result
+
+            except Exception:
+                continue
+
+        if not result['found']:
+            result['error'] = NOT_FOUND_ERROR
+
+    except Exception as e:
+        result['error'] = str(e)
+
+    return result
+
+# --- BAZA PRODUKTÓW (SQLite) ---
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracked_query (
+    query_norm        TEXT PRIMARY KEY,
+    query             TEXT NOT NULL,
+    added_at          REAL NOT NULL,
+    last_crawled_at   REAL,
+    last_requested_at REAL
+);
+CREATE TABLE IF NOT EXISTS offer (
+    id                INTEGER PRIMARY KEY,
+    query_norm        TEXT NOT NULL,
+    shop_domain       TEXT NOT NULL,
+    shop_name         TEXT NOT NULL,
+    found             INTEGER NOT NULL DEFAULT 0,
+    product_name      TEXT NOT NULL,
+    product_name_norm TEXT NOT NULL,
+    price             REAL NOT NULL DEFAULT 0,
+    available         INTEGER NOT NULL DEFAULT 0,
+    link              TEXT NOT NULL DEFAULT '#',
+    error             TEXT,
+    checked_at        REAL NOT NULL,
+    UNIQUE (query_norm, shop_domain)
+);
+CREATE INDEX IF NOT EXISTS ix_offer_product_name_norm ON offer (product_name_norm);
+CREATE INDEX IF NOT EXISTS ix_tracked_query_last_crawled ON tracked_query (last_crawled_at);
+"""
+
+# Zapytanie dodane przed kolumną ``last_requested_at`` liczy się od ``added_at``
+_LAST_REQUESTED = "COALESCE(last_requested_at, added_at)"
+
+# Błędy przejściowe (HTTP, sieć) nie nadpisują ostatniego dobrego wyniku
+_KEEP_PREVIOUS = "found = 1 AND excluded.found = 0 AND excluded.error IS NOT NULL AND excluded.error != ?"
+
+_OFFER_COLUMNS = "shop_name, shop_domain AS domain, found, product_name, price, link, error, available, checked_at"
+
+
+class ProductStore:
+    """Śledzone zapytania i ostatnie oferty sklepów.
+
+    Połączenie jest współdzielone przez wątki, więc odczyty i zapisy
+    trzymają ``_lock``.
+    """
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(tracked_query)")}
+        if "last_requested_at" not in columns:
+            # Baza sprzed śledzenia ostatniego wyszukiwania
+            self._conn.execute("ALTER TABLE tracked_query ADD COLUMN last_requested_at REAL")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def track(self, query, now=None):
+        """Dodaje zapytanie do odświeżania w tle i notuje wyszukiwanie; zwraca klucz."""
+        key = normalize_name(query)
+        if key:
+            now = now or time.time()
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO tracked_query (query_norm, query, added_at, last_requested_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (query_norm) DO UPDATE SET last_requested_at = excluded.last_requested_at",
+                    (key, query.strip(), now, now),
+                )
+        return key
+
+    def tracked(self):
+        rows = self._read("SELECT query FROM tracked_query ORDER BY added_at")
+        return [row["query"] for row in rows]
+
+    def due_queries(self, max_age=REFRESH_AFTER, now=None, idle_after=FORGET_AFTER):
+        """Zapytania nigdy nie sprawdzane lub starsze niż ``max_age``, najstarsze pierwsze.
+
+        Pomija zapytania, których nikt nie szukał od ``idle_after`` sekund.
+        """
+        now = now or time.time()
+        rows = self._read(
+            "SELECT query FROM tracked_query "
+            f"WHERE (last_crawled_at IS NULL OR last_crawled_at < ?) AND {_LAST_REQUESTED} >= ? "
+            "ORDER BY last_crawled_at IS NOT NULL, last_crawled_at",
+            (now - max_age, now - idle_after),
+        )
+        return [row["query"] for row in rows]
+
+    def forget_idle(self, idle_after=FORGET_AFTER, now=None):
+        """Przestaje śledzić zapytania, których nikt nie szukał od ``idle_after`` sekund."""
+        cutoff = (now or time.time()) - idle_after
+        with self._lock, self._conn:
+            return self._conn.execute(
+                f"DELETE FROM tracked_query WHERE {_LAST_REQUESTED} < ?", (cutoff,)
+            ).rowcount
+
+    def save_results(self, query, results, now=None):
+        """Zapisuje oferty zapytania i oznacza je jako sprawdzone."""
+        now = now or time.time()
+        key = normalize_name(query)
+        with self._lock, self._conn:
+            self._write_offers(key, results, now)
+            self._conn.execute(
+                "INSERT INTO tracked_query (query_norm, query, added_at, last_crawled_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (query_norm) DO UPDATE SET last_crawled_at = excluded.last_crawled_at",
+                (key, query.strip(), now, now),
+            )
+
+    def _write_offers(self, key, results, now):
+        # Wywoływane z ``_lock`` i otwartą transakcją.
+        rows = [
+            (
+                key, r['domain'], r['shop_name'], int(bool(r['found'])), r['product_name'],
+                normalize_name(r['product_name']) if r['found'] else "", float(r['price'] or 0.0),
+                int(bool(r['available'])), r['link'], r['error'], now,
+            )
+            for r in results
+        ]
+        self._conn.executemany(
+            f"""
+            INSERT INTO offer (query_norm, shop_domain, shop_name, found, product_name,
+                               product_name_norm, price, available, link, error, checked_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (query_norm, shop_domain) DO UPDATE SET
+                shop_name = excluded.shop_name,
+                found = excluded.found,
+                product_name = excluded.product_name,
+                product_name_norm = excluded.product_name_norm,
+                price = excluded.price,
+                available = excluded.available,
+                link = excluded.link,
+                error = excluded.error,
+                checked_at = excluded.checked_at
+            WHERE NOT ({_KEEP_PREVIOUS})
+            """,
+            [row + (NOT_FOUND_ERROR,) for row in rows],
+        )
+
+    def _rows_to_results(self, rows, now, stale_after):
+        now = now or time.time()
+        results = []
+        for row in rows:
+            item = dict(row)
+            item['found'] = bool(item['found'])
+            item['available'] = bool(item['available'])
+            item['stale'] = now - item['checked_at'] > stale_after
+            results.append(item)
+        return results
+
+    def lookup(self, query, now=None, stale_after=STALE_AFTER):
+        """Ostatnie wyniki zapytania, z flagą ``stale`` dla starych wpisów."""
+        rows = self._read(
+            f"SELECT {_OFFER_COLUMNS} FROM offer WHERE query_norm = ? ORDER BY shop_name",
+            (normalize_name(query),),
+        )
+        return self._rows_to_results(rows, now, stale_after)
+
+    def search_products(self, text, limit=20, now=None, stale_after=STALE_AFTER):
+        """Znalezione oferty, których nazwa zaczyna się od ``text`` (zakres po indeksie)."""
+        prefix = normalize_name(text)
+        if not prefix:
+            return []
+        rows = self._read(
+            f"SELECT {_OFFER_COLUMNS} FROM offer "
+            "WHERE product_name_norm >= ? AND product_name_norm < ? AND found = 1 "
+            "ORDER BY product_name_norm, price LIMIT ?",
+            (prefix, prefix + "\uffff", limit),
+        )
+        return self._rows_to_results(rows, now, stale_after)
+
+    def import_legacy_json(self, path=LEGACY_DB_FILE):
+        """Jednorazowy import ofert z dawnego ``produkty_db.json``.
+
+        Oferty trafiają do bazy bez dodawania zapytań do śledzonych, więc
+        crawler nie odpytuje sklepów o każdą dawną pozycję.
+        """
+        if not os.path.exists(path):
+            return 0
+        if self._read("SELECT 1 FROM offer LIMIT 1"):
+            return 0
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        checked_at = os.path.getmtime(path)
+        results = {}
+        for entry in entries:
+            slug = urllib.parse.urlparse(entry.get('url', '')).path.rstrip('/').rsplit('/', 1)[-1]
+            name = slug.replace('-', ' ').strip()
+            if not name or not entry.get('price'):
+                continue
+            results.setdefault(name, []).append({
+                "shop_name": entry.get('shop', ''),
+                "domain": domain_of(entry['url']),
+                "found": True,
+                "product_name": name,
+                "price": entry['price'],
+                "link": entry['url'],
+                "error": None,
+                "available": True,
+            })
+        with self._lock, self._conn:
+            for name, rows in results.items():
+                self._write_offers(normalize_name(name), rows, checked_at)
+        return sum(len(rows) for rows in results.values())
+
+# --- CRAWLER W TLE ---
+
+class Crawler:
+    """Odświeża śledzone zapytania w wątku w tle."""
+
+    def __init__(self, store, load_shops, fetcher=None, interval=CRAWL_INTERVAL,
+                 refresh_after=REFRESH_AFTER, throttle=None, forget_after=FORGET_AFTER):
+        self.store = store
+        self.load_shops = load_shops
+        self.fetch = fetcher or HttpFetcher()
+        self.interval = interval
+        self.refresh_after = refresh_after
+        self.forget_after = forget_after
+        self.throttle = throttle or DomainThrottle()
+        self._urgent = []
+        self._urgent_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _polite_fetch(self, url, timeout):
+        with self.throttle.slot(domain_of(url)):
+            return self.fetch(url, timeout)
+
+    def crawl_query(self, query):
+        """Przeszukuje wszystkie sklepy (równolegle między domenami) i zapisuje wyniki."""
+        shops = self.load_shops()
+        with ThreadPoolExecutor(max_workers=max(1, len(shops))) as executor:
+            results = list(executor.map(lambda shop: process_shop(shop, query, self._polite_fetch), shops))
+        self.store.save_results(query, results)
+        return results
+
+    def request(self, query):
+        """Śledzi zapytanie i prosi o sprawdzenie go przy najbliższej okazji."""
+        key = self.store.track(query)
+        if key:
+            with self._urgent_lock:
+                if query not in self._urgent:
+                    self._urgent.append(query)
+            self._wake.set()
+        return key
+
+    def run_once(self):
+        with self._urgent_lock:
+            queries, self._urgent = self._urgent, []
+        self.store.forget_idle(self.forget_after)
+        seen = {normalize_name(q) for q in queries}
+        queries += [
+            q for q in self.store.due_queries(self.refresh_after, idle_after=self.forget_after)
+            if normalize_name(q) not in seen
+        ]
+        for query in queries:
+            if self._stop.is_set():
+                break
+            self.crawl_query(query)
+        return len(queries)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Crawler: błąd odświeżania: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="ceny-crawler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Odświeża ceny śledzonych zapytań.")
+    parser.add_argument("--query", action="append", default=[], help="dodaj zapytanie do śledzenia")
+    parser.add_argument("--offline", action="store_true", help="użyj zapisanych stron z katalogu fixtures")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--shops", default='shops_config.json')
+    args = parser.parse_args()
+
+    def load_shops():
+        with open(args.shops, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    store = ProductStore(args.db)
+    crawler = Crawler(
+        store,
+        load_shops,
+        fetcher=FixtureFetcher() if args.offline else None,
+        throttle=DomainThrottle(0 if args.offline else POLITENESS_DELAY),
+    )
+    for query in args.query:
+        crawler.request(query)
+    print(f"Odświeżono zapytań: {crawler.run_once()}")
+    for query in store.tracked():
+        for item in store.lookup(query):
+            price = f"{item['price']:.2f} zł" if item['found'] else (item['error'] or '---')
+            print(f"  {query} | {item['shop_name']}: {price}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,11 @@
 #!/usr/bin/env python3
 from flask import Flask, render_template_string, request, redirect, url_for, flash
-import requests
-from bs4 import BeautifulSoup
-import re
 import json
 import os
+import threading
 import time
-import urllib.parse
-from concurrent.futures import ThreadPoolExecutor
+
+from crawler import Crawler, ProductStore
 
 # --- KONFIGURACJA APLIKACJI ---
 app = Flask(__name__)
@@ -89,11 +87,6 @@ DEFAULT_SHOPS = [
     }
 ]
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    "Accept-Language": "pl-PL,pl;q=0.9,en-US;q=0.8,en;q=0.7"
-}
-
 # --- FUNKCJE POMOCNICZE ---
 
 def load_shops():
@@ -107,207 +100,27 @@ def save_shops(data):
     with open(SHOPS_FILE, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=4, ensure_ascii=False)
 
-def clean_price(text):
-    if not text: return 0.0
-    # Usuwamy wszystko co nie jest cyfrą lub przecinkiem/kropką
-    clean = re.sub(r'[^\d,.]', '', str(text))
-    clean = clean.replace(',', '.')
-    try:
-        val = float(clean.strip('.'))
-        return val
-    except ValueError:
-        return 0.0
-
-def make_search_url(url_template, query):
-    # Standardowe kodowanie spacje -> +
-    query_plus = urllib.parse.quote_plus(query)
-    # Specjalne dla TCG Love (przecinki zamiast spacji w parametrze url=)
-    query_commas = urllib.parse.quote(query.replace(" ", ","))
-    
-    url = url_template.replace("{query}", query_plus)
-    url = url.replace("{query_commas}", query_commas)
-    return url
-
-# --- LOGIKA FILTROWANIA ---
-
-def is_valid_match(title, query):
-    title_lower = title.lower()
-    query_lower = query.lower()
-    
-    # 1. Sprawdzenie słów kluczowych
-    query_words = query_lower.split()
-    significant_words = [w for w in query_words if len(w) > 2]
-    
-    if significant_words:
-        matches = 0
-        for word in significant_words:
-            if word in title_lower:
-                matches += 1
-        # Musi pasować większość słów
-        if matches < len(significant_words) * 0.5:
-             return False, "Nie pasuje do nazwy"
-
-    # 2. SŁOWA ZAKAZANE
-    # Dodano 'break', 'kushi', 'live' aby wykluczyć te oferty zgodnie z życzeniem
-    exclusion_list = [
-        "box", "display", "bundle", "etb", "elite trainer box", "zestaw", "case", 
-        "puszka", "tin", "album", "poster", "collection",
-        "break", "kushi", "live", "otwieranie", "otwieramy"
-    ]
-    
-    user_wants_excluded = any(ex in query_lower for ex in exclusion_list)
-    
-    if not user_wants_excluded:
-        found_forbidden = [word for word in exclusion_list if word in title_lower]
-        if found_forbidden:
-            return False, f"Wykluczone słowo: {found_forbidden[0]}"
-            
-    return True, "OK"
-
-# --- SILNIK WYSZUKIWANIA ---
+# --- BAZA I CRAWLER ---
 
-def process_shop(shop, query):
-    result = {
-        "shop_name": shop['name'],
-        "domain": shop['domain'],
-        "found": False,
-        "product_name": "Brak produktu / Niedostępny",
-        "price": 0.0,
-        "link": "#",
-        "error": None,
-        "available": False
-    }
+_store = None
+_crawler = None
+_init_lock = threading.Lock()
 
-    try:
-        search_url = make_search_url(shop['search_url'], query)
-        # Timeout nieco dłuższy dla bezpieczeństwa
-        resp_search = requests.get(search_url, headers=HEADERS, timeout=15)
-        
-        if resp_search.status_code != 200:
-            result['error'] = f"Błąd HTTP {resp_search.status_code}"
-            return result
+def get_crawler():
+    """Baza i crawler tworzone przy pierwszym użyciu, nie przy imporcie modułu."""
+    global _store, _crawler
+    with _init_lock:
+        if _crawler is None:
+            _store = ProductStore()
+            _crawler = Crawler(_store, load_shops)
+    return _crawler
 
-        soup = BeautifulSoup(resp_search.content, 'html.parser')
-        
-        item_selector = shop.get('item_selector')
-        items = []
-        
-        if item_selector:
-            items = soup.select(item_selector)
-        else:
-            # Fallback
-            link_el = soup.select_one(shop['link_selector'])
-            if link_el: items = [link_el.parent]
+def get_store():
+    return get_crawler().store
 
-        if not items:
-            return result 
-
-        # Pętla po wynikach (szukamy pierwszego pasującego)
-        for item in items[:6]:
-            # 1. Tytuł
-            title_selector = shop.get('title_selector', shop['link_selector'])
-            title_el = item.select_one(title_selector)
-            if not title_el: continue
-            
-            title_text = title_el.get_text(strip=True)
-            
-            # 2. Filtr
-            is_valid, msg = is_valid_match(title_text, query)
-            if not is_valid: continue
-            
-            # 3. Link
-            link_el = item.select_one(shop['link_selector'])
-            if not link_el and item.name == 'a': link_el = item
-            if not link_el: link_el = item.find('a')
-            if not link_el or not link_el.has_attr('href'): continue
-            
-            product_url = link_el['href']
-            if not product_url.startswith("http"):
-                base_domain = shop['domain']
-                path = product_url.lstrip('/')
-                product_url = f"https://{base_domain}/{path}"
-            
-            # 4. Sprawdzenie dostępności NA LIŚCIE (Optymalizacja)
-            # Jeśli element ma klasę 'outofstock', to od razu wiemy, że brak.
-            is_available = True
-            stock_class = shop.get('stock_check_class')
-            if stock_class:
-                # Sprawdzamy klasy samego itemu i jego rodziców/dzieci w prosty sposób
-                item_classes = item.get('class', [])
-                if stock_class in item_classes:
-                    is_available = False
-                # Czasami klasa jest głębiej
-                elif item.select_one(f".{stock_class}"):
-                    is_available = False
-
-            # Jeśli produkt jest oznaczony jako niedostępny na liście,
-            # to i tak go wyświetlamy (jako wyszarzony), ale nie musimy wchodzić głębiej po cenę
-            # CHYBA ŻE cena nie jest widoczna na liście.
-            # W podanych przykładach, cena jest zazwyczaj na liście, ale
-            # dla pewności wchodzimy na stronę produktu, żeby pobrać świeżą cenę i status.
-            
-            try:
-                time.sleep(0.2)
-                resp_product = requests.get(product_url, headers=HEADERS, timeout=10)
-                soup_product = BeautifulSoup(resp_product.content, 'html.parser')
-                
-                # A. Potwierdzenie dostępności na karcie produktu
-                # (Czasami lista kłamie, karta mówi prawdę)
-                if shop.get('stock_selector'):
-                    oos_el = soup_product.select_one(shop['stock_selector'])
-                    if oos_el: is_available = False
-                
-                # Dodatkowe sprawdzenie tekstu dla pewności
-                if is_available:
-                    text_content = soup_product.get_text().lower()
-                    if "brak w magazynie" in text_content or "produkt niedostępny" in text_content:
-                        # Uwaga: to może dać false positive z menu, ale spróbujmy
-                        pass
-
-                # B. Cena
-                val = 0.0
-                selectors = shop['price_selector'].split(',')
-                price_el = None
-                for sel in selectors:
-                    price_el = soup_product.select_one(sel.strip())
-                    if price_el: break
-
-                if price_el:
-                    if price_el.has_attr('content'):
-                        val = clean_price(price_el['content'])
-                    else:
-                        val = clean_price(price_el.get_text(strip=True))
-                
-                # Fallbacki
-                if val == 0.0:
-                    fallback = soup_product.select_one(".woocommerce-Price-amount bdi")
-                    if fallback: val = clean_price(fallback.get_text(strip=True))
-                if val == 0.0:
-                    fallback = soup_product.select_one(".price__value")
-                    if fallback: val = clean_price(fallback.get_text(strip=True))
-                if val == 0.0:
-                    meta = soup_product.select_one("meta[property='product:price:amount']")
-                    if meta: val = clean_price(meta['content'])
-
-                if val > 0:
-                    result['found'] = True
-                    result['product_name'] = title_text
-                    result['link'] = product_url
-                    result['price'] = val
-                    result['available'] = is_available
-                    result['error'] = None
-                    return result
-                
-            except Exception:
-                continue
-
-        if not result['found']:
-            result['error'] = "Nie znaleziono (filtrowanie)"
-
-    except Exception as e:
-        result['error'] = str(e)
-    
-    return result
+@app.template_filter('checked_time')
+def checked_time(timestamp):
+    return time.strftime('%d.%m %H:%M', time.localtime(timestamp))
 
 # --- HTML TEMPLATES ---
 
@@ -385,6 +198,10 @@ HTML_HOME = """
         </form>
     </div>
 
+    {% if pending is defined and pending %}
+        <div class="text-center text-gray-500 mb-6"><i class="fa-solid fa-clock"></i> Zapytanie dodane do kolejki - ceny pojawią się po odświeżeniu strony za chwilę.</div>
+    {% endif %}
+
     {% if results is defined and results %}
         {% set found_count = results|selectattr('found')|list|length %}
         <div class="mb-6 flex justify-between items-end px-2">
@@ -403,6 +220,7 @@ HTML_HOME = """
                         <img src="https://www.google.com/s2/favicons?domain={{ item.domain }}&sz=32" alt="icon" class="w-6 h-6 rounded-sm shadow-sm">
                         <span class="font-bold text-gray-800 text-lg">{{ item.shop_name }}</span>
                     </div>
+                    <span class="text-xs {{ 'text-amber-600 font-semibold' if item.stale else 'text-gray-400' }}">{% if item.stale %}<i class="fa-solid fa-triangle-exclamation"></i> Nieaktualne · {% endif %}sprawdzono {{ item.checked_at|checked_time }}</span>
                     {% if item == best %}<span class="bg-green-100 text-green-700 text-xs font-bold px-3 py-1 rounded-full uppercase tracking-wide border border-green-200 shadow-sm">Najtaniej</span>{% endif %}
                 </div>
                 <div class="p-6 sm:w-2/4 flex flex-col justify-center">
@@ -483,14 +301,19 @@ def home():
 def search():
     query = request.form.get('query')
     shops = load_shops()
-    results = []
-    
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = [executor.submit(process_shop, shop, query) for shop in shops]
-        for future in futures:
-            results.append(future.result())
-            
-    inner_html = render_template_string(HTML_HOME, shop_count=len(shops), query=query, results=results)
+
+    # Odpowiedź z lokalnej bazy; sklepy odpytuje crawler w tle
+    store = get_store()
+    results = store.lookup(query)
+    if not results:
+        results = store.search_products(query)
+    if not results or any(item['stale'] for item in results):
+        get_crawler().request(query)
+    else:
+        store.track(query)
+    pending = not results
+
+    inner_html = render_template_string(HTML_HOME, shop_count=len(shops), query=query, results=results, pending=pending)
     return render_template_string(HTML_BASE, active='home', content=inner_html)
 
 @app.route('/shops')
@@ -531,5 +354,12 @@ if __name__ == '__main__':
     if os.path.exists(SHOPS_FILE):
         os.remove(SHOPS_FILE) 
         
+    app.debug = True
+
+    # Crawler w procesie serwera; z reloaderem (debug) proces nadrzędny tylko pilnuje plików
+    if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        get_store().import_legacy_json()
+        get_crawler().start()
+
     print("Uruchamianie PokeCena Search Engine v2.8 (Full Fixed Config)...")
-    app.run(debug=True, port=5000)
+    app.run(port=5000)
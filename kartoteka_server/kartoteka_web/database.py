@@ -2,65 +2,177 @@
 
 from __future__ import annotations
 
-import asyncio
 import logging
 import os
-import threading
-from contextlib import asynccontextmanager, contextmanager, nullcontext
-from typing import AsyncIterator, Iterator
+import random
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Iterator, TypeVar
 from weakref import WeakKeyDictionary
 
-from sqlalchemy import inspect
-from sqlalchemy.exc import NoSuchTableError
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import NoSuchTableError, OperationalError
+from sqlalchemy.orm import Session as OrmSession
 from sqlmodel import Session, SQLModel, create_engine
 
 DATABASE_URL = os.getenv("KARTOTEKA_DATABASE_URL", "sqlite:///./kartoteka.db")
 
 USING_SQLITE = DATABASE_URL.startswith("sqlite")
 connect_args = {"check_same_thread": False} if USING_SQLITE else {}
-engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
 
-DATABASE_WRITE_LOCK = threading.RLock() if USING_SQLITE else nullcontext()
+# WAL lets readers run alongside the single writer; set to DELETE to opt out.
+SQLITE_JOURNAL_MODE = os.getenv("KARTOTEKA_SQLITE_JOURNAL_MODE", "WAL").upper()
+# How long a writer waits for the SQLite write lock before SQLITE_BUSY.
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("KARTOTEKA_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Attempts made by ``session_scope`` commits and ``run_write`` when the write lock stays busy.
+WRITE_RETRIES = 3
 
-_ASYNC_LOCKS: WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]
-_ASYNC_LOCKS = WeakKeyDictionary()
-_ASYNC_LOCKS_GUARD = threading.Lock()
+T = TypeVar("T")
 
+logger = logging.getLogger(__name__)
 
-def _get_async_lock_for_current_loop() -> asyncio.Lock:
-    loop = asyncio.get_running_loop()
-    with _ASYNC_LOCKS_GUARD:
-        lock = _ASYNC_LOCKS.get(loop)
-        if lock is None:
-            lock = asyncio.Lock()
-            _ASYNC_LOCKS[loop] = lock
-    return lock
 
+def _set_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        row = cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}").fetchone()
+        if row and str(row[0]).upper() == "WAL":
+            # Durable at checkpoints; a power loss can only drop the last commits
+            cursor.execute("PRAGMA synchronous=NORMAL")
+    finally:
+        cursor.close()
 
-@asynccontextmanager
-async def _async_database_write_lock() -> AsyncIterator[None]:
-    if USING_SQLITE:
-        lock = _get_async_lock_for_current_loop()
-        async with lock:
-            yield
-    else:
-        yield
 
-logger = logging.getLogger(__name__)
+def _set_query_only(dbapi_connection, _connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def _configure_engine(target: Engine) -> Engine:
+    """Apply the SQLite pragmas to every new connection of ``target``."""
+
+    if target.dialect.name == "sqlite" and not event.contains(target, "connect", _set_sqlite_pragmas):
+        event.listen(target, "connect", _set_sqlite_pragmas)
+    return target
+
+
+engine = _configure_engine(create_engine(DATABASE_URL, echo=False, connect_args=connect_args))
+
+_READ_ENGINES: WeakKeyDictionary[Engine, Engine] = WeakKeyDictionary()
+
+
+def _get_read_engine() -> Engine:
+    """Engine for read-only sessions, paired with the current ``engine``.
+
+    SQLite connections of this engine run with ``query_only`` so an
+    accidental write in a read path fails loudly instead of contending for
+    the write lock. Other backends share the main engine.
+    """
+
+    if engine.dialect.name != "sqlite":
+        return engine
+    read_engine = _READ_ENGINES.get(engine)
+    if read_engine is None:
+        read_engine = _configure_engine(
+            create_engine(engine.url, echo=False, connect_args={"check_same_thread": False})
+        )
+        event.listen(read_engine, "connect", _set_query_only)
+        _READ_ENGINES[engine] = read_engine
+    return read_engine
+
+
+def is_busy_error(exc: BaseException) -> bool:
+    """Whether ``exc`` is SQLite reporting a held write lock."""
+
+    if not isinstance(exc, OperationalError):
+        return False
+    message = str(exc.orig or exc).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def _backoff(attempt: int) -> float:
+    return 0.05 * 2 ** attempt + random.uniform(0, 0.05)
+
+
+def _acquire_write_lock(session: OrmSession) -> None:
+    """Take the SQLite write lock before a commit flushes, retrying while busy.
+
+    A busy error raised by the flush itself would roll the session back and
+    lose its pending changes, so the lock is taken first with ``BEGIN
+    IMMEDIATE``; that fails without side effects and can simply be retried.
+    Only ``session_scope`` (and so ``run_write``) calls this; other sessions
+    rely on ``busy_timeout`` alone.
+    """
+
+    if not (session.new or session.dirty or session.deleted):
+        return
+    connection = session.connection()
+    if connection.dialect.name != "sqlite" or connection.connection.dbapi_connection.in_transaction:
+        # Other backends lock per row; an open SQLite transaction already wrote
+        return
+    for attempt in range(1, WRITE_RETRIES + 1):
+        try:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            return
+        except OperationalError as exc:
+            if attempt >= WRITE_RETRIES or not is_busy_error(exc):
+                raise
+            delay = _backoff(attempt)
+            logger.warning("Database busy, retrying commit in %.2fs (attempt %s/%s)", delay, attempt, WRITE_RETRIES)
+            time.sleep(delay)
 
 
 @contextmanager
 def session_scope() -> Iterator[Session]:
-    """Provide a transactional scope around a series of operations."""
-
-    with DATABASE_WRITE_LOCK:
-        with Session(engine) as session:
-            try:
-                yield session
-                session.commit()
-            except Exception:
-                session.rollback()
+    """Provide a transactional scope around a series of operations.
+
+    Reads run concurrently; the commit waits for the SQLite write lock,
+    retrying with backoff while another writer holds it.
+    """
+
+    with Session(engine) as session:
+        try:
+            yield session
+            _acquire_write_lock(session)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+
+@contextmanager
+def read_session() -> Iterator[Session]:
+    """Session for read-only work; never commits and cannot write."""
+
+    with Session(_get_read_engine()) as session:
+        yield session
+
+
+def run_write(fn: Callable[..., T], *args, retries: int = WRITE_RETRIES, **kwargs) -> T:
+    """Run ``fn(session, *args, **kwargs)`` in a write transaction.
+
+    Commits already wait out a held write lock; ``run_write`` additionally
+    retries the whole unit of work when ``fn`` itself hits a busy lock
+    (e.g. a query autoflushed earlier writes), so ``fn`` must be safe to
+    repeat.
+    """
+
+    for attempt in range(1, retries + 1):
+        try:
+            with session_scope() as session:
+                return fn(session, *args, **kwargs)
+        except OperationalError as exc:
+            if attempt >= retries or not is_busy_error(exc):
                 raise
+            delay = _backoff(attempt)
+            logger.warning("Database busy, retrying write in %.2fs (attempt %s/%s)", delay, attempt, retries)
+            time.sleep(delay)
+    raise AssertionError("unreachable")
 
 
 def init_db() -> None:
@@ -70,8 +182,11 @@ def init_db() -> None:
     from . import models  # noqa: F401  # pylint: disable=unused-import
 
     logger.info("Ensuring database tables are created")
+    _configure_engine(engine)
     _ensure_card_price_columns()
+    _ensure_card_record_columns()
     SQLModel.metadata.create_all(engine)
+    _ensure_card_search_index()
     logger.info("Database tables confirmed")
 
 
@@ -106,10 +221,50 @@ def _ensure_card_price_columns() -> None:
             )
 
 
+def _ensure_card_record_columns() -> None:
+    """Add the visual search hash column on the catalogue table for older schemas."""
+
+    inspector = inspect(engine)
+
+    try:
+        existing_columns = {column["name"] for column in inspector.get_columns("cardrecord")}
+    except NoSuchTableError:
+        return
+
+    if "phash" in existing_columns:
+        return
+
+    logger.info("Migrating cardrecord table to include the phash column")
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql("ALTER TABLE cardrecord ADD COLUMN phash INTEGER")
+        connection.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_cardrecord_phash ON cardrecord (phash)"
+        )
+
+
+def _ensure_card_search_index() -> None:
+    """Create the FTS5 card search tables and their sync triggers."""
+
+    from .services import card_search
+
+    card_search.ensure_search_index(engine)
+
 
 async def get_session() -> AsyncIterator[Session]:
-    """FastAPI dependency returning a new SQLModel session."""
+    """FastAPI dependency returning a new SQLModel session.
 
-    async with _async_database_write_lock():
-        with Session(engine) as session:
-            yield session
+    Handlers commit themselves; a commit waits up to ``busy_timeout`` for
+    the write lock. Use ``run_write`` for writes that must survive a longer
+    wait.
+    """
+
+    with Session(engine) as session:
+        yield session
+
+
+async def get_read_session() -> AsyncIterator[Session]:
+    """FastAPI dependency returning a read-only SQLModel session."""
+
+    with read_session() as session:
+        yield session
@@ -4,7 +4,7 @@ import datetime as dt
 from enum import Enum
 from typing import List, Optional
 
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import JSON, Column, UniqueConstraint
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -85,6 +85,26 @@ class Product(SQLModel, table=True):
     entries: List["CollectionEntry"] = Relationship(back_populates="product")
 
 
+class LatestProduct(SQLModel, table=True):
+    """Cached RapidAPI "latest products" feed shown on the home page."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    position: int = Field(index=True)
+    product_id: Optional[str] = Field(default=None)
+    name: str
+    set_name: Optional[str] = Field(default=None)
+    set_code: Optional[str] = Field(default=None)
+    image_small: Optional[str] = Field(default=None)
+    image_large: Optional[str] = Field(default=None)
+    release_date: Optional[str] = Field(default=None)
+    price: Optional[float] = Field(default=None)
+    price_7d_average: Optional[float] = Field(default=None)
+    shop_url: Optional[str] = Field(default=None)
+    fetched_at: dt.datetime = Field(
+        default_factory=lambda: dt.datetime.now(dt.timezone.utc)
+    )
+
+
 class PriceHistory(SQLModel, table=True):
     """Historical price data for cards and products."""
 
@@ -136,6 +156,8 @@ class CardRecord(SQLModel, table=True):
     set_icon: Optional[str] = Field(default=None)
     price: Optional[float] = Field(default=None)
     price_7d_average: Optional[float] = Field(default=None)
+    # 64-bit perceptual hash of image_small, stored signed (SQLite INTEGER)
+    phash: Optional[int] = Field(default=None, index=True)
     
     # Sync tracking fields
     sync_status: str = Field(default="pending", index=True)  # "pending", "synced", "failed"
@@ -154,6 +176,21 @@ class CardRecord(SQLModel, table=True):
     collection_cards: List["CollectionCard"] = Relationship(back_populates="card_record")
 
 
+class LearnedPhash(SQLModel, table=True):
+    """Perceptual hash of a user photo confirmed as a catalogue card."""
+
+    __table_args__ = (
+        UniqueConstraint("card_record_id", "phash", name="uq_learnedphash_hash"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    card_record_id: int = Field(foreign_key="cardrecord.id", index=True)
+    # Same encoding as CardRecord.phash
+    phash: int
+    created_at: dt.datetime = Field(
+        default_factory=lambda: dt.datetime.now(dt.timezone.utc)
+    )
+
 
 class ProductRecord(SQLModel, table=True):
     """Cached product entry for faster search and detail pages."""
@@ -211,6 +248,72 @@ class SetInfo(SQLModel, table=True):
     )
 
 
+class SetSyncState(SQLModel, table=True):
+    """Remote fingerprint of a set for the incremental catalogue sync."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    set_code: str = Field(unique=True, index=True)  # SetInfo.code
+    api_id: Optional[int] = Field(default=None, index=True)  # TCGGO episode ID
+    remote_updated_at: Optional[str] = Field(default=None)  # Episode updated_at from the API
+    remote_total: Optional[int] = Field(default=None)  # Episode card count from the API
+    total_pages: Optional[int] = Field(default=None)
+    content_hash: Optional[str] = Field(default=None)  # Hash over the page hashes
+    walk_started_at: Optional[dt.datetime] = Field(default=None)  # Pages fetched since then are current
+    checked_at: Optional[dt.datetime] = Field(default=None)
+    changed_at: Optional[dt.datetime] = Field(default=None)
+
+
+class SetSyncPage(SQLModel, table=True):
+    """One fetched page of a set's card list."""
+
+    __table_args__ = (
+        UniqueConstraint("set_code", "page", name="uq_setsyncpage_page"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    set_code: str = Field(index=True)
+    page: int
+    content_hash: str
+    etag: Optional[str] = Field(default=None)
+    remote_ids: list = Field(default_factory=list, sa_column=Column(JSON))  # Card IDs on the page
+    fetched_at: dt.datetime = Field(index=True)
+    changed_at: Optional[dt.datetime] = Field(default=None)
+
+
+class SetSyncCard(SQLModel, table=True):
+    """Stored ``SetSyncPage`` that lists a catalogue card."""
+
+    remote_id: str = Field(primary_key=True)  # CardRecord.remote_id
+    set_code: str = Field(index=True)
+    page: int
+
+
+class ApiQuota(SQLModel, table=True):
+    """RapidAPI requests spent by the catalogue sync per UTC day."""
+
+    day: dt.date = Field(primary_key=True)
+    requests: int = Field(default=0)
+
+
+class DashboardStats(SQLModel, table=True):
+    """Single-row snapshot behind ``GET /users/stats/dashboard``."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    total_users: int = Field(default=0)
+    total_collections: int = Field(default=0)
+    total_cards: int = Field(default=0)
+    total_products: int = Field(default=0)
+    average_card_price: float = Field(default=0.0)
+    last_sync: Optional[dt.datetime] = Field(default=None)
+    most_popular_card: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    most_valuable_card: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    top_cards: Optional[list] = Field(default=None, sa_column=Column(JSON))
+    refresh_ms: float = Field(default=0.0)  # Time spent computing the snapshot
+    refreshed_at: dt.datetime = Field(
+        default_factory=lambda: dt.datetime.now(dt.timezone.utc)
+    )
+
+
 class CollectionEntry(SQLModel, table=True):
     """Link between a user and the cards they own."""
 
@@ -228,6 +331,19 @@ class CollectionEntry(SQLModel, table=True):
     product: Optional["Product"] = Relationship(back_populates="entries")
 
 
+class CollectionValueDaily(SQLModel, table=True):
+    """Daily value of a user's cards (rollup behind the dashboard chart)."""
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "date", name="uq_collection_value_daily"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    date: dt.date = Field(index=True)
+    cards_value: float = Field(default=0.0)
+
+
 class Collection(SQLModel, table=True):
     """User-defined collection for tracking card ownership."""
 
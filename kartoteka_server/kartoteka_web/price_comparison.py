@@ -1,9 +1,34 @@
-import requests
-from bs4 import BeautifulSoup
+"""Price comparison across Polish TCG shops.
+
+:class:`PriceComparisonEngine` scrapes every shop concurrently on asyncio:
+
+* one pooled ``httpx.AsyncClient`` per shop domain, reused across calls;
+* the search page is fetched first, then the product pages of up to
+  ``MAX_CANDIDATES`` matching items concurrently. The first candidate (in
+  search order) with a price wins and the remaining fetches are cancelled;
+* results are cached per (shop, query) for ``CACHE_TTL`` seconds;
+* a global ``DEADLINE`` bounds the whole call; shops that have not answered
+  by then are reported as timed out instead of delaying the others.
+
+HTML parsing (:func:`parse_search_results`, :func:`parse_product_price`)
+runs in worker threads so it does not block the event loop. Both parsers
+only build the subtrees the shop's selectors can match (see
+:func:`_strainer`); ``scripts/bench_price_comparison.py`` times them
+against the saved pages in ``tests/fixtures/price_comparison``.
+"""
+
+import asyncio
+import logging
 import re
+import time
 import urllib.parse
-from concurrent.futures import ThreadPoolExecutor
-import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional
+
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +37,31 @@ HEADERS = {
     "Accept-Language": "pl-PL,pl;q=0.9,en-US;q=0.8,en;q=0.7"
 }
 
+SEARCH_TIMEOUT = 15.0
+PRODUCT_TIMEOUT = 10.0
+# Whole comparison; slower shops are returned as timed out
+DEADLINE = 12.0
+# Search results inspected per shop
+MAX_CANDIDATES = 6
+# Concurrent product page fetches per shop
+PRODUCT_CONCURRENCY = 3
+# Pooled connections per shop domain
+CONNECTIONS_PER_DOMAIN = 4
+CACHE_TTL = 15 * 60
+CACHE_SIZE = 512
+
+NOT_FOUND_ERROR = "Nie znaleziono (filtrowanie)"
+TIMEOUT_ERROR = "Przekroczono limit czasu"
+
+_PRICE_FALLBACKS = (
+    ".woocommerce-Price-amount bdi",
+    ".price__value",
+)
+_PRICE_META = "meta[property='product:price:amount']"
+
+# Leftmost compound of a selector: optional tag, classes, optional attribute test
+_COMPOUND_PATTERN = re.compile(r"^([a-zA-Z][\w-]*)?((?:\.[\w-]+)*)(\[[^\]]*\])?$")
+
 DEFAULT_SHOPS = [
     {
         "name": "BoosterPoint",
@@ -78,6 +128,7 @@ DEFAULT_SHOPS = [
     }
 ]
 
+
 def clean_price(text):
     if not text: return 0.0
     clean = re.sub(r'[^\d,.]', '', str(text))
@@ -125,8 +176,18 @@ def is_valid_match(title, query):
             
     return True, "OK"
 
-def process_shop(shop, query):
-    result = {
+
+@dataclass
+class Candidate:
+    """Search result that matches the query and links to a product page."""
+
+    title: str
+    url: str
+    available: bool
+
+
+def empty_result(shop: dict[str, Any]) -> dict[str, Any]:
+    return {
         "shop_name": shop['name'],
         "domain": shop['domain'],
         "found": False,
@@ -137,128 +198,310 @@ def process_shop(shop, query):
         "available": False
     }
 
-    try:
-        search_url = make_search_url(shop['search_url'], query)
-        resp_search = requests.get(search_url, headers=HEADERS, timeout=15)
-        
-        if resp_search.status_code != 200:
-            result['error'] = f"Błąd HTTP {resp_search.status_code}"
-            return result
-
-        soup = BeautifulSoup(resp_search.content.decode('utf-8', 'ignore'), 'html.parser')
-        
-        item_selector = shop.get('item_selector')
-        items = []
-        
-        if item_selector:
-            items = soup.select(item_selector)
+
+@lru_cache(maxsize=64)
+def _strainer(selectors: tuple[str, ...]) -> Optional[SoupStrainer]:
+    """Keep only elements matching the first compound of each selector.
+
+    Their whole subtrees are kept, so descendant selectors still match.
+    Returns ``None`` (parse everything) for selectors it cannot reduce.
+    """
+
+    rules = []
+    for selector in selectors:
+        head = selector.strip().split()[0] if selector.strip() else ""
+        match = _COMPOUND_PATTERN.match(head)
+        if not match or not (match.group(1) or match.group(2)):
+            return None
+        tag = match.group(1).lower() if match.group(1) else None
+        classes = frozenset(filter(None, match.group(2).split(".")))
+        rules.append((tag, classes))
+
+    def keep(name, attrs):
+        value = (attrs or {}).get("class") or ""
+        element_classes = set(value.split() if isinstance(value, str) else value)
+        return any(
+            (tag is None or tag == name) and classes <= element_classes
+            for tag, classes in rules
+        )
+
+    return SoupStrainer(keep)
+
+
+def _soup(html: str, selectors: tuple[str, ...] = ()) -> BeautifulSoup:
+    strainer = _strainer(selectors) if selectors else None
+    return BeautifulSoup(html, 'html.parser', parse_only=strainer)
+
+
+def _price_selectors(shop: dict[str, Any]) -> tuple[str, ...]:
+    selectors = [sel.strip() for sel in shop['price_selector'].split(',')]
+    selectors += [*_PRICE_FALLBACKS, _PRICE_META]
+    if shop.get('stock_selector'):
+        selectors += shop['stock_selector'].split(',')
+    return tuple(selectors)
+
+
+def parse_search_results(shop: dict[str, Any], html: str, query: str) -> list[Candidate]:
+    """Matching items of a shop search page, in page order."""
+
+    item_selector = shop.get('item_selector')
+    soup = _soup(html, tuple(item_selector.split(',')) if item_selector else ())
+    items = []
+    if item_selector:
+        items = soup.select(item_selector)
+    else:
+        link_el = soup.select_one(shop['link_selector'])
+        if link_el: items = [link_el.parent]
+
+    title_selector = shop.get('title_selector', shop['link_selector'])
+    stock_class = shop.get('stock_check_class')
+    candidates = []
+    for item in items[:MAX_CANDIDATES]:
+        title_el = item.select_one(title_selector)
+        if not title_el: continue
+
+        title_text = title_el.get_text(strip=True)
+        is_valid, msg = is_valid_match(title_text, query)
+        if not is_valid: continue
+
+        link_el = item.select_one(shop['link_selector'])
+        if not link_el and item.name == 'a': link_el = item
+        if not link_el: link_el = item.find('a')
+        if not link_el or not link_el.has_attr('href'): continue
+
+        product_url = link_el['href']
+        if not product_url.startswith("http"):
+            path = product_url.lstrip('/')
+            product_url = f"https://{shop['domain']}/{path}"
+
+        is_available = True
+        if stock_class:
+            if stock_class in item.get('class', []):
+                is_available = False
+            elif item.select_one(f".{stock_class}"):
+                is_available = False
+
+        candidates.append(Candidate(title_text, product_url, is_available))
+    return candidates
+
+
+def parse_product_price(shop: dict[str, Any], html: str) -> tuple[float, bool]:
+    """Price on a product page and whether the shop's stock selector allows it."""
+
+    soup = _soup(html, _price_selectors(shop))
+    in_stock = not (shop.get('stock_selector') and soup.select_one(shop['stock_selector']))
+
+    val = 0.0
+    price_el = None
+    for sel in shop['price_selector'].split(','):
+        price_el = soup.select_one(sel.strip())
+        if price_el: break
+    if price_el:
+        if price_el.has_attr('content'):
+            val = clean_price(price_el['content'])
         else:
-            link_el = soup.select_one(shop['link_selector'])
-            if link_el: items = [link_el.parent]
+            val = clean_price(price_el.get_text(strip=True))
 
-        if not items:
-            return result 
+    for selector in _PRICE_FALLBACKS:
+        if val != 0.0: break
+        fallback = soup.select_one(selector)
+        if fallback: val = clean_price(fallback.get_text(strip=True))
+    if val == 0.0:
+        meta = soup.select_one(_PRICE_META)
+        if meta and meta.has_attr('content'): val = clean_price(meta['content'])
+    return val, in_stock
 
-        for item in items[:6]:
-            title_selector = shop.get('title_selector', shop['link_selector'])
-            title_el = item.select_one(title_selector)
-            if not title_el: continue
-            
-            title_text = title_el.get_text(strip=True)
-            
-            is_valid, msg = is_valid_match(title_text, query)
-            if not is_valid: continue
-            
-            link_el = item.select_one(shop['link_selector'])
-            if not link_el and item.name == 'a': link_el = item
-            if not link_el: link_el = item.find('a')
-            if not link_el or not link_el.has_attr('href'): continue
-            
-            product_url = link_el['href']
-            if not product_url.startswith("http"):
-                base_domain = shop['domain']
-                path = product_url.lstrip('/')
-                product_url = f"https://{base_domain}/{path}"
-            
-            is_available = True
-            stock_class = shop.get('stock_check_class')
-            if stock_class:
-                item_classes = item.get('class', [])
-                if stock_class in item_classes:
-                    is_available = False
-                elif item.select_one(f".{stock_class}"):
-                    is_available = False
 
+def _cache_key(shop: dict[str, Any], query: str) -> tuple[str, str]:
+    return shop['domain'], " ".join(query.lower().split())
+
+
+class PriceComparisonEngine:
+    """Concurrent shop scraper with per-domain connection pools and a result cache."""
+
+    def __init__(
+        self,
+        shops: Optional[list[dict[str, Any]]] = None,
+        *,
+        deadline: float = DEADLINE,
+        cache_ttl: float = CACHE_TTL,
+        product_concurrency: int = PRODUCT_CONCURRENCY,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.shops = shops if shops is not None else DEFAULT_SHOPS
+        self.deadline = deadline
+        self.cache_ttl = cache_ttl
+        self.product_concurrency = max(1, product_concurrency)
+        self._transport = transport
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._cache: OrderedDict[tuple[str, str], tuple[float, dict[str, Any]]] = OrderedDict()
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def _client(self, domain: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Connections belong to the loop that opened them
+            self._clients = {}
+            self._loop = loop
+        client = self._clients.get(domain)
+        if client is None:
+            client = self._clients[domain] = httpx.AsyncClient(
+                headers=HEADERS,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=CONNECTIONS_PER_DOMAIN,
+                    max_keepalive_connections=CONNECTIONS_PER_DOMAIN,
+                ),
+                transport=self._transport,
+            )
+        return client
+
+    async def _get(self, shop: dict[str, Any], url: str, timeout: float) -> httpx.Response:
+        return await self._client(shop['domain']).get(url, timeout=timeout)
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            try:
+                await client.aclose()
+            except RuntimeError:  # pragma: no cover - loop already closed
+                pass
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    def _cached(self, key: tuple[str, str]) -> Optional[dict[str, Any]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if expires < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return dict(result)
+
+    def _store(self, key: tuple[str, str], result: dict[str, Any]) -> None:
+        # Transient failures are retried on the next call
+        if result['error'] not in (None, NOT_FOUND_ERROR):
+            return
+        self._cache[key] = (time.monotonic() + self.cache_ttl, dict(result))
+        self._cache.move_to_end(key)
+        while len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+
+    # ------------------------------------------------------------------
+    # Scraping
+    # ------------------------------------------------------------------
+
+    async def _product_price(
+        self, shop: dict[str, Any], candidate: Candidate, limit: asyncio.Semaphore
+    ) -> tuple[float, bool]:
+        async with limit:
             try:
-                # Check product page details if necessary, or rely on list
-                # For now, scraping product page for price accuracy as per original script
-                # NOTE: This adds latency.
-                resp_product = requests.get(product_url, headers=HEADERS, timeout=10)
-                if resp_product.status_code == 200:
-                    soup_product = BeautifulSoup(resp_product.content.decode('utf-8', 'ignore'), 'html.parser')
-                    
-                    if shop.get('stock_selector'):
-                        oos_el = soup_product.select_one(shop['stock_selector'])
-                        if oos_el: is_available = False
-                    
-                    if is_available:
-                        text_content = soup_product.get_text().lower()
-                        if "brak w magazynie" in text_content or "produkt niedostępny" in text_content:
-                            pass # Warning: this check is heuristic
-
-                    val = 0.0
-                    selectors = shop['price_selector'].split(',')
-                    price_el = None
-                    for sel in selectors:
-                        price_el = soup_product.select_one(sel.strip())
-                        if price_el: break
-
-                    if price_el:
-                        if price_el.has_attr('content'):
-                            val = clean_price(price_el['content'])
-                        else:
-                            val = clean_price(price_el.get_text(strip=True))
-                    
-                    if val == 0.0:
-                        fallback = soup_product.select_one(".woocommerce-Price-amount bdi")
-                        if fallback: val = clean_price(fallback.get_text(strip=True))
-                    if val == 0.0:
-                        fallback = soup_product.select_one(".price__value")
-                        if fallback: val = clean_price(fallback.get_text(strip=True))
-                    if val == 0.0:
-                        meta = soup_product.select_one("meta[property='product:price:amount']")
-                        if meta: val = clean_price(meta['content'])
+                response = await self._get(shop, candidate.url, PRODUCT_TIMEOUT)
+            except httpx.HTTPError:
+                return 0.0, False
+        if response.status_code != 200:
+            return 0.0, False
+        html = response.content.decode('utf-8', 'ignore')
+        return await asyncio.to_thread(parse_product_price, shop, html)
+
+    async def process_shop(self, shop: dict[str, Any], query: str) -> dict[str, Any]:
+        result = empty_result(shop)
+        try:
+            search_url = make_search_url(shop['search_url'], query)
+            response = await self._get(shop, search_url, SEARCH_TIMEOUT)
+            if response.status_code != 200:
+                result['error'] = f"Błąd HTTP {response.status_code}"
+                return result
+
+            html = response.content.decode('utf-8', 'ignore')
+            candidates = await asyncio.to_thread(parse_search_results, shop, html, query)
+            if not candidates:
+                return result
 
+            limit = asyncio.Semaphore(self.product_concurrency)
+            tasks = [
+                asyncio.create_task(self._product_price(shop, candidate, limit))
+                for candidate in candidates
+            ]
+            try:
+                # Earlier search results win; later fetches are cancelled once one has a price
+                for candidate, task in zip(candidates, tasks):
+                    val, in_stock = await task
                     if val > 0:
                         result['found'] = True
-                        result['product_name'] = title_text
-                        result['link'] = product_url
+                        result['product_name'] = candidate.title
+                        result['link'] = candidate.url
                         result['price'] = val
-                        result['available'] = is_available
+                        result['available'] = candidate.available and in_stock
                         result['error'] = None
                         return result
-                
-            except Exception:
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+            result['error'] = NOT_FOUND_ERROR
+        except Exception as e:
+            result['error'] = str(e) or type(e).__name__
+        return result
+
+    async def _shop_result(self, shop: dict[str, Any], query: str) -> dict[str, Any]:
+        key = _cache_key(shop, query)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        result = await self.process_shop(shop, query)
+        self._store(key, result)
+        return result
+
+    async def search(self, query: str) -> list[dict[str, Any]]:
+        """Results for every shop, in shop order, within ``deadline`` seconds."""
+
+        tasks = [asyncio.create_task(self._shop_result(shop, query)) for shop in self.shops]
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=self.deadline)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        results = []
+        for shop, task in zip(self.shops, tasks):
+            if task in done and task.exception() is None:
+                results.append(task.result())
                 continue
+            if task in done:
+                logger.error("Error comparing prices in %s: %s", shop['name'], task.exception())
+            result = empty_result(shop)
+            result['error'] = TIMEOUT_ERROR if task in pending else str(task.exception())
+            results.append(result)
+        return results
 
-        if not result['found']:
-            result['error'] = "Nie znaleziono (filtrowanie)"
 
-    except Exception as e:
-        result['error'] = str(e)
-    
-    return result
+engine = PriceComparisonEngine()
+
+
+async def compare_prices(query: str) -> list[dict[str, Any]]:
+    """Search for products in Polish TCG shops using the shared engine."""
+    return await engine.search(query)
+
 
 def search_polish_prices(query: str):
-    """Search for products in Polish TCG shops."""
-    shops = DEFAULT_SHOPS
-    results = []
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = [executor.submit(process_shop, shop, query) for shop in shops]
-        for future in futures:
-            try:
-                res = future.result()
-                results.append(res)
-            except Exception as e:
-                logger.error(f"Error in search thread: {e}")
-    return results
+    """Search for products in Polish TCG shops (blocking helper for scripts)."""
+
+    async def run():
+        try:
+            return await engine.search(query)
+        finally:
+            await engine.aclose()
+
+    return asyncio.run(run())
@@ -1,109 +1,260 @@
-"""Simple in-memory rate limiter for authentication endpoints."""
+"""Rate limiting for authentication endpoints.
+
+Each key (usually the client IP) keeps two fixed-window counters. The
+sliding-window estimate is the current window's count plus the previous
+window's count weighted by how much of it still overlaps the window, so a
+check is O(1) whatever the limit. Idle keys are swept periodically and the
+number of tracked keys is capped, so a spray of unique (or spoofed
+``X-Forwarded-For``) addresses cannot grow memory without bound. The cap
+drops expired keys first, then the least recently seen ones, but never a
+key that is still blocked, so a spray cannot lift a block.
+
+Set ``KARTOTEKA_RATE_LIMIT_DB`` to a SQLite file path to keep the counters
+there instead, so several uvicorn workers share the same limits.
+"""
 
 from __future__ import annotations
 
+import math
+import os
+import sqlite3
+import threading
 import time
-from collections import defaultdict
+from collections import OrderedDict
 from threading import Lock
-from typing import Optional
+from typing import Callable, Optional
 
 from fastapi import HTTPException, Request, status
 
+RATE_LIMIT_DB = os.getenv("KARTOTEKA_RATE_LIMIT_DB") or None
+RATE_LIMIT_MAX_KEYS = int(os.getenv("KARTOTEKA_RATE_LIMIT_MAX_KEYS", "10000"))
+
+# (window_start, count, previous_count, blocked_until)
+_State = tuple[float, int, int, float]
+
 
 class RateLimiter:
     """
-    In-memory rate limiter using sliding window algorithm.
-    
-    Thread-safe implementation for limiting requests per IP address.
+    Sliding-window rate limiter with bounded memory.
+
+    Thread-safe. Counters live in memory unless ``db_path`` is given, in which
+    case they are stored in a SQLite table shared by every process using it.
     """
-    
+
     def __init__(
         self,
         max_requests: int = 5,
         window_seconds: int = 60,
         block_seconds: int = 300,
+        *,
+        max_keys: int = RATE_LIMIT_MAX_KEYS,
+        sweep_interval: float = 60.0,
+        db_path: Optional[str] = None,
+        scope: str = "default",
+        clock: Callable[[], float] = time.time,
     ):
         """
         Initialize rate limiter.
-        
+
         Args:
             max_requests: Maximum number of requests allowed in the window
             window_seconds: Time window in seconds
             block_seconds: How long to block after exceeding limit
+            max_keys: Cap on tracked keys; expired, then least recently seen
+                unblocked keys go first, blocked keys are always kept
+            sweep_interval: Seconds between sweeps of idle keys
+            db_path: SQLite file shared between workers (in-memory when None)
+            scope: Name separating limiters that share one database
+            clock: Time source, overridable in tests
         """
         self.max_requests = max_requests
         self.window_seconds = window_seconds
         self.block_seconds = block_seconds
-        self._requests: dict[str, list[float]] = defaultdict(list)
-        self._blocked: dict[str, float] = {}
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self.db_path = db_path
+        self.scope = scope
+        self._clock = clock
+        self._entries: OrderedDict[str, _State] = OrderedDict()
         self._lock = Lock()
-    
-    def _cleanup_old_requests(self, key: str, now: float) -> None:
-        """Remove requests older than the window."""
-        cutoff = now - self.window_seconds
-        self._requests[key] = [t for t in self._requests[key] if t > cutoff]
-    
-    def _is_blocked(self, key: str, now: float) -> bool:
-        """Check if the key is currently blocked."""
-        if key in self._blocked:
-            if now < self._blocked[key]:
-                return True
-            else:
-                del self._blocked[key]
-        return False
-    
-    def _get_remaining_block_time(self, key: str, now: float) -> int:
-        """Get remaining block time in seconds."""
-        if key in self._blocked:
-            return max(0, int(self._blocked[key] - now))
-        return 0
-    
+        self._local = threading.local()
+        self._next_sweep = 0.0
+        self.evicted = 0
+
+    def _decide(self, state: Optional[_State], now: float) -> tuple[_State, bool, Optional[int]]:
+        """Apply one request to ``state``; returns (new_state, allowed, retry_after)."""
+        window = self.window_seconds
+        window_start = math.floor(now / window) * window
+        if state is None:
+            state = (window_start, 0, 0, 0.0)
+        started, count, previous, blocked_until = state
+
+        if now < blocked_until:
+            return state, False, max(0, int(blocked_until - now))
+
+        if started != window_start:
+            previous = count if started == window_start - window else 0
+            count = 0
+        overlap = 1.0 - (now - window_start) / window
+        if previous * overlap + count >= self.max_requests:
+            blocked_until = now + self.block_seconds
+            return (window_start, count, previous, blocked_until), False, self.block_seconds
+
+        return (window_start, count + 1, previous, 0.0), True, None
+
+    def _expires_at(self, state: _State) -> float:
+        """When the state stops mattering (block over, both windows elapsed)."""
+        return max(state[3], state[0] + 2 * self.window_seconds)
+
     def check(self, key: str) -> tuple[bool, Optional[int]]:
         """
         Check if request is allowed.
-        
+
         Args:
             key: Unique identifier (usually IP address)
-            
+
         Returns:
             Tuple of (is_allowed, retry_after_seconds)
         """
-        now = time.time()
-        
+        now = self._clock()
+        if self.db_path:
+            return self._check_db(key, now)
+
         with self._lock:
-            # Check if blocked
-            if self._is_blocked(key, now):
-                retry_after = self._get_remaining_block_time(key, now)
-                return False, retry_after
-            
-            # Cleanup old requests
-            self._cleanup_old_requests(key, now)
-            
-            # Check rate limit
-            if len(self._requests[key]) >= self.max_requests:
-                # Block the key
-                self._blocked[key] = now + self.block_seconds
-                return False, self.block_seconds
-            
-            # Allow request and record it
-            self._requests[key].append(now)
-            return True, None
-    
+            if now >= self._next_sweep:
+                self._sweep(now)
+            state, allowed, retry_after = self._decide(self._entries.get(key), now)
+            self._entries[key] = state
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_keys:
+                self._evict(now)
+            return allowed, retry_after
+
+    def _evict(self, now: float) -> None:
+        """Drop keys above ``max_keys``, never blocked ones (caller holds the lock)."""
+        excess = len(self._entries) - self.max_keys
+        expired: list[str] = []
+        unblocked: list[str] = []
+        # Least recently seen first; those are the likeliest to have expired
+        for key, state in self._entries.items():
+            if self._expires_at(state) <= now:
+                expired.append(key)
+                if len(expired) >= excess:
+                    break
+            elif state[3] <= now and len(unblocked) < excess:
+                unblocked.append(key)
+        victims = (expired + unblocked)[:excess]
+        for key in victims:
+            del self._entries[key]
+        self.evicted += len(victims)
+
+    def _sweep(self, now: float) -> None:
+        """Drop idle keys (caller holds the lock)."""
+        idle = [key for key, state in self._entries.items() if self._expires_at(state) <= now]
+        for key in idle:
+            del self._entries[key]
+        self.evicted += len(idle)
+        self._next_sweep = now + self.sweep_interval
+
     def reset(self, key: str) -> None:
         """Reset rate limit for a key (e.g., after successful login)."""
+        if self.db_path:
+            self._connection().execute(
+                "DELETE FROM rate_limit WHERE scope = ? AND key = ?", (self.scope, key)
+            )
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def tracked_keys(self) -> int:
+        """Number of keys currently held."""
+        if self.db_path:
+            row = self._connection().execute(
+                "SELECT COUNT(*) FROM rate_limit WHERE scope = ?", (self.scope,)
+            ).fetchone()
+            return row[0]
         with self._lock:
-            if key in self._requests:
-                del self._requests[key]
-            if key in self._blocked:
-                del self._blocked[key]
+            return len(self._entries)
+
+    # --- SQLite-backed mode -------------------------------------------------
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rate_limit (
+                    scope TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    window_start REAL NOT NULL,
+                    count INTEGER NOT NULL,
+                    previous INTEGER NOT NULL,
+                    blocked_until REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (scope, key)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_rate_limit_expires ON rate_limit (scope, expires_at)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _check_db(self, key: str, now: float) -> tuple[bool, Optional[int]]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT window_start, count, previous, blocked_until FROM rate_limit "
+                "WHERE scope = ? AND key = ?",
+                (self.scope, key),
+            ).fetchone()
+            state, allowed, retry_after = self._decide(tuple(row) if row else None, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.scope, key, *state, self._expires_at(state)),
+            )
+            if now >= self._next_sweep:
+                self._sweep_db(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+    def _sweep_db(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop idle rows, then the soonest-expiring unblocked ones above ``max_keys``."""
+        deleted = conn.execute(
+            "DELETE FROM rate_limit WHERE scope = ? AND expires_at <= ?", (self.scope, now)
+        ).rowcount
+        (tracked,) = conn.execute(
+            "SELECT COUNT(*) FROM rate_limit WHERE scope = ?", (self.scope,)
+        ).fetchone()
+        if tracked > self.max_keys:
+            deleted += conn.execute(
+                "DELETE FROM rate_limit WHERE scope = ? AND key IN ("
+                "SELECT key FROM rate_limit WHERE scope = ? AND blocked_until <= ? "
+                "ORDER BY expires_at LIMIT ?)",
+                (self.scope, self.scope, now, tracked - self.max_keys),
+            ).rowcount
+        self.evicted += deleted
+        self._next_sweep = now + self.sweep_interval
 
 
 # Global rate limiters for different endpoints
-# Login: 5 attempts per minute, block for 5 minutes
-login_limiter = RateLimiter(max_requests=10, window_seconds=60, block_seconds=60)
+# Login: 10 attempts per minute, block for 1 minute
+login_limiter = RateLimiter(
+    max_requests=10, window_seconds=60, block_seconds=60, db_path=RATE_LIMIT_DB, scope="login"
+)
 
 # Register: 10 attempts per minute, block for 1 minute (relaxed for testing)
-register_limiter = RateLimiter(max_requests=10, window_seconds=60, block_seconds=60)
+register_limiter = RateLimiter(
+    max_requests=10, window_seconds=60, block_seconds=60, db_path=RATE_LIMIT_DB, scope="register"
+)
 
 
 def get_client_ip(request: Request) -> str:
@@ -113,27 +264,27 @@ def get_client_ip(request: Request) -> str:
     if forwarded_for:
         # Take the first IP in the chain (original client)
         return forwarded_for.split(",")[0].strip()
-    
+
     real_ip = request.headers.get("X-Real-IP")
     if real_ip:
         return real_ip.strip()
-    
+
     # Fallback to direct client
     if request.client:
         return request.client.host
-    
+
     return "unknown"
 
 
 def check_login_rate_limit(request: Request) -> None:
     """
     Dependency to check login rate limit.
-    
+
     Raises HTTPException 429 if rate limit exceeded.
     """
     client_ip = get_client_ip(request)
     allowed, retry_after = login_limiter.check(client_ip)
-    
+
     if not allowed:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -145,12 +296,12 @@ def check_login_rate_limit(request: Request) -> None:
 def check_register_rate_limit(request: Request) -> None:
     """
     Dependency to check registration rate limit.
-    
+
     Raises HTTPException 429 if rate limit exceeded.
     """
     client_ip = get_client_ip(request)
     allowed, retry_after = register_limiter.check(client_ip)
-    
+
     if not allowed:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -6,20 +6,19 @@ import datetime as dt
 import logging
 import os
 import re
-import time
-from collections import defaultdict
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Iterable
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy import func, or_
 from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select
 
 from .. import models, schemas
 from ..auth import get_current_user, get_optional_user
-from ..database import get_session, session_scope
-from ..services import catalog_sync, tcg_api, crud
+from ..database import get_read_session, get_session
+from ..services import card_search, catalog_sync, collection_value, export, price_fill, price_history_jobs, tcg_api
 from ..utils import images as image_utils, text, sets as set_utils
 
 router = APIRouter(prefix="/cards", tags=["cards"])
@@ -128,7 +127,7 @@ def _card_to_search_schema(card: models.Card) -> schemas.CardSearchResult:
         set_name=card.set_name,
         set_code=card.set_code,
         rarity=card.rarity,
-        image_small=card.image_small,
+        image_small=image_utils.thumbnail_path(card.image_small),
         image_large=card.image_large,
         set_icon=None,
         set_icon_path=_local_set_icon_path(card.set_code, card.set_name),
@@ -149,7 +148,7 @@ def _card_record_to_search_schema(record: models.CardRecord) -> schemas.CardSear
         set_name=record.set_name,
         set_code=record.set_code,
         rarity=record.rarity,
-        image_small=record.image_small,
+        image_small=image_utils.thumbnail_path(record.image_small),
         image_large=record.image_large,
         set_icon=record.set_icon,
         set_icon_path=_local_set_icon_path(record.set_code, record.set_name),
@@ -504,52 +503,6 @@ def _apply_card_images(card: models.Card, card_data: schemas.CardBase) -> bool:
     return updated
 
 
-def _apply_card_price(card: models.Card, session: Session) -> bool:
-    """Fetch and update price from CardRecord catalog if available."""
-    from sqlmodel import select
-    
-    # Try to find price in CardRecord catalog
-    name_norm = text.normalize(card.name, keep_spaces=True)
-    set_name_norm = text.normalize(card.set_name, keep_spaces=True)
-    
-    # First try: exact match (name + set + number)
-    stmt = select(models.CardRecord).where(
-        models.CardRecord.name_normalized == name_norm,
-        models.CardRecord.set_name_normalized == set_name_norm,
-        models.CardRecord.number == card.number
-    ).limit(1)
-    
-    card_record = session.exec(stmt).first()
-    
-    # Second try: if no exact match, try normalized number match
-    if not card_record:
-        number_clean = text.sanitize_number(card.number or "")
-        if number_clean:
-            stmt = select(models.CardRecord).where(
-                models.CardRecord.name_normalized == name_norm,
-                models.CardRecord.set_name_normalized == set_name_norm
-            )
-            candidates = session.exec(stmt).all()
-            for candidate in candidates:
-                candidate_number_clean = text.sanitize_number(candidate.number or "")
-                if candidate_number_clean == number_clean:
-                    card_record = candidate
-                    break
-    
-    updated = False
-    if card_record:
-        # Update price if available
-        if card_record.price is not None and card.price != card_record.price:
-            card.price = card_record.price
-            updated = True
-        # Update 7-day average if available
-        if card_record.price_7d_average is not None and card.price_7d_average != card_record.price_7d_average:
-            card.price_7d_average = card_record.price_7d_average
-            updated = True
-    
-    return updated
-
-
 def _serialize_entry(
     entry: models.CollectionEntry,
     session: Session | None = None,
@@ -627,6 +580,163 @@ def _apply_card_record_filters(
     return stmt
 
 
+@dataclass
+class _LocalSearchResult:
+    """Page of local catalogue matches for :func:`search_cards_endpoint`."""
+
+    records: list[models.CardRecord]
+    total: int
+    page: int
+    total_remote: int | None = None
+    next_cursor: str | None = None
+    suggested_query: str | None = None
+
+
+def _search_local_catalog_like(
+    session: Session,
+    *,
+    name_norm: str,
+    query_norm: str,
+    number_clean: str,
+    total_clean: str,
+    set_name_norm: str,
+    set_code_clean: str,
+    per_page: int,
+    result_cap: int,
+    page: int,
+) -> _LocalSearchResult:
+    """``LIKE`` based search used when the FTS index is unavailable."""
+
+    filter_kwargs = dict(
+        name_norm=name_norm,
+        query_norm=query_norm,
+        number_clean=number_clean,
+        total_clean=total_clean,
+        set_name_norm=set_name_norm,
+        set_code_clean=set_code_clean,
+    )
+    filtered_stmt = _apply_card_record_filters(select(models.CardRecord), **filter_kwargs)
+    count_stmt = _apply_card_record_filters(
+        select(func.count()).select_from(models.CardRecord), **filter_kwargs
+    )
+    total_local = int(session.exec(count_stmt).one() or 0)
+
+    capped_total = min(total_local, result_cap)
+    total_pages = max(1, (capped_total + per_page - 1) // per_page)
+    page_value = min(page, total_pages)
+    offset = (page_value - 1) * per_page
+    limit_value = min(per_page, max(0, capped_total - offset))
+    records: list[models.CardRecord] = []
+    if total_local >= per_page and limit_value > 0:
+        records = session.exec(
+            filtered_stmt
+            .order_by(
+                models.CardRecord.name_normalized,
+                models.CardRecord.set_name_normalized,
+                models.CardRecord.number,
+                models.CardRecord.id,
+            )
+            .offset(offset)
+            .limit(limit_value)
+        ).all()
+    return _LocalSearchResult(
+        records,
+        total_local,
+        page_value,
+        total_remote=total_local if total_local > result_cap else None,
+    )
+
+
+def _search_local_catalog_fts(
+    session: Session,
+    *,
+    name_norm: str,
+    number_clean: str,
+    total_clean: str,
+    set_name_norm: str,
+    set_code_clean: str,
+    per_page: int,
+    result_cap: int,
+    page: int,
+    cursor: str | None,
+) -> _LocalSearchResult:
+    """Ranked full-text search over the local catalogue.
+
+    Tries a prefix match on the card name, then on all indexed columns
+    (set name, set code, number, artist) and finally a typo-tolerant
+    trigram match.
+    """
+
+    def _filters(stmt):
+        return _apply_card_record_filters(
+            stmt,
+            name_norm="",
+            query_norm="",
+            number_clean=number_clean,
+            total_clean=total_clean,
+            set_name_norm="",
+            set_code_clean=set_code_clean,
+        )
+
+    extra_filters = _filters if (number_clean or total_clean or set_code_clean) else None
+
+    tokens = card_search.tokenize(name_norm)
+    set_match = card_search.prefix_query(
+        card_search.tokenize(set_name_norm), ("set_name_normalized",)
+    )
+    matches = [
+        card_search.prefix_query(tokens, ("name_normalized",)),
+        card_search.prefix_query(tokens),
+    ]
+    for match in matches:
+        if not match:
+            continue
+        if set_match:
+            match = f"({match}) AND {set_match}"
+        result = card_search.search(
+            session,
+            match,
+            filters=extra_filters,
+            per_page=per_page,
+            cap=result_cap,
+            page=page,
+            cursor=cursor,
+        )
+        if not result.total:
+            continue
+        total_remote = None
+        if result.total > result_cap:
+            total_remote = (
+                result.total
+                if extra_filters is None
+                else card_search.count(session, match, filters=extra_filters)
+            )
+        return _LocalSearchResult(
+            result.records,
+            total_remote or result.total,
+            result.page,
+            total_remote=total_remote,
+            next_cursor=result.next_cursor,
+        )
+
+    def _fuzzy_filters(stmt):
+        stmt = _filters(stmt)
+        if set_name_norm:
+            stmt = stmt.where(models.CardRecord.set_name_normalized.contains(set_name_norm))
+        return stmt
+
+    fuzzy = card_search.fuzzy_search(session, name_norm, filters=_fuzzy_filters, cap=result_cap)
+    total_pages = max(1, (len(fuzzy) + per_page - 1) // per_page)
+    page_value = min(page, total_pages)
+    offset = (page_value - 1) * per_page
+    return _LocalSearchResult(
+        fuzzy[offset:offset + per_page],
+        len(fuzzy),
+        page_value,
+        suggested_query=fuzzy[0].name if fuzzy else None,
+    )
+
+
 @router.get("/search", response_model=schemas.CardSearchResponse)
 def search_cards_endpoint(
     query: str | None = None,
@@ -640,6 +750,7 @@ def search_cards_endpoint(
     order: str | None = None,
     page: int = 1,
     per_page: int = 20,
+    cursor: str | None = None,
     current_user: models.User | None = Depends(get_optional_user),
     session: Session = Depends(get_session),
 ):
@@ -692,61 +803,47 @@ def search_cards_endpoint(
         else ""
     )
 
-    filtered_stmt = _apply_card_record_filters(
-        select(models.CardRecord),
-        name_norm=name_norm,
-        query_norm=query_norm,
-        number_clean=number_clean,
-        total_clean=total_clean,
-        set_name_norm=set_name_norm,
-        set_code_clean=set_code_clean,
-    )
-
-    count_stmt = _apply_card_record_filters(
-        select(func.count()).select_from(models.CardRecord),
-        name_norm=name_norm,
-        query_norm=query_norm,
-        number_clean=number_clean,
-        total_clean=total_clean,
-        set_name_norm=set_name_norm,
-        set_code_clean=set_code_clean,
-    )
-    total_local = session.exec(count_stmt).one()
-    total_local = int(total_local or 0)
+    if card_search.is_available(session):
+        local = _search_local_catalog_fts(
+            session,
+            name_norm=name_norm or query_norm,
+            number_clean=number_clean,
+            total_clean=total_clean,
+            set_name_norm=set_name_norm,
+            set_code_clean=set_code_clean,
+            per_page=per_page_value,
+            result_cap=result_cap,
+            page=requested_page,
+            cursor=cursor,
+        )
+    else:
+        local = _search_local_catalog_like(
+            session,
+            name_norm=name_norm,
+            query_norm=query_norm,
+            number_clean=number_clean,
+            total_clean=total_clean,
+            set_name_norm=set_name_norm,
+            set_code_clean=set_code_clean,
+            per_page=per_page_value,
+            result_cap=result_cap,
+            page=requested_page,
+        )
 
     # Only use local results if we have enough cards (at least per_page_value results)
     # Otherwise, fall through to remote API search for better coverage
     LOCAL_THRESHOLD = per_page_value
-    if total_local >= LOCAL_THRESHOLD:
-        capped_total = min(total_local, result_cap)
-        total_pages = max(1, (capped_total + per_page_value - 1) // per_page_value)
-        page_value = min(requested_page, total_pages)
-        offset = (page_value - 1) * per_page_value
-        limit_value = min(per_page_value, max(0, capped_total - offset))
-        records: list[models.CardRecord] = []
-        if limit_value > 0:
-            records = session.exec(
-                filtered_stmt
-                .order_by(
-                    models.CardRecord.name_normalized,
-                    models.CardRecord.set_name_normalized,
-                    models.CardRecord.number,
-                    models.CardRecord.id,
-                )
-                .offset(offset)
-                .limit(limit_value)
-            ).all()
-
-        items = [_card_record_to_search_schema(record) for record in records]
-        total_remote_value = total_local if total_local > result_cap else None
+    if local.total >= LOCAL_THRESHOLD:
+        items = [_card_record_to_search_schema(record) for record in local.records]
         return schemas.CardSearchResponse(
             items=items,
             total=len(items),
-            total_count=min(total_local, result_cap),
-            total_remote=total_remote_value,
-            page=page_value,
+            total_count=min(local.total, result_cap),
+            total_remote=local.total_remote,
+            page=local.page,
             per_page=per_page_value,
-            suggested_query=None,
+            suggested_query=local.suggested_query,
+            next_cursor=local.next_cursor,
         )
 
     # Try search with query variants for flexible matching
@@ -804,14 +901,10 @@ def search_cards_endpoint(
     if records and isinstance(records[0], dict):
         suggestion = records[0].get("name")
 
-    changed_catalog = False
-    for record in records:
-        if isinstance(record, dict):
-            _, created, updated = catalog_sync.upsert_card_record(session, record)
-            if created or updated:
-                changed_catalog = True
-
-    if changed_catalog:
+    added, updated = catalog_sync.upsert_card_records(
+        session, (record for record in records if isinstance(record, dict))
+    )
+    if added or updated:
         session.commit()
 
     effective_total = min(result_cap, filtered_total_value)
@@ -1187,22 +1280,29 @@ def list_collection(
         )
     ).all()
     
-    # Refresh prices for cards/products that don't have them
-    for entry in entries:
-        if entry.card and entry.card.price is None:
-            _apply_card_price(entry.card, session)
-        elif entry.product and entry.product.price is None:
-            from .products import _apply_product_price
-            _apply_product_price(entry.product, session)
-    
-    session.commit()
+    # Prices missing from cards/products are filled in the background
+    price_fill.enqueue_unpriced(entries)
     return _serialize_entries(entries, session=session)
 
 
+@router.get("/export")
+def export_collection(
+    format: str = Query("csv", regex=export.FORMAT_PATTERN),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Stream the user's collection entries (cards and products) as CSV or NDJSON."""
+    user_id = current_user.id
+    return export.stream(
+        lambda session: export.collection_entries(session, user_id),
+        export.ENTRY_FIELDS,
+        format,
+        "kartoteka-collection",
+    )
+
+
 @router.post("/", response_model=schemas.CollectionEntryRead, status_code=status.HTTP_201_CREATED)
 def add_card(
     payload: schemas.CollectionEntryCreate,
-    background_tasks: BackgroundTasks,
     current_user: models.User = Depends(get_current_user),
     session: Session = Depends(get_session),
 ):
@@ -1235,7 +1335,7 @@ def add_card(
         _apply_card_images(card, card_data)
         session.add(card)
         session.flush()
-        _apply_card_price(card, session)
+        price_fill.apply_card_price(card, session)
         session.commit()
         session.refresh(card)
     else:
@@ -1248,7 +1348,7 @@ def add_card(
             updated = True
         if _apply_card_images(card, card_data):
             updated = True
-        if _apply_card_price(card, session):
+        if price_fill.apply_card_price(card, session):
             updated = True
         if updated:
             session.add(card)
@@ -1277,72 +1377,15 @@ def add_card(
     session.refresh(entry)
     session.refresh(card)
     
-    # Fetch price history in the background
-    background_tasks.add_task(fetch_and_save_history_for_card, card.id)
+    # Fetch price history (and the price, if the catalogue had none) in the background
+    price_history_jobs.enqueue_stale(
+        session, collection_value.card_record_ids(session, [card]).values()
+    )
+    price_fill.enqueue_unpriced([entry])
 
     return _serialize_entry(entry, session=session)
 
 
-def fetch_and_save_history_for_card(card_id: int):
-    """
-    Background task to fetch and save price history for a specific card.
-    Uses its own session scope to be thread-safe.
-    """
-    logger.info(f"Background task started for card_id: {card_id}")
-    with session_scope() as session:
-        card = session.get(models.Card, card_id)
-        if not card:
-            logger.error(f"[BG Task] Card with id {card_id} not found.")
-            return
-
-        # Find the corresponding CardRecord to get the remote_id
-        stmt = select(models.CardRecord).where(
-            models.CardRecord.name == card.name,
-            models.CardRecord.set_name == card.set_name,
-            models.CardRecord.number == card.number
-        ).limit(1)
-        card_record = session.exec(stmt).first()
-
-        if not (card_record and card_record.remote_id):
-            logger.warning(f"[BG Task] No CardRecord or remote_id found for {card.name} ({card.set_name} #{card.number}). Cannot fetch history.")
-            return
-
-        logger.info(f"[BG Task] Found remote_id: {card_record.remote_id} for {card.name}. Fetching history...")
-        try:
-            today = dt.date.today()
-            date_from = today - dt.timedelta(days=365)
-            
-            history_data = tcg_api.fetch_card_price_history(
-                card_record.remote_id,
-                date_from=date_from,
-                date_to=today
-            )
-            
-            if not history_data:
-                logger.info(f"[BG Task] No price history returned from API for remote_id: {card_record.remote_id}.")
-                return
-
-            normalized_history = tcg_api.normalize_price_history(history_data)
-            
-            if normalized_history:
-                added, updated = crud.upsert_price_history(
-                    session, card_record_id=card_record.id, price_history=normalized_history
-                )
-                card_record.last_price_synced = dt.datetime.now(dt.timezone.utc)
-                session.add(card_record)
-                # The session is committed by the session_scope context manager
-                logger.info(f"[BG Task] Success for {card.name}. Added: {added}, Updated: {updated} price points.")
-            else:
-                logger.info(f"[BG Task] API returned data, but it was empty after normalization for {card.name}.")
-
-        except Exception as e:
-            logger.error(f"[BG Task] Failed to fetch/save price history for {card.name}: {e}", exc_info=True)
-
-
-
-
-
-
 @router.patch("/{entry_id}", response_model=schemas.CollectionEntryRead)
 def update_entry(
     entry_id: int,
@@ -1373,6 +1416,7 @@ def update_entry(
     session.add(entry)
     session.commit()
     session.refresh(entry)
+    price_fill.enqueue_unpriced([entry])
     return _serialize_entry(entry, session=session)
 
 
@@ -1401,18 +1445,18 @@ def _fetch_collection_history(
     entries: list[models.CollectionEntry],
     days: int,
     session: Session,
-) -> list[schemas.CollectionValueHistoryPoint]:
-    """
-    Fetch historical collection values, sourcing from local DB and backfilling from the API
-    for any cards with missing or stale data.
-    This implementation is optimized for performance and correctness.
-    Now returns separate cards_value and products_value for each history point.
+    user_id: int,
+) -> tuple[list[schemas.CollectionValueHistoryPoint], str, int]:
     """
-    today = dt.date.today()
-    date_from = today - dt.timedelta(days=days)
+    Return the collection value history from the precomputed daily rollup.
 
+    Cards with missing or stale price history are queued for a background
+    API fetch; the history is returned as-is together with a freshness status
+    ("fresh", "updating" or "stale") and the number of cards still queued.
+    Each point carries separate cards_value and products_value.
+    """
     # Separate cards and products
-    card_entries = {entry.card.id: entry for entry in entries if entry.card and entry.quantity > 0}
+    card_entries = [entry for entry in entries if entry.card and entry.quantity > 0]
     product_entries = [entry for entry in entries if entry.product and entry.quantity > 0]
     
     # Calculate total products value (products don't have historical prices, so it's constant)
@@ -1422,151 +1466,39 @@ def _fetch_collection_history(
     )
     
     if not card_entries and not product_entries:
-        return []
-    
-    # If no cards but we have products, return history with just products value
-    if not card_entries:
-        date_range = [date_from + dt.timedelta(days=x) for x in range((today - date_from).days + 1)]
-        return [
-            schemas.CollectionValueHistoryPoint(
-                date=day.isoformat(), 
-                value=round(products_total, 2),
-                cards_value=0.0,
-                products_value=round(products_total, 2)
-            )
-            for day in date_range
-        ]
-
-    card_map = {card_id: entry.card for card_id, entry in card_entries.items()}
-
-    # Step 1: Get all relevant CardRecords for the cards in the collection
-    card_identifiers = list(set((c.name, c.set_name, c.number) for c in card_map.values()))
-    card_records_map: dict[tuple, models.CardRecord] = {}
-    if card_identifiers:
-        clauses = [
-            (models.CardRecord.name == name and models.CardRecord.set_name == set_name and models.CardRecord.number == number)
-            for name, set_name, number in card_identifiers
-        ]
-        card_records_stmt = select(models.CardRecord).where(or_(*clauses))
-        card_records = session.exec(card_records_stmt).all()
-        card_records_map = {(r.name, r.set_name, r.number): r for r in card_records}
-
-    # Step 2: On-demand fetching for cards with missing/stale history
-    stale_threshold = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=7)
-    records_to_fetch: list[models.CardRecord] = []
-    
-    for card in card_map.values():
-        key = (card.name, card.set_name, card.number)
-        record = card_records_map.get(key)
-        if record and record.remote_id:
-            last_synced = record.last_price_synced
-            if last_synced and last_synced.tzinfo is None:
-                last_synced = last_synced.replace(tzinfo=dt.timezone.utc)
-
-            if not last_synced or last_synced < stale_threshold:
-                records_to_fetch.append(record)
-
-    if records_to_fetch:
-        logger.info(f"Found {len(records_to_fetch)} cards with stale/missing price history. Fetching from API.")
-        for i, record in enumerate(records_to_fetch):
-            if i > 0:
-                time.sleep(1.1)  # Rate limit
-            try:
-                logger.info(f"Fetching history for remote_id: {record.remote_id}")
-                history_data = tcg_api.fetch_card_price_history(
-                    record.remote_id, date_from=date_from, date_to=today,
-                    rapidapi_key=RAPIDAPI_KEY, rapidapi_host=RAPIDAPI_HOST,
-                )
-                if history_data:
-                    normalized_history = tcg_api.normalize_price_history(history_data)
-                    if normalized_history:
-                        added, updated = crud.upsert_price_history(
-                            session, card_record_id=record.id, price_history=normalized_history
-                        )
-                        record.last_price_synced = dt.datetime.now(dt.timezone.utc)
-                        session.add(record)
-                        logger.info(f"Updated history for {record.name}: {added} added, {updated} updated.")
-            except Exception as e:
-                logger.error(f"Failed to fetch/save history for {record.name}: {e}", exc_info=True)
-        session.commit()
-
-    # Step 3: Create a mapping of Card.id -> CardRecord.id
-    card_to_record_id_map: dict[int, int] = {
-        card.id: card_records_map[key].id
-        for card in card_map.values()
-        if (key := (card.name, card.set_name, card.number)) in card_records_map
-    }
-    record_ids = list(card_to_record_id_map.values())
-    if not record_ids:
-        return []
-
-    # Step 4: Fetch ALL relevant price history in one batch.
-    # We fetch all history, not just from date_from, to establish a correct starting value.
-    price_history_data = session.exec(
-        select(models.PriceHistory)
-        .where(models.PriceHistory.card_record_id.in_(record_ids))
-        .order_by(models.PriceHistory.date)
-    ).all()
-
-    # Step 5: Pre-process history to find the initial price for each card at the beginning of the date range.
-    latest_prices: dict[int, float] = {}
-    for record_id in record_ids:
-        # Fallback to the card's current price if no history is found.
-        card_id = next((cid for cid, rid in card_to_record_id_map.items() if rid == record_id), None)
-        if card_id and (card := card_map.get(card_id)):
-            latest_prices[record_id] = card.price or 0.0
-
-    for ph in price_history_data:
-        if ph.card_record_id and ph.date < date_from:
-            latest_prices[ph.card_record_id] = ph.price or 0.0
-    
-    # Group subsequent price points by date for efficient iteration
-    from collections import defaultdict
-    prices_by_date: dict[dt.date, dict[int, float]] = defaultdict(dict)
-    for ph in price_history_data:
-        if ph.card_record_id and ph.date >= date_from:
-            prices_by_date[ph.date][ph.card_record_id] = ph.price or 0.0
-
-    # Step 6: Iterate through the date range and calculate daily totals.
-    value_history = []
-    date_range = [date_from + dt.timedelta(days=x) for x in range((today - date_from).days + 1)]
-
-    daily_cards_total = sum(
-        (latest_prices.get(record_id, 0.0) * (card_entries[card_id].quantity or 1))
-        for card_id, record_id in card_to_record_id_map.items()
-    )
+        return [], "fresh", 0
 
-    for day in date_range:
-        if day in prices_by_date:
-            # Recalculate total value only when prices change
-            for record_id, new_price in prices_by_date[day].items():
-                card_id = next((cid for cid, rid in card_to_record_id_map.items() if rid == record_id), None)
-                if card_id:
-                    quantity = card_entries[card_id].quantity or 1
-                    old_price = latest_prices.get(record_id, 0.0)
-                    daily_cards_total -= old_price * quantity
-                    daily_cards_total += new_price * quantity
-                    latest_prices[record_id] = new_price
-
-        # Total = cards + products (products value is constant)
-        daily_total = daily_cards_total + products_total
-        value_history.append(
-            schemas.CollectionValueHistoryPoint(
-                date=day.isoformat(), 
-                value=round(daily_total, 2),
-                cards_value=round(daily_cards_total, 2),
-                products_value=round(products_total, 2)
-            )
+    history_status, pending = "fresh", 0
+    if card_entries:
+        card_to_record = collection_value.card_record_ids(
+            session, (entry.card for entry in card_entries)
         )
-        
-    return value_history
+        stale, pending = price_history_jobs.enqueue_stale(session, card_to_record.values())
+        if pending:
+            logger.info(f"Queued price history backfill: {pending} of {stale} stale cards pending.")
+            history_status = "updating"
+        elif stale:
+            history_status = "stale"
+
+    series = collection_value.read_series(session, user_id, days=days)
+
+    history = [
+        schemas.CollectionValueHistoryPoint(
+            date=day.isoformat(),
+            value=round(cards_value + products_total, 2),
+            cards_value=round(cards_value, 2),
+            products_value=round(products_total, 2),
+        )
+        for day, cards_value in series
+    ]
+    return history, history_status, pending
 
 
 @router.get("/stats", response_model=schemas.CollectionStats)
 def get_collection_stats(
     use_history: bool = True,
     current_user: models.User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """Get collection statistics including value history."""
     entries = session.exec(
@@ -1587,7 +1519,8 @@ def get_collection_stats(
     purchase_value = 0.0
     purchase_cards_value = 0.0  # Sum of card values that have purchase price
 
-    # Refresh prices for cards/products that don't have them
+    # Stored prices only; missing ones are filled in the background
+    price_fill.enqueue_unpriced(entries)
     for entry in entries:
         quantity = entry.quantity or 0
         purchase_price = entry.purchase_price or 0.0
@@ -1596,8 +1529,6 @@ def get_collection_stats(
         if entry.card:
             total_cards += quantity
             unique_cards += 1
-            if entry.card.price is None:
-                _apply_card_price(entry.card, session)
             price = entry.card.price or 0.0
             cards_value += price * quantity
             # Track value of cards with purchase price set
@@ -1605,26 +1536,23 @@ def get_collection_stats(
                 purchase_cards_value += price * quantity
         elif entry.product:
             total_products += quantity
-            from .products import _apply_product_price
-            if entry.product.price is None:
-                _apply_product_price(entry.product, session)
             price = entry.product.price or 0.0
             products_value += price * quantity
     
-    session.commit()
-    
     total_value = cards_value + products_value
     
     # Generate value history
     value_history: list[schemas.CollectionValueHistoryPoint] = []
+    history_status, history_pending = "fresh", 0
     
     if use_history:
         # Fetch real historical data from the local database
         logger.info("Fetching historical prices for collection from local DB...")
-        value_history = _fetch_collection_history(
+        value_history, history_status, history_pending = _fetch_collection_history(
             entries=list(entries),
-            days=365,
+            days=collection_value.HISTORY_DAYS,
             session=session,
+            user_id=current_user.id,
         )
     
     return schemas.CollectionStats(
@@ -1637,6 +1565,8 @@ def get_collection_stats(
         purchase_value=purchase_value,
         purchase_cards_value=purchase_cards_value,
         value_history=value_history,
+        history_status=history_status,
+        history_pending=history_pending,
     )
 
 
@@ -1660,13 +1590,11 @@ def refresh_collection_prices(
     
     for entry in entries:
         if entry.card:
-            if _apply_card_price(entry.card, session):
+            if price_fill.apply_card_price(entry.card, session):
                 session.add(entry.card)
                 updated_cards += 1
         elif entry.product:
-            # Import _apply_product_price from products module
-            from .products import _apply_product_price
-            if _apply_product_price(entry.product, session):
+            if price_fill.apply_product_price(entry.product, session):
                 session.add(entry.product)
                 updated_products += 1
     
@@ -1687,7 +1615,7 @@ def refresh_collection_prices(
 def get_recently_added_cards(
     limit: int = 10,
     current_user: models.User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """Get recently added cards and products from user's collection."""
     entries = session.exec(
@@ -1708,7 +1636,7 @@ def get_recently_added_cards(
 def get_price_changes(
     limit: int = 10,
     current_user: models.User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """Get cards with biggest price changes in user's collection."""
     entries = session.exec(
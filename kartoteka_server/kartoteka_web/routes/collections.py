@@ -6,15 +6,16 @@ import datetime as dt
 import logging
 from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import func, or_
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import and_, case, func, insert, literal, or_
 from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select
 
 from .. import models, schemas
 from ..auth import get_current_user
-from ..database import get_session
-from ..utils import sets as set_utils
+from ..database import get_read_session, get_session
+from ..services import card_search, crud, export, set_catalog
+from ..utils import sets as set_utils, text
 
 router = APIRouter(prefix="/collections", tags=["collections"])
 
@@ -55,50 +56,14 @@ def _get_set_cards_query(
     session: Session,
 ) -> list[models.CardRecord]:
     """Get cards for a set based on set type (baseset/masterset)."""
-    set_code_clean = set_utils.clean_code(set_code) or set_code.lower()
-    
-    stmt = select(models.CardRecord).where(
-        or_(
-            models.CardRecord.set_code == set_code,
-            models.CardRecord.set_code_clean == set_code_clean,
-        )
-    )
-    
-    cards = list(session.exec(stmt).all())
+    cards = list(session.exec(select(models.CardRecord).where(export.set_card_filter(set_code))).all())
     
     if set_type == models.SetType.BASESET.value:
         # Filter only base cards (number <= total)
-        filtered_cards = []
-        for card in cards:
-            try:
-                # Extract numeric part from card number
-                number_str = card.number or "0"
-                number_clean = ''.join(c for c in number_str if c.isdigit())
-                card_number = int(number_clean) if number_clean else 0
-                
-                # Get set total
-                total_str = card.total or "999"
-                total_clean = ''.join(c for c in total_str if c.isdigit())
-                set_total = int(total_clean) if total_clean else 999
-                
-                if card_number <= set_total:
-                    filtered_cards.append(card)
-            except (ValueError, TypeError):
-                # Include card if we can't parse numbers
-                filtered_cards.append(card)
-        cards = filtered_cards
+        cards = [card for card in cards if export.is_base_card(card.number, card.total)]
     
     # Sort by number
-    def sort_key(card: models.CardRecord) -> tuple:
-        number_str = card.number or "0"
-        number_clean = ''.join(c for c in number_str if c.isdigit())
-        try:
-            num = int(number_clean) if number_clean else 0
-        except ValueError:
-            num = 0
-        return (num, card.number or "", card.name or "")
-    
-    return sorted(cards, key=sort_key)
+    return sorted(cards, key=lambda card: export.number_sort_key(card.number, card.name))
 
 
 def _get_artist_cards_query(
@@ -124,27 +89,52 @@ def _populate_collection_cards(
     cards: list[models.CardRecord],
     session: Session,
 ) -> int:
-    """Populate collection with cards and return count."""
+    """Populate collection with cards and return count.
+
+    Inserts with ``INSERT … SELECT`` anti-joined against the collection's
+    existing cards, one statement per chunk of card ids.
+    """
+    card_ids = list(dict.fromkeys(card.id for card in cards if card.id is not None))
+    now = dt.datetime.now(dt.timezone.utc)
+    table = models.CollectionCard.__table__
+    record = models.CardRecord.__table__
     count = 0
-    for card in cards:
-        # Check if card already exists in collection
-        existing = session.exec(
-            select(models.CollectionCard).where(
-                models.CollectionCard.collection_id == collection.id,
-                models.CollectionCard.card_record_id == card.id,
+    for start in range(0, len(card_ids), crud.BULK_CHUNK_SIZE):
+        chunk = card_ids[start:start + crud.BULK_CHUNK_SIZE]
+        already_added = (
+            select(table.c.id)
+            .where(
+                table.c.collection_id == collection.id,
+                table.c.card_record_id == record.c.id,
             )
-        ).first()
-        
-        if not existing:
-            collection_card = models.CollectionCard(
-                collection_id=collection.id,
-                card_record_id=card.id,
-                is_owned=False,
-                quantity=0,
+            .exists()
+        )
+        rows = select(
+            literal(collection.id),
+            record.c.id,
+            literal(False),
+            literal(0),
+            literal(False),
+            literal(False),
+            literal(now),
+            literal(now),
+        ).where(record.c.id.in_(chunk), ~already_added)
+        result = session.execute(
+            insert(table).from_select(
+                [
+                    "collection_id",
+                    "card_record_id",
+                    "is_owned",
+                    "quantity",
+                    "is_reverse",
+                    "is_holo",
+                    "added_at",
+                    "updated_at",
+                ],
+                rows,
             )
-            session.add(collection_card)
-            count += 1
-    
+        )
+        count += max(result.rowcount or 0, 0)
     return count
 
 
@@ -623,81 +613,56 @@ def get_collection_progress(
             detail="Collection not found"
         )
     
-    # Get all collection cards with their card records
-    collection_cards = session.exec(
-        select(models.CollectionCard)
-        .where(models.CollectionCard.collection_id == collection_id)
-        .options(selectinload(models.CollectionCard.card_record))
-    ).all()
-    
-    owned_value = 0.0
-    missing_value = 0.0
-    cards_with_price = 0
-    cards_without_price = 0
-    
-    # Track top cards
-    owned_cards_with_price: list[tuple[models.CollectionCard, float]] = []
-    missing_cards_with_price: list[tuple[models.CollectionCard, float]] = []
-    
-    for cc in collection_cards:
-        if cc.card_record:
-            if cc.card_record.price and cc.card_record.price > 0:
-                cards_with_price += 1
-                if cc.is_owned:
-                    card_value = cc.card_record.price * max(1, cc.quantity)
-                    owned_value += card_value
-                    owned_cards_with_price.append((cc, cc.card_record.price))
-                else:
-                    missing_value += cc.card_record.price
-                    missing_cards_with_price.append((cc, cc.card_record.price))
-            else:
-                cards_without_price += 1
+    # Value totals in one aggregate over the collection's cards
+    cc = models.CollectionCard
+    record = models.CardRecord
+    priced = record.price > 0
+    owned_value, missing_value, cards_with_price, cards_without_price = session.exec(
+        select(
+            func.coalesce(
+                func.sum(
+                    case(
+                        (priced & cc.is_owned, record.price * case((cc.quantity > 1, cc.quantity), else_=1)),
+                        else_=0.0,
+                    )
+                ),
+                0.0,
+            ),
+            func.coalesce(func.sum(case((priced & ~cc.is_owned, record.price), else_=0.0)), 0.0),
+            func.coalesce(func.sum(case((priced, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((priced, 0), else_=1)), 0),
+        )
+        .select_from(cc)
+        .join(record, record.id == cc.card_record_id)
+        .where(cc.collection_id == collection_id)
+    ).one()
     
     total_value = owned_value + missing_value
     avg_card_price = total_value / cards_with_price if cards_with_price > 0 else 0.0
     
-    # Find top cards
-    most_expensive_owned = None
-    most_expensive_missing = None
-    cheapest_missing = None
-    
-    if owned_cards_with_price:
-        owned_cards_with_price.sort(key=lambda x: x[1], reverse=True)
-        top_owned = owned_cards_with_price[0]
-        if top_owned[0].card_record:
-            most_expensive_owned = schemas.CollectionProgressCard(
-                name=top_owned[0].card_record.name,
-                number=top_owned[0].card_record.number,
-                set_name=top_owned[0].card_record.set_name,
-                image_small=top_owned[0].card_record.image_small,
-                price=top_owned[1],
-                is_owned=True,
-            )
+    def _extreme_card(is_owned: bool, *order_by) -> Optional[schemas.CollectionProgressCard]:
+        card = session.exec(
+            select(record)
+            .join(cc, record.id == cc.card_record_id)
+            .where(cc.collection_id == collection_id, cc.is_owned == is_owned, priced)
+            .order_by(*order_by)
+            .limit(1)
+        ).first()
+        if card is None:
+            return None
+        return schemas.CollectionProgressCard(
+            name=card.name,
+            number=card.number,
+            set_name=card.set_name,
+            image_small=card.image_small,
+            price=card.price,
+            is_owned=is_owned,
+        )
     
-    if missing_cards_with_price:
-        missing_cards_with_price.sort(key=lambda x: x[1], reverse=True)
-        top_missing = missing_cards_with_price[0]
-        if top_missing[0].card_record:
-            most_expensive_missing = schemas.CollectionProgressCard(
-                name=top_missing[0].card_record.name,
-                number=top_missing[0].card_record.number,
-                set_name=top_missing[0].card_record.set_name,
-                image_small=top_missing[0].card_record.image_small,
-                price=top_missing[1],
-                is_owned=False,
-            )
-        
-        # Cheapest missing
-        cheapest = missing_cards_with_price[-1]
-        if cheapest[0].card_record:
-            cheapest_missing = schemas.CollectionProgressCard(
-                name=cheapest[0].card_record.name,
-                number=cheapest[0].card_record.number,
-                set_name=cheapest[0].card_record.set_name,
-                image_small=cheapest[0].card_record.image_small,
-                price=cheapest[1],
-                is_owned=False,
-            )
+    # Top cards
+    most_expensive_owned = _extreme_card(True, record.price.desc(), cc.id)
+    most_expensive_missing = _extreme_card(False, record.price.desc(), cc.id)
+    cheapest_missing = _extreme_card(False, record.price, cc.id.desc())
     
     return schemas.CollectionProgress(
         total_cards=collection.total_cards,
@@ -742,50 +707,8 @@ def get_print_data(
             detail="Collection not found"
         )
     
-    # Get all collection cards with their card records
-    stmt = (
-        select(models.CollectionCard)
-        .where(models.CollectionCard.collection_id == collection_id)
-        .options(selectinload(models.CollectionCard.card_record))
-    )
-    
-    collection_cards = list(session.exec(stmt).all())
-    
-    # Filter cards
-    if cards_filter == "owned":
-        collection_cards = [cc for cc in collection_cards if cc.is_owned]
-    elif cards_filter == "missing":
-        collection_cards = [cc for cc in collection_cards if not cc.is_owned]
-    
-    # Sort by number
-    def sort_key(cc: models.CollectionCard) -> tuple:
-        if not cc.card_record:
-            return (999999, "", "")
-        number_str = cc.card_record.number or "0"
-        number_clean = ''.join(c for c in number_str if c.isdigit())
-        try:
-            num = int(number_clean) if number_clean else 0
-        except ValueError:
-            num = 0
-        return (num, cc.card_record.number or "", cc.card_record.name or "")
-    
-    collection_cards.sort(key=sort_key)
-    
-    # Format cards for print
-    cards_data = []
-    for cc in collection_cards:
-        if cc.card_record:
-            cards_data.append({
-                "name": cc.card_record.name,
-                "number": cc.card_record.number,
-                "number_display": cc.card_record.number_display or cc.card_record.number,
-                "set_name": cc.card_record.set_name,
-                "set_code": cc.card_record.set_code,
-                "rarity": cc.card_record.rarity,
-                "artist": cc.card_record.artist,
-                "image_small": cc.card_record.image_small,
-                "is_owned": cc.is_owned,
-            })
+    # Album order, filtered by ownership; column rows only
+    cards_data = list(export.collection_print_rows(session, collection_id, cards_filter))
     
     return {
         "collection": {
@@ -801,197 +724,56 @@ def get_print_data(
     }
 
 
+@router.get("/{collection_id}/export")
+def export_collection_cards(
+    collection_id: int,
+    format: str = Query("csv", regex=export.FORMAT_PATTERN),
+    cards_filter: str = Query("all", regex="^(all|owned|missing)$"),
+    current_user: models.User = Depends(get_current_user),
+    session: Session = Depends(get_read_session),
+):
+    """Stream the collection's cards (print data) as CSV or NDJSON."""
+    collection = session.exec(
+        select(models.Collection.id)
+        .where(
+            models.Collection.id == collection_id,
+            models.Collection.user_id == current_user.id,
+        )
+    ).first()
+    
+    if not collection:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Collection not found"
+        )
+    
+    return export.stream(
+        lambda read: export.collection_print_rows(read, collection_id, cards_filter),
+        export.PRINT_FIELDS,
+        format,
+        f"collection-{collection_id}",
+    )
+
+
 # ============================================================================
 # Helper endpoints for sets and artists
 # ============================================================================
 
 @router.get("/sets/list", response_model=list[schemas.SetInfoRead])
 def list_available_sets(
-    session: Session = Depends(get_session),
+    request: Request,
+    session: Session = Depends(get_read_session),
 ):
-    """List all available Pokemon TCG sets from local card database."""
-    import json
-    from pathlib import Path
-    
-    # Load sets from JSON file for additional metadata
-    json_sets: dict[str, dict] = {}  # code -> {name, series, abbr}
-    json_path = Path(__file__).parent.parent.parent / "tcg_sets.json"
-    if json_path.exists():
-        try:
-            with open(json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            for series_name, sets_list in data.items():
-                for s in sets_list:
-                    code = s.get("code", "")
-                    if code:
-                        json_sets[code.lower()] = {
-                            "name": s.get("name", ""),
-                            "series": series_name,
-                            "abbr": s.get("abbr", ""),
-                            "original_code": code,  # Keep original case
-                        }
-        except Exception as e:
-            logger.warning(f"Failed to load tcg_sets.json: {e}")
-    
-    # Load API mapping for logo URLs
-    api_mapping: dict[str, dict] = {}
-    api_mapping_path = Path(__file__).parent.parent.parent / "set_code_to_api.json"
-    if api_mapping_path.exists():
-        try:
-            with open(api_mapping_path, "r", encoding="utf-8") as f:
-                api_mapping = json.load(f)
-        except Exception as e:
-            logger.warning(f"Failed to load set_code_to_api.json: {e}")
-    
-    # Get unique sets from CardRecord with card counts
-    stmt = (
-        select(
-            models.CardRecord.set_code,
-            models.CardRecord.set_name,
-            models.CardRecord.series,
-            func.count(models.CardRecord.id).label("card_count"),
-            func.min(models.CardRecord.release_date).label("release_date"),
-        )
-        .where(models.CardRecord.set_code.is_not(None))
-        .where(models.CardRecord.set_code != "")
-        .group_by(models.CardRecord.set_code)
-        .order_by(func.min(models.CardRecord.release_date).desc())
-    )
-    
-    results = session.exec(stmt).all()
-    
-    sets_output = []
-    seen_codes = set()
-    
-    # Helper to get logo URL - prioritize local logos, then pokemontcg.io
-    def get_logo_url(code: str) -> str:
-        # 1. Check for local logo (downloaded from TCGGO)
-        local_logo_path = Path(__file__).parent.parent / "static" / "img" / "sets" / f"{code.lower()}_logo.png"
-        if local_logo_path.exists():
-            return f"/static/img/sets/{code.lower()}_logo.png"
-        
-        # 2. Try pokemontcg.io with code variations
-        import re
-        code_variations = [
-            code.lower(),
-            re.sub(r'0(\d)', r'\1', code.lower()),  # sv01 -> sv1
-        ]
-        for c in code_variations:
-            # We'll use pokemontcg.io as fallback - most work
-            pass
-        
-        # 3. Fallback to pokemontcg.io URL (may or may not work)
-        return f"https://images.pokemontcg.io/{code.lower()}/logo.png"
-    
-    def get_symbol_url(code: str) -> str:
-        # Symbol URLs use pokemontcg.io format
-        return f"https://images.pokemontcg.io/{code.lower()}/symbol.png"
-    
-    for row in results:
-        set_code = row[0]
-        if not set_code or set_code.lower() in seen_codes:
-            continue
-        seen_codes.add(set_code.lower())
-        
-        set_name = row[1] or ""
-        series = row[2] or ""
-        card_count = row[3] or 0
-        release_date = row[4]
-        
-        # Enrich with JSON data if available
-        json_info = json_sets.get(set_code.lower(), {})
-        original_code = set_code
-        if json_info:
-            if not series:
-                series = json_info.get("series", "")
-            # Prefer JSON name if it looks more complete
-            json_name = json_info.get("name", "")
-            if json_name and len(json_name) > len(set_name):
-                set_name = json_name
-            # Use original code case from JSON for API lookup
-            original_code = json_info.get("original_code", set_code)
-        
-        sets_output.append(schemas.SetInfoRead(
-            code=set_code,
-            name=set_name,
-            series=series,
-            release_date=release_date,
-            total_cards=card_count,
-            logo_url=get_logo_url(original_code),
-            symbol_url=get_symbol_url(set_code),
-        ))
-    
-    # Also add sets from JSON that are not in CardRecord yet
-    for code, info in json_sets.items():
-        if code not in seen_codes:
-            original_code = info.get("original_code", code)
-            sets_output.append(schemas.SetInfoRead(
-                code=info.get("original_code", code),  # Use original case
-                name=info.get("name", code),
-                series=info.get("series", ""),
-                release_date=None,
-                total_cards=0,
-                logo_url=get_logo_url(original_code),
-                symbol_url=get_symbol_url(code),
-            ))
-    
-    # Sort by series (era) order, then by release date
-    series_order = [
-        "Mega Evolution",  # Newest era - 2025+
-        "Scarlet & Violet",
-        "Sword & Shield", 
-        "Sun & Moon",
-        "XY",
-        "Black & White",
-        "HeartGold & SoulSilver",
-        "HeartGold SoulSilver",
-        "Platinum",
-        "Diamond & Pearl",
-        "EX",
-        "EX Series",
-        "E-Card",
-        "e-Card",
-        "Neo",
-        "Gym",
-        "Base",
-        "Base Set",
-        "Other",
-        "",
-    ]
-    
-    def sort_key(s):
-        try:
-            series_idx = series_order.index(s.series) if s.series in series_order else len(series_order) - 2
-        except ValueError:
-            series_idx = len(series_order) - 2
-        # Secondary sort by release date (newest first) or name
-        date_key = s.release_date or "0000-00-00"
-        return (series_idx, date_key, s.name)
-    
-    # Sort: first by series order, then by release date descending within series
-    sets_output.sort(key=lambda s: (
-        series_order.index(s.series) if s.series in series_order else len(series_order) - 2,
-        s.release_date or "0000-00-00"
-    ), reverse=False)
-    
-    # Reverse within each series to get newest first
-    result = []
-    current_series = None
-    series_batch = []
-    for s in sets_output:
-        if s.series != current_series:
-            if series_batch:
-                series_batch.sort(key=lambda x: x.release_date or "0000-00-00", reverse=True)
-                result.extend(series_batch)
-            current_series = s.series
-            series_batch = [s]
-        else:
-            series_batch.append(s)
-    if series_batch:
-        series_batch.sort(key=lambda x: x.release_date or "0000-00-00", reverse=True)
-        result.extend(series_batch)
-    
-    return result
+    """List all available Pokemon TCG sets from local card database.
+
+    Served from the precomputed :mod:`set_catalog` response; clients that
+    send the current ETag get ``304 Not Modified``.
+    """
+    body, etag = set_catalog.catalog.response(session)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if set_catalog.matches_etag(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/artists/list", response_model=list[schemas.ArtistInfo])
@@ -1059,16 +841,10 @@ def get_artist_cards(
 # Set Print (without creating collection) - for downloading/printing sets
 # ============================================================================
 
-@router.get("/sets/{set_code}/print-data")
-def get_set_print_data(
-    set_code: str,
-    set_type: str = Query("baseset", regex="^(baseset|masterset)$"),
-    session: Session = Depends(get_session),
-):
-    """Get set data formatted for printing album templates (no authentication required)."""
+def _get_set_info(set_code: str, session: Session) -> models.SetInfo:
+    """Set metadata by code (raw or cleaned); 404 when unknown."""
     set_code_clean = set_utils.clean_code(set_code) or set_code.lower()
     
-    # Get set info
     set_info = session.exec(
         select(models.SetInfo).where(
             or_(
@@ -1083,31 +859,27 @@ def get_set_print_data(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Set not found: {set_code}"
         )
+    return set_info
+
+
+@router.get("/sets/{set_code}/print-data")
+def get_set_print_data(
+    set_code: str,
+    set_type: str = Query("baseset", regex="^(baseset|masterset)$"),
+    session: Session = Depends(get_session),
+):
+    """Get set data formatted for printing album templates (no authentication required)."""
+    set_info = _get_set_info(set_code, session)
     
     # Get cards for this set
-    cards = _get_set_cards_query(set_code, set_type, session)
+    cards_data = list(export.set_print_rows(session, set_code, set_type))
     
-    if not cards:
+    if not cards_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No cards found for set: {set_code}"
         )
     
-    # Format cards for print
-    cards_data = []
-    for card in cards:
-        cards_data.append({
-            "name": card.name,
-            "number": card.number,
-            "number_display": card.number_display or card.number,
-            "set_name": card.set_name,
-            "set_code": card.set_code,
-            "rarity": card.rarity,
-            "artist": card.artist,
-            "image_small": card.image_small,
-            "is_owned": False,  # Always false for standalone set print
-        })
-    
     return {
         "set": {
             "code": set_info.code,
@@ -1120,6 +892,24 @@ def get_set_print_data(
     }
 
 
+@router.get("/sets/{set_code}/export")
+def export_set_print_data(
+    set_code: str,
+    format: str = Query("csv", regex=export.FORMAT_PATTERN),
+    set_type: str = Query("baseset", regex="^(baseset|masterset)$"),
+    session: Session = Depends(get_read_session),
+):
+    """Stream set print data as CSV or NDJSON (no authentication required)."""
+    set_info = _get_set_info(set_code, session)
+    
+    return export.stream(
+        lambda read: export.set_print_rows(read, set_code, set_type),
+        export.PRINT_FIELDS,
+        format,
+        f"set-{set_info.code}-{set_type}",
+    )
+
+
 # ============================================================================
 # Custom Collection Card Management
 # ============================================================================
@@ -1314,68 +1104,77 @@ def search_cards_for_collection(
             detail="Collection not found"
         )
     
-    # Get cards already in this collection
-    existing_card_ids = set(
-        row[0] for row in session.exec(
-            select(models.CollectionCard.card_record_id)
-            .where(models.CollectionCard.collection_id == collection_id)
-        ).all()
+    entry = models.CollectionEntry
+    # Copies the user holds of each card, matched to catalogue records by identity
+    owned = (
+        select(
+            models.Card.name,
+            models.Card.set_name,
+            models.Card.number,
+            func.sum(entry.quantity).label("quantity"),
+        )
+        .join(entry, entry.card_id == models.Card.id)
+        .where(entry.user_id == current_user.id)
+        .group_by(models.Card.id)
+        .subquery()
+    )
+    already_added = (
+        select(models.CollectionCard.id)
+        .where(
+            models.CollectionCard.collection_id == collection_id,
+            models.CollectionCard.card_record_id == models.CardRecord.id,
+        )
+        .exists()
+    )
+    quantity_owned = func.coalesce(owned.c.quantity, 0)
+
+    stmt = (
+        select(models.CardRecord, quantity_owned)
+        .outerjoin(
+            owned,
+            and_(
+                owned.c.name == models.CardRecord.name,
+                owned.c.set_name == models.CardRecord.set_name,
+                owned.c.number == models.CardRecord.number,
+            ),
+        )
+        .where(~already_added)
     )
-    
     if only_owned:
         # Search only in user's main collection
-        stmt = (
-            select(models.CardRecord)
-            .join(models.CollectionEntry, models.CollectionEntry.card_record_id == models.CardRecord.id)
-            .where(models.CollectionEntry.user_id == current_user.id)
-            .where(models.CollectionEntry.quantity > 0)
+        stmt = stmt.where(owned.c.quantity > 0)
+
+    tokens = card_search.tokenize(text.normalize(q, keep_spaces=True)) if q else []
+    if tokens and card_search.is_available(session):
+        ranked = card_search.ranked_matches(card_search.prefix_query(tokens))
+        stmt = stmt.join(ranked, ranked.c.record_id == models.CardRecord.id).order_by(
+            ranked.c.score, models.CardRecord.id
         )
     else:
-        # Search all cards
-        stmt = select(models.CardRecord)
-    
-    # Apply search filter
-    if q:
-        search_pattern = f"%{q}%"
-        stmt = stmt.where(
-            or_(
-                models.CardRecord.name.ilike(search_pattern),
-                models.CardRecord.set_name.ilike(search_pattern),
-                models.CardRecord.number.ilike(search_pattern),
+        if q:
+            search_pattern = f"%{q}%"
+            stmt = stmt.where(
+                or_(
+                    models.CardRecord.name.ilike(search_pattern),
+                    models.CardRecord.set_name.ilike(search_pattern),
+                    models.CardRecord.number.ilike(search_pattern),
+                )
             )
-        )
-    
-    stmt = stmt.order_by(models.CardRecord.name).limit(limit + len(existing_card_ids))
-    
-    cards = session.exec(stmt).all()
-    
-    # Filter out cards already in collection and limit results
+        stmt = stmt.order_by(models.CardRecord.name, models.CardRecord.id)
+
     result = []
-    for card in cards:
-        if card.id not in existing_card_ids:
-            # Check if user owns this card
-            user_entry = session.exec(
-                select(models.CollectionEntry)
-                .where(
-                    models.CollectionEntry.user_id == current_user.id,
-                    models.CollectionEntry.card_record_id == card.id,
-                )
-            ).first()
-            
-            result.append({
-                "id": card.id,
-                "name": card.name,
-                "number": card.number,
-                "number_display": card.number_display,
-                "set_name": card.set_name,
-                "set_code": card.set_code,
-                "rarity": card.rarity,
-                "image_small": card.image_small,
-                "is_in_main_collection": user_entry is not None and (user_entry.quantity or 0) > 0,
-                "quantity_owned": user_entry.quantity if user_entry else 0,
-            })
-            
-            if len(result) >= limit:
-                break
-    
+    for card, quantity in session.exec(stmt.limit(limit)).all():
+        result.append({
+            "id": card.id,
+            "name": card.name,
+            "number": card.number,
+            "number_display": card.number_display,
+            "set_name": card.set_name,
+            "set_code": card.set_code,
+            "rarity": card.rarity,
+            "image_small": card.image_small,
+            "is_in_main_collection": quantity > 0,
+            "quantity_owned": quantity,
+        })
+
     return result
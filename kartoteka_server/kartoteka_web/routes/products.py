@@ -9,13 +9,11 @@ from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlmodel import Session
 
 from ..database import get_session
-from ..services import tcg_api
+from ..services import price_fill, tcg_api
 from .. import models, schemas
 from ..auth import get_current_user
-from ..utils import text
-from ..price_comparison import search_polish_prices
+from ..price_comparison import compare_prices
 from sqlmodel import Session, select
-import asyncio
 
 router = APIRouter(prefix="/products", tags=["products"])
 
@@ -26,39 +24,9 @@ async def compare_prices_api(query: str):
     if not query or len(query) < 3:
         return []
     
-    loop = asyncio.get_event_loop()
-    results = await loop.run_in_executor(None, search_polish_prices, query)
-    return results
+    return await compare_prices(query)
 
 
-def _apply_product_price(product: models.Product, session: Session) -> bool:
-    """Fetch and update price from ProductRecord catalog if available."""
-    
-    # Try to find price in ProductRecord catalog
-    name_norm = text.normalize(product.name, keep_spaces=True)
-    set_name_norm = text.normalize(product.set_name, keep_spaces=True)
-    
-    # Try to find matching ProductRecord
-    stmt = select(models.ProductRecord).where(
-        models.ProductRecord.name_normalized == name_norm,
-        models.ProductRecord.set_name_normalized == set_name_norm
-    ).limit(1)
-    
-    product_record = session.exec(stmt).first()
-    
-    updated = False
-    if product_record:
-        # Update price if available
-        if product_record.price is not None and product.price != product_record.price:
-            product.price = product_record.price
-            updated = True
-        # Update 7-day average if available
-        if product_record.price_7d_average is not None and product.price_7d_average != product_record.price_7d_average:
-            product.price_7d_average = product_record.price_7d_average
-            updated = True
-    
-    return updated
-
 RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY") or os.getenv("KARTOTEKA_RAPIDAPI_KEY")
 RAPIDAPI_HOST = os.getenv("RAPIDAPI_HOST") or os.getenv("KARTOTEKA_RAPIDAPI_HOST")
 
@@ -130,7 +98,7 @@ def add_product(
         session.flush()
         # Try to get price from ProductRecord if not provided
         if product.price is None or product.price_7d_average is None:
-            _apply_product_price(product, session)
+            price_fill.apply_product_price(product, session)
         session.commit()
         session.refresh(product)
     else:
@@ -149,7 +117,7 @@ def add_product(
             product.image_large = product_data.image_large
             updated = True
         # Also try to update price from ProductRecord
-        if _apply_product_price(product, session):
+        if price_fill.apply_product_price(product, session):
             updated = True
         if updated:
             session.add(product)
@@ -175,5 +143,6 @@ def add_product(
     session.commit()
     session.refresh(entry)
     session.refresh(product)
+    price_fill.enqueue_unpriced([entry])
     return entry
 
@@ -3,13 +3,14 @@
 import os
 from typing import List, Optional
 from fastapi import APIRouter, Depends, File, UploadFile, Form, HTTPException
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import func
 from sqlmodel import Session, select
 from ..database import get_session
-from ..services import scanner, tcg_api
+from ..services import scanner, tcg_api, visual_search
 from ..models import CardRecord
 from ..schemas import CardSearchResult
-from .cards import _payload_to_search_schema
+from .cards import _card_record_to_search_schema, _payload_to_search_schema
 
 router = APIRouter(prefix="/api/scanner", tags=["scanner"])
 
@@ -32,13 +33,24 @@ async def scan_card(
 ):
     """
     Process uploaded card image:
-    1. Try OpenAI Vision OCR -> Global TCG API Search.
-    2. Try visual search (pHash) against local DB.
-    3. Fallback to client-side OCR text -> Global TCG API Search.
+    1. Visual search (pHash) against local DB; a confident match skips OCR.
+    2. Try OpenAI Vision OCR -> Global TCG API Search.
+    3. Weaker visual matches, if any.
+    4. Fallback to client-side OCR text -> Global TCG API Search.
     """
     contents = await file.read()
-    
-    # 1. OpenAI Vision OCR (Highest Priority)
+
+    # 1. Visual Search (pHash); hashing and index reloads run off the event loop
+    visual_matches = await run_in_threadpool(scanner.find_similar_cards, session, contents)
+    visual_results = {
+        "match_type": "visual",
+        "results": [_card_record_to_search_schema(record) for record, _ in visual_matches],
+        "distance": visual_matches[0][1] if visual_matches else None,
+    }
+    if visual_matches and visual_matches[0][1] <= visual_search.CONFIDENT_DISTANCE:
+        return visual_results
+
+    # 2. OpenAI Vision OCR
     openai_text = await scanner.openai_vision_ocr(contents)
     if openai_text:
         query = openai_text.strip()
@@ -60,25 +72,12 @@ async def scan_card(
                 "results": items,
                 "raw_text": openai_text
             }
-    
-    # 2. Visual Search (pHash) - currently disabled until phash column is added
-    # visual_match = scanner.find_similar_card(session, contents)
-    # if visual_match:
-    #     result = CardSearchResult(
-    #         name=visual_match.name,
-    #         number=visual_match.number,
-    #         set_name=visual_match.set_name,
-    #         set_code=visual_match.set_code,
-    #         image_small=visual_match.image_small,
-    #         price=visual_match.price,
-    #         rarity=visual_match.rarity
-    #     )
-    #     return {
-    #         "match_type": "visual",
-    #         "results": [result]
-    #     }
 
-    # 3. Text Search (Client-side Fallback)
+    # 3. Visual matches below the confidence cutoff
+    if visual_matches:
+        return visual_results
+
+    # 4. Text Search (Client-side Fallback)
     if ocr_text and len(ocr_text.strip()) > 2:
         query = ocr_text.strip()
         records, _, _ = tcg_api.search_cards(
@@ -108,11 +107,13 @@ async def learn_card(
     session: Session = Depends(get_session)
 ):
     """
-    Save pHash for a known card to improve future visual search.
+    Learn the pHash of a photo of a known card to improve future visual search.
     Called when user confirms a match or selects a card manually after taking a photo.
-    
-    Note: Currently disabled until phash column is added to CardRecord.
+    ``card_id`` is the ``CardRecord`` id.
     """
     contents = await file.read()
-    scanner.register_card_image(session, card_id, contents)
+    if session.get(CardRecord, card_id) is None:
+        raise HTTPException(status_code=404, detail="Card not found")
+    if not scanner.register_card_image(session, card_id, contents):
+        raise HTTPException(status_code=400, detail="Invalid image data")
     return {"status": "learned"}
@@ -5,7 +5,6 @@ from __future__ import annotations
 import re
 import datetime as dt
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
-from sqlalchemy import func, desc
 from sqlmodel import Session, select
 
 from .. import models, schemas
@@ -17,8 +16,9 @@ from ..auth import (
     verify_password,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
-from ..database import get_session
+from ..database import get_read_session, get_session
 from ..profanity import contains_profanity
+from ..services import dashboard_stats
 from ..rate_limit import (
     check_login_rate_limit,
     check_register_rate_limit,
@@ -227,110 +227,17 @@ def read_users(
 
 
 @router.get("/stats/dashboard")
-def get_dashboard_stats(session: Session = Depends(get_session)):
-    """Get aggregated statistics for the Collector App Dashboard."""
-    
-    # 1. Total Users
-    total_users = session.exec(select(func.count(models.User.id))).one()
-    
-    # 2. Total Collections
-    total_collections = session.exec(select(func.count(models.Collection.id))).one()
-    
-    # 3. Total Cards in Database
-    total_cards = session.exec(select(func.count(models.CardRecord.id))).one()
-    
-    # 4. Total Products in Database
-    total_products = session.exec(select(func.count(models.ProductRecord.id))).one()
-    
-    # 5. Average Card Price
-    avg_price_result = session.exec(
-        select(func.avg(models.CardRecord.price))
-        .where(models.CardRecord.price.is_not(None))
-    ).first()
-    average_card_price = float(avg_price_result) if avg_price_result else 0.0
-    
-    # 6. Most Added Card (from collections)
-    most_popular_card_stmt = (
-        select(models.Card.name, models.Card.set_code, models.Card.number, func.count(models.CollectionEntry.id).label("count"))
-        .join(models.CollectionEntry)
-        .group_by(models.Card.id)
-        .order_by(desc("count"))
-        .limit(1)
-    )
-    popular_card = session.exec(most_popular_card_stmt).first()
-    
-    popular_card_data = None
-    if popular_card:
-        popular_card_data = {
-            "name": popular_card[0],
-            "set_code": popular_card[1],
-            "number": popular_card[2],
-            "count": popular_card[3]
-        }
+def get_dashboard_stats(session: Session = Depends(get_read_session)):
+    """Get aggregated statistics for the Collector App Dashboard.
 
-    # 7. Most Valuable Card (in master DB)
-    most_valuable_stmt = (
-        select(models.Card)
-        .where(models.Card.price.is_not(None))
-        .order_by(desc(models.Card.price))
-        .limit(1)
-    )
-    expensive_card = session.exec(most_valuable_stmt).first()
-    
-    expensive_card_data = None
-    if expensive_card:
-        expensive_card_data = {
-            "name": expensive_card.name,
-            "set_code": expensive_card.set_code,
-            "number": expensive_card.number,
-            "price": expensive_card.price,
-            "image": expensive_card.image_small
-        }
-
-    # 8. Top 5 Most Popular Cards
-    top_cards_stmt = (
-        select(models.Card.name, models.Card.set_code, models.Card.number, models.Card.price, models.Card.image_small, func.count(models.CollectionEntry.id).label("count"))
-        .join(models.CollectionEntry)
-        .group_by(models.Card.id)
-        .order_by(desc("count"))
-        .limit(5)
-    )
-    top_cards_rows = session.exec(top_cards_stmt).all()
-    
-    top_cards = None
-    if top_cards_rows:
-        top_cards = [
-            {
-                "name": card[0],
-                "set_code": card[1],
-                "number": card[2],
-                "price": card[3] or 0.0,
-                "image": card[4],
-                "count": card[5]
-            }
-            for card in top_cards_rows
-        ]
-
-    # 9. System Status
-    system_status = "healthy"  # Could be based on sync status in future
-    
-    # 10. Last Sync Time (from latest CardRecord update)
-    last_sync_result = session.exec(
-        select(func.max(models.CardRecord.updated_at))
-    ).first()
-    last_sync = last_sync_result if last_sync_result else None
+    Served from the ``DashboardStats`` snapshot kept by the scheduler;
+    ``updated_at`` tells when it was computed.
+    """
 
+    stats = dashboard_stats.read(session)
     return {
-        "total_users": total_users,
-        "total_collections": total_collections,
+        **stats,
         "online_users": 1,  # Placeholder
         "shop_clicks": 42,  # Placeholder
-        "total_cards": total_cards,
-        "total_products": total_products,
-        "average_card_price": average_card_price,
-        "last_sync": last_sync,
-        "system_status": system_status,
-        "most_popular_card": popular_card_data,
-        "most_valuable_card": expensive_card_data,
-        "top_cards": top_cards
+        "system_status": "healthy",  # Could be based on sync status in future
     }
@@ -12,14 +12,28 @@ from apscheduler.triggers.interval import IntervalTrigger
 from sqlmodel import Session, select
 
 from . import models
-from .database import session_scope
-from .services import catalog_sync, tcg_api, crud
+from .database import read_session, session_scope
+from .services import (
+    catalog_delta,
+    collection_value,
+    crud,
+    dashboard_stats,
+    fetch_engine,
+    home_feed,
+    tcg_api,
+    visual_search,
+)
 
 logger = logging.getLogger(__name__)
 
 # Global scheduler instance
 scheduler: Optional[BackgroundScheduler] = None
 
+# Price histories written per database transaction
+HISTORY_COMMIT_EVERY = 50
+# Delay before a write-triggered dashboard stats refresh; writes in between share it
+DASHBOARD_REFRESH_DELAY = dt.timedelta(seconds=30)
+
 
 def get_scheduler() -> BackgroundScheduler:
     """Get or create the global scheduler instance."""
@@ -36,6 +50,12 @@ def get_scheduler() -> BackgroundScheduler:
     return scheduler
 
 
+def _seed_now(missing: bool) -> dict:
+    """``add_job`` arguments running a cache refresh at once if its rows are missing."""
+    # Passing next_run_time=None would add the job paused, so leave it out
+    return {'next_run_time': dt.datetime.now(dt.timezone.utc)} if missing else {}
+
+
 def start_scheduler():
     """Start the background scheduler and register all jobs."""
     sched = get_scheduler()
@@ -46,13 +66,19 @@ def start_scheduler():
     
     logger.info("Starting background scheduler...")
     
-    # ===== JOB 1: Sync cards batch (100 cards/hour) =====
+    # Cache tables are filled at startup only when empty; otherwise the
+    # cached rows are served until the next interval run
+    with read_session() as session:
+        feed_missing = session.exec(select(models.LatestProduct.id).limit(1)).first() is None
+        stats_missing = session.get(models.DashboardStats, dashboard_stats.SNAPSHOT_ID) is None
+    
+    # ===== JOB 1: Delta-sync cards batch =====
     # Uruchamiany co godzinę
     sched.add_job(
         func=sync_cards_batch,
         trigger=IntervalTrigger(hours=1),
         id='sync_cards_batch',
-        name='Sync Cards Batch (100/hour)',
+        name='Sync Cards Batch (delta)',
         replace_existing=True,
     )
     logger.info("  ✓ Registered: sync_cards_batch (every 1 hour)")
@@ -79,6 +105,52 @@ def start_scheduler():
     )
     logger.info("  ✓ Registered: check_new_sets (Mondays at 2:00)")
     
+    # ===== JOB 4: Hash cached card images for visual search =====
+    sched.add_job(
+        func=hash_card_images,
+        trigger=IntervalTrigger(minutes=30),
+        id='hash_card_images',
+        name='Hash Card Images (visual search)',
+        replace_existing=True,
+        next_run_time=dt.datetime.now(dt.timezone.utc) + dt.timedelta(minutes=1),
+    )
+    logger.info("  ✓ Registered: hash_card_images (every 30 minutes)")
+    
+    # ===== JOB 5: Refresh the home page latest products feed =====
+    sched.add_job(
+        func=refresh_latest_products,
+        trigger=IntervalTrigger(hours=6),
+        id='refresh_latest_products',
+        name='Refresh Latest Products (home page)',
+        replace_existing=True,
+        **_seed_now(feed_missing),
+    )
+    logger.info(f"  ✓ Registered: refresh_latest_products (every 6 hours{', now' if feed_missing else ''})")
+    
+    # ===== JOB 6: Refresh the dashboard statistics snapshot =====
+    sched.add_job(
+        func=refresh_dashboard_stats,
+        trigger=IntervalTrigger(minutes=15),
+        id='refresh_dashboard_stats',
+        name='Refresh Dashboard Stats',
+        replace_existing=True,
+        **_seed_now(stats_missing),
+    )
+    dashboard_stats.on_change(request_dashboard_refresh)
+    logger.info("  ✓ Registered: refresh_dashboard_stats (every 15 minutes, and after writes)")
+    
+    # ===== JOB 7: Seed and roll the collection value rollup forward =====
+    # Runs at startup too, so users without stored rows are seeded once
+    sched.add_job(
+        func=roll_collection_values,
+        trigger=IntervalTrigger(hours=1),
+        id='roll_collection_values',
+        name='Roll Collection Values (hourly)',
+        replace_existing=True,
+        next_run_time=dt.datetime.now(dt.timezone.utc),
+    )
+    logger.info("  ✓ Registered: roll_collection_values (every hour, now)")
+    
     # Start scheduler
     sched.start()
     logger.info("✅ Scheduler started successfully!")
@@ -91,6 +163,7 @@ def start_scheduler():
 def stop_scheduler():
     """Stop the background scheduler."""
     sched = get_scheduler()
+    dashboard_stats.on_change(None)
     if sched.running:
         logger.info("Stopping scheduler...")
         sched.shutdown(wait=False)
@@ -103,7 +176,12 @@ def stop_scheduler():
 
 def sync_cards_batch():
     """
-    Sync batch of 100 cards from API to CardRecord.
+    Delta-sync the card catalogue from the API into CardRecord.
+
+    Up to ``catalog_delta.SETS_PER_RUN`` pending or reopened sets are walked concurrently;
+    only pages whose content changed are written. Once every set is
+    complete, the pages of the stalest cards are re-fetched instead. All
+    requests count against the daily catalogue budget.
     
     Priority:
     1. New sets (priority=1)
@@ -114,81 +192,58 @@ def sync_cards_batch():
     logger.info("JOB: Sync Cards Batch")
     logger.info("=" * 60)
     
-    batch_size = 100
-    
     try:
-        with session_scope() as session:
-            # Find next set to sync (lowest priority number = highest priority)
-            stmt = (
-                select(models.SetInfo)
-                .where(models.SetInfo.sync_status.in_(['pending', 'partial']))
-                .order_by(models.SetInfo.sync_priority, models.SetInfo.code)
-                .limit(1)
-            )
-            set_info = session.exec(stmt).first()
-            
-            if not set_info:
-                logger.info("✓ All sets synchronized!")
-                logger.info("  Checking for cards needing refresh...")
-                
-                # Find cards that need price refresh (older than 24h)
-                yesterday = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=1)
-                stmt = (
-                    select(models.CardRecord)
-                    .where(
-                        (models.CardRecord.last_synced < yesterday) |
-                        (models.CardRecord.last_synced.is_(None))
-                    )
-                    .order_by(models.CardRecord.sync_priority)
-                    .limit(batch_size)
-                )
-                cards_to_refresh = session.exec(stmt).all()
-                
-                if cards_to_refresh:
-                    logger.info(f"  Found {len(cards_to_refresh)} cards to refresh")
-                    # TODO: Implement card refresh logic in ETAP 3
-                else:
-                    logger.info("  All cards are up to date!")
-                
-                return
-            
-            logger.info(f"Syncing set: {set_info.code} - {set_info.name}")
-            logger.info(f"  Priority: {set_info.sync_priority}")
-            logger.info(f"  Status: {set_info.sync_status}")
-            logger.info(f"  Progress: {set_info.synced_cards}/{set_info.total_cards or '?'}")
-            
-            # Sync cards from this set
-            added, updated, request_count = catalog_sync.sync_set(
-                session=session,
-                set_code=set_info.code,
-                limit=batch_size,
-            )
-            
-            # Update set progress
-            set_info.synced_cards += added + updated
-            set_info.last_synced = dt.datetime.now(dt.timezone.utc)
-            
-            # Check if set is complete
-            if set_info.total_cards and set_info.synced_cards >= set_info.total_cards:
-                set_info.sync_status = 'complete'
-                logger.info(f"  ✅ Set {set_info.code} COMPLETE!")
-            else:
-                set_info.sync_status = 'partial'
-            
-            session.add(set_info)
-            session.commit()
-            
-            logger.info(f"  ✓ Added: {added}, Updated: {updated}")
-            logger.info(f"  ✓ API requests: {request_count}")
-            logger.info(f"  ✓ New progress: {set_info.synced_cards}/{set_info.total_cards or '?'}")
+        summary = catalog_delta.sync_sets()
+        if not summary.sets_walked:
+            logger.info("✓ All sets synchronized!")
+            logger.info("  Refreshing stale cards...")
+            summary = catalog_delta.refresh_stale_cards()
+            if not (summary.pages_changed or summary.pages_unchanged):
+                logger.info("  All cards are up to date!")
+
+        logger.info(
+            f"  ✓ Pages changed: {summary.pages_changed}, unchanged: {summary.pages_unchanged}"
+        )
+        logger.info(f"  ✓ Added: {summary.cards_added}, Updated: {summary.cards_updated}")
+        if summary.sets_completed:
+            logger.info(f"  ✅ {summary.sets_completed} sets COMPLETE!")
+        if summary.budget_exhausted:
+            logger.warning("  ⚠️ Daily API budget spent - sync resumes tomorrow")
+        if summary.cards_added or summary.cards_updated:
+            # Bulk upserts bypass the ORM change tracking
+            dashboard_stats.changed()
     
     except Exception as e:
         logger.error(f"❌ Error in sync_cards_batch: {e}", exc_info=True)
 
 
+def _save_price_histories(results: list[tuple[int, list[dict]]]) -> int:
+    """Write fetched histories for a chunk of cards in one transaction."""
+
+    now = dt.datetime.now(dt.timezone.utc)
+    points = 0
+    with session_scope() as session:
+        for record_id, normalized_history in results:
+            card = session.get(models.CardRecord, record_id)
+            if card is None:
+                continue
+            if normalized_history:
+                added, updated = crud.upsert_price_history(
+                    session, card_record_id=card.id, price_history=normalized_history
+                )
+                points += added + updated
+            # Update sync time even if no data, to avoid retrying constantly
+            card.last_price_synced = now
+            session.add(card)
+    return points
+
+
 def sync_price_history_batch():
     """
     Sync price history for 500 cards per day.
+
+    Histories are fetched concurrently through the shared fetch engine and
+    written ``HISTORY_COMMIT_EVERY`` cards per transaction.
     
     Priority:
     1. Cards with remote_id that have not been synced recently.
@@ -200,11 +255,11 @@ def sync_price_history_batch():
     batch_size = 500
     
     try:
-        with session_scope() as session:
+        with read_session() as session:
             # Find cards that need price history update (older than 24h)
             yesterday = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=1)
             stmt = (
-                select(models.CardRecord)
+                select(models.CardRecord.id, models.CardRecord.remote_id)
                 .where(models.CardRecord.remote_id.isnot(None))
                 .where(
                     (models.CardRecord.last_price_synced < yesterday) |
@@ -215,43 +270,31 @@ def sync_price_history_batch():
             )
             cards_to_sync = session.exec(stmt).all()
             
-            if not cards_to_sync:
-                logger.info("✓ All card prices are up to date.")
-                return
-                
-            logger.info(f"Found {len(cards_to_sync)} cards for price history sync.")
+        if not cards_to_sync:
+            logger.info("✓ All card prices are up to date.")
+            return
             
-            for i, card in enumerate(cards_to_sync):
-                logger.info(f"  ({i+1}/{len(cards_to_sync)}) Syncing card: {card.name} ({card.set_code})")
-                
-                if not card.remote_id:
-                    continue
-
-                try:
-                    history_data = tcg_api.fetch_card_price_history(card.remote_id)
-                    if not history_data:
-                        logger.info("    - No price history found.")
-                        # Update sync time even if no data, to avoid retrying constantly
-                        card.last_price_synced = dt.datetime.now(dt.timezone.utc)
-                        session.add(card)
-                        session.commit()
-                        continue
-
-                    normalized_history = tcg_api.normalize_price_history(history_data)
-                    
-                    if normalized_history:
-                        added, updated = crud.upsert_price_history(
-                            session, card_record_id=card.id, price_history=normalized_history
-                        )
-                        logger.info(f"    - Added: {added}, Updated: {updated} price points.")
-                    
-                    card.last_price_synced = dt.datetime.now(dt.timezone.utc)
-                    session.add(card)
-                    session.commit()
-
-                except Exception as e:
-                    logger.error(f"    - Error syncing price history for card {card.id}: {e}", exc_info=True)
-                    session.rollback()
+        logger.info(f"Found {len(cards_to_sync)} cards for price history sync.")
+
+        def fetch(http, card):
+            _, remote_id = card
+            history_data = tcg_api.fetch_card_price_history(remote_id, session=http)
+            return tcg_api.normalize_price_history(history_data) if history_data else []
+
+        engine = fetch_engine.get_fetch_engine()
+        results = (
+            (card_id, history)
+            for (card_id, _), history, error in engine.run("sync_price_history", cards_to_sync, fetch)
+            if error is None
+        )
+        saved = points = 0
+        for chunk in fetch_engine.chunked(results, HISTORY_COMMIT_EVERY):
+            try:
+                points += _save_price_histories(chunk)
+                saved += len(chunk)
+            except Exception as e:
+                logger.error(f"    - Error saving price history chunk: {e}", exc_info=True)
+            logger.info(f"  ({saved}/{len(cards_to_sync)}) cards saved, {points} price points written")
 
     except Exception as e:
         logger.error(f"❌ Error in sync_price_history_batch: {e}", exc_info=True)
@@ -260,28 +303,89 @@ def sync_price_history_batch():
 def check_new_sets():
     """
     Check for new Pokemon TCG sets released.
-    Automatically adds them to SetInfo with high priority.
+    Automatically adds them to SetInfo with high priority, and queues sets
+    changed on the API side for a delta walk.
     """
     logger.info("=" * 60)
     logger.info("JOB: Check New Sets")
     logger.info("=" * 60)
     
     try:
-        with session_scope() as session:
-            # Get current sets from database
-            stmt = select(models.SetInfo.code)
-            existing_codes = {code for (code,) in session.exec(stmt).all()}
-            
-            logger.info(f"  Current sets in DB: {len(existing_codes)}")
-            
-            # TODO: Implement set discovery from API in ETAP 3
-            # For now, just log
-            logger.info("  ⚠️ Set discovery not implemented yet - will be in ETAP 3")
+        summary = catalog_delta.discover_sets()
+        logger.info(f"  ✓ New sets: {summary.sets_added}, changed sets: {summary.sets_reopened}")
+        if summary.budget_exhausted:
+            logger.warning("  ⚠️ Daily API budget spent - set discovery skipped")
             
     except Exception as e:
         logger.error(f"❌ Error in check_new_sets: {e}", exc_info=True)
 
 
+def hash_card_images():
+    """
+    Compute pHash fingerprints for catalogue cards whose small image is
+    already cached locally, and add them to the visual search index.
+    """
+    try:
+        hashed = visual_search.hash_cached_images()
+        if hashed:
+            logger.info(f"🖼️ Hashed {hashed} card images for visual search")
+    except Exception as e:
+        logger.error(f"❌ Error in hash_card_images: {e}", exc_info=True)
+
+
+def refresh_latest_products():
+    """
+    Fetch the RapidAPI latest products feed into the local cache table
+    read by the home page.
+    """
+    try:
+        stored = home_feed.refresh_latest_products()
+        if stored:
+            logger.info(f"🛒 Cached {stored} latest products")
+        else:
+            logger.warning("⚠️ Latest products feed empty; keeping cached rows")
+    except Exception as e:
+        logger.error(f"❌ Error in refresh_latest_products: {e}", exc_info=True)
+
+
+def refresh_dashboard_stats():
+    """
+    Recompute the DashboardStats snapshot read by /users/stats/dashboard.
+    """
+    try:
+        snapshot = dashboard_stats.refresh()
+        logger.info(f"📊 Dashboard stats refreshed in {snapshot.refresh_ms} ms")
+    except Exception as e:
+        logger.error(f"❌ Error in refresh_dashboard_stats: {e}", exc_info=True)
+
+
+def roll_collection_values():
+    """
+    Seed the collection value series of users without stored rows, store
+    the new days of every series and drop the days that left the window.
+    """
+    try:
+        written = collection_value.roll_forward_all()
+        logger.info(f"📈 Collection value rollup rolled forward ({written} rows)")
+    except Exception as e:
+        logger.error(f"❌ Error in roll_collection_values: {e}", exc_info=True)
+
+
+def request_dashboard_refresh():
+    """Schedule one dashboard stats refresh shortly, unless one is already pending."""
+    sched = get_scheduler()
+    if not sched.running or sched.get_job('refresh_dashboard_stats_soon') is not None:
+        return
+    sched.add_job(
+        func=refresh_dashboard_stats,
+        trigger='date',
+        run_date=dt.datetime.now(dt.timezone.utc) + DASHBOARD_REFRESH_DELAY,
+        id='refresh_dashboard_stats_soon',
+        name='Refresh Dashboard Stats (after writes)',
+        replace_existing=True,
+    )
+
+
 # ============================================================================
 # MANUAL TRIGGERS (for testing and admin panel)
 # ============================================================================
@@ -314,4 +418,8 @@ def get_scheduler_status() -> dict:
     return {
         'running': sched.running,
         'jobs': jobs,
+        'metrics': fetch_engine.get_fetch_engine().metrics(),
+        'api_cache': tcg_api.cache_stats(),
+        'dashboard_stats': dashboard_stats.metrics(),
+        'catalog_sync': catalog_delta.status(),
     }
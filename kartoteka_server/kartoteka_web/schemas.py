@@ -83,6 +83,7 @@ class CardSearchResponse(SQLModel):
     per_page: int = 20
     suggested_query: Optional[str] = None
     total_remote: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 
 class CardPriceHistoryPoint(SQLModel):
@@ -189,6 +190,8 @@ class CollectionStats(SQLModel):
     purchase_value: float = 0.0  # Total purchase cost
     purchase_cards_value: float = 0.0  # Sum of card values that have purchase price set
     value_history: List[CollectionValueHistoryPoint] = Field(default_factory=list)
+    history_status: str = "fresh"  # fresh, updating (backfill queued) or stale
+    history_pending: int = 0  # Cards whose price history is still being fetched
 
 
 # ============================================================================
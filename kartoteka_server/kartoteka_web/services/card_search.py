@@ -0,0 +1,367 @@
+"""Full-text search over the local card catalogue (SQLite FTS5).
+
+Two external-content FTS5 tables mirror :class:`~kartoteka_web.models.CardRecord`:
+
+``cardrecord_fts``
+    ``unicode61`` tokens of the normalised name, set name, set code, number
+    and artist. Used for ranked prefix queries (``"pika"*``).
+``cardrecord_trigram``
+    ``trigram`` tokens of the normalised name. Used as a typo-tolerant
+    fallback when the prefix query finds nothing.
+
+Both are kept in sync by triggers on the ``cardrecord`` table, so every
+writer (``catalog_sync.upsert_card_record``, tests, maintenance scripts)
+updates the index without extra code. On databases without FTS5 support
+:func:`is_available` returns ``False`` and callers fall back to ``LIKE``.
+"""
+
+from __future__ import annotations
+
+import base64
+import difflib
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from sqlalchemy import and_, column, func, literal_column, or_, table, text as sql_text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from .. import models
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "cardrecord_fts"
+TRIGRAM_TABLE = "cardrecord_trigram"
+
+# Columns indexed by ``cardrecord_fts`` (names must match ``cardrecord``).
+FTS_COLUMNS = ("name_normalized", "set_name_normalized", "set_code", "number", "artist")
+# bm25 weights, same order as FTS_COLUMNS; a name hit outranks everything else.
+FTS_WEIGHTS = (10.0, 4.0, 3.0, 2.0, 1.0)
+
+FUZZY_SIMILARITY_THRESHOLD = 0.6
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+StatementFilter = Callable[[Any], Any]
+
+
+@dataclass
+class SearchPage:
+    """Page of ranked card records returned by :func:`search`."""
+
+    records: list[models.CardRecord]
+    total: int
+    page: int = 1
+    next_cursor: str | None = None
+
+
+def _schema_statements() -> list[str]:
+    cols = ", ".join(FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{name}" for name in FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{name}" for name in FTS_COLUMNS)
+    return [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            {cols},
+            content='cardrecord', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_TABLE} USING fts5(
+            name_normalized,
+            content='cardrecord', content_rowid='id',
+            tokenize='trigram'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS cardrecord_search_ai AFTER INSERT ON cardrecord BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols});
+            INSERT INTO {TRIGRAM_TABLE}(rowid, name_normalized) VALUES (new.id, new.name_normalized);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS cardrecord_search_ad AFTER DELETE ON cardrecord BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, name_normalized)
+                VALUES ('delete', old.id, old.name_normalized);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS cardrecord_search_au AFTER UPDATE OF {cols} ON cardrecord BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, name_normalized)
+                VALUES ('delete', old.id, old.name_normalized);
+            INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols});
+            INSERT INTO {TRIGRAM_TABLE}(rowid, name_normalized) VALUES (new.id, new.name_normalized);
+        END
+        """,
+    ]
+
+
+def ensure_search_index(engine: Engine) -> bool:
+    """Create the FTS tables and triggers, rebuilding them on first creation.
+
+    Returns ``False`` when the database is not SQLite or lacks FTS5.
+    """
+
+    if engine.dialect.name != "sqlite":
+        return False
+
+    try:
+        with engine.begin() as connection:
+            existing = connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE name IN (?, ?)",
+                (FTS_TABLE, TRIGRAM_TABLE),
+            ).fetchall()
+            for statement in _schema_statements():
+                connection.exec_driver_sql(statement)
+            if len(existing) < 2:
+                logger.info("Building card search index")
+                connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+                connection.exec_driver_sql(f"INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}) VALUES ('rebuild')")
+    except Exception as exc:  # pragma: no cover - depends on the SQLite build
+        logger.warning("Card search index unavailable, falling back to LIKE: %s", exc)
+        return False
+    return True
+
+
+def is_available(session: Session) -> bool:
+    """Return ``True`` when the search tables exist in the session's database."""
+
+    bind = session.get_bind()
+    if bind.dialect.name != "sqlite":
+        return False
+    row = session.connection().exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (FTS_TABLE,),
+    ).first()
+    return row is not None
+
+
+def tokenize(value: str) -> list[str]:
+    return [token for token in _TOKEN_PATTERN.findall((value or "").lower()) if token]
+
+
+def prefix_query(tokens: list[str], columns: tuple[str, ...] | None = None) -> str:
+    """Build an FTS5 query matching every token as a prefix (``"tok"*``)."""
+
+    terms = " AND ".join(f'"{token}"*' for token in tokens)
+    if not terms:
+        return ""
+    if columns:
+        return f"{{{' '.join(columns)}}} : ({terms})"
+    return terms
+
+
+def trigram_query(value: str) -> str:
+    """Build an FTS5 ``trigram`` query matching any trigram of ``value``."""
+
+    compact = "".join(tokenize(value))
+    grams = sorted({compact[i:i + 3] for i in range(len(compact) - 2)})
+    return " OR ".join(f'"{gram}"' for gram in grams)
+
+
+def encode_cursor(score: float, record_id: int) -> str:
+    raw = f"{score!r}:{record_id}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str | None) -> tuple[float, int] | None:
+    if not cursor:
+        return None
+    try:
+        score, record_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split(":")
+        return float(score), int(record_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def _ranked(fts_name: str, match: str, weights: tuple[float, ...] = ()):
+    fts = table(fts_name, column("rowid"))
+    fts_column = literal_column(fts_name)
+    score = func.bm25(fts_column, *weights) if weights else func.bm25(fts_column)
+    return (
+        select(fts.c.rowid.label("record_id"), score.label("score"))
+        .select_from(fts)
+        .where(fts_column.op("MATCH")(match))
+        .subquery()
+    )
+
+
+def ranked_matches(match: str):
+    """Subquery of ``(record_id, score)`` rows matching ``match``, for joins.
+
+    Lower scores rank higher, as in :func:`search`.
+    """
+
+    return _ranked(FTS_TABLE, match, FTS_WEIGHTS)
+
+
+def _keyset(ranked, id_column, cursor: str | None):
+    position = decode_cursor(cursor)
+    if position is None:
+        return None
+    score, record_id = position
+    return or_(
+        ranked.c.score > score,
+        and_(ranked.c.score == score, id_column > record_id),
+    )
+
+
+def _page_bounds(total: int, cap: int, per_page: int, page: int) -> tuple[int, int, int]:
+    capped_total = min(total, cap)
+    total_pages = max(1, (capped_total + per_page - 1) // per_page)
+    page = min(max(1, page), total_pages)
+    offset = (page - 1) * per_page
+    return page, offset, min(per_page, max(0, capped_total - offset))
+
+
+def search(
+    session: Session,
+    match: str,
+    *,
+    filters: StatementFilter | None = None,
+    per_page: int,
+    cap: int,
+    page: int = 1,
+    cursor: str | None = None,
+) -> SearchPage:
+    """Run a ranked FTS query and return one page of results.
+
+    ``filters`` receives and returns a ``select`` over ``CardRecord`` for
+    extra predicates (number, total, set code). Without filters the count
+    and the ranking run on the FTS table alone and only the page rows are
+    loaded from ``cardrecord``. With ``cursor`` (the ``next_cursor`` of the
+    previous page) the page is fetched by keyset on ``(score, id)``
+    instead of ``OFFSET``.
+    """
+
+    if not match:
+        return SearchPage(records=[], total=0)
+    ranked = _ranked(FTS_TABLE, match, FTS_WEIGHTS)
+
+    if filters is None:
+        total = count(session, match)
+        base = select(ranked.c.record_id, ranked.c.score)
+        id_column = ranked.c.record_id
+    else:
+        base = filters(
+            select(models.CardRecord.id, ranked.c.score).join(
+                ranked, ranked.c.record_id == models.CardRecord.id
+            )
+        )
+        id_column = models.CardRecord.id
+        # Count only up to cap + 1; callers ask for an exact count when needed.
+        total = int(
+            session.exec(select(func.count()).select_from(base.limit(cap + 1).subquery())).one() or 0
+        )
+    if not total:
+        return SearchPage(records=[], total=0)
+
+    stmt = base
+    keyset = _keyset(ranked, id_column, cursor)
+    if keyset is not None:
+        stmt = stmt.where(keyset)
+        limit = per_page
+    else:
+        page, offset, limit = _page_bounds(total, cap, per_page, page)
+        if offset:
+            stmt = stmt.offset(offset)
+    if limit <= 0:
+        return SearchPage(records=[], total=total, page=page)
+    rows = session.exec(stmt.order_by(ranked.c.score, id_column).limit(limit)).all()
+
+    by_id = {
+        record.id: record
+        for record in session.exec(
+            select(models.CardRecord).where(models.CardRecord.id.in_([row[0] for row in rows]))
+        ).all()
+    }
+    records = [by_id[row[0]] for row in rows if row[0] in by_id]
+
+    next_cursor = None
+    if len(rows) == per_page:
+        last_id, last_score = rows[-1]
+        next_cursor = encode_cursor(float(last_score), int(last_id))
+    return SearchPage(records=records, total=total, page=page, next_cursor=next_cursor)
+
+
+def count(session: Session, match: str, *, filters: StatementFilter | None = None) -> int:
+    """Exact number of matches for ``match``."""
+
+    if filters is None:
+        fts_column = literal_column(FTS_TABLE)
+        stmt = select(func.count()).select_from(table(FTS_TABLE)).where(fts_column.op("MATCH")(match))
+        return int(session.exec(stmt).one() or 0)
+    ranked = _ranked(FTS_TABLE, match)
+    stmt = filters(
+        select(models.CardRecord.id).join(ranked, ranked.c.record_id == models.CardRecord.id)
+    )
+    return int(session.exec(select(func.count()).select_from(stmt.subquery())).one() or 0)
+
+
+def fuzzy_search(
+    session: Session,
+    value: str,
+    *,
+    filters: StatementFilter | None = None,
+    cap: int,
+    threshold: float = FUZZY_SIMILARITY_THRESHOLD,
+) -> list[models.CardRecord]:
+    """Typo-tolerant name search using shared trigrams.
+
+    Candidates are ranked by bm25 over the trigram table and kept when the
+    normalised name is similar enough to ``value``.
+    """
+
+    match = trigram_query(value)
+    if not match:
+        return []
+    ranked = _ranked(TRIGRAM_TABLE, match)
+    stmt = select(models.CardRecord).join(ranked, ranked.c.record_id == models.CardRecord.id)
+    if filters is not None:
+        stmt = filters(stmt)
+    # Over-fetch: similarity is checked in Python on the best trigram matches.
+    candidates = session.exec(stmt.order_by(ranked.c.score, models.CardRecord.id).limit(cap * 5)).all()
+
+    needle = " ".join(tokenize(value))
+    scored = []
+    for record in candidates:
+        name = " ".join(tokenize(record.name_normalized))
+        ratio = difflib.SequenceMatcher(None, needle, name).ratio()
+        if needle in name:
+            ratio = max(ratio, threshold)
+        if ratio >= threshold:
+            scored.append((-ratio, record.id, record))
+    scored.sort(key=lambda item: (item[0], item[1]))
+    return [record for _, _, record in scored[:cap]]
+
+
+def rebuild(session: Session) -> None:
+    """Rebuild both FTS tables from ``cardrecord`` (e.g. after bulk SQL edits)."""
+
+    connection = session.connection()
+    connection.execute(sql_text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    connection.execute(sql_text(f"INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}) VALUES ('rebuild')"))
+
+
+__all__ = [
+    "FTS_TABLE",
+    "SearchPage",
+    "TRIGRAM_TABLE",
+    "count",
+    "decode_cursor",
+    "encode_cursor",
+    "ensure_search_index",
+    "fuzzy_search",
+    "is_available",
+    "prefix_query",
+    "ranked_matches",
+    "rebuild",
+    "search",
+    "tokenize",
+    "trigram_query",
+]
@@ -0,0 +1,718 @@
+"""Incremental (delta) sync of the card catalogue from RapidAPI.
+
+The hourly sync used to walk up to 100 cards of every pending or partial
+set, and a set whose card count never reached ``total_cards`` stayed
+partial and was walked again every hour. New sets were never discovered
+and nothing refreshed a card once it was stored. The catalogue is now kept
+current with as few requests as possible:
+
+* :func:`discover_sets` lists the API's episodes, adds sets that are new to
+  ``SetInfo`` with top priority and reopens a complete set only when its
+  remote ``updated_at`` or card count changed (or it was never walked by
+  this engine, so its pages are unknown);
+* :func:`sync_sets` walks pending and reopened sets. Each page request
+  carries the page's stored ETag (``If-None-Match``) and the card data is
+  hashed, so only pages whose content changed are upserted. A walk cut
+  short by the budget or an error resumes at the first page it has not
+  fetched yet; a finished walk marks the set complete;
+* :func:`refresh_stale_cards` re-fetches the pages holding the cards whose
+  ``CardRecord.last_synced`` is oldest, once it is older than
+  ``REFRESH_AFTER``. ``SetSyncCard`` maps each card to the page that
+  listed it, so finding those pages is one indexed join;
+* every request, adapter retries included, goes through
+  :class:`BudgetedSession` and is charged to :class:`DailyBudget`, a per-UTC-day cap (``RAPIDAPI_DAILY_BUDGET``) kept
+  in the database so restarts do not reset it. Once it is spent the sync
+  stops until the next day.
+
+Fetches run on the shared :mod:`.fetch_engine`; writes stay in the
+caller's thread, one transaction per set. :func:`status` reports set
+progress, stale cards and quota use for the admin status endpoint.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Optional
+
+import requests
+from sqlalchemy import delete, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from .. import models
+from ..database import read_session, session_scope
+from . import catalog_sync, crud, fetch_engine, tcg_api
+
+logger = logging.getLogger(__name__)
+
+# Hard cap on catalogue sync requests per UTC day
+DAILY_BUDGET = int(os.getenv("RAPIDAPI_DAILY_BUDGET", "1000"))
+
+# Cards not confirmed by the API for this long are refreshed
+REFRESH_AFTER = dt.timedelta(days=int(os.getenv("CATALOG_REFRESH_DAYS", "7")))
+
+# Sets walked concurrently per sync_sets run
+SETS_PER_RUN = 4
+
+# Pages re-fetched per refresh_stale_cards run
+REFRESH_PAGES_PER_RUN = 20
+
+# Stale cards read per query while looking for pages to refresh
+STALE_SCAN_CHUNK = 500
+
+
+class BudgetExhausted(RuntimeError):
+    """Raised instead of sending a request once the daily budget is spent."""
+
+
+def _utcnow() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+def _aware(value: Optional[dt.datetime]) -> Optional[dt.datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=dt.timezone.utc)
+    return value
+
+
+class DailyBudget:
+    """Per-UTC-day request cap kept in ``ApiQuota``."""
+
+    def __init__(
+        self,
+        limit: int = DAILY_BUDGET,
+        *,
+        session_factory: Callable[[], object] = session_scope,
+        clock: Callable[[], dt.datetime] = _utcnow,
+    ) -> None:
+        self.limit = limit
+        self._session_factory = session_factory
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def today(self) -> dt.date:
+        return self._clock().date()
+
+    def take(self) -> bool:
+        """Charge one request to today's budget; ``False`` once it is spent."""
+
+        if self.limit <= 0:
+            return False
+        day = self.today()
+        with self._lock, self._session_factory() as session:
+            return self._charge(session, day)
+
+    def _charge(self, session: Session, day: dt.date) -> bool:
+        # One conditional upsert, so concurrent processes can neither
+        # overspend nor race on creating the day's row
+        table = models.ApiQuota.__table__
+        dialect = session.get_bind().dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            insert = None
+
+        if insert is not None:
+            stmt = insert(table).values(day=day, requests=1).on_conflict_do_update(
+                index_elements=[table.c.day],
+                set_={"requests": table.c.requests + 1},
+                where=table.c.requests < self.limit,
+            )
+            return bool(session.execute(stmt).rowcount)
+
+        increment = (
+            update(table)
+            .where(table.c.day == day, table.c.requests < self.limit)
+            .values(requests=table.c.requests + 1)
+        )
+        if session.execute(increment).rowcount:
+            return True
+        if session.get(models.ApiQuota, day) is not None:
+            return False
+        try:
+            with session.begin_nested():
+                session.execute(table.insert().values(day=day, requests=1))
+        except IntegrityError:
+            # Another process created the row first
+            return bool(session.execute(increment).rowcount)
+        return True
+
+    def used(self) -> int:
+        with self._session_factory() as session:
+            quota = session.get(models.ApiQuota, self.today())
+            return quota.requests if quota is not None else 0
+
+    def usage(self) -> dict[str, Any]:
+        used = self.used()
+        return {
+            "day": self.today().isoformat(),
+            "limit": self.limit,
+            "used": used,
+            "remaining": max(self.limit - used, 0),
+        }
+
+
+class BudgetedSession:
+    """HTTP session wrapper that charges every attempt, retries included, to a :class:`DailyBudget`."""
+
+    def __init__(self, http: requests.Session, budget: DailyBudget) -> None:
+        self.http = http
+        self.budget = budget
+        # Read by tcg_api for the User-Agent
+        self.headers = getattr(http, "headers", {})
+
+    def _charge(self) -> None:
+        if not self.budget.take():
+            raise BudgetExhausted(f"Daily RapidAPI budget of {self.budget.limit} requests spent")
+
+    def get(self, url, **kwargs):
+        self._charge()
+        with fetch_engine.retry_hook(self._charge):
+            return self.http.get(url, **kwargs)
+
+
+budget = DailyBudget()
+
+
+@dataclass
+class RunSummary:
+    """Outcome of one discovery, sync or refresh run."""
+
+    job: str
+    started_at: str
+    finished_at: Optional[str] = None
+    sets_added: int = 0
+    sets_reopened: int = 0
+    sets_walked: int = 0
+    sets_completed: int = 0
+    pages_changed: int = 0
+    pages_unchanged: int = 0
+    cards_added: int = 0
+    cards_updated: int = 0
+    cards_confirmed: int = 0
+    budget_exhausted: bool = False
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+_last_runs: dict[str, RunSummary] = {}
+_runs_lock = threading.Lock()
+
+
+def _start(job: str) -> RunSummary:
+    return RunSummary(job=job, started_at=_utcnow().isoformat())
+
+
+def _finish(summary: RunSummary) -> RunSummary:
+    summary.finished_at = _utcnow().isoformat()
+    with _runs_lock:
+        _last_runs[summary.job] = summary
+    logger.info(
+        "Catalogue %s: %s sets added, %s reopened, %s walked (%s complete), %s pages changed, "
+        "%s unchanged, %s cards added, %s updated, %s confirmed%s",
+        summary.job, summary.sets_added, summary.sets_reopened, summary.sets_walked,
+        summary.sets_completed, summary.pages_changed,
+        summary.pages_unchanged, summary.cards_added, summary.cards_updated,
+        summary.cards_confirmed, " (daily budget spent)" if summary.budget_exhausted else "",
+    )
+    return summary
+
+
+# ---------------------------------------------------------------------------
+# Set discovery
+# ---------------------------------------------------------------------------
+
+
+def _episode_date(value: Any) -> Optional[dt.date]:
+    if not value:
+        return None
+    try:
+        return dt.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _episode_total(episode: dict[str, Any]) -> Optional[int]:
+    for key in ("cards_total", "cards_printed_total", "total", "totalCards"):
+        value = episode.get(key)
+        if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+            return int(value)
+    return None
+
+
+def _episode_series(episode: dict[str, Any]) -> Optional[str]:
+    series = episode.get("series")
+    if isinstance(series, dict):
+        series = series.get("name")
+    return str(series) if series else None
+
+
+def _set_api_id(code: str, state: Optional[models.SetSyncState]) -> Optional[int]:
+    if state is not None and state.api_id is not None:
+        return state.api_id
+    api_id = (tcg_api.get_set_api_info(code) or {}).get("api_id")
+    return int(api_id) if api_id is not None else None
+
+
+def discover_sets(now: Optional[dt.datetime] = None) -> RunSummary:
+    """Add new sets from the API's episode list and reopen changed ones."""
+
+    summary = _start("discover")
+    now = now or _utcnow()
+    http = BudgetedSession(fetch_engine.get_fetch_engine().http, budget)
+    try:
+        episodes, _ = tcg_api.list_episodes(session=http)
+    except BudgetExhausted:
+        summary.budget_exhausted = True
+        return _finish(summary)
+
+    with session_scope() as session:
+        infos = {info.code: info for info in session.exec(select(models.SetInfo)).all()}
+        states = {state.set_code: state for state in session.exec(select(models.SetSyncState)).all()}
+        by_api_id: dict[int, str] = {}
+        for code in infos:
+            api_id = _set_api_id(code, states.get(code))
+            if api_id is not None:
+                by_api_id.setdefault(api_id, code)
+        by_code = {code.lower(): code for code in infos}
+
+        for episode in episodes:
+            try:
+                api_id = int(episode.get("id"))
+            except (TypeError, ValueError):
+                continue
+            remote_code = str(episode.get("code") or episode.get("slug") or api_id).strip()
+            code = by_api_id.get(api_id) or by_code.get(remote_code.lower())
+            total = _episode_total(episode)
+
+            if code is None:
+                code = remote_code
+                infos[code] = models.SetInfo(
+                    code=code,
+                    name=str(episode.get("name") or code),
+                    series=_episode_series(episode),
+                    release_date=_episode_date(episode.get("released_at") or episode.get("release_date")),
+                    total_cards=total,
+                    sync_status="pending",
+                    sync_priority=1,
+                )
+                session.add(infos[code])
+                by_api_id[api_id] = code
+                by_code[code.lower()] = code
+                summary.sets_added += 1
+                logger.info("Discovered new set %s (%s)", code, infos[code].name)
+            tcg_api.register_set_api_info(
+                code,
+                {
+                    "api_id": api_id,
+                    "api_name": episode.get("name"),
+                    "api_slug": episode.get("slug"),
+                    "logo_url": episode.get("logo"),
+                },
+            )
+
+            state = states.get(code)
+            if state is None:
+                state = states[code] = models.SetSyncState(set_code=code)
+            updated_at = episode.get("updated_at") or episode.get("updatedAt")
+            updated_at = str(updated_at) if updated_at else None
+            changed = (
+                state.total_pages is None
+                or state.remote_updated_at != updated_at
+                or state.remote_total != total
+            )
+            state.api_id = api_id
+            state.remote_updated_at = updated_at
+            state.remote_total = total
+            state.checked_at = now
+            session.add(state)
+
+            info = infos[code]
+            if changed and info.sync_status in ("complete", "failed"):
+                info.sync_status = "partial"
+                info.updated_at = now
+                session.add(info)
+                summary.sets_reopened += 1
+                logger.info("Set %s changed remotely; queued for a delta walk", code)
+
+    return _finish(summary)
+
+
+# ---------------------------------------------------------------------------
+# Page walks
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class SetWalk:
+    """Stored page state a walk needs, read before fetching."""
+
+    code: str
+    api_id: Optional[int]
+    started_at: dt.datetime
+    total_pages: Optional[int] = None
+    etags: dict[int, Optional[str]] = field(default_factory=dict)
+    # Pages fetched since the walk started; skipped when it resumes
+    done: set[int] = field(default_factory=set)
+    # Refresh only these pages instead of walking the set
+    only: Optional[list[int]] = None
+
+
+@dataclass
+class WalkResult:
+    pages: list[tcg_api.CardsPage] = field(default_factory=list)
+    total_pages: Optional[int] = None
+    complete: bool = False
+    budget_exhausted: bool = False
+    # Search fallback for sets without an episode ID
+    cards: Optional[list[dict[str, Any]]] = None
+
+
+def _load_walk(session: Session, code: str, now: dt.datetime, only: Optional[list[int]] = None) -> SetWalk:
+    state = session.exec(select(models.SetSyncState).where(models.SetSyncState.set_code == code)).first()
+    started_at = _aware(state.walk_started_at) if state is not None and state.walk_started_at else now
+    walk = SetWalk(
+        code=code,
+        api_id=_set_api_id(code, state),
+        started_at=started_at,
+        total_pages=state.total_pages if state is not None else None,
+        only=only,
+    )
+    rows = session.exec(
+        select(models.SetSyncPage.page, models.SetSyncPage.etag, models.SetSyncPage.fetched_at)
+        .where(models.SetSyncPage.set_code == code)
+    ).all()
+    for page, etag, fetched_at in rows:
+        walk.etags[page] = etag
+        if only is None and _aware(fetched_at) >= started_at:
+            walk.done.add(page)
+    return walk
+
+
+def fetch_walk(http: requests.Session, walk: SetWalk) -> WalkResult:
+    """Fetch the pages of ``walk`` that may have changed (runs in a worker thread)."""
+
+    result = WalkResult(total_pages=walk.total_pages)
+    try:
+        if walk.api_id is None:
+            result.cards, _ = tcg_api.list_set_cards(walk.code, limit=0, session=http, raise_errors=True)
+            result.complete = True
+            return result
+
+        if walk.only is not None:
+            for page in walk.only:
+                fetched = tcg_api.fetch_episode_cards_page(
+                    walk.api_id, page, etag=walk.etags.get(page), session=http
+                )
+                result.pages.append(fetched)
+                if not fetched.not_modified:
+                    result.total_pages = fetched.total_pages
+            return result
+
+        page = 1
+        while True:
+            if page in walk.done and result.total_pages:
+                if page >= result.total_pages:
+                    break
+                page += 1
+                continue
+            fetched = tcg_api.fetch_episode_cards_page(
+                walk.api_id, page, etag=walk.etags.get(page), session=http
+            )
+            result.pages.append(fetched)
+            if not fetched.not_modified:
+                result.total_pages = fetched.total_pages
+                if not fetched.cards:
+                    result.total_pages = page
+            if page >= (result.total_pages or page):
+                break
+            page += 1
+        result.complete = True
+    except BudgetExhausted:
+        result.budget_exhausted = True
+    except requests.RequestException as exc:
+        logger.warning("Delta walk of set %s stopped: %s", walk.code, exc)
+    return result
+
+
+def _confirm_cards(session: Session, remote_ids: list[str], now: dt.datetime) -> int:
+    """Stamp ``last_synced`` on the catalogue cards the API has just listed."""
+
+    if not remote_ids:
+        return 0
+    record = models.CardRecord
+    confirmed = 0
+    for start in range(0, len(remote_ids), STALE_SCAN_CHUNK):
+        result = session.execute(
+            update(record)
+            .where(record.remote_id.in_(remote_ids[start:start + STALE_SCAN_CHUNK]))
+            .values(last_synced=now)
+        )
+        confirmed += result.rowcount or 0
+    return confirmed
+
+
+def _remote_ids(payloads: list[dict[str, Any]]) -> list[str]:
+    return [str(payload["id"]).strip() for payload in payloads if payload.get("id")]
+
+
+def _place_cards(session: Session, code: str, page: int, remote_ids: list[str]) -> None:
+    """Point the ``SetSyncCard`` rows of a page at the cards it now lists."""
+
+    placed = models.SetSyncCard
+    session.execute(delete(placed).where(placed.set_code == code, placed.page == page))
+    crud.bulk_upsert(
+        session,
+        placed,
+        [{"remote_id": remote_id, "set_code": code, "page": page} for remote_id in dict.fromkeys(remote_ids)],
+        conflict_columns=["remote_id"],
+        update_columns=["set_code", "page"],
+    )
+
+
+def save_walk(
+    session: Session,
+    walk: SetWalk,
+    result: WalkResult,
+    summary: RunSummary,
+    now: Optional[dt.datetime] = None,
+) -> None:
+    """Write a fetched walk: upsert changed pages and record every page's state."""
+
+    now = now or _utcnow()
+    set_info = session.exec(select(models.SetInfo).where(models.SetInfo.code == walk.code)).first()
+    if set_info is None:
+        return
+
+    if walk.api_id is None and result.cards is None:
+        # The search fallback stopped early; keep the set for the next run
+        set_info.sync_status = "partial"
+    elif result.cards is not None:
+        added, updated = catalog_sync.upsert_card_records(session, result.cards)
+        summary.cards_added += added
+        summary.cards_updated += updated
+        summary.cards_confirmed += _confirm_cards(session, _remote_ids(result.cards), now)
+        set_info.synced_cards = len(result.cards)
+        set_info.sync_status = "complete" if result.cards else "failed"
+    else:
+        state = session.exec(
+            select(models.SetSyncState).where(models.SetSyncState.set_code == walk.code)
+        ).first() or models.SetSyncState(set_code=walk.code, api_id=walk.api_id)
+        rows = {
+            row.page: row
+            for row in session.exec(select(models.SetSyncPage).where(models.SetSyncPage.set_code == walk.code)).all()
+        }
+        for fetched in result.pages:
+            row = rows.get(fetched.page)
+            if row is None:
+                row = rows[fetched.page] = models.SetSyncPage(
+                    set_code=walk.code, page=fetched.page, content_hash="", fetched_at=now
+                )
+            if fetched.not_modified or fetched.content_hash == row.content_hash:
+                summary.pages_unchanged += 1
+                if not fetched.not_modified:
+                    row.etag = fetched.etag
+            else:
+                payloads = tcg_api.build_set_card_payloads(fetched.cards, walk.code)
+                added, updated = catalog_sync.upsert_card_records(session, payloads)
+                summary.cards_added += added
+                summary.cards_updated += updated
+                summary.pages_changed += 1
+                row.content_hash = fetched.content_hash or ""
+                row.etag = fetched.etag
+                row.remote_ids = _remote_ids(payloads)
+                _place_cards(session, walk.code, fetched.page, row.remote_ids)
+                row.changed_at = now
+                state.changed_at = now
+            row.fetched_at = now
+            session.add(row)
+            summary.cards_confirmed += _confirm_cards(session, list(row.remote_ids or []), now)
+
+        if result.total_pages:
+            for page, row in list(rows.items()):
+                if page > result.total_pages:
+                    _place_cards(session, walk.code, page, [])
+                    session.delete(row)
+                    del rows[page]
+        if walk.only is not None and result.total_pages and result.total_pages != state.total_pages:
+            # A refreshed page reports a different page count: walk the set again
+            set_info.sync_status = "partial"
+            state.walk_started_at = now
+        elif walk.only is None:
+            if result.complete:
+                state.walk_started_at = None
+                set_info.sync_status = "complete"
+            else:
+                state.walk_started_at = walk.started_at
+                set_info.sync_status = "partial"
+        state.total_pages = result.total_pages or state.total_pages
+        state.content_hash = tcg_api.content_hash([rows[page].content_hash for page in sorted(rows)])
+        session.add(state)
+        set_info.synced_cards = sum(len(row.remote_ids or []) for row in rows.values())
+
+    if set_info.sync_status == "complete":
+        summary.sets_completed += 1
+        set_info.total_cards = max(set_info.total_cards or 0, set_info.synced_cards)
+    set_info.last_synced = now
+    set_info.updated_at = now
+    session.add(set_info)
+
+
+def _run_walks(job: str, walks: list[SetWalk], summary: RunSummary) -> None:
+    engine = fetch_engine.get_fetch_engine()
+    http = BudgetedSession(engine.http, budget)
+    for walk, result, error in engine.run(job, walks, lambda _http, walk: fetch_walk(http, walk)):
+        if error is not None or result is None:
+            continue
+        summary.budget_exhausted = summary.budget_exhausted or result.budget_exhausted
+        try:
+            with session_scope() as session:
+                save_walk(session, walk, result, summary)
+        except Exception as exc:
+            logger.error("Saving delta walk of set %s failed: %s", walk.code, exc, exc_info=True)
+
+
+def sync_sets(limit: int = SETS_PER_RUN) -> RunSummary:
+    """Walk up to ``limit`` pending or reopened sets, highest priority first."""
+
+    summary = _start("sync")
+    now = _utcnow()
+    with read_session() as session:
+        codes = session.exec(
+            select(models.SetInfo.code)
+            .where(models.SetInfo.sync_status.in_(["pending", "partial"]))
+            .order_by(models.SetInfo.sync_priority, models.SetInfo.code)
+            .limit(limit)
+        ).all()
+        walks = [_load_walk(session, code, now) for code in codes]
+    summary.sets_walked = len(walks)
+    if walks:
+        _run_walks("catalog_sync", walks, summary)
+    return _finish(summary)
+
+
+# ---------------------------------------------------------------------------
+# Staleness refresh
+# ---------------------------------------------------------------------------
+
+
+def stale_pages(
+    session: Session,
+    *,
+    limit: int = REFRESH_PAGES_PER_RUN,
+    now: Optional[dt.datetime] = None,
+) -> dict[str, list[int]]:
+    """Pages holding the stalest cards, ``{set_code: [page, …]}``.
+
+    Cards are taken in ``last_synced`` order (never confirmed first); each
+    maps to the stored page that listed it through ``SetSyncCard``. Cards
+    on no stored page belong to sets the delta walk has not reached yet and
+    are skipped.
+    """
+
+    cutoff = (now or _utcnow()) - REFRESH_AFTER
+    record, placed = models.CardRecord, models.SetSyncCard
+    stmt = (
+        select(placed.set_code, placed.page)
+        .join(record, record.remote_id == placed.remote_id)
+        .where(or_(record.last_synced.is_(None), record.last_synced < cutoff))
+        .order_by(record.last_synced.asc().nulls_first(), record.id)
+        .execution_options(yield_per=STALE_SCAN_CHUNK)
+    )
+    selected: dict[str, list[int]] = {}
+    count = 0
+    for code, page in session.exec(stmt):
+        pages = selected.setdefault(code, [])
+        if page in pages:
+            continue
+        pages.append(page)
+        count += 1
+        if count >= limit:
+            break
+    return selected
+
+
+def _place_stored_cards() -> None:
+    """Fill ``SetSyncCard`` from pages stored before it existed (runs once)."""
+
+    with session_scope() as session:
+        if session.exec(select(models.SetSyncCard.remote_id).limit(1)).first() is not None:
+            return
+        for code, page, remote_ids in session.exec(
+            select(models.SetSyncPage.set_code, models.SetSyncPage.page, models.SetSyncPage.remote_ids)
+        ).all():
+            _place_cards(session, code, page, list(remote_ids or []))
+
+
+def refresh_stale_cards(limit: int = REFRESH_PAGES_PER_RUN) -> RunSummary:
+    """Re-fetch the pages of the cards not confirmed for ``REFRESH_AFTER``."""
+
+    summary = _start("refresh")
+    now = _utcnow()
+    _place_stored_cards()
+    with read_session() as session:
+        selected = stale_pages(session, limit=limit, now=now)
+        walks = [_load_walk(session, code, now, only=sorted(pages)) for code, pages in selected.items()]
+    if walks:
+        _run_walks("catalog_refresh", walks, summary)
+    return _finish(summary)
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+
+def status(*, now: Optional[dt.datetime] = None) -> dict[str, Any]:
+    """Set progress, stale cards, quota use and the latest runs."""
+
+    cutoff = (now or _utcnow()) - REFRESH_AFTER
+    record = models.CardRecord
+    with read_session() as session:
+        sets = dict(
+            session.exec(
+                select(models.SetInfo.sync_status, func.count(models.SetInfo.id))
+                .group_by(models.SetInfo.sync_status)
+            ).all()
+        )
+        cards = session.exec(select(func.count(record.id))).one()
+        stale = session.exec(
+            select(func.count(record.id)).where(
+                or_(record.last_synced.is_(None), record.last_synced < cutoff)
+            )
+        ).one()
+        pages = session.exec(select(func.count(models.SetSyncPage.id))).one()
+    with _runs_lock:
+        runs = {job: summary.as_dict() for job, summary in _last_runs.items()}
+    return {
+        "sets": sets,
+        "cards": {"total": cards, "stale": stale},
+        "pages": pages,
+        "quota": budget.usage(),
+        "runs": runs,
+    }
+
+
+__all__ = [
+    "BudgetExhausted",
+    "BudgetedSession",
+    "DailyBudget",
+    "RunSummary",
+    "SetWalk",
+    "WalkResult",
+    "budget",
+    "discover_sets",
+    "fetch_walk",
+    "refresh_stale_cards",
+    "save_walk",
+    "stale_pages",
+    "status",
+    "sync_sets",
+]
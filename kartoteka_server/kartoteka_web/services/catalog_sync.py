@@ -9,11 +9,12 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable, Sequence
 
+from sqlalchemy import String, tuple_
 from sqlmodel import Session, select
 
 from .. import models
 from ..utils import sets as set_utils, text
-from . import tcg_api
+from . import crud, set_catalog, tcg_api
 
 logger = logging.getLogger(__name__)
 
@@ -66,22 +67,47 @@ def _normalize_price(value: object) -> float | None:
     return None
 
 
-def upsert_card_record(
-    session: Session,
-    payload: dict[str, object],
-    *,
-    timestamp: dt.datetime | None = None,
-) -> tuple[models.CardRecord | None, bool, bool]:
-    """Insert or update a :class:`CardRecord` from a RapidAPI payload."""
+def _python_type(column) -> type | None:
+    if isinstance(getattr(column.type, "impl", column.type), String):
+        return str  # SQLModel's AutoString decorator does not report one
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+
+# Python type of each ``CardRecord`` column, for coercing payload values
+_COLUMN_TYPES = {column.name: _python_type(column) for column in models.CardRecord.__table__.columns}
+
+
+def _column_value(field: str, value: object) -> object:
+    """``value`` as the ``field`` column stores it, so it compares equal to a row read back."""
+
+    python_type = _COLUMN_TYPES.get(field)
+    if value is None or python_type is None or isinstance(value, python_type):
+        return value
+    if python_type is str:
+        return value.isoformat() if isinstance(value, dt.date) else str(value)
+    if python_type is float:
+        return _normalize_price(value)
+    if python_type is int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return value
+
+
+def _card_record_values(payload: dict[str, object]) -> dict[str, object] | None:
+    """Column values of a :class:`CardRecord` built from a RapidAPI payload."""
 
     name = str(payload.get("name") or "").strip()
     number = str(payload.get("number") or "").strip()
     set_name = str(payload.get("set_name") or "").strip()
 
     if not (name and number and set_name):
-        return None, False, False
+        return None
 
-    now = timestamp or dt.datetime.now(dt.timezone.utc)
     number_display = str(payload.get("number_display") or number).strip() or number
     total_value_raw = payload.get("total")
     total_value = (
@@ -93,18 +119,11 @@ def upsert_card_record(
     set_code = str(set_code_value).strip() if set_code_value else None
     set_code_clean = set_utils.clean_code(set_code)
 
-    stmt = select(models.CardRecord).where(
-        (models.CardRecord.name == name)
-        & (models.CardRecord.number == number)
-        & (models.CardRecord.set_name == set_name)
-    )
-    record = session.exec(stmt).first()
-
     # Extract remote_id from payload
     remote_id_value = payload.get("id")
     remote_id = str(remote_id_value).strip() if remote_id_value else None
     
-    base_kwargs = {
+    values = {
         "remote_id": remote_id,
         "name": name,
         "name_normalized": text.normalize(name, keep_spaces=True),
@@ -125,6 +144,44 @@ def upsert_card_record(
         "price": _normalize_price(payload.get("price")),
         "price_7d_average": _normalize_price(payload.get("price_7d_average")),
     }
+    return {field: _column_value(field, value) for field, value in values.items()}
+
+
+_IDENTITY = ("name", "number", "set_name")
+_CARD_FIELDS = (
+    "remote_id", "name", "name_normalized", "number", "number_display", "total",
+    "set_name", "set_name_normalized", "set_code", "set_code_clean", "rarity",
+    "artist", "series", "release_date", "image_small", "image_large", "set_icon",
+    "price", "price_7d_average",
+)
+# Fields that place a card in the /collections/sets/list counts
+_SET_FIELDS = ("set_code", "release_date")
+
+
+def upsert_card_record(
+    session: Session,
+    payload: dict[str, object],
+    *,
+    timestamp: dt.datetime | None = None,
+) -> tuple[models.CardRecord | None, bool, bool]:
+    """Insert or update a :class:`CardRecord` from a RapidAPI payload.
+
+    The full-text search index (:mod:`.card_search`) follows the row through
+    triggers on ``cardrecord``, so no extra bookkeeping is needed here. Use
+    :func:`upsert_card_records` for batches.
+    """
+
+    base_kwargs = _card_record_values(payload)
+    if base_kwargs is None:
+        return None, False, False
+
+    now = timestamp or dt.datetime.now(dt.timezone.utc)
+    stmt = select(models.CardRecord).where(
+        (models.CardRecord.name == base_kwargs["name"])
+        & (models.CardRecord.number == base_kwargs["number"])
+        & (models.CardRecord.set_name == base_kwargs["set_name"])
+    )
+    record = session.exec(stmt).first()
 
     if record is None:
         record = models.CardRecord(
@@ -133,11 +190,14 @@ def upsert_card_record(
             **base_kwargs,
         )
         session.add(record)
+        set_catalog.note_added(session, [base_kwargs])
         return record, True, False
 
     updated = False
     for field, value in base_kwargs.items():
         if getattr(record, field) != value:
+            if field in _SET_FIELDS:
+                set_catalog.note_moved(session)
             setattr(record, field, value)
             updated = True
 
@@ -146,6 +206,73 @@ def upsert_card_record(
     return record, False, updated
 
 
+def upsert_card_records(
+    session: Session,
+    payloads: Iterable[dict[str, object]],
+    *,
+    timestamp: dt.datetime | None = None,
+) -> tuple[int, int]:
+    """Bulk version of :func:`upsert_card_record`; returns ``(added, updated)``.
+
+    Existing rows for the whole batch are loaded by identity (name, number,
+    set name) and diffed in memory; new and changed rows are written with
+    ``INSERT … ON CONFLICT DO UPDATE``. Unchanged rows are not touched.
+    """
+
+    now = timestamp or dt.datetime.now(dt.timezone.utc)
+    incoming: dict[tuple[object, ...], dict[str, object]] = {}
+    for payload in payloads:
+        values = _card_record_values(payload)
+        if values is not None:
+            # Later payloads for the same card win, as with one-by-one upserts
+            incoming[tuple(values[field] for field in _IDENTITY)] = values
+    if not incoming:
+        return 0, 0
+
+    # Pending ORM changes must reach the table before it is read and upserted
+    session.flush()
+    columns = [getattr(models.CardRecord, field) for field in _CARD_FIELDS]
+    identity = tuple_(*(getattr(models.CardRecord, field) for field in _IDENTITY))
+    existing: dict[tuple[object, ...], tuple[object, ...]] = {}
+    keys = list(incoming)
+    for start in range(0, len(keys), crud.BULK_CHUNK_SIZE):
+        rows = session.exec(
+            select(*columns).where(identity.in_(keys[start:start + crud.BULK_CHUNK_SIZE]))
+        ).all()
+        for row in rows:
+            values = dict(zip(_CARD_FIELDS, row))
+            existing[tuple(values[field] for field in _IDENTITY)] = tuple(row)
+
+    added = updated = 0
+    writes: list[dict[str, object]] = []
+    new_rows: list[dict[str, object]] = []
+    set_positions = [_CARD_FIELDS.index(field) for field in _SET_FIELDS]
+    for key, values in incoming.items():
+        current = existing.get(key)
+        if current is None:
+            added += 1
+            new_rows.append(values)
+        elif current != tuple(values[field] for field in _CARD_FIELDS):
+            updated += 1
+            if any(current[position] != values[_CARD_FIELDS[position]] for position in set_positions):
+                set_catalog.note_moved(session)
+        else:
+            continue
+        # Built through the model so new rows get the column defaults
+        record = models.CardRecord(created_at=now, updated_at=now, **values)
+        writes.append(record.model_dump(exclude={"id"}))
+
+    crud.bulk_upsert(
+        session,
+        models.CardRecord,
+        writes,
+        conflict_columns=_IDENTITY,
+        update_columns=(*(field for field in _CARD_FIELDS if field not in _IDENTITY), "updated_at"),
+    )
+    set_catalog.note_added(session, new_rows)
+    return added, updated
+
+
 def sync_set(
     session: Session,
     set_code: str,
@@ -164,14 +291,7 @@ def sync_set(
         rapidapi_host=rapidapi_host,
     )
 
-    added = updated = 0
-    now = dt.datetime.now(dt.timezone.utc)
-    for payload in cards:
-        _, created, changed = upsert_card_record(session, payload, timestamp=now)
-        if created:
-            added += 1
-        elif changed:
-            updated += 1
+    added, updated = upsert_card_records(session, cards)
     return added, updated, request_count
 
 
@@ -215,4 +335,5 @@ __all__ = [
     "sync_set",
     "sync_sets",
     "upsert_card_record",
+    "upsert_card_records",
 ]
@@ -0,0 +1,479 @@
+"""Per-user daily collection value rollup.
+
+``CollectionValueDaily`` stores the value of each user's cards for every
+day of the history window. :func:`roll_forward_all` seeds the rows of every
+user holding cards and rolls the window forward; the scheduler runs it at
+startup and hourly. Stored rows are then kept current with per-day deltas,
+written in the writer's transaction and only for the days whose value
+changed:
+
+* a collection entry inserted, edited or deleted adds or removes the
+  card's per-day value (mapper events on ``CollectionEntry``);
+* a ``Card.price`` change, e.g. from the price fill queue, shifts the days
+  its holders value at that fallback price (mapper event on ``Card``);
+* price history written inside :func:`track_price_history` shifts the days
+  from the first changed price onwards.
+
+Users without stored rows get no deltas; :func:`read_series` never writes
+and computes days not stored yet in memory. Sealed products have no price
+history, so their value is added at read time.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+from sqlalchemy import delete, event, exists, func, insert, inspect, tuple_, update
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select
+
+from .. import models
+from ..database import session_scope
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DAYS = 365
+
+# Max identities per ``IN`` clause when mapping cards to catalogue records
+_IDENTITY_CHUNK = 300
+
+
+
+def history_window(days: int = HISTORY_DAYS, today: dt.date | None = None) -> tuple[dt.date, dt.date]:
+    end = today or dt.date.today()
+    return end - dt.timedelta(days=days), end
+
+
+def _days(date_from: dt.date, date_to: dt.date) -> list[dt.date]:
+    return [date_from + dt.timedelta(days=x) for x in range((date_to - date_from).days + 1)]
+
+
+def card_record_ids(session: Session, cards: Iterable[models.Card]) -> dict[int, int]:
+    """Map ``Card.id`` to the matching ``CardRecord.id`` (same name/set/number)."""
+
+    by_identity: dict[tuple[str, str, str], list[int]] = defaultdict(list)
+    for card in cards:
+        if card.id is not None:
+            by_identity[(card.name, card.set_name, card.number)].append(card.id)
+    identities = list(by_identity)
+    mapping: dict[int, int] = {}
+    for start in range(0, len(identities), _IDENTITY_CHUNK):
+        chunk = identities[start:start + _IDENTITY_CHUNK]
+        rows = session.exec(
+            select(
+                models.CardRecord.id,
+                models.CardRecord.name,
+                models.CardRecord.set_name,
+                models.CardRecord.number,
+            ).where(
+                tuple_(
+                    models.CardRecord.name,
+                    models.CardRecord.set_name,
+                    models.CardRecord.number,
+                ).in_(chunk)
+            )
+        ).all()
+        for record_id, name, set_name, number in rows:
+            for card_id in by_identity.get((name, set_name, number), []):
+                mapping.setdefault(card_id, record_id)
+    return mapping
+
+
+def build_series(
+    session: Session,
+    user_id: int,
+    date_from: dt.date,
+    date_to: dt.date,
+) -> dict[dt.date, float]:
+    """Compute the user's daily card value from scratch for ``[date_from, date_to]``.
+
+    Runs in O(cards + price points + days): quantities are aggregated per
+    catalogue record so each price change is applied with one dict lookup.
+    """
+
+    entries = session.exec(
+        select(models.CollectionEntry.card_id, models.CollectionEntry.quantity, models.Card)
+        .join(models.Card, models.Card.id == models.CollectionEntry.card_id)
+        .where(
+            models.CollectionEntry.user_id == user_id,
+            models.CollectionEntry.quantity > 0,
+        )
+    ).all()
+    days = _days(date_from, date_to)
+    if not entries:
+        return {day: 0.0 for day in days}
+
+    cards = {card.id: card for _, _, card in entries}
+    card_to_record = card_record_ids(session, cards.values())
+
+    # Inverse index: record -> held quantity and fallback price. Cards with
+    # no catalogue record have no history and keep their stored price.
+    record_qty: dict[int, int] = defaultdict(int)
+    fallback: dict[int, float] = {}
+    unmatched = 0.0
+    for card_id, quantity, card in entries:
+        record_id = card_to_record.get(card_id)
+        if record_id is None:
+            unmatched += (card.price or 0.0) * (quantity or 0)
+            continue
+        record_qty[record_id] += quantity or 0
+        fallback.setdefault(record_id, card.price or 0.0)
+    if not record_qty:
+        return {day: unmatched for day in days}
+
+    prices = dict(fallback)
+    changes: dict[dt.date, list[tuple[int, float]]] = defaultdict(list)
+    history = session.exec(
+        select(models.PriceHistory.card_record_id, models.PriceHistory.date, models.PriceHistory.price)
+        .where(
+            models.PriceHistory.card_record_id.in_(list(record_qty)),
+            models.PriceHistory.date <= date_to,
+        )
+        .order_by(models.PriceHistory.date)
+    ).all()
+    for record_id, day, price in history:
+        if day <= date_from:
+            prices[record_id] = price or 0.0
+        else:
+            changes[day].append((record_id, price or 0.0))
+
+    total = unmatched + sum(prices[record_id] * qty for record_id, qty in record_qty.items())
+    series: dict[dt.date, float] = {}
+    for day in days:
+        for record_id, price in changes.get(day, ()):
+            total += (price - prices[record_id]) * record_qty[record_id]
+            prices[record_id] = price
+        series[day] = total
+    return series
+
+
+def rebuild_series(session: Session, user_id: int, today: dt.date | None = None) -> int:
+    """Replace the user's stored rows with a fresh :func:`build_series` of the window.
+
+    Returns the number of rows written; the caller commits.
+    """
+
+    date_from, date_to = history_window(today=today)
+    table = models.CollectionValueDaily
+    session.execute(delete(table).where(table.user_id == user_id))
+    series = build_series(session, user_id, date_from, date_to)
+    session.execute(
+        insert(table),
+        [{"user_id": user_id, "date": day, "cards_value": value} for day, value in series.items()],
+    )
+    return len(series)
+
+
+def roll_forward(session: Session, user_id: int, today: dt.date | None = None) -> int:
+    """Drop the user's rows that left the window and store the days added since.
+
+    Returns the number of rows written; the caller commits.
+    """
+
+    date_from, date_to = history_window(today=today)
+    table = models.CollectionValueDaily
+    session.execute(delete(table).where(table.user_id == user_id, table.date < date_from))
+    last = session.exec(select(func.max(table.date)).where(table.user_id == user_id)).one()
+    start = date_from if last is None else last + dt.timedelta(days=1)
+    if start > date_to:
+        return 0
+    series = build_series(session, user_id, start, date_to)
+    session.execute(
+        insert(table),
+        [{"user_id": user_id, "date": day, "cards_value": value} for day, value in series.items()],
+    )
+    return len(series)
+
+
+def roll_forward_all(today: dt.date | None = None) -> int:
+    """Seed and roll forward the series of every user holding cards; returns rows written.
+
+    Users without stored rows get their full window, so this also seeds
+    users created (or holding cards) before the rollup existed.
+    """
+
+    with session_scope() as session:
+        user_ids = set(session.exec(select(models.CollectionEntry.user_id).distinct()).all())
+        user_ids.update(session.exec(select(models.CollectionValueDaily.user_id).distinct()).all())
+        return sum(roll_forward(session, user_id, today) for user_id in sorted(user_ids))
+
+
+def read_series(
+    session: Session,
+    user_id: int,
+    days: int = HISTORY_DAYS,
+    today: dt.date | None = None,
+) -> list[tuple[dt.date, float]]:
+    """Return the ``(date, cards_value)`` series for the window.
+
+    Read only: days the rollup does not hold yet (before the first rebuild,
+    or elapsed since the last roll-forward) are computed in memory.
+    """
+
+    date_from, date_to = history_window(days, today)
+    table = models.CollectionValueDaily
+    stored = dict(
+        session.exec(
+            select(table.date, table.cards_value).where(
+                table.user_id == user_id,
+                table.date >= date_from,
+                table.date <= date_to,
+            )
+        ).all()
+    )
+    missing = [day for day in _days(date_from, date_to) if day not in stored]
+    if missing:
+        computed = build_series(session, user_id, missing[0], missing[-1])
+        stored.update((day, computed[day]) for day in missing)
+    return sorted(stored.items())
+
+
+# ---------------------------------------------------------------------------
+# Incremental deltas
+# ---------------------------------------------------------------------------
+
+
+def _history_prices(
+    connection: Connection,
+    record_id: int,
+    date_from: dt.date,
+    date_to: dt.date,
+) -> list[float | None]:
+    """Price of a record on each day of ``[date_from, date_to]``; ``None`` before its history.
+
+    Reads the window and the last point before it, not the whole history.
+    """
+
+    table = models.PriceHistory.__table__
+    price = connection.execute(
+        select(table.c.price)
+        .where(table.c.card_record_id == record_id, table.c.date <= date_from)
+        .order_by(table.c.date.desc())
+        .limit(1)
+    ).scalar()
+    changes = dict(
+        connection.execute(
+            select(table.c.date, table.c.price).where(
+                table.c.card_record_id == record_id,
+                table.c.date > date_from,
+                table.c.date <= date_to,
+            )
+        ).all()
+    )
+    prices: list[float | None] = []
+    for day in _days(date_from, date_to):
+        if day in changes:
+            price = changes[day]
+        prices.append(None if price is None else price or 0.0)
+    return prices
+
+
+def _record_id(connection: Connection, name: str, set_name: str, number: str) -> int | None:
+    table = models.CardRecord.__table__
+    return connection.execute(
+        select(func.min(table.c.id)).where(
+            table.c.name == name, table.c.set_name == set_name, table.c.number == number
+        )
+    ).scalar()
+
+
+def _card_prices(
+    connection: Connection,
+    card_id: int,
+    date_from: dt.date,
+    date_to: dt.date,
+    fallback: float | None = None,
+    use_fallback: bool = False,
+) -> list[float]:
+    """Per-day price :func:`build_series` values one copy of the card at.
+
+    ``fallback`` replaces the stored ``Card.price`` when ``use_fallback`` is set.
+    """
+
+    table = models.Card.__table__
+    row = connection.execute(
+        select(table.c.name, table.c.set_name, table.c.number, table.c.price).where(table.c.id == card_id)
+    ).first()
+    if row is None:
+        return [0.0] * len(_days(date_from, date_to))
+    price = (fallback if use_fallback else row.price) or 0.0
+    record_id = _record_id(connection, row.name, row.set_name, row.number)
+    if record_id is None:
+        return [price] * len(_days(date_from, date_to))
+    return [price if day is None else day for day in _history_prices(connection, record_id, date_from, date_to)]
+
+
+def _has_rows(connection: Connection, user_id: int) -> bool:
+    table = models.CollectionValueDaily.__table__
+    return bool(connection.execute(select(exists().where(table.c.user_id == user_id))).scalar())
+
+
+def _add_deltas(connection: Connection, user_id: int, date_from: dt.date, deltas: list[float]) -> None:
+    """Add ``deltas[i]`` to the user's row for ``date_from + i`` days.
+
+    Runs of equal deltas are written as one range ``UPDATE``; zero runs are
+    skipped.
+    """
+
+    table = models.CollectionValueDaily.__table__
+    start = 0
+    for index in range(1, len(deltas) + 1):
+        if index < len(deltas) and deltas[index] == deltas[start]:
+            continue
+        if deltas[start]:
+            connection.execute(
+                update(table)
+                .where(
+                    table.c.user_id == user_id,
+                    table.c.date >= date_from + dt.timedelta(days=start),
+                    table.c.date <= date_from + dt.timedelta(days=index - 1),
+                )
+                .values(cards_value=table.c.cards_value + deltas[start])
+            )
+        start = index
+
+
+def _apply_entry(connection: Connection, user_id: int | None, card_id: int | None, quantity: int | None, sign: int) -> None:
+    if user_id is None or card_id is None or not quantity or quantity < 0:
+        return
+    if not _has_rows(connection, user_id):
+        return
+    date_from, date_to = history_window()
+    prices = _card_prices(connection, card_id, date_from, date_to)
+    _add_deltas(connection, user_id, date_from, [sign * quantity * price for price in prices])
+
+
+def _stored_entry(connection: Connection, entry_id: int | None) -> tuple | None:
+    # The entry's row as last written; attributes may be expired or
+    # overwritten without their old value being loaded
+    if entry_id is None:
+        return None
+    table = models.CollectionEntry.__table__
+    return connection.execute(
+        select(table.c.user_id, table.c.card_id, table.c.quantity).where(table.c.id == entry_id)
+    ).first()
+
+
+def _holdings(connection: Connection, card_ids: Iterable[int]) -> dict[int, dict[int, int]]:
+    """``{user_id: {card_id: quantity}}`` for users holding any of the cards."""
+
+    table = models.CollectionEntry.__table__
+    holdings: dict[int, dict[int, int]] = defaultdict(dict)
+    for user_id, card_id, quantity in connection.execute(
+        select(table.c.user_id, table.c.card_id, func.sum(table.c.quantity))
+        .where(table.c.card_id.in_(list(card_ids)), table.c.quantity > 0)
+        .group_by(table.c.user_id, table.c.card_id)
+    ).all():
+        holdings[user_id][card_id] = int(quantity or 0)
+    return holdings
+
+
+@event.listens_for(models.CollectionEntry, "after_insert")
+def _entry_inserted(mapper, connection: Connection, target: models.CollectionEntry) -> None:
+    _apply_entry(connection, target.user_id, target.card_id, target.quantity, 1)
+
+
+@event.listens_for(models.CollectionEntry, "before_delete")
+def _entry_deleted(mapper, connection: Connection, target: models.CollectionEntry) -> None:
+    stored = _stored_entry(connection, target.id)
+    if stored is not None:
+        _apply_entry(connection, *stored, -1)
+
+
+@event.listens_for(models.CollectionEntry, "before_update")
+def _entry_updated(mapper, connection: Connection, target: models.CollectionEntry) -> None:
+    attrs = inspect(target).attrs
+    if not any(attrs[key].history.has_changes() for key in ("user_id", "card_id", "quantity")):
+        return
+    stored = _stored_entry(connection, target.id)
+    if stored is None or tuple(stored) == (target.user_id, target.card_id, target.quantity):
+        return
+    _apply_entry(connection, *stored, -1)
+    _apply_entry(connection, target.user_id, target.card_id, target.quantity, 1)
+
+
+@event.listens_for(models.Card, "before_update")
+def _card_price_updated(mapper, connection: Connection, target: models.Card) -> None:
+    # Card.price is the fallback before the record's first history point,
+    # and the only price of cards without a catalogue record
+    if target.id is None or not inspect(target).attrs.price.history.has_changes():
+        return
+    table = models.Card.__table__
+    stored = connection.execute(select(table.c.price).where(table.c.id == target.id)).scalar()
+    if stored == target.price:
+        return
+    holdings = _holdings(connection, [target.id])
+    if not holdings:
+        return
+    date_from, date_to = history_window()
+    old = _card_prices(connection, target.id, date_from, date_to, stored, use_fallback=True)
+    new = _card_prices(connection, target.id, date_from, date_to, target.price, use_fallback=True)
+    diff = [after - before for before, after in zip(old, new)]
+    for user_id, cards in holdings.items():
+        if _has_rows(connection, user_id):
+            _add_deltas(connection, user_id, date_from, [cards[target.id] * value for value in diff])
+
+
+@contextmanager
+def track_price_history(session: Session, record_id: int) -> Iterator[None]:
+    """Apply the holders' deltas for price history written inside the block.
+
+    Usage::
+
+        with collection_value.track_price_history(session, record_id):
+            ...insert/update PriceHistory rows for record_id...
+
+    Only the history window (and the point before it) is read, before and
+    after the block; days before the first changed price get no update.
+    """
+
+    connection = session.connection()
+    record = session.get(models.CardRecord, record_id)
+    card_id = None
+    if record is not None:
+        card_id = connection.execute(
+            select(models.Card.__table__.c.id).where(
+                models.Card.__table__.c.name == record.name,
+                models.Card.__table__.c.set_name == record.set_name,
+                models.Card.__table__.c.number == record.number,
+            )
+        ).scalar()
+    holdings = _holdings(connection, [card_id]) if card_id is not None else {}
+    holders = [user_id for user_id in holdings if _has_rows(connection, user_id)]
+    if not holders:
+        yield
+        return
+    date_from, date_to = history_window()
+    before = _history_prices(connection, record_id, date_from, date_to)
+    yield
+    session.flush()
+    after = _history_prices(session.connection(), record_id, date_from, date_to)
+    if after == before:
+        return
+    fallback = connection.execute(
+        select(models.Card.__table__.c.price).where(models.Card.__table__.c.id == card_id)
+    ).scalar() or 0.0
+    diff = [
+        (fallback if new is None else new) - (fallback if old is None else old)
+        for old, new in zip(before, after)
+    ]
+    for user_id in holders:
+        quantity = holdings[user_id][card_id]
+        _add_deltas(session.connection(), user_id, date_from, [quantity * value for value in diff])
+
+
+__all__ = [
+    "HISTORY_DAYS",
+    "build_series",
+    "card_record_ids",
+    "history_window",
+    "read_series",
+    "rebuild_series",
+    "roll_forward",
+    "roll_forward_all",
+    "track_price_history",
+]
@@ -3,11 +3,68 @@
 from __future__ import annotations
 
 import datetime as dt
-from typing import Sequence
+from typing import Any, Iterable, Sequence
 
-from sqlmodel import Session, select
+from sqlalchemy import and_, update
+from sqlmodel import Session, SQLModel, select
 
 from .. import models
+from . import collection_value
+
+# Rows per executemany batch of a bulk upsert
+BULK_CHUNK_SIZE = 500
+
+
+def _chunks(rows: Sequence[Any], size: int) -> Iterable[Sequence[Any]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def bulk_upsert(
+    session: Session,
+    model: type[SQLModel],
+    rows: Sequence[dict[str, Any]],
+    *,
+    conflict_columns: Sequence[str],
+    update_columns: Sequence[str],
+    chunk_size: int = BULK_CHUNK_SIZE,
+) -> None:
+    """Write ``rows`` with ``INSERT … ON CONFLICT DO UPDATE`` in chunks.
+
+    ``conflict_columns`` must match a unique constraint of the table. All
+    rows need the same keys. Dialects without ``ON CONFLICT`` fall back to
+    an UPDATE per row followed by an INSERT of the rows it did not match.
+    """
+
+    if not rows:
+        return
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        insert = None
+
+    if insert is not None:
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[column] for column in conflict_columns],
+            set_={column: stmt.excluded[column] for column in update_columns},
+        )
+        for chunk in _chunks(rows, chunk_size):
+            session.execute(stmt, list(chunk))
+        return
+
+    for row in rows:
+        result = session.execute(
+            update(table)
+            .where(and_(*(table.c[column] == row[column] for column in conflict_columns)))
+            .values({column: row[column] for column in update_columns})
+        )
+        if not result.rowcount:
+            session.execute(table.insert().values(row))
 
 
 def upsert_price_history(
@@ -19,13 +76,15 @@ def upsert_price_history(
 ) -> tuple[int, int]:
     """
     Insert or update price history records for a card.
+
+    Existing points for the batch are loaded with one query and diffed in
+    memory; only new or changed points are written, in bulk.
     
     Returns a tuple of (added, updated) counts.
     """
     now = timestamp or dt.datetime.now(dt.timezone.utc)
-    added = 0
-    updated = 0
 
+    incoming: dict[dt.date, tuple[object, str]] = {}
     for entry in price_history:
         date_str = entry.get("date")
         price = entry.get("price")
@@ -39,31 +98,58 @@ def upsert_price_history(
         except (ValueError, TypeError):
             continue
 
-        stmt = select(models.PriceHistory).where(
-            models.PriceHistory.card_record_id == card_record_id,
-            models.PriceHistory.date == date,
-        )
-        record = session.exec(stmt).first()
+        # Later points for the same day win, as with one-by-one upserts
+        incoming[date] = (price, str(currency))
 
-        if record:
-            # Update existing record if price or currency changed
-            if record.price != price or record.currency != currency:
-                record.price = price
-                record.currency = str(currency)
-                record.updated_at = now
-                session.add(record)
-                updated += 1
-        else:
-            # Create new record
-            record = models.PriceHistory(
-                card_record_id=card_record_id,
-                date=date,
-                price=price,
-                currency=str(currency),
-                created_at=now,
-                updated_at=now,
+    if not incoming:
+        return 0, 0
+
+    existing: dict[dt.date, tuple[float, str]] = {}
+    for dates in _chunks(sorted(incoming), BULK_CHUNK_SIZE):
+        rows = session.exec(
+            select(models.PriceHistory.date, models.PriceHistory.price, models.PriceHistory.currency)
+            .where(
+                models.PriceHistory.card_record_id == card_record_id,
+                models.PriceHistory.date.in_(dates),
             )
-            session.add(record)
+        ).all()
+        existing.update({date: (price, currency) for date, price, currency in rows})
+
+    added = 0
+    updated = 0
+    writes: list[dict[str, Any]] = []
+    for date, (price, currency) in incoming.items():
+        current = existing.get(date)
+        if current is None:
             added += 1
-            
+        elif current != (price, currency):
+            # Update existing record if price or currency changed
+            updated += 1
+        else:
+            continue
+        writes.append(
+            {
+                "card_record_id": card_record_id,
+                "product_record_id": None,
+                "date": date,
+                "price": price,
+                "currency": currency,
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+
+    if not writes:
+        return added, updated
+
+    # Keeps the per-user daily collection value rollup in step with the history
+    with collection_value.track_price_history(session, card_record_id):
+        bulk_upsert(
+            session,
+            models.PriceHistory,
+            writes,
+            conflict_columns=("card_record_id", "date"),
+            update_columns=("price", "currency", "updated_at"),
+        )
+
     return added, updated
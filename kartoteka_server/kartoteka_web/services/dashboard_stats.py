@@ -0,0 +1,218 @@
+"""Snapshot of the collector dashboard statistics.
+
+The aggregates behind ``GET /users/stats/dashboard`` (row counts, average
+card price, most collected and most valuable cards) are computed by
+:func:`refresh` into the single ``DashboardStats`` row, so the endpoint is
+one primary-key read. The scheduler refreshes the row periodically; commits
+that add or remove users, collections, collection entries or catalogue
+records request an early refresh through :func:`changed`.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from sqlalchemy import desc, event, func
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from .. import models
+from ..database import session_scope
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ID = 1
+TOP_CARDS = 5
+
+# Models whose inserts/deletes change the snapshot
+_TRACKED = (
+    models.User,
+    models.Collection,
+    models.CollectionEntry,
+    models.CardRecord,
+    models.ProductRecord,
+)
+_SESSION_KEY = "dashboard_stats_changed"
+
+_lock = threading.Lock()
+_metrics: dict[str, Any] = {"refreshes": 0, "last_refresh_ms": None, "refreshed_at": None}
+_on_change: Optional[Callable[[], None]] = None
+
+
+def compute(session: Session) -> dict[str, Any]:
+    """Run the dashboard aggregations."""
+
+    total_users = session.exec(select(func.count(models.User.id))).one()
+    total_collections = session.exec(select(func.count(models.Collection.id))).one()
+    total_cards = session.exec(select(func.count(models.CardRecord.id))).one()
+    total_products = session.exec(select(func.count(models.ProductRecord.id))).one()
+
+    avg_price_result = session.exec(
+        select(func.avg(models.CardRecord.price))
+        .where(models.CardRecord.price.is_not(None))
+    ).first()
+    average_card_price = float(avg_price_result) if avg_price_result else 0.0
+
+    # Most added cards (from collections); the first one is the most popular
+    top_cards_rows = session.exec(
+        select(
+            models.Card.name,
+            models.Card.set_code,
+            models.Card.number,
+            models.Card.price,
+            models.Card.image_small,
+            func.count(models.CollectionEntry.id).label("count"),
+        )
+        .join(models.CollectionEntry)
+        .group_by(models.Card.id)
+        .order_by(desc("count"))
+        .limit(TOP_CARDS)
+    ).all()
+    top_cards = [
+        {
+            "name": name,
+            "set_code": set_code,
+            "number": number,
+            "price": price or 0.0,
+            "image": image,
+            "count": count,
+        }
+        for name, set_code, number, price, image, count in top_cards_rows
+    ] or None
+    popular_card = None
+    if top_cards:
+        first = top_cards[0]
+        popular_card = {key: first[key] for key in ("name", "set_code", "number", "count")}
+
+    expensive_card = session.exec(
+        select(models.Card)
+        .where(models.Card.price.is_not(None))
+        .order_by(desc(models.Card.price))
+        .limit(1)
+    ).first()
+    expensive_card_data = None
+    if expensive_card:
+        expensive_card_data = {
+            "name": expensive_card.name,
+            "set_code": expensive_card.set_code,
+            "number": expensive_card.number,
+            "price": expensive_card.price,
+            "image": expensive_card.image_small,
+        }
+
+    last_sync = session.exec(select(func.max(models.CardRecord.updated_at))).first()
+
+    return {
+        "total_users": total_users,
+        "total_collections": total_collections,
+        "total_cards": total_cards,
+        "total_products": total_products,
+        "average_card_price": average_card_price,
+        "last_sync": last_sync or None,
+        "most_popular_card": popular_card,
+        "most_valuable_card": expensive_card_data,
+        "top_cards": top_cards,
+    }
+
+
+def refresh() -> models.DashboardStats:
+    """Recompute the snapshot row and record how long it took."""
+
+    started = time.perf_counter()
+    with session_scope() as session:
+        values = compute(session)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        snapshot = session.get(models.DashboardStats, SNAPSHOT_ID)
+        if snapshot is None:
+            snapshot = models.DashboardStats(id=SNAPSHOT_ID)
+        for key, value in values.items():
+            setattr(snapshot, key, value)
+        snapshot.refresh_ms = elapsed_ms
+        snapshot.refreshed_at = dt.datetime.now(dt.timezone.utc)
+        session.add(snapshot)
+        session.flush()
+        session.expunge(snapshot)
+    with _lock:
+        _metrics["refreshes"] += 1
+        _metrics["last_refresh_ms"] = elapsed_ms
+        _metrics["refreshed_at"] = snapshot.refreshed_at.isoformat()
+    return snapshot
+
+
+def read(session: Session) -> dict[str, Any]:
+    """Snapshot values with ``updated_at``; computed in place if none is stored yet."""
+
+    snapshot = session.get(models.DashboardStats, SNAPSHOT_ID)
+    if snapshot is None:
+        return {**compute(session), "updated_at": None}
+    return {
+        "total_users": snapshot.total_users,
+        "total_collections": snapshot.total_collections,
+        "total_cards": snapshot.total_cards,
+        "total_products": snapshot.total_products,
+        "average_card_price": snapshot.average_card_price,
+        "last_sync": snapshot.last_sync,
+        "most_popular_card": snapshot.most_popular_card,
+        "most_valuable_card": snapshot.most_valuable_card,
+        "top_cards": snapshot.top_cards,
+        "updated_at": snapshot.refreshed_at,
+    }
+
+
+def metrics() -> dict[str, Any]:
+    """Refresh count and cost of the last refresh, for the scheduler status."""
+
+    with _lock:
+        return dict(_metrics)
+
+
+def on_change(callback: Optional[Callable[[], None]]) -> None:
+    """Register the callback run after commits that change the snapshot."""
+
+    global _on_change
+    _on_change = callback
+
+
+def changed() -> None:
+    """Ask for an early refresh (e.g. after a bulk write the ORM does not see)."""
+
+    callback = _on_change
+    if callback is None:
+        return
+    try:
+        callback()
+    except Exception as exc:  # pragma: no cover - scheduler shutting down
+        logger.warning("Dashboard stats refresh request failed: %s", exc)
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _note_changes(session: OrmSession, flush_context) -> None:
+    if session.info.get(_SESSION_KEY):
+        return
+    if any(isinstance(obj, _TRACKED) for obj in (*session.new, *session.deleted)):
+        session.info[_SESSION_KEY] = True
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _request_on_commit(session: OrmSession) -> None:
+    if session.info.pop(_SESSION_KEY, False):
+        changed()
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_on_rollback(session: OrmSession) -> None:
+    session.info.pop(_SESSION_KEY, None)
+
+
+__all__ = [
+    "changed",
+    "compute",
+    "metrics",
+    "on_change",
+    "read",
+    "refresh",
+]
@@ -0,0 +1,286 @@
+"""Streaming CSV / NDJSON export of collections and set print data.
+
+Rows are read as plain column tuples (no ORM objects in the identity map)
+and encoded a chunk at a time, so an export's memory does not grow with the
+number of rows:
+
+* collection entries come straight from one ``yield_per`` query ordered by
+  id;
+* album and set print data keep their album order (numeric part of the card
+  number), which SQL cannot express portably: only a small sort key per
+  card is loaded and sorted, then full rows are read ``CHUNK_SIZE`` ids at a
+  time.
+
+The generators open their own read session because the request session is
+closed once the endpoint returns, before the body is streamed.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import case, func, or_
+from sqlmodel import Session, select
+
+from .. import models
+from ..database import read_session
+from ..utils import sets as set_utils
+
+CHUNK_SIZE = 500
+
+FORMATS = ("csv", "ndjson")
+FORMAT_PATTERN = "^(csv|ndjson)$"
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+ENTRY_FIELDS = (
+    "id",
+    "kind",
+    "name",
+    "number",
+    "set_name",
+    "set_code",
+    "rarity",
+    "quantity",
+    "is_reverse",
+    "is_holo",
+    "purchase_price",
+    "price",
+    "price_7d_average",
+)
+
+PRINT_FIELDS = (
+    "name",
+    "number",
+    "number_display",
+    "set_name",
+    "set_code",
+    "rarity",
+    "artist",
+    "image_small",
+    "is_owned",
+)
+
+_PRINT_COLUMNS = (
+    models.CardRecord.id,
+    models.CardRecord.name,
+    models.CardRecord.number,
+    models.CardRecord.number_display,
+    models.CardRecord.set_name,
+    models.CardRecord.set_code,
+    models.CardRecord.rarity,
+    models.CardRecord.artist,
+    models.CardRecord.image_small,
+)
+
+
+def _digits(value: Optional[str]) -> str:
+    return "".join(c for c in (value or "") if c.isdigit())
+
+
+def number_sort_key(number: Optional[str], name: Optional[str]) -> tuple:
+    """Album order: numeric part of the card number, then number, then name."""
+
+    number_clean = _digits(number or "0")
+    return (int(number_clean) if number_clean else 0, number or "", name or "")
+
+
+def is_base_card(number: Optional[str], total: Optional[str]) -> bool:
+    """Whether the card belongs to the base set (number not above the set total)."""
+
+    number_clean = _digits(number or "0")
+    total_clean = _digits(total or "999")
+    card_number = int(number_clean) if number_clean else 0
+    set_total = int(total_clean) if total_clean else 999
+    return card_number <= set_total
+
+
+def set_card_filter(set_code: str):
+    """WHERE clause selecting the catalogue cards of ``set_code``."""
+
+    set_code_clean = set_utils.clean_code(set_code) or set_code.lower()
+    return or_(
+        models.CardRecord.set_code == set_code,
+        models.CardRecord.set_code_clean == set_code_clean,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Row sources
+# ---------------------------------------------------------------------------
+
+
+def collection_entries(session: Session, user_id: int) -> Iterator[dict[str, Any]]:
+    """The user's cards and products, one dict per ``CollectionEntry``."""
+
+    entry = models.CollectionEntry
+    stmt = (
+        select(
+            entry.id,
+            case((entry.card_id.is_not(None), "card"), else_="product").label("kind"),
+            func.coalesce(models.Card.name, models.Product.name).label("name"),
+            models.Card.number,
+            func.coalesce(models.Card.set_name, models.Product.set_name).label("set_name"),
+            func.coalesce(models.Card.set_code, models.Product.set_code).label("set_code"),
+            models.Card.rarity,
+            entry.quantity,
+            entry.is_reverse,
+            entry.is_holo,
+            entry.purchase_price,
+            func.coalesce(models.Card.price, models.Product.price).label("price"),
+            func.coalesce(models.Card.price_7d_average, models.Product.price_7d_average).label("price_7d_average"),
+        )
+        .outerjoin(models.Card, models.Card.id == entry.card_id)
+        .outerjoin(models.Product, models.Product.id == entry.product_id)
+        .where(entry.user_id == user_id)
+        .order_by(entry.id)
+        .execution_options(yield_per=CHUNK_SIZE)
+    )
+    for row in session.exec(stmt):
+        yield dict(zip(ENTRY_FIELDS, row))
+
+
+def _print_rows(session: Session, ordered: list[tuple[int, bool]]) -> Iterator[dict[str, Any]]:
+    """Full print rows for ``(card_record_id, is_owned)`` pairs, in order."""
+
+    for start in range(0, len(ordered), CHUNK_SIZE):
+        chunk = ordered[start:start + CHUNK_SIZE]
+        rows = {
+            row[0]: row
+            for row in session.exec(
+                select(*_PRINT_COLUMNS).where(models.CardRecord.id.in_([record_id for record_id, _ in chunk]))
+            )
+        }
+        for record_id, is_owned in chunk:
+            row = rows.get(record_id)
+            if row is None:
+                continue
+            _, name, number, number_display, set_name, set_code, rarity, artist, image_small = row
+            yield {
+                "name": name,
+                "number": number,
+                "number_display": number_display or number,
+                "set_name": set_name,
+                "set_code": set_code,
+                "rarity": rarity,
+                "artist": artist,
+                "image_small": image_small,
+                "is_owned": is_owned,
+            }
+
+
+def collection_print_order(session: Session, collection_id: int, cards_filter: str = "all") -> list[tuple[int, bool]]:
+    """``(card_record_id, is_owned)`` of an album's cards in album order."""
+
+    stmt = (
+        select(
+            models.CollectionCard.card_record_id,
+            models.CollectionCard.is_owned,
+            models.CardRecord.number,
+            models.CardRecord.name,
+        )
+        .join(models.CardRecord, models.CardRecord.id == models.CollectionCard.card_record_id)
+        .where(models.CollectionCard.collection_id == collection_id)
+    )
+    if cards_filter == "owned":
+        stmt = stmt.where(models.CollectionCard.is_owned == True)  # noqa: E712
+    elif cards_filter == "missing":
+        stmt = stmt.where(models.CollectionCard.is_owned == False)  # noqa: E712
+    keys = sorted(session.exec(stmt), key=lambda row: number_sort_key(row[2], row[3]))
+    return [(record_id, is_owned) for record_id, is_owned, _, _ in keys]
+
+
+def set_print_order(session: Session, set_code: str, set_type: Optional[str]) -> list[tuple[int, bool]]:
+    """``(card_record_id, False)`` of a set's cards in album order."""
+
+    stmt = select(
+        models.CardRecord.id,
+        models.CardRecord.number,
+        models.CardRecord.total,
+        models.CardRecord.name,
+    ).where(set_card_filter(set_code))
+    keys = [
+        row
+        for row in session.exec(stmt)
+        if set_type != models.SetType.BASESET.value or is_base_card(row[1], row[2])
+    ]
+    keys.sort(key=lambda row: number_sort_key(row[1], row[3]))
+    return [(row[0], False) for row in keys]
+
+
+def collection_print_rows(session: Session, collection_id: int, cards_filter: str = "all") -> Iterator[dict[str, Any]]:
+    return _print_rows(session, collection_print_order(session, collection_id, cards_filter))
+
+
+def set_print_rows(session: Session, set_code: str, set_type: Optional[str]) -> Iterator[dict[str, Any]]:
+    return _print_rows(session, set_print_order(session, set_code, set_type))
+
+
+# ---------------------------------------------------------------------------
+# Encoding
+# ---------------------------------------------------------------------------
+
+
+def encode(rows: Iterable[dict[str, Any]], fields: tuple[str, ...], fmt: str) -> Iterator[str]:
+    """Encode ``rows`` as CSV (with header) or NDJSON, ``CHUNK_SIZE`` rows per piece."""
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore") if fmt == "csv" else None
+    if writer is not None:
+        writer.writeheader()
+    pending = 0
+    for row in rows:
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row, ensure_ascii=False, default=str))
+            buffer.write("\n")
+        pending += 1
+        if pending >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream(
+    rows: Callable[[Session], Iterable[dict[str, Any]]],
+    fields: tuple[str, ...],
+    fmt: str,
+    filename: str,
+) -> StreamingResponse:
+    """Response streaming ``rows(session)`` read in a fresh read session."""
+
+    def body() -> Iterator[str]:
+        with read_session() as session:
+            yield from encode(rows(session), fields, fmt)
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+
+__all__ = [
+    "CHUNK_SIZE",
+    "ENTRY_FIELDS",
+    "FORMATS",
+    "FORMAT_PATTERN",
+    "PRINT_FIELDS",
+    "collection_entries",
+    "collection_print_order",
+    "collection_print_rows",
+    "encode",
+    "is_base_card",
+    "number_sort_key",
+    "set_card_filter",
+    "set_print_order",
+    "set_print_rows",
+    "stream",
+]
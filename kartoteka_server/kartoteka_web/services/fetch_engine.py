@@ -0,0 +1,286 @@
+"""Shared RapidAPI fetch engine for scheduler batch jobs.
+
+Batch jobs hand a list of work items and a fetch function to
+:meth:`FetchEngine.run`, which calls the function on a small thread pool
+and yields results as they complete. Every HTTP request goes through one
+pooled :class:`RateLimitedSession`:
+
+* a token bucket caps the request rate at the RapidAPI plan limit
+  (``RAPIDAPI_REQUESTS_PER_SECOND`` / ``RAPIDAPI_BURST``), including the
+  pagination requests made inside ``tcg_api.list_set_cards``;
+* urllib3 retries 429 and 5xx responses with backoff, honouring
+  ``Retry-After``; every retry takes a bucket token too and runs the hooks
+  registered with :func:`retry_hook` (the daily budget charges each
+  attempt this way);
+* connections are reused across requests and worker threads.
+
+Database writes stay in the job's own thread, so callers can commit in
+chunks while fetches continue. Per-job throughput is kept in
+:meth:`FetchEngine.metrics` for the admin status endpoint.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+RAPIDAPI_KEY = (
+    os.getenv("KARTOTEKA_RAPIDAPI_KEY")
+    or os.getenv("POKEMONTCG_RAPIDAPI_KEY")
+    or os.getenv("RAPIDAPI_KEY")
+)
+
+# Sized to the RapidAPI plan; the defaults stay well below the basic tier burst
+REQUESTS_PER_SECOND = float(os.getenv("RAPIDAPI_REQUESTS_PER_SECOND", "5"))
+BURST = int(os.getenv("RAPIDAPI_BURST", "10"))
+CONCURRENCY = int(os.getenv("RAPIDAPI_CONCURRENCY", "4"))
+RETRIES = 3
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = max(rate, 0.001)
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns the wait."""
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+_retry_hooks = threading.local()
+
+
+@contextmanager
+def retry_hook(hook: Callable[[], None]) -> Iterator[None]:
+    """Call ``hook()`` before each adapter retry sent by this thread in the block.
+
+    urllib3 retries inside a single ``session.get``, so anything charged
+    per request (rate limit tokens, the daily budget) must also be charged
+    here. An exception from ``hook`` aborts the retry and propagates.
+    """
+
+    hooks = getattr(_retry_hooks, "hooks", ())
+    _retry_hooks.hooks = hooks + (hook,)
+    try:
+        yield
+    finally:
+        _retry_hooks.hooks = hooks
+
+
+class HookedRetry(Retry):
+    """``Retry`` that runs the thread's :func:`retry_hook` hooks after each backoff."""
+
+    def sleep(self, response=None) -> None:  # type: ignore[override]
+        super().sleep(response)
+        for hook in getattr(_retry_hooks, "hooks", ()):
+            hook()
+
+
+class RateLimitedSession(requests.Session):
+    """``requests.Session`` that takes a bucket token before every attempt."""
+
+    def __init__(self, bucket: TokenBucket) -> None:
+        super().__init__()
+        self.bucket = bucket
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    def _take(self) -> None:
+        self.bucket.acquire()
+        with self._count_lock:
+            self.request_count += 1
+
+    def request(self, method, url, *args, **kwargs):  # type: ignore[override]
+        self._take()
+        with retry_hook(self._take):
+            return super().request(method, url, *args, **kwargs)
+
+
+def build_session(bucket: TokenBucket, pool_size: int, retries: int = RETRIES) -> RateLimitedSession:
+    """Pooled, retrying, rate-limited HTTP session for RapidAPI."""
+
+    session = RateLimitedSession(bucket)
+    retry = HookedRetry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = "kartoteka/1.0"
+    if RAPIDAPI_KEY:
+        session.headers["X-RapidAPI-Key"] = RAPIDAPI_KEY
+    return session
+
+
+@dataclass
+class JobMetrics:
+    """Throughput of one run of a batch job."""
+
+    job: str
+    started_at: str
+    finished_at: Optional[str] = None
+    items: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    requests: int = 0
+    duration_s: float = 0.0
+    items_per_minute: float = 0.0
+    _started: float = field(default=0.0, repr=False)
+    _requests_before: int = field(default=0, repr=False)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {key: value for key, value in asdict(self).items() if not key.startswith("_")}
+
+
+class FetchEngine:
+    """Bounded-concurrency, rate-limited runner for RapidAPI fetches."""
+
+    def __init__(
+        self,
+        *,
+        requests_per_second: float = REQUESTS_PER_SECOND,
+        burst: int = BURST,
+        concurrency: int = CONCURRENCY,
+        session: Optional[requests.Session] = None,
+    ) -> None:
+        self.concurrency = max(concurrency, 1)
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.http = session or build_session(self.bucket, self.concurrency)
+        self._metrics: dict[str, JobMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _request_count(self) -> int:
+        return int(getattr(self.http, "request_count", 0))
+
+    def run(
+        self,
+        job: str,
+        items: Iterable[T],
+        fetch: Callable[[requests.Session, T], R],
+    ) -> Iterator[tuple[T, Optional[R], Optional[BaseException]]]:
+        """Call ``fetch(http, item)`` concurrently; yield ``(item, result, error)``.
+
+        Results arrive in completion order. Consume the iterator fully (or
+        close it) so the metrics for ``job`` are finalised.
+        """
+
+        work = list(items)
+        metrics = JobMetrics(
+            job=job,
+            started_at=dt.datetime.now(dt.timezone.utc).isoformat(),
+            items=len(work),
+            _started=time.monotonic(),
+            _requests_before=self._request_count(),
+        )
+        with self._lock:
+            self._metrics[job] = metrics
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"fetch-{job}") as pool:
+                futures = {pool.submit(fetch, self.http, item): item for item in work}
+                try:
+                    for future in as_completed(futures):
+                        item = futures[future]
+                        error = future.exception()
+                        if error is None:
+                            metrics.succeeded += 1
+                            yield item, future.result(), None
+                        else:
+                            metrics.failed += 1
+                            logger.warning("Fetch for %s failed in job %s: %s", item, job, error)
+                            yield item, None, error
+                finally:
+                    for future in futures:
+                        future.cancel()
+        finally:
+            metrics.duration_s = round(time.monotonic() - metrics._started, 3)
+            metrics.requests = self._request_count() - metrics._requests_before
+            done = metrics.succeeded + metrics.failed
+            metrics.items_per_minute = round(done / metrics.duration_s * 60, 1) if metrics.duration_s else 0.0
+            metrics.finished_at = dt.datetime.now(dt.timezone.utc).isoformat()
+            logger.info(
+                "Job %s fetched %s/%s items with %s requests in %.1fs (%.1f items/min)",
+                job, done, metrics.items, metrics.requests, metrics.duration_s, metrics.items_per_minute,
+            )
+
+    def metrics(self) -> dict[str, dict[str, Any]]:
+        """Metrics of the latest run of every job."""
+
+        with self._lock:
+            return {job: metrics.as_dict() for job, metrics in self._metrics.items()}
+
+
+def chunked(iterator: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Group an iterator into lists of ``size`` (the last may be shorter)."""
+
+    chunk: list[T] = []
+    for item in iterator:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+_engine: Optional[FetchEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_fetch_engine() -> FetchEngine:
+    """Get or create the shared scheduler fetch engine."""
+
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = FetchEngine()
+        return _engine
+
+
+__all__ = [
+    "FetchEngine",
+    "JobMetrics",
+    "RateLimitedSession",
+    "TokenBucket",
+    "build_session",
+    "chunked",
+    "get_fetch_engine",
+]
@@ -0,0 +1,200 @@
+"""Data behind the home page, read from local tables only.
+
+* The RapidAPI "latest products" feed is fetched by the scheduler
+  (:func:`refresh_latest_products`) into ``LatestProduct``; the page reads
+  that table and never calls out.
+* Per-user widgets come from aggregate queries and the daily collection
+  value rollup (``CollectionValueDaily``) instead of loading every entry.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from typing import Any, Optional
+
+from sqlalchemy import delete, func
+from sqlmodel import Session, select
+
+from .. import models
+from ..database import session_scope
+from . import tcg_api
+
+logger = logging.getLogger(__name__)
+
+LATEST_PRODUCTS_LIMIT = 10
+WIDGET_LIMIT = 5
+
+_LATEST_FIELDS = (
+    "name",
+    "set_name",
+    "set_code",
+    "image_small",
+    "image_large",
+    "release_date",
+    "price",
+    "price_7d_average",
+    "shop_url",
+)
+
+
+def refresh_latest_products(limit: int = LATEST_PRODUCTS_LIMIT) -> int:
+    """Fetch the latest products feed and replace the cached rows.
+
+    An empty or failed fetch keeps the previous rows. Returns the number of
+    rows stored.
+    """
+
+    products = tcg_api.get_latest_products(
+        limit=limit,
+        rapidapi_key=os.getenv("RAPIDAPI_KEY"),
+        rapidapi_host=os.getenv("RAPIDAPI_HOST"),
+    )
+    if not products:
+        return 0
+    with session_scope() as session:
+        session.execute(delete(models.LatestProduct))
+        for position, product in enumerate(products):
+            values = {field: product.get(field) for field in _LATEST_FIELDS}
+            values["name"] = values["name"] or ""
+            session.add(
+                models.LatestProduct(position=position, product_id=product.get("id"), **values)
+            )
+    return len(products)
+
+
+def latest_products(session: Session, limit: int = LATEST_PRODUCTS_LIMIT) -> list[dict[str, Any]]:
+    """Cached latest products, in feed order."""
+
+    rows = session.exec(
+        select(models.LatestProduct).order_by(models.LatestProduct.position).limit(limit)
+    ).all()
+    return [
+        {"id": row.product_id, **{field: getattr(row, field) for field in _LATEST_FIELDS}}
+        for row in rows
+    ]
+
+
+def _collection_stats(session: Session, user_id: int) -> dict[str, Any]:
+    entry = models.CollectionEntry
+    total_cards, unique_cards, cards_value = session.exec(
+        select(
+            func.coalesce(func.sum(entry.quantity), 0),
+            func.count(entry.id),
+            func.coalesce(func.sum(func.coalesce(models.Card.price, 0.0) * entry.quantity), 0.0),
+        )
+        .join(models.Card, models.Card.id == entry.card_id)
+        .where(entry.user_id == user_id)
+    ).one()
+    products_value = session.exec(
+        select(func.coalesce(func.sum(func.coalesce(models.Product.price, 0.0) * entry.quantity), 0.0))
+        .join(models.Product, models.Product.id == entry.product_id)
+        .where(entry.user_id == user_id)
+    ).one()
+
+    # Latest day of the rollup, as on the dashboard chart; live prices until it is built
+    rollup_value = session.exec(
+        select(models.CollectionValueDaily.cards_value)
+        .where(models.CollectionValueDaily.user_id == user_id)
+        .order_by(models.CollectionValueDaily.date.desc())
+        .limit(1)
+    ).first()
+    if rollup_value is not None:
+        cards_value = rollup_value
+
+    return {
+        "total_cards": int(total_cards or 0),
+        "unique_cards": int(unique_cards or 0),
+        "total_value": round((cards_value or 0.0) + (products_value or 0.0), 2),
+    }
+
+
+def _recently_added(session: Session, user_id: int) -> list[dict[str, Any]]:
+    entry = models.CollectionEntry
+    rows = session.exec(
+        select(
+            models.Card.name,
+            models.Card.image_small,
+            models.Card.set_name,
+            models.Card.price,
+            models.Product.name,
+            models.Product.image_small,
+            models.Product.set_name,
+            models.Product.price,
+        )
+        .select_from(entry)
+        .outerjoin(models.Card, models.Card.id == entry.card_id)
+        .outerjoin(models.Product, models.Product.id == entry.product_id)
+        .where(entry.user_id == user_id)
+        .where((entry.card_id.is_not(None)) | (entry.product_id.is_not(None)))
+        .order_by(entry.id.desc())
+        .limit(WIDGET_LIMIT)
+    ).all()
+    recent: list[dict[str, Any]] = []
+    for card_name, card_image, card_set, card_price, product_name, product_image, product_set, product_price in rows:
+        if card_name is not None:
+            recent.append({
+                "type": "card",
+                "name": card_name,
+                "image_small": card_image,
+                "set_name": card_set,
+                "price": card_price,
+            })
+        elif product_name is not None:
+            recent.append({
+                "type": "product",
+                "name": product_name,
+                "image_small": product_image,
+                "set_name": product_set,
+                "price": product_price,
+            })
+    return recent
+
+
+def _top_changes(session: Session, user_id: int, model: Any, foreign_key: Any) -> list[dict[str, Any]]:
+    change = (model.price - model.price_7d_average) / model.price_7d_average
+    rows = session.exec(
+        select(model.name, model.image_small, model.price, change)
+        .select_from(models.CollectionEntry)
+        .join(model, model.id == foreign_key)
+        .where(models.CollectionEntry.user_id == user_id)
+        .where(model.price > 0, model.price_7d_average > 0)
+        .order_by(func.abs(change).desc())
+        .limit(WIDGET_LIMIT)
+    ).all()
+    return [
+        {
+            "name": name,
+            "image_small": image_small,
+            "current_price": price,
+            "change_percent": round(ratio * 100, 2),
+        }
+        for name, image_small, price, ratio in rows
+    ]
+
+
+def _price_changes(session: Session, user_id: int) -> list[dict[str, Any]]:
+    changes = _top_changes(session, user_id, models.Card, models.CollectionEntry.card_id)
+    changes += _top_changes(session, user_id, models.Product, models.CollectionEntry.product_id)
+    changes.sort(key=lambda item: abs(item["change_percent"]), reverse=True)
+    return changes[:WIDGET_LIMIT]
+
+
+def user_widgets(session: Session, user_id: Optional[int]) -> dict[str, Any]:
+    """Collection stats, recently added entries and biggest price moves."""
+
+    if user_id is None:
+        return {"collection_stats": None, "recently_added": [], "price_changes": []}
+    return {
+        "collection_stats": _collection_stats(session, user_id),
+        "recently_added": _recently_added(session, user_id),
+        "price_changes": _price_changes(session, user_id),
+    }
+
+
+__all__ = [
+    "LATEST_PRODUCTS_LIMIT",
+    "latest_products",
+    "refresh_latest_products",
+    "user_widgets",
+]
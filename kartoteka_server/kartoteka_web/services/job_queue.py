@@ -0,0 +1,158 @@
+"""Deduplicating job queue drained by one background worker thread.
+
+Shared by the price fill and price history backfill queues:
+
+* a key that is already queued or running is not queued again, so work
+  asked for by many users is done once;
+* a key that failed, or that the subclass marks with :meth:`retry_later`,
+  is not queued again before ``retry_after`` has passed;
+* the worker starts on the first enqueue and hands :meth:`process` either
+  one key or, with ``batch_size``, a list of up to that many keys; jobs can
+  be spaced ``min_interval`` seconds apart.
+
+Subclasses only implement :meth:`process`.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import queue
+import threading
+import time
+from typing import Any, Generic, Hashable, Iterable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+
+
+class WorkerQueue(Generic[K]):
+    """Deduplicating queue of job keys processed by a single worker thread."""
+
+    # Name of the worker thread, also used in log messages
+    name = "job-queue"
+
+    def __init__(
+        self,
+        *,
+        retry_after: dt.timedelta,
+        batch_size: Optional[int] = None,
+        min_interval: float = 0.0,
+    ) -> None:
+        self.retry_after = retry_after
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self._jobs: "queue.Queue[K]" = queue.Queue()
+        self._pending: set[K] = set()
+        self._failed: dict[K, float] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Set by ``process`` when it makes a rate-limited call
+        self._last_request = 0.0
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def enqueue(self, keys: Iterable[K]) -> int:
+        """Queue jobs; returns how many were newly added."""
+
+        added = 0
+        retry_cutoff = time.monotonic() - self.retry_after.total_seconds()
+        with self._lock:
+            for key in keys:
+                if key in self._pending:
+                    continue
+                if self._failed.get(key, retry_cutoff) > retry_cutoff:
+                    continue
+                self._pending.add(key)
+                self._jobs.put(key)
+                added += 1
+        if added:
+            self.start()
+        return added
+
+    def pending(self, keys: Optional[Iterable[K]] = None) -> int:
+        """Number of queued or running jobs, optionally among ``keys``."""
+
+        with self._lock:
+            if keys is None:
+                return len(self._pending)
+            return sum(1 for key in set(keys) if key in self._pending)
+
+    def retry_later(self, keys: Iterable[K]) -> None:
+        """Keep ``keys`` out of the queue until ``retry_after`` has passed."""
+
+        now = time.monotonic()
+        with self._lock:
+            self._failed.update((key, now) for key in keys)
+
+    def resolved(self, keys: Iterable[K]) -> None:
+        """Forget earlier failures of ``keys``."""
+
+        with self._lock:
+            for key in keys:
+                self._failed.pop(key, None)
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def join(self) -> None:
+        """Block until every queued job has been processed."""
+
+        self._jobs.join()
+
+    def _take(self) -> list[K]:
+        batch = [self._jobs.get(timeout=1.0)]
+        while len(batch) < (self.batch_size or 1):
+            try:
+                batch.append(self._jobs.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                batch = self._take()
+            except queue.Empty:
+                continue
+            try:
+                wait = self._last_request + self.min_interval - time.monotonic()
+                if wait > 0 and self._stop.wait(wait):
+                    break
+                self.process(batch if self.batch_size else batch[0])
+            except Exception as exc:  # pragma: no cover - logged and retried later
+                logger.error("%s failed for %s: %s", self.name, batch, exc, exc_info=True)
+                self.retry_later(batch)
+            finally:
+                with self._lock:
+                    self._pending.difference_update(batch)
+                for _ in batch:
+                    self._jobs.task_done()
+
+    def process(self, job: Any) -> Any:
+        """Handle one key, or a list of keys when ``batch_size`` is set."""
+
+        raise NotImplementedError
+
+
+__all__ = ["WorkerQueue"]
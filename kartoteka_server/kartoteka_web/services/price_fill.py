@@ -0,0 +1,194 @@
+"""Background fill of missing collection prices.
+
+The collection list and stats endpoints used to look up a price for every
+unpriced card or product while serving the request and then commit, turning
+reads into writes that queue behind the database write lock. Unpriced items
+are now handed to :data:`fill_queue` when they are added to or updated in a
+collection (and when a read comes across one):
+
+* jobs are keyed by ``(kind, id)``, so an item held by many users is
+  resolved once;
+* a single worker thread (:class:`~.job_queue.WorkerQueue`) resolves
+  queued items in batches, each batch in one short transaction, from the
+  local catalogue (``CardRecord`` / ``ProductRecord``);
+* items the catalogue has no price for are not queued again before
+  ``RETRY_AFTER`` has passed.
+
+The read endpoints then compute their figures from stored prices only.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+from typing import Callable, Iterable
+
+from sqlmodel import Session, select
+
+from .. import models
+from ..database import session_scope
+from ..utils import text
+from .job_queue import WorkerQueue
+
+logger = logging.getLogger(__name__)
+
+CARD = "card"
+PRODUCT = "product"
+
+# Items resolved per transaction
+BATCH_SIZE = 100
+
+# An item with no catalogue price is not queued again before this has passed
+RETRY_AFTER = dt.timedelta(minutes=15)
+
+Job = tuple[str, int]
+
+
+def apply_card_price(card: models.Card, session: Session) -> bool:
+    """Fetch and update price from CardRecord catalog if available."""
+
+    # Try to find price in CardRecord catalog
+    name_norm = text.normalize(card.name, keep_spaces=True)
+    set_name_norm = text.normalize(card.set_name, keep_spaces=True)
+
+    # First try: exact match (name + set + number)
+    stmt = select(models.CardRecord).where(
+        models.CardRecord.name_normalized == name_norm,
+        models.CardRecord.set_name_normalized == set_name_norm,
+        models.CardRecord.number == card.number
+    ).limit(1)
+
+    card_record = session.exec(stmt).first()
+
+    # Second try: if no exact match, try normalized number match
+    if not card_record:
+        number_clean = text.sanitize_number(card.number or "")
+        if number_clean:
+            stmt = select(models.CardRecord).where(
+                models.CardRecord.name_normalized == name_norm,
+                models.CardRecord.set_name_normalized == set_name_norm
+            )
+            candidates = session.exec(stmt).all()
+            for candidate in candidates:
+                candidate_number_clean = text.sanitize_number(candidate.number or "")
+                if candidate_number_clean == number_clean:
+                    card_record = candidate
+                    break
+
+    updated = False
+    if card_record:
+        # Update price if available
+        if card_record.price is not None and card.price != card_record.price:
+            card.price = card_record.price
+            updated = True
+        # Update 7-day average if available
+        if card_record.price_7d_average is not None and card.price_7d_average != card_record.price_7d_average:
+            card.price_7d_average = card_record.price_7d_average
+            updated = True
+
+    return updated
+
+
+def apply_product_price(product: models.Product, session: Session) -> bool:
+    """Fetch and update price from ProductRecord catalog if available."""
+
+    # Try to find price in ProductRecord catalog
+    name_norm = text.normalize(product.name, keep_spaces=True)
+    set_name_norm = text.normalize(product.set_name, keep_spaces=True)
+
+    # Try to find matching ProductRecord
+    stmt = select(models.ProductRecord).where(
+        models.ProductRecord.name_normalized == name_norm,
+        models.ProductRecord.set_name_normalized == set_name_norm
+    ).limit(1)
+
+    product_record = session.exec(stmt).first()
+
+    updated = False
+    if product_record:
+        # Update price if available
+        if product_record.price is not None and product.price != product_record.price:
+            product.price = product_record.price
+            updated = True
+        # Update 7-day average if available
+        if product_record.price_7d_average is not None and product.price_7d_average != product_record.price_7d_average:
+            product.price_7d_average = product_record.price_7d_average
+            updated = True
+
+    return updated
+
+
+_MODELS = {CARD: models.Card, PRODUCT: models.Product}
+_APPLY = {CARD: apply_card_price, PRODUCT: apply_product_price}
+
+
+class PriceFillQueue(WorkerQueue[Job]):
+    """Deduplicating queue of unpriced cards and products."""
+
+    name = "collection-price-fill"
+
+    def __init__(
+        self,
+        *,
+        batch_size: int = BATCH_SIZE,
+        session_factory: Callable[[], object] = session_scope,
+    ) -> None:
+        super().__init__(retry_after=RETRY_AFTER, batch_size=batch_size)
+        self._session_factory = session_factory
+
+    def process(self, jobs: Iterable[Job]) -> int:
+        """Resolve prices for ``jobs`` in one transaction; returns how many were priced."""
+
+        priced: list[Job] = []
+        unresolved: list[Job] = []
+        with self._session_factory() as session:
+            for job in jobs:
+                kind, item_id = job
+                item = session.get(_MODELS[kind], item_id)
+                if item is None or item.price is not None:
+                    continue
+                if _APPLY[kind](item, session) and item.price is not None:
+                    session.add(item)
+                    priced.append(job)
+                else:
+                    unresolved.append(job)
+        self.resolved(priced)
+        self.retry_later(unresolved)
+        if priced:
+            logger.info("Filled collection prices for %s items (%s without a catalogue price).", len(priced), len(unresolved))
+        return len(priced)
+
+
+fill_queue = PriceFillQueue()
+
+
+def unpriced(entries: Iterable[models.CollectionEntry]) -> list[Job]:
+    """Jobs for the entries' cards and products that have no price yet."""
+
+    jobs: list[Job] = []
+    for entry in entries:
+        if entry.card is not None:
+            if entry.card.price is None and entry.card.id is not None:
+                jobs.append((CARD, entry.card.id))
+        elif entry.product is not None:
+            if entry.product.price is None and entry.product.id is not None:
+                jobs.append((PRODUCT, entry.product.id))
+    return jobs
+
+
+def enqueue_unpriced(entries: Iterable[models.CollectionEntry]) -> int:
+    """Queue the unpriced items among ``entries``; returns how many were added."""
+
+    return fill_queue.enqueue(unpriced(entries))
+
+
+__all__ = [
+    "CARD",
+    "PRODUCT",
+    "PriceFillQueue",
+    "apply_card_price",
+    "apply_product_price",
+    "enqueue_unpriced",
+    "fill_queue",
+    "unpriced",
+]
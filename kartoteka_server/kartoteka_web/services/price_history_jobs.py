@@ -0,0 +1,162 @@
+"""Background queue for price history backfill from RapidAPI.
+
+The collection stats endpoint used to fetch missing price history inline,
+one card per 1.1 s, while holding the database write lock. Stale catalogue
+records are now handed to :data:`backfill_queue` instead:
+
+* jobs are keyed by ``CardRecord.id``, so a card held by many users is
+  fetched once;
+* a single worker thread (:class:`~.job_queue.WorkerQueue`) performs the
+  fetches, spaced at least ``PRICE_HISTORY_MIN_INTERVAL`` seconds apart
+  across all users;
+* the API call runs outside any transaction; only the upsert writes.
+
+Ingested points reach the collection value rollup through
+``crud.upsert_price_history``.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import os
+import time
+from typing import Callable, Iterable, Optional
+
+from sqlmodel import Session, select
+
+from .. import models
+from ..database import session_scope
+from . import collection_value, crud, tcg_api
+from .job_queue import WorkerQueue
+
+logger = logging.getLogger(__name__)
+
+RAPIDAPI_KEY = (
+    os.getenv("KARTOTEKA_RAPIDAPI_KEY")
+    or os.getenv("POKEMONTCG_RAPIDAPI_KEY")
+    or os.getenv("RAPIDAPI_KEY")
+)
+RAPIDAPI_HOST = (
+    os.getenv("KARTOTEKA_RAPIDAPI_HOST")
+    or os.getenv("POKEMONTCG_RAPIDAPI_HOST")
+    or os.getenv("RAPIDAPI_HOST")
+)
+
+# Minimum spacing between two history requests, shared by all users
+MIN_INTERVAL = float(os.getenv("PRICE_HISTORY_MIN_INTERVAL", "1.1"))
+
+# History older than this is refreshed when a user opens the dashboard
+STALE_AFTER = dt.timedelta(days=7)
+
+# A record whose fetch failed is not queued again before this has passed
+RETRY_AFTER = dt.timedelta(minutes=15)
+
+
+def _aware(value: Optional[dt.datetime]) -> Optional[dt.datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=dt.timezone.utc)
+    return value
+
+
+def is_stale(record: models.CardRecord, now: Optional[dt.datetime] = None) -> bool:
+    """Whether the record's price history should be fetched again."""
+
+    if not record.remote_id:
+        return False
+    last_synced = _aware(record.last_price_synced)
+    now = now or dt.datetime.now(dt.timezone.utc)
+    return last_synced is None or last_synced < now - STALE_AFTER
+
+
+def fetch_history(remote_id: str) -> list[dict[str, object]]:
+    """Download and normalise one year of price history for ``remote_id``."""
+
+    date_from, date_to = collection_value.history_window()
+    history_data = tcg_api.fetch_card_price_history(
+        remote_id,
+        date_from=date_from,
+        date_to=date_to,
+        rapidapi_key=RAPIDAPI_KEY,
+        rapidapi_host=RAPIDAPI_HOST,
+    )
+    if not history_data:
+        return []
+    return tcg_api.normalize_price_history(history_data)
+
+
+class BackfillQueue(WorkerQueue[int]):
+    """Deduplicating, globally rate-limited price history job queue."""
+
+    name = "price-history-backfill"
+
+    def __init__(
+        self,
+        *,
+        min_interval: float = MIN_INTERVAL,
+        fetch: Callable[[str], list[dict[str, object]]] = fetch_history,
+        session_factory: Callable[[], object] = session_scope,
+    ) -> None:
+        super().__init__(retry_after=RETRY_AFTER, min_interval=min_interval)
+        self._fetch = fetch
+        self._session_factory = session_factory
+
+    def process(self, record_id: int) -> tuple[int, int]:
+        """Fetch and store history for one record; returns (added, updated)."""
+
+        with self._session_factory() as session:
+            record = session.get(models.CardRecord, record_id)
+            if record is None or not is_stale(record):
+                return 0, 0
+            remote_id = record.remote_id
+
+        self._last_request = time.monotonic()
+        normalized_history = self._fetch(remote_id)
+
+        added = updated = 0
+        with self._session_factory() as session:
+            record = session.get(models.CardRecord, record_id)
+            if record is None:
+                return 0, 0
+            if normalized_history:
+                added, updated = crud.upsert_price_history(
+                    session, card_record_id=record.id, price_history=normalized_history
+                )
+            # Also marked when the API has no data, to avoid retrying constantly
+            record.last_price_synced = dt.datetime.now(dt.timezone.utc)
+            session.add(record)
+        self.resolved([record_id])
+        logger.info("Backfilled price history for record %s: %s added, %s updated.", record_id, added, updated)
+        return added, updated
+
+
+backfill_queue = BackfillQueue()
+
+
+def enqueue_stale(session: Session, record_ids: Iterable[int]) -> tuple[int, int]:
+    """Queue stale records among ``record_ids``.
+
+    Returns ``(stale, pending)``: how many of the records have stale history
+    and how many of those are waiting in the queue after this call.
+    """
+
+    ids = list(set(record_ids))
+    if not ids:
+        return 0, 0
+    now = dt.datetime.now(dt.timezone.utc)
+    records = session.exec(
+        select(models.CardRecord).where(models.CardRecord.id.in_(ids))
+    ).all()
+    stale = [record.id for record in records if is_stale(record, now)]
+    backfill_queue.enqueue(stale)
+    return len(stale), backfill_queue.pending(stale)
+
+
+__all__ = [
+    "BackfillQueue",
+    "STALE_AFTER",
+    "backfill_queue",
+    "enqueue_stale",
+    "fetch_history",
+    "is_stale",
+]
@@ -1,6 +1,7 @@
 """Card scanner service with OpenAI Vision and pHash visual search."""
 
 import io
+import logging
 import os
 import base64
 import datetime as dt
@@ -8,20 +9,24 @@ from typing import Optional, TYPE_CHECKING
 from pydantic import BaseModel
 from PIL import Image
 import imagehash
-from sqlmodel import Session, select
+from sqlmodel import Session
+
+from . import visual_search
 
 if TYPE_CHECKING:
     from ..models import CardRecord
 
+logger = logging.getLogger(__name__)
+
 
 class CardImageHash(BaseModel):
     """
     Pydantic model for visual search compatibility.
     Represents cached card data for pHash functionality.
-    In the future, add a dedicated phash column to CardRecord.
+    ``phash`` is the signed 64-bit value stored in ``CardRecord.phash``.
     """
     id: Optional[int] = None
-    phash: Optional[str] = None
+    phash: Optional[int] = None
     name: str
     set_code: Optional[str] = None
     image_small: Optional[str] = None
@@ -38,7 +43,7 @@ def compute_phash(image_bytes: bytes) -> str:
         h = imagehash.phash(image)
         return str(h)
     except Exception as e:
-        print(f"Error computing phash: {e}")
+        logger.warning("Error computing phash: %s", e)
         raise ValueError("Invalid image data")
 
 
@@ -57,7 +62,7 @@ async def openai_vision_ocr(image_bytes: bytes) -> str | None:
         # Get API key from environment
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
-            print("Warning: OPENAI_API_KEY not set. Skipping OpenAI OCR.")
+            logger.warning("OPENAI_API_KEY not set. Skipping OpenAI OCR.")
             return None
         
         client = OpenAI(api_key=api_key)
@@ -103,73 +108,47 @@ async def openai_vision_ocr(image_bytes: bytes) -> str | None:
         return text.strip() if text else None
         
     except Exception as e:
-        print(f"OpenAI Vision OCR failed: {e}")
+        logger.warning("OpenAI Vision OCR failed: %s", e)
         return None
 
 
-def find_similar_card(session: Session, image_bytes: bytes, threshold: int = 12) -> Optional[dict]:
+def find_similar_cards(
+    session: Session,
+    image_bytes: bytes,
+    threshold: int = visual_search.MATCH_THRESHOLD,
+    limit: int = 5,
+) -> list[tuple["CardRecord", int]]:
+    """
+    Find cards visually similar to the uploaded image using pHash.
+    Returns (card, hamming distance) pairs, closest first.
     """
-    Find a card visually similar to the uploaded image using pHash.
+    return visual_search.search(session, image_bytes, k=limit, max_distance=threshold)
+
+
+def find_similar_card(
+    session: Session,
+    image_bytes: bytes,
+    threshold: int = visual_search.MATCH_THRESHOLD,
+) -> Optional["CardRecord"]:
+    """
+    Find the card most similar to the uploaded image using pHash.
     threshold: Max hamming distance (0-64). 10-12 is usually a good balance.
-    
-    Note: This requires pHash data to be stored in database.
-    For now, returns None until phash column is added to CardRecord.
     """
-    # TODO: Add phash column to CardRecord model
-    # For now, return None (feature disabled)
-    print("Warning: pHash visual search not yet implemented. Add 'phash' column to CardRecord.")
-    return None
-    
-    # Future implementation:
-    # try:
-    #     target_hash_hex = compute_phash(image_bytes)
-    #     target_hash = imagehash.hex_to_hash(target_hash_hex)
-    # except ValueError:
-    #     return None
-    #
-    # # Fetch all cards with phash data
-    # known_cards = session.exec(
-    #     select(CardRecord).where(CardRecord.phash.isnot(None))
-    # ).all()
-    #
-    # best_match = None
-    # min_dist = 65
-    #
-    # for card in known_cards:
-    #     try:
-    #         db_hash = imagehash.hex_to_hash(card.phash)
-    #         dist = target_hash - db_hash
-    #         if dist < min_dist:
-    #             min_dist = dist
-    #             best_match = card
-    #     except Exception:
-    #         continue
-    #
-    # if best_match and min_dist <= threshold:
-    #     return best_match
-    #
-    # return None
-
-
-def register_card_image(session: Session, card_id: int, image_bytes: bytes):
+    matches = find_similar_cards(session, image_bytes, threshold=threshold, limit=1)
+    return matches[0][0] if matches else None
+
+
+def register_card_image(session: Session, card_id: int, image_bytes: bytes) -> bool:
     """
     Register a known image for a card to build the visual database.
-    
-    Note: Requires phash column in CardRecord.
-    For now, this is a no-op until database is updated.
+    Returns True when the card exists and the image could be hashed.
     """
-    print(f"Warning: register_card_image not yet implemented. Add 'phash' column to CardRecord.")
-    # TODO: Implement after adding phash column
-    pass
-    
-    # Future implementation:
-    # try:
-    #     phash = compute_phash(image_bytes)
-    #     card = session.get(CardRecord, card_id)
-    #     if card:
-    #         card.phash = phash
-    #         session.add(card)
-    #         session.commit()
-    #         print(f"Registered visual fingerprint for card {card_id}: {phash}")
-    # except Exception as e:
-    #     print(f"Failed to register card image: {e}")
+    try:
+        phash = visual_search.register(session, card_id, image_bytes)
+    except ValueError as e:
+        logger.warning("Failed to register card image for card %s: %s", card_id, e)
+        return False
+    if phash is None:
+        return False
+    logger.info("Registered visual fingerprint for card %s: %016x", card_id, phash)
+    return True
@@ -0,0 +1,379 @@
+"""Precomputed response for ``GET /collections/sets/list``.
+
+The set list combines three sources:
+
+* per-set card counts from ``CardRecord``, grouped on first use and kept
+  current from catalogue sync in this process (:func:`note_added` queues
+  new rows on the session; they are applied when it commits). Other worker
+  processes sync too, so the counts are regrouped every
+  :data:`COUNTS_TTL` seconds and every worker converges on the same body
+  and ETag;
+* ``tcg_sets.json`` names and series, reloaded when the file's mtime
+  changes;
+* the set logos shipped in ``static/img/sets``, listed once per directory
+  mtime instead of one ``Path.exists()`` per set.
+
+Whenever one of them changes the list is re-sorted and serialized once;
+requests get the cached JSON body and its ETag.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from .. import models, schemas
+
+logger = logging.getLogger(__name__)
+
+SETS_JSON_PATH = Path(__file__).resolve().parents[2] / "tcg_sets.json"
+LOGO_DIR = Path(__file__).resolve().parents[1] / "static" / "img" / "sets"
+
+# Eras in display order, newest first; unknown series sort just before ""
+SERIES_ORDER = [
+    "Mega Evolution",  # Newest era - 2025+
+    "Scarlet & Violet",
+    "Sword & Shield",
+    "Sun & Moon",
+    "XY",
+    "Black & White",
+    "HeartGold & SoulSilver",
+    "HeartGold SoulSilver",
+    "Platinum",
+    "Diamond & Pearl",
+    "EX",
+    "EX Series",
+    "E-Card",
+    "e-Card",
+    "Neo",
+    "Gym",
+    "Base",
+    "Base Set",
+    "Other",
+    "",
+]
+_SERIES_RANK = {name: index for index, name in enumerate(SERIES_ORDER)}
+_UNKNOWN_SERIES_RANK = len(SERIES_ORDER) - 2
+
+# Seconds before per-set counts are regrouped from the database
+COUNTS_TTL = 5 * 60
+
+_SESSION_KEY = "set_catalog_added"
+_SESSION_STALE_KEY = "set_catalog_stale"
+
+
+@dataclass
+class SetCount:
+    """Catalogue cards of one set code."""
+
+    set_name: str
+    series: str
+    card_count: int
+    release_date: Optional[str]
+
+
+def _mtime(path: Path) -> Optional[float]:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+def _load_sets_json(path: Path) -> dict[str, dict[str, str]]:
+    """``tcg_sets.json`` keyed by lower-case set code."""
+
+    sets: dict[str, dict[str, str]] = {}
+    if not path.exists():
+        return sets
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+    except Exception as exc:
+        logger.warning("Failed to load %s: %s", path.name, exc)
+        return sets
+    for series_name, sets_list in data.items():
+        for entry in sets_list:
+            code = entry.get("code", "")
+            if code:
+                sets[code.lower()] = {
+                    "name": entry.get("name", ""),
+                    "series": series_name,
+                    "abbr": entry.get("abbr", ""),
+                    "original_code": code,  # Keep original case
+                }
+    return sets
+
+
+def _sort_sets(sets_output: list[schemas.SetInfoRead]) -> list[schemas.SetInfoRead]:
+    """Series (era) order first, newest release first within each series."""
+
+    sets_output.sort(key=lambda s: (
+        _SERIES_RANK.get(s.series, _UNKNOWN_SERIES_RANK),
+        s.release_date or "0000-00-00",
+    ))
+    result: list[schemas.SetInfoRead] = []
+    current_series = None
+    series_batch: list[schemas.SetInfoRead] = []
+    for s in sets_output:
+        if s.series != current_series:
+            if series_batch:
+                series_batch.sort(key=lambda x: x.release_date or "0000-00-00", reverse=True)
+                result.extend(series_batch)
+            current_series = s.series
+            series_batch = [s]
+        else:
+            series_batch.append(s)
+    if series_batch:
+        series_batch.sort(key=lambda x: x.release_date or "0000-00-00", reverse=True)
+        result.extend(series_batch)
+    return result
+
+
+class SetCatalog:
+    """Set list with incrementally maintained counts and a cached response."""
+
+    def __init__(
+        self,
+        sets_path: Path = SETS_JSON_PATH,
+        logo_dir: Path = LOGO_DIR,
+        counts_ttl: float = COUNTS_TTL,
+    ) -> None:
+        self.sets_path = sets_path
+        self.logo_dir = logo_dir
+        self.counts_ttl = counts_ttl
+        self._lock = threading.RLock()
+        self._counts: Optional[dict[str, SetCount]] = None
+        self._counts_loaded_at = 0.0
+        self._json_sets: dict[str, dict[str, str]] = {}
+        self._json_mtime: Optional[float] = None
+        self._logos: frozenset[str] = frozenset()
+        self._logo_mtime: Optional[float] = None
+        self._response: Optional[tuple[bytes, str]] = None
+
+    # ------------------------------------------------------------------
+    # Sources
+    # ------------------------------------------------------------------
+
+    def load_counts(self, session: Session) -> None:
+        """Group ``CardRecord`` by set code; kept incrementally until the TTL runs out."""
+
+        rows = session.exec(
+            select(
+                models.CardRecord.set_code,
+                models.CardRecord.set_name,
+                models.CardRecord.series,
+                func.count(models.CardRecord.id),
+                func.min(models.CardRecord.release_date),
+            )
+            .where(models.CardRecord.set_code.is_not(None))
+            .where(models.CardRecord.set_code != "")
+            .group_by(models.CardRecord.set_code)
+        ).all()
+        counts = {
+            set_code: SetCount(set_name or "", series or "", card_count or 0, release_date)
+            for set_code, set_name, series, card_count, release_date in rows
+        }
+        with self._lock:
+            if counts != self._counts:
+                self._counts = counts
+                self._response = None
+            self._counts_loaded_at = time.monotonic()
+        logger.debug("Set catalog loaded %s sets", len(counts))
+
+    def _refresh_files(self) -> None:
+        # Called with the lock held.
+        json_mtime = _mtime(self.sets_path)
+        if json_mtime != self._json_mtime:
+            self._json_sets = _load_sets_json(self.sets_path)
+            self._json_mtime = json_mtime
+            self._response = None
+        logo_mtime = _mtime(self.logo_dir)
+        if logo_mtime != self._logo_mtime:
+            try:
+                self._logos = frozenset(os.listdir(self.logo_dir))
+            except OSError:
+                self._logos = frozenset()
+            self._logo_mtime = logo_mtime
+            self._response = None
+
+    def apply_added(self, rows: Iterable[dict[str, Any]]) -> None:
+        """Count newly inserted ``CardRecord`` rows (committed)."""
+
+        with self._lock:
+            if self._counts is None:
+                return
+            changed = False
+            for row in rows:
+                set_code = row.get("set_code")
+                if not set_code:
+                    continue
+                entry = self._counts.get(set_code)
+                if entry is None:
+                    entry = self._counts[set_code] = SetCount(
+                        row.get("set_name") or "", row.get("series") or "", 0, None
+                    )
+                entry.card_count += 1
+                release_date = row.get("release_date")
+                if release_date and (entry.release_date is None or release_date < entry.release_date):
+                    entry.release_date = release_date
+                changed = True
+            if changed:
+                self._response = None
+
+    def invalidate(self) -> None:
+        """Drop counts and the cached response; both are rebuilt on next use."""
+
+        with self._lock:
+            self._counts = None
+            self._response = None
+
+    # ------------------------------------------------------------------
+    # Response
+    # ------------------------------------------------------------------
+
+    def _logo_url(self, code: str) -> str:
+        # Local logo (downloaded from TCGGO) first, pokemontcg.io otherwise
+        filename = f"{code.lower()}_logo.png"
+        if filename in self._logos:
+            return f"/static/img/sets/{filename}"
+        return f"https://images.pokemontcg.io/{code.lower()}/logo.png"
+
+    @staticmethod
+    def _symbol_url(code: str) -> str:
+        return f"https://images.pokemontcg.io/{code.lower()}/symbol.png"
+
+    def _build(self) -> list[schemas.SetInfoRead]:
+        # Called with the lock held.
+        counts = self._counts or {}
+        sets_output: list[schemas.SetInfoRead] = []
+        seen_codes: set[str] = set()
+
+        # Newest sets win when two codes differ only by case, as before
+        ordered = sorted(counts.items(), key=lambda item: item[1].release_date or "", reverse=True)
+        for set_code, entry in ordered:
+            if set_code.lower() in seen_codes:
+                continue
+            seen_codes.add(set_code.lower())
+
+            set_name = entry.set_name
+            series = entry.series
+            original_code = set_code
+            json_info = self._json_sets.get(set_code.lower(), {})
+            if json_info:
+                if not series:
+                    series = json_info.get("series", "")
+                # Prefer JSON name if it looks more complete
+                json_name = json_info.get("name", "")
+                if json_name and len(json_name) > len(set_name):
+                    set_name = json_name
+                # Use original code case from JSON for API lookup
+                original_code = json_info.get("original_code", set_code)
+
+            sets_output.append(schemas.SetInfoRead(
+                code=set_code,
+                name=set_name,
+                series=series,
+                release_date=entry.release_date,
+                total_cards=entry.card_count,
+                logo_url=self._logo_url(original_code),
+                symbol_url=self._symbol_url(set_code),
+            ))
+
+        # Also add sets from JSON that are not in CardRecord yet
+        for code, info in self._json_sets.items():
+            if code not in seen_codes:
+                original_code = info.get("original_code", code)
+                sets_output.append(schemas.SetInfoRead(
+                    code=original_code,
+                    name=info.get("name", code),
+                    series=info.get("series", ""),
+                    release_date=None,
+                    total_cards=0,
+                    logo_url=self._logo_url(original_code),
+                    symbol_url=self._symbol_url(code),
+                ))
+
+        return _sort_sets(sets_output)
+
+    def response(self, session: Session, *, now: Optional[float] = None) -> tuple[bytes, str]:
+        """Serialized set list and its ETag."""
+
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._refresh_files()
+            if self._counts is None or now - self._counts_loaded_at >= self.counts_ttl:
+                self.load_counts(session)
+            if self._response is None:
+                body = json.dumps(
+                    [item.model_dump() for item in self._build()],
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                ).encode("utf-8")
+                etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+                self._response = (body, etag)
+            return self._response
+
+
+catalog = SetCatalog()
+
+
+def note_added(session: Session, rows: Iterable[dict[str, Any]]) -> None:
+    """Record inserted ``CardRecord`` rows; counted once ``session`` commits."""
+
+    session.info.setdefault(_SESSION_KEY, []).extend(
+        {key: row.get(key) for key in ("set_code", "set_name", "series", "release_date")}
+        for row in rows
+    )
+
+
+def note_moved(session: Session) -> None:
+    """Record that existing rows changed set; counts are regrouped after commit."""
+
+    session.info[_SESSION_STALE_KEY] = True
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _apply_on_commit(session: OrmSession) -> None:
+    rows = session.info.pop(_SESSION_KEY, None)
+    if session.info.pop(_SESSION_STALE_KEY, False):
+        catalog.invalidate()
+    elif rows:
+        catalog.apply_added(rows)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_on_rollback(session: OrmSession) -> None:
+    session.info.pop(_SESSION_KEY, None)
+    session.info.pop(_SESSION_STALE_KEY, None)
+
+
+def matches_etag(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match`` header covers ``etag``."""
+
+    if not if_none_match:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+__all__ = [
+    "COUNTS_TTL",
+    "SERIES_ORDER",
+    "SetCatalog",
+    "SetCount",
+    "catalog",
+    "matches_etag",
+    "note_added",
+    "note_moved",
+]
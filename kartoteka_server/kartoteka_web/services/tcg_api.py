@@ -3,17 +3,22 @@
 from __future__ import annotations
 
 import datetime as dt
+import hashlib
 import json
 import logging
 import os
 import re
+import threading
 import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from difflib import SequenceMatcher
 from pathlib import Path
 from typing import Any, Optional
 from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from ..utils import text, sets as set_utils
 
@@ -53,6 +58,136 @@ RAPIDAPI_DEFAULT_HOST = "pokemon-tcg-api.p.rapidapi.com"
 _EUR_PLN_RATE_CACHE: dict[str, float | None] = {"value": None, "expires": 0.0}
 _EUR_PLN_RATE_TTL = 60 * 60  # 1 hour
 
+# Shared HTTP client used when callers do not pass their own session
+_HTTP_POOL_SIZE = 10
+RESPONSE_CACHE_TTL = float(os.getenv("TCG_API_CACHE_TTL", "600"))  # seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("TCG_API_CACHE_MAX_ENTRIES", "2048"))
+
+
+def get_set_api_info(set_code: str) -> Optional[dict[str, Any]]:
+    """API episode info (``api_id``, ``api_name``, …) for a set code, if known."""
+    if not set_code:
+        return None
+    return _load_set_code_mapping().get(set_code.strip())
+
+
+def register_set_api_info(set_code: str, info: dict[str, Any]) -> None:
+    """Add a set discovered at runtime to the set code mapping."""
+    _load_set_code_mapping()
+    _SET_CODE_TO_API_CACHE.setdefault(set_code.strip(), dict(info))
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of successful GET responses with a TTL."""
+
+    def __init__(self, ttl: float, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max(max_entries, 1)
+        self._entries: OrderedDict[tuple, tuple[float, requests.Response]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple) -> Optional[requests.Response]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, response: requests.Response) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+def _cache_key(url: str, params: Any, headers: Optional[dict[str, str]]) -> tuple:
+    """Key a GET on its URL, normalised query parameters and API host."""
+
+    items = params.items() if isinstance(params, dict) else (params or ())
+    normalized = tuple(
+        sorted((str(key), " ".join(str(value).split()).casefold()) for key, value in items if value is not None)
+    )
+    host = (headers or {}).get("X-RapidAPI-Host", "")
+    return url.rstrip("/"), normalized, host
+
+
+class CachedSession(requests.Session):
+    """Pooled session that serves repeated GETs from a :class:`ResponseCache`."""
+
+    def __init__(self, cache: ResponseCache) -> None:
+        super().__init__()
+        self.cache = cache
+        adapter = HTTPAdapter(pool_connections=_HTTP_POOL_SIZE, pool_maxsize=_HTTP_POOL_SIZE)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def get(self, url, params=None, headers=None, **kwargs):  # type: ignore[override]
+        key = _cache_key(url, params, headers)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        response = super().get(url, params=params, headers=headers, **kwargs)
+        if response.status_code == 200:
+            response.content  # read the body so the connection returns to the pool
+            self.cache.put(key, response)
+        return response
+
+
+_response_cache = ResponseCache(RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES)
+_http_session: Optional[CachedSession] = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session() -> CachedSession:
+    """Return the shared pooled, caching HTTP session."""
+
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = CachedSession(_response_cache)
+        return _http_session
+
+
+def cache_stats() -> dict[str, Any]:
+    """Hit/miss statistics of the shared response cache."""
+
+    return _response_cache.stats()
+
+
+def clear_cache() -> None:
+    _response_cache.clear()
+
 _RARITY_ICON_BASE_PATH = "/static/icons/rarity"
 _RARITY_ICON_IMAGE_BASE_PATH = "/icon/rarity"
 _RARITY_ICON_VECTOR_MAP = {
@@ -201,7 +336,7 @@ def get_eur_pln_rate(
     if cached_value is not None and now < expires_at:
         return cached_value
 
-    http = session or requests
+    http = session or get_http_session()
     url = "https://api.nbp.pl/api/exchangerates/rates/A/EUR"
 
     try:
@@ -535,7 +670,7 @@ def _extract_shop_url(card: dict[str, Any]) -> Optional[str]:
     for key in ("cardmarket", "cardMarket", "tcgplayer", "tcgPlayer"):
         container = card.get(key)
         if isinstance(container, dict):
-            for field in (
+            for url_key in (
                 "url",
                 "website",
                 "websiteUrl",
@@ -547,7 +682,7 @@ def _extract_shop_url(card: dict[str, Any]) -> Optional[str]:
                 "directHighURL",
                 "link",
             ):
-                _add_candidate(container.get(field))
+                _add_candidate(container.get(url_key))
 
     for key in ("purchaseUrls", "purchase_urls", "urls", "links"):
         container = card.get(key)
@@ -890,7 +1025,7 @@ def search_cards(
     if not name:
         return [], 0, 0
 
-    http = session or requests
+    http = session or get_http_session()
 
     try:
         page_value = int(page)
@@ -1154,7 +1289,7 @@ def search_products(
     if not name:
         return [], 0, 0
 
-    http = session or requests
+    http = session or get_http_session()
 
     try:
         page_value = int(page)
@@ -1305,7 +1440,7 @@ def get_latest_products(
     session: Optional[requests.sessions.Session] = None,
     timeout: float = 10.0,
 ) -> list[dict]:
-    http = session or requests
+    http = session or get_http_session()
 
     headers: dict[str, str] = {}
     _apply_default_user_agent(headers, session)
@@ -1413,6 +1548,26 @@ def get_latest_products(
 
 
 
+def build_set_card_payloads(cards: list[dict[str, Any]], set_code: str) -> list[dict[str, Any]]:
+    """Card payloads for one page of a set's card list."""
+    results: list[dict[str, Any]] = []
+    for card in cards:
+        if not isinstance(card, dict):
+            continue
+        item = build_card_payload(card)
+        if not item:
+            continue
+        if not item.get("name"):
+            item["name"] = card.get("name") or ""
+        if not item.get("image_small") and item.get("image_large"):
+            item["image_small"] = item.get("image_large")
+        # Add set code to the card
+        if not item.get("set_code"):
+            item["set_code"] = set_code
+        results.append(item)
+    return results
+
+
 def list_set_cards(
     set_code: str,
     *,
@@ -1421,16 +1576,21 @@ def list_set_cards(
     rapidapi_host: Optional[str] = None,
     session: Optional[requests.sessions.Session] = None,
     timeout: float = 10.0,
+    raise_errors: bool = False,
 ) -> tuple[list[dict[str, Any]], int]:
     """Fetch cards for a set from the API.
     
     Uses /episodes/{id}/cards endpoint with the API's episode ID.
     Falls back to search query if no mapping is found.
+
+    A failed request ends the listing early and the cards fetched so far
+    are returned; with ``raise_errors`` it raises ``requests.RequestException``
+    instead, so a truncated listing is never taken for the whole set.
     """
     if not set_code:
         return [], 0
 
-    http = session or requests
+    http = session or get_http_session()
     headers: dict[str, str] = {}
     _apply_default_user_agent(headers, session)
     api_host_value, api_host_header = _normalize_host(rapidapi_host)
@@ -1470,15 +1630,21 @@ def list_set_cards(
             except requests.Timeout:
                 request_count += 1
                 logger.warning("Request timed out for set %s page %d", set_code, page)
+                if raise_errors:
+                    raise
                 break
             except (requests.RequestException, ValueError) as exc:
                 request_count += 1
                 logger.warning("Fetching cards for set %s failed: %s", set_code, exc)
+                if raise_errors:
+                    raise
                 break
             else:
                 request_count += 1
                 if response.status_code != 200:
                     logger.warning("API error for set %s: %s", set_code, response.status_code)
+                    if raise_errors:
+                        raise requests.HTTPError(f"API error {response.status_code} for set {set_code}")
                     break
                 payload = response.json()
 
@@ -1495,18 +1661,7 @@ def list_set_cards(
             if not cards:
                 break
 
-            for card in cards:
-                item = build_card_payload(card)
-                if not item:
-                    continue
-                if not item.get("name"):
-                    item["name"] = card.get("name") or ""
-                if not item.get("image_small") and item.get("image_large"):
-                    item["image_small"] = item.get("image_large")
-                # Add set code to the card
-                if not item.get("set_code"):
-                    item["set_code"] = set_code
-                results.append(item)
+            results.extend(build_set_card_payloads(cards, set_code))
 
             fetched_total += len(cards)
             logger.debug("Set %s: page %d/%d, got %d cards, total %d", 
@@ -1570,15 +1725,21 @@ def list_set_cards(
             except requests.Timeout:
                 request_count += 1
                 logger.warning("Request timed out")
+                if raise_errors:
+                    raise
                 break
             except (requests.RequestException, ValueError) as exc:
                 request_count += 1
                 logger.warning("Fetching cards for set %s failed: %s", set_code, exc)
+                if raise_errors:
+                    raise
                 break
             else:
                 request_count += 1
                 if response.status_code != 200:
                     logger.warning("API error: %s", response.status_code)
+                    if raise_errors:
+                        raise requests.HTTPError(f"API error {response.status_code} for set {set_code}")
                     break
                 payload = response.json()
 
@@ -1622,6 +1783,137 @@ def list_set_cards(
     return results, request_count
 
 
+
+EPISODE_PAGE_SIZE = 50
+
+
+@dataclass
+class CardsPage:
+    """One page of an episode's card list; ``not_modified`` after a 304."""
+
+    page: int
+    cards: list[dict[str, Any]] = field(default_factory=list)
+    total_pages: int = 1
+    total_count: int = 0
+    etag: Optional[str] = None
+    content_hash: Optional[str] = None
+    not_modified: bool = False
+
+
+def content_hash(value: Any) -> str:
+    """Stable SHA-256 of a JSON value; key order does not matter."""
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def fetch_episode_cards_page(
+    api_id: int | str,
+    page: int = 1,
+    *,
+    etag: Optional[str] = None,
+    page_size: int = EPISODE_PAGE_SIZE,
+    rapidapi_key: Optional[str] = None,
+    rapidapi_host: Optional[str] = None,
+    session: Optional[requests.sessions.Session] = None,
+    timeout: float = 10.0,
+) -> CardsPage:
+    """Fetch one page of ``/episodes/{id}/cards``.
+
+    With ``etag`` the request is conditional (``If-None-Match``) and a 304
+    comes back as ``not_modified`` without cards. The page's
+    ``content_hash`` covers the card data only, so it can be compared even
+    when the API sends no ETag. HTTP errors raise ``requests.HTTPError``.
+    """
+    http = session or get_http_session()
+    headers: dict[str, str] = {}
+    _apply_default_user_agent(headers, session)
+    api_host_value, api_host_header = _normalize_host(rapidapi_host)
+    if rapidapi_key:
+        headers["X-RapidAPI-Key"] = rapidapi_key
+    headers["X-RapidAPI-Host"] = api_host_header
+    if etag:
+        headers["If-None-Match"] = etag
+
+    url = _build_cards_endpoint(api_host_value, f"episodes/{api_id}/cards")
+    params = {"page": str(page), "pageSize": str(page_size)}
+    response = http.get(url, params=params, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return CardsPage(page=page, etag=etag, not_modified=True)
+    response.raise_for_status()
+    payload = response.json()
+
+    cards: list[dict[str, Any]] = []
+    total_pages = 1
+    total_count = 0
+    if isinstance(payload, dict):
+        cards = payload.get("data") or []
+        total_count = int(payload.get("results") or payload.get("totalCount") or 0)
+        paging = payload.get("paging") or {}
+        total_pages = int(paging.get("total") or 1)
+    elif isinstance(payload, list):
+        cards = payload
+
+    return CardsPage(
+        page=page,
+        cards=cards,
+        total_pages=max(total_pages, 1),
+        total_count=total_count,
+        etag=response.headers.get("ETag"),
+        content_hash=content_hash(cards),
+    )
+
+
+def list_episodes(
+    *,
+    page_size: int = 100,
+    rapidapi_key: Optional[str] = None,
+    rapidapi_host: Optional[str] = None,
+    session: Optional[requests.sessions.Session] = None,
+    timeout: float = 10.0,
+) -> tuple[list[dict[str, Any]], int]:
+    """List every episode (set) known to the API; returns ``(episodes, request_count)``.
+
+    HTTP errors raise ``requests.HTTPError`` so a partial listing is never
+    mistaken for the full one.
+    """
+    http = session or get_http_session()
+    headers: dict[str, str] = {}
+    _apply_default_user_agent(headers, session)
+    api_host_value, api_host_header = _normalize_host(rapidapi_host)
+    if rapidapi_key:
+        headers["X-RapidAPI-Key"] = rapidapi_key
+    headers["X-RapidAPI-Host"] = api_host_header
+
+    url = _build_cards_endpoint(api_host_value, "episodes")
+    episodes: list[dict[str, Any]] = []
+    request_count = 0
+    page = 1
+    while True:
+        params = {"page": str(page), "pageSize": str(page_size)}
+        response = http.get(url, params=params, headers=headers, timeout=timeout)
+        request_count += 1
+        response.raise_for_status()
+        payload = response.json()
+
+        total_pages = 1
+        if isinstance(payload, dict):
+            data = payload.get("data") or []
+            paging = payload.get("paging") or {}
+            total_pages = int(paging.get("total") or 1)
+        elif isinstance(payload, list):
+            data = payload
+        else:
+            data = []
+
+        episodes.extend(item for item in data if isinstance(item, dict))
+        if not data or page >= total_pages:
+            break
+        page += 1
+
+    logger.info("Listed %d episodes in %d requests", len(episodes), request_count)
+    return episodes, request_count
+
+
 def _normalize_history_date_param(value: Any) -> Optional[str]:
     if value is None:
         return None
@@ -1660,7 +1952,7 @@ def fetch_card_price_history(
     if not card_id:
         return []
 
-    http = session or requests
+    http = session or get_http_session()
     headers: dict[str, str] = {}
     _apply_default_user_agent(headers, session)
     api_host_value, api_host_header = _normalize_host(rapidapi_host)
@@ -1736,7 +2028,7 @@ def fetch_product_price_history(
     if not product_id:
         return []
 
-    http = session or requests
+    http = session or get_http_session()
     headers: dict[str, str] = {}
     _apply_default_user_agent(headers, session)
     api_host_value, api_host_header = _normalize_host(rapidapi_host)
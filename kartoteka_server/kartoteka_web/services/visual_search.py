@@ -0,0 +1,415 @@
+"""Perceptual-hash visual search over the card catalogue.
+
+Every ``CardRecord`` with a cached ``image_small`` gets a 64-bit pHash in
+``CardRecord.phash``. The column is an ``INTEGER``, so the unsigned hash is
+stored in its signed two's-complement form (:func:`to_signed` /
+:func:`to_unsigned`).
+
+Photos confirmed by users through ``/api/scanner/learn`` are kept apart
+as ``LearnedPhash`` rows, so a record can match by its artwork and by any
+number of photos without the catalogue hash being replaced.
+
+Lookups never scan the table. :data:`phash_index` keeps every known hash in
+one packed ``uint64`` numpy array, loaded from the database and then
+extended as hashes are written. Every worker process keeps its own index,
+so at most every :data:`RELOAD_CHECK_INTERVAL` seconds a search compares
+the stored hash counts with the loaded ones and reloads when another
+process has added hashes. A query XORs the scan hash against the
+whole array, counts bits per element and takes the ``k`` smallest distances
+with ``argpartition``.
+
+:func:`hash_cached_images` is run by the scheduler to hash small images in
+the local image cache, queueing the ones not downloaded yet.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import imagehash
+import numpy as np
+from PIL import Image
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from .. import models
+from ..database import session_scope
+from ..utils import images as image_utils
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+# Hamming distance at or below which a match is trusted without OCR
+CONFIDENT_DISTANCE = 6
+# Largest distance still reported as a candidate
+MATCH_THRESHOLD = 12
+
+# Records hashed per scheduler run
+HASH_BATCH_SIZE = 500
+
+# Seconds between checks whether other processes stored new hashes
+RELOAD_CHECK_INTERVAL = 60.0
+
+_POPCOUNT8 = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def to_signed(value: int) -> int:
+    """Unsigned 64-bit hash to the signed value stored in the database."""
+
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value: int) -> int:
+    """Signed database value back to the unsigned 64-bit hash."""
+
+    return value & ((1 << HASH_BITS) - 1)
+
+
+def phash_image(image_bytes: bytes) -> int:
+    """Unsigned 64-bit pHash of an encoded image; ``ValueError`` if unreadable."""
+
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        bits = imagehash.phash(image).hash.flatten()
+    except Exception as exc:
+        raise ValueError("Invalid image data") from exc
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distances(hashes: np.ndarray, target: int) -> np.ndarray:
+    """Bit distance between ``target`` and every element of a ``uint64`` array."""
+
+    xor = np.bitwise_xor(hashes, np.uint64(target))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor).astype(np.int64)
+    return _POPCOUNT8[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+
+@dataclass
+class VisualMatch:
+    """A catalogue record and its Hamming distance to the scanned image."""
+
+    record_id: int
+    distance: int
+
+    @property
+    def confident(self) -> bool:
+        return self.distance <= CONFIDENT_DISTANCE
+
+
+def learned_key(learned_id: int) -> int:
+    """Index entry key of a ``LearnedPhash`` row.
+
+    Catalogue hashes are keyed by their record id; learned hashes use the
+    negated row id so both live in the same index without colliding.
+    """
+
+    return -learned_id
+
+
+def stored_hash_counts(session: Session) -> tuple[int, int]:
+    """Number of catalogue and learned hashes stored in the database."""
+
+    catalogue = session.exec(
+        select(func.count(models.CardRecord.phash)).where(models.CardRecord.phash.is_not(None))
+    ).one()
+    learned = session.exec(select(func.count(models.LearnedPhash.id))).one()
+    return int(catalogue), int(learned)
+
+
+class PhashIndex:
+    """Packed in-memory hash index with vectorized top-k Hamming search.
+
+    Each entry has a key, a record id and a hash. Several entries may point
+    at the same record; searches report every record once, at its closest
+    distance.
+    """
+
+    def __init__(self) -> None:
+        self._keys = np.empty(0, dtype=np.int64)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._extra = 0
+        self._pending: dict[int, tuple[int, int]] = {}
+        self._loaded = False
+        # Stored hash counts seen at the last load and when they were checked
+        self._counts: Optional[tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._merge()
+            return int(self._keys.size)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, session: Session) -> int:
+        """(Re)build the index from catalogue and learned hashes; returns its size."""
+
+        counts = stored_hash_counts(session)
+        rows = [
+            (record_id, record_id, value)
+            for record_id, value in session.exec(
+                select(models.CardRecord.id, models.CardRecord.phash).where(
+                    models.CardRecord.phash.is_not(None)
+                )
+            ).all()
+        ]
+        rows += [
+            (learned_key(learned_id), record_id, value)
+            for learned_id, record_id, value in session.exec(
+                select(
+                    models.LearnedPhash.id,
+                    models.LearnedPhash.card_record_id,
+                    models.LearnedPhash.phash,
+                )
+            ).all()
+        ]
+        keys = np.fromiter((key for key, _, _ in rows), dtype=np.int64, count=len(rows))
+        ids = np.fromiter((record_id for _, record_id, _ in rows), dtype=np.int64, count=len(rows))
+        hashes = np.fromiter((to_unsigned(value) for _, _, value in rows), dtype=np.uint64, count=len(rows))
+        with self._lock:
+            self._keys, self._ids, self._hashes = keys, ids, hashes
+            self._extra = int(np.count_nonzero(keys != ids))
+            self._pending.clear()
+            self._loaded = True
+            self._counts = counts
+            self._checked_at = time.monotonic()
+        logger.info("Visual search index loaded with %s hashes", len(rows))
+        return len(rows)
+
+    def ensure_loaded(self, session: Session, *, now: Optional[float] = None) -> None:
+        """Load the index on first use and reload it when the stored counts changed.
+
+        The counts are compared at most every :data:`RELOAD_CHECK_INTERVAL`
+        seconds, so hashes written by other processes show up within that.
+        """
+
+        if not self._loaded:
+            self.load(session)
+            return
+        now = time.monotonic() if now is None else now
+        if now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        if stored_hash_counts(session) != self._counts:
+            self.load(session)
+
+    def add(self, record_id: int, value: int, *, key: Optional[int] = None) -> None:
+        """Insert or replace one (unsigned) hash of a record.
+
+        ``key`` defaults to ``record_id``, the record's catalogue hash.
+        """
+
+        with self._lock:
+            self._pending[record_id if key is None else key] = (record_id, to_unsigned(value))
+
+    def add_many(self, items: Iterable[tuple[int, int]]) -> None:
+        """Insert or replace catalogue hashes given as ``(record_id, value)``."""
+
+        with self._lock:
+            for record_id, value in items:
+                self._pending[record_id] = (record_id, to_unsigned(value))
+
+    def _merge(self) -> None:
+        # Fold buffered writes into the packed arrays; called with the lock held.
+        if not self._pending:
+            return
+        count = len(self._pending)
+        pending_keys = np.fromiter(self._pending.keys(), dtype=np.int64, count=count)
+        pending_ids = np.fromiter((record_id for record_id, _ in self._pending.values()), dtype=np.int64, count=count)
+        pending_hashes = np.fromiter((value for _, value in self._pending.values()), dtype=np.uint64, count=count)
+        keep = ~np.isin(self._keys, pending_keys)
+        self._keys = np.concatenate([self._keys[keep], pending_keys])
+        self._ids = np.concatenate([self._ids[keep], pending_ids])
+        self._hashes = np.concatenate([self._hashes[keep], pending_hashes])
+        self._extra = int(np.count_nonzero(self._keys != self._ids))
+        self._pending.clear()
+
+    def search(self, value: int, k: int = 5, max_distance: int = MATCH_THRESHOLD) -> list[VisualMatch]:
+        """The ``k`` nearest records within ``max_distance``, closest first."""
+
+        with self._lock:
+            self._merge()
+            ids, hashes, extra = self._ids, self._hashes, self._extra
+        if not ids.size or k <= 0:
+            return []
+        distances = hamming_distances(hashes, value)
+        # Learned photos repeat record ids; widen the cut so k distinct records survive
+        wanted = k + extra
+        if ids.size > wanted:
+            candidates = np.argpartition(distances, wanted - 1)[:wanted]
+        else:
+            candidates = np.arange(ids.size)
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        matches: list[VisualMatch] = []
+        seen: set[int] = set()
+        for i in candidates:
+            record_id = int(ids[i])
+            if distances[i] > max_distance or len(matches) == k:
+                break
+            if record_id not in seen:
+                seen.add(record_id)
+                matches.append(VisualMatch(record_id=record_id, distance=int(distances[i])))
+        return matches
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys = np.empty(0, dtype=np.int64)
+            self._ids = np.empty(0, dtype=np.int64)
+            self._hashes = np.empty(0, dtype=np.uint64)
+            self._extra = 0
+            self._pending.clear()
+            self._loaded = False
+            self._counts = None
+
+
+phash_index = PhashIndex()
+
+# Records whose cached image could not be hashed; skipped until restart
+_unhashable: set[int] = set()
+# Last record id visited by ``hash_cached_images``
+_cursor = 0
+
+
+def search(
+    session: Session,
+    image_bytes: bytes,
+    *,
+    k: int = 5,
+    max_distance: int = MATCH_THRESHOLD,
+) -> list[tuple[models.CardRecord, int]]:
+    """Catalogue records visually closest to ``image_bytes`` with their distances."""
+
+    try:
+        value = phash_image(image_bytes)
+    except ValueError:
+        return []
+    phash_index.ensure_loaded(session)
+    matches = phash_index.search(value, k=k, max_distance=max_distance)
+    if not matches:
+        return []
+    records = {
+        record.id: record
+        for record in session.exec(
+            select(models.CardRecord).where(
+                models.CardRecord.id.in_([match.record_id for match in matches])
+            )
+        ).all()
+    }
+    return [
+        (records[match.record_id], match.distance)
+        for match in matches
+        if match.record_id in records
+    ]
+
+
+def register(session: Session, record_id: int, image_bytes: bytes) -> Optional[int]:
+    """Learn a user photo of a record; returns its hash or ``None``.
+
+    The hash is stored as a ``LearnedPhash`` row next to the catalogue
+    hash, which keeps describing the record's own artwork.
+    """
+
+    if session.get(models.CardRecord, record_id) is None:
+        return None
+    value = phash_image(image_bytes)
+    stored = to_signed(value)
+    learned = session.exec(
+        select(models.LearnedPhash).where(
+            models.LearnedPhash.card_record_id == record_id,
+            models.LearnedPhash.phash == stored,
+        )
+    ).first()
+    if learned is None:
+        learned = models.LearnedPhash(card_record_id=record_id, phash=stored)
+        session.add(learned)
+        session.commit()
+        session.refresh(learned)
+    phash_index.add(record_id, value, key=learned_key(learned.id))
+    return value
+
+
+def hash_cached_images(limit: int = HASH_BATCH_SIZE) -> int:
+    """Hash up to ``limit`` unhashed records whose small image is cached.
+
+    Records are visited in id order from where the previous run stopped.
+    Remote images that are not cached yet are queued on the image cache
+    and hashed by a later run.
+    """
+
+    global _cursor
+    with session_scope() as session:
+        stmt = (
+            select(models.CardRecord.id, models.CardRecord.image_small)
+            .where(
+                models.CardRecord.phash.is_(None),
+                models.CardRecord.image_small.is_not(None),
+                models.CardRecord.id > _cursor,
+            )
+            .order_by(models.CardRecord.id)
+            .limit(limit)
+        )
+        rows = session.exec(stmt).all()
+    _cursor = rows[-1][0] if len(rows) == limit else 0
+
+    # Image decoding and DCT run outside any transaction
+    hashed: list[tuple[int, int]] = []
+    for record_id, image_small in rows:
+        if record_id in _unhashable:
+            continue
+        path = image_utils.local_file(image_utils.cached_path(image_small, variant="small"))
+        if path is None:
+            if image_small.startswith(("http://", "https://")):
+                image_utils.image_cache.submit(image_small, "small")
+            else:
+                _unhashable.add(record_id)
+            continue
+        try:
+            hashed.append((record_id, phash_image(path.read_bytes())))
+        except (OSError, ValueError) as exc:
+            logger.debug("Cannot hash image for record %s: %s", record_id, exc)
+            _unhashable.add(record_id)
+
+    if hashed:
+        with session_scope() as session:
+            for record_id, value in hashed:
+                record = session.get(models.CardRecord, record_id)
+                if record is not None:
+                    record.phash = to_signed(value)
+                    session.add(record)
+        phash_index.add_many(hashed)
+    return len(hashed)
+
+
+__all__ = [
+    "CONFIDENT_DISTANCE",
+    "MATCH_THRESHOLD",
+    "PhashIndex",
+    "RELOAD_CHECK_INTERVAL",
+    "VisualMatch",
+    "hamming_distances",
+    "hash_cached_images",
+    "learned_key",
+    "phash_image",
+    "phash_index",
+    "register",
+    "search",
+    "stored_hash_counts",
+    "to_signed",
+    "to_unsigned",
+]
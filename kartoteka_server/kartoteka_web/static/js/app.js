@@ -844,6 +844,9 @@
     }
   };
 
+  const HISTORY_REFRESH_MS = 15000;
+  let historyRefreshTimer = null;
+
   const updateCollectionStats = async (useHistory = false) => {
     const totalCardsEl = document.getElementById("stat-total-cards");
     const uniqueCardsEl = document.getElementById("stat-unique-cards");
@@ -859,6 +862,14 @@
       const stats = await apiFetch(url);
       
       currentStats = stats;
+
+      // Price history is being backfilled in the background; poll until done
+      if (useHistory) {
+        clearTimeout(historyRefreshTimer);
+        if (stats.history_status === "updating") {
+          historyRefreshTimer = setTimeout(() => updateCollectionStats(true), HISTORY_REFRESH_MS);
+        }
+      }
       
       // Update statistics
       if (totalCardsEl) totalCardsEl.textContent = stats.total_cards?.toString() || "0";
@@ -1,20 +1,64 @@
-"""Helpers for caching card artwork locally."""
+"""Helpers for caching card artwork locally.
+
+Downloads go through :data:`image_cache`, a small background worker pool:
+
+* requests for the same URL and variant share one in-flight download;
+* callers that must not block (:func:`ensure_local_path`,
+  :func:`cache_card_images`) get the remote URL back immediately and the
+  local path on a later call, once the file is on disk;
+* files are written to a temporary name and renamed into place, so a
+  half-written image is never served;
+* small images also get a WebP thumbnail for listing pages
+  (:func:`thumbnail_path`);
+* the directory is capped at ``CARD_IMAGE_CACHE_MAX_MB``; least recently
+  used files are evicted first. The source URL of every file is kept in a
+  side index, so :class:`CardImageFiles` redirects requests for evicted
+  files to the original and queues them again.
+"""
 
 from __future__ import annotations
 
 import hashlib
+import io
 import logging
 import mimetypes
 import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import RedirectResponse, Response
+from starlette.staticfiles import StaticFiles
 
 LOGGER = logging.getLogger(__name__)
 
 CARD_IMAGE_DIR = Path(os.getenv("CARD_IMAGE_DIR", "card_images"))
 CARD_IMAGE_URL_PREFIX = os.getenv("CARD_IMAGE_URL_PREFIX", "/card-images")
+CARD_IMAGE_CACHE_MAX_BYTES = int(os.getenv("CARD_IMAGE_CACHE_MAX_MB", "2048")) * 1024 * 1024
+CARD_IMAGE_CONCURRENCY = int(os.getenv("CARD_IMAGE_CONCURRENCY", "4"))
+
+THUMBNAIL_VARIANT = "thumb"
+THUMBNAIL_SIZE = (160, 224)
+THUMBNAIL_QUALITY = 80
+
+# Eviction frees space down to this share of the cap
+_EVICT_TARGET = 0.9
+# Access times are written to the index at most this often per file
+_TOUCH_INTERVAL = 300.0
+# Files whose last index write is remembered for throttling
+_TOUCHED_MAX = 4096
+
+_INDEX_FILENAME = ".cache-index.sqlite"
+_TEMP_PREFIX = ".tmp-"
 
 _VALID_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 
@@ -49,8 +93,12 @@ def _guess_extension(url: str, content_type: str | None) -> str:
     return ".jpg"
 
 
+def _digest(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
 def _candidate_filename(url: str, variant: str) -> tuple[str, Optional[Path]]:
-    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    digest = _digest(url)
     suffix = _normalise_suffix(Path(url.split("?", 1)[0]).suffix)
     if suffix:
         filename = f"{digest}-{variant}{suffix}"
@@ -58,11 +106,390 @@ def _candidate_filename(url: str, variant: str) -> tuple[str, Optional[Path]]:
     return f"{digest}-{variant}", None
 
 
+def _thumbnail_filename(filename: str) -> str:
+    stem = filename.rsplit(".", 1)[0]
+    return f"{stem}-{THUMBNAIL_VARIANT}.webp"
+
+
+def _full_size_path(value: str) -> str:
+    """Map a cached thumbnail path back to the image it was made from."""
+
+    filename = _filename_of(value)
+    thumb_suffix = f"-{THUMBNAIL_VARIANT}.webp"
+    if not filename or not filename.endswith(thumb_suffix):
+        return value
+    stem = filename[: -len(thumb_suffix)]
+    for suffix in sorted(_VALID_SUFFIXES):
+        if (CARD_IMAGE_DIR / f"{stem}{suffix}").is_file():
+            return _local_path(f"{stem}{suffix}")
+    return value
+
+
 def _local_path(filename: str) -> str:
     prefix = CARD_IMAGE_URL_PREFIX.rstrip("/")
     return f"{prefix}/{filename}"
 
 
+def _is_remote(value: str) -> bool:
+    return value.startswith(("http://", "https://"))
+
+
+def _filename_of(value: str) -> Optional[str]:
+    """Bare filename of a cached ``/card-images/...`` path."""
+
+    if not value.startswith(CARD_IMAGE_URL_PREFIX):
+        return None
+    filename = value[len(CARD_IMAGE_URL_PREFIX):].lstrip("/")
+    if not filename or "/" in filename or filename.startswith("."):
+        return None
+    return filename
+
+
+def local_file(value: Optional[str]) -> Optional[Path]:
+    """Return the file behind a cached ``/card-images/...`` path, if it exists."""
+
+    filename = _filename_of(value or "")
+    if filename is None:
+        return None
+    path = CARD_IMAGE_DIR / filename
+    return path if path.is_file() else None
+
+
+def write_atomic(path: Path, content: bytes) -> None:
+    """Write ``content`` to ``path`` via a temporary file and rename."""
+
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=_TEMP_PREFIX)
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(content)
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except OSError:
+            pass
+        raise
+
+
+def make_thumbnail(content: bytes) -> bytes:
+    """Encode a listing-size WebP thumbnail of an image."""
+
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(content))
+    image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    image.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=THUMBNAIL_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+class ImageCache:
+    """Background downloader and size-capped LRU store for card images."""
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        *,
+        max_bytes: int = CARD_IMAGE_CACHE_MAX_BYTES,
+        concurrency: int = CARD_IMAGE_CONCURRENCY,
+        session: Optional[requests.Session] = None,
+    ) -> None:
+        self._directory = directory
+        self.max_bytes = max_bytes
+        self.concurrency = max(concurrency, 1)
+        self._session = session
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._inflight: dict[tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_dir: Optional[Path] = None
+        self._db_lock = threading.Lock()
+        self._touched: OrderedDict[str, float] = OrderedDict()
+
+    @property
+    def directory(self) -> Path:
+        return self._directory or CARD_IMAGE_DIR
+
+    # ------------------------------------------------------------------
+    # Side index: filename -> source URL, size and last access
+    # ------------------------------------------------------------------
+
+    def _index(self) -> sqlite3.Connection:
+        # Called with ``_db_lock`` held.
+        directory = self.directory
+        if self._db is not None and self._db_dir == directory:
+            return self._db
+        if self._db is not None:
+            self._db.close()
+        directory.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(str(directory / _INDEX_FILENAME), check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " filename TEXT PRIMARY KEY, url TEXT, variant TEXT,"
+            " size INTEGER NOT NULL DEFAULT 0, accessed REAL NOT NULL DEFAULT 0,"
+            " present INTEGER NOT NULL DEFAULT 1)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS ix_entries_source ON entries (url, variant)")
+        db.execute("CREATE INDEX IF NOT EXISTS ix_entries_lru ON entries (present, accessed)")
+        if db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 0:
+            # Adopt files cached before the index existed.
+            rows = []
+            for path in directory.iterdir():
+                if path.name.startswith(".") or not path.is_file():
+                    continue
+                stat = path.stat()
+                rows.append((path.name, stat.st_size, stat.st_mtime))
+            db.executemany(
+                "INSERT OR IGNORE INTO entries (filename, size, accessed) VALUES (?, ?, ?)", rows
+            )
+        db.commit()
+        self._db, self._db_dir = db, directory
+        return db
+
+    def _record(self, filename: str, url: Optional[str], variant: str, size: int) -> None:
+        with self._db_lock:
+            db = self._index()
+            db.execute(
+                "INSERT INTO entries (filename, url, variant, size, accessed, present)"
+                " VALUES (?, ?, ?, ?, ?, 1)"
+                " ON CONFLICT(filename) DO UPDATE SET url = COALESCE(excluded.url, url),"
+                " variant = excluded.variant, size = excluded.size,"
+                " accessed = excluded.accessed, present = 1",
+                (filename, url, variant, size, time.time()),
+            )
+            db.commit()
+
+    def lookup(self, url: str, variant: str) -> Optional[str]:
+        """Filename of the cached copy of ``url``, if it is on disk."""
+
+        filename, path = _candidate_filename(url, variant)
+        if path is not None:
+            path = self.directory / filename
+            return filename if path.is_file() else None
+        with self._db_lock:
+            row = self._index().execute(
+                "SELECT filename FROM entries WHERE url = ? AND variant = ? AND present = 1",
+                (url, variant),
+            ).fetchone()
+        if row and (self.directory / row[0]).is_file():
+            return row[0]
+        return None
+
+    def source(self, filename: str) -> Optional[tuple[str, str]]:
+        """``(url, variant)`` a cached (or evicted) file was downloaded from."""
+
+        with self._db_lock:
+            row = self._index().execute(
+                "SELECT url, variant FROM entries WHERE filename = ? AND url IS NOT NULL",
+                (filename,),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def touch(self, filename: str) -> None:
+        """Mark a file as used; throttled to one index write per interval."""
+
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(filename, 0.0) < _TOUCH_INTERVAL:
+                return
+            self._touched[filename] = now
+            self._touched.move_to_end(filename)
+            # Oldest first: drop entries past the interval, and any over the cap
+            while self._touched:
+                oldest, touched_at = next(iter(self._touched.items()))
+                if now - touched_at < _TOUCH_INTERVAL and len(self._touched) <= _TOUCHED_MAX:
+                    break
+                del self._touched[oldest]
+        with self._db_lock:
+            db = self._index()
+            db.execute("UPDATE entries SET accessed = ? WHERE filename = ?", (now, filename))
+            db.commit()
+
+    def size(self) -> int:
+        with self._db_lock:
+            return int(
+                self._index().execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE present = 1").fetchone()[0]
+            )
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """Delete least recently used files until under the cap; returns bytes freed."""
+
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        with self._db_lock:
+            db = self._index()
+            total = int(db.execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE present = 1").fetchone()[0])
+            if total <= limit:
+                return 0
+            target = int(limit * _EVICT_TARGET)
+            freed = 0
+            evicted: list[str] = []
+            for filename, size in db.execute(
+                "SELECT filename, size FROM entries WHERE present = 1 ORDER BY accessed"
+            ).fetchall():
+                if total - freed <= target:
+                    break
+                try:
+                    (self.directory / filename).unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as exc:  # pragma: no cover - logged for visibility
+                    LOGGER.warning("Failed to evict card image %s: %s", filename, exc)
+                    continue
+                freed += size
+                evicted.append(filename)
+            db.executemany(
+                "UPDATE entries SET present = 0, size = 0 WHERE filename = ?",
+                [(filename,) for filename in evicted],
+            )
+            db.commit()
+        with self._lock:
+            for filename in evicted:
+                self._touched.pop(filename, None)
+        LOGGER.info("Evicted %s card images (%s bytes)", len(evicted), freed)
+        return freed
+
+    # ------------------------------------------------------------------
+    # Downloads
+    # ------------------------------------------------------------------
+
+    def _http(self) -> requests.Session:
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+        return self._session
+
+    def submit(
+        self,
+        url: str,
+        variant: str = "image",
+        *,
+        session: Optional[requests.sessions.Session] = None,
+        timeout: float = 10.0,
+    ) -> Future:
+        """Queue a download; resolves to the local path or ``None``."""
+
+        key = (url, variant)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.concurrency, thread_name_prefix="card-images"
+                )
+            future = self._pool.submit(self._download, url, variant, session, timeout)
+            self._inflight[key] = future
+        future.add_done_callback(lambda _: self._done(key))
+        return future
+
+    def _done(self, key: tuple[str, str]) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+    def _download(
+        self,
+        url: str,
+        variant: str,
+        session: Optional[requests.sessions.Session],
+        timeout: float,
+    ) -> Optional[str]:
+        existing = self.lookup(url, variant)
+        if existing:
+            if variant == "small" and not (self.directory / _thumbnail_filename(existing)).is_file():
+                try:
+                    self._write_thumbnail(existing, url, (self.directory / existing).read_bytes())
+                except OSError as exc:  # pragma: no cover - logged for visibility
+                    LOGGER.warning("Failed to read card image %s: %s", existing, exc)
+            return _local_path(existing)
+
+        http = session or self._http()
+        try:
+            response = http.get(url, timeout=timeout)
+        except requests.RequestException as exc:  # pragma: no cover - logged in production
+            LOGGER.warning("Failed to download card image %s: %s", url, exc)
+            return None
+
+        if response.status_code != 200 or not response.content:
+            LOGGER.warning(
+                "Failed to download card image %s (status %s)", url, response.status_code
+            )
+            return None
+
+        extension = _guess_extension(url, response.headers.get("Content-Type"))
+        filename = f"{_digest(url)}-{variant}{extension}"
+        directory = self.directory
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            write_atomic(directory / filename, response.content)
+        except OSError as exc:  # pragma: no cover - logged for visibility
+            LOGGER.warning("Failed to write card image %s: %s", filename, exc)
+            return None
+        self._record(filename, url, variant, len(response.content))
+
+        if variant == "small":
+            self._write_thumbnail(filename, url, response.content)
+
+        self.evict()
+        return _local_path(filename)
+
+    def _write_thumbnail(self, filename: str, url: str, content: bytes) -> None:
+        # Recorded with the small image's URL, so an evicted thumbnail can be
+        # redirected and rebuilt
+        thumb_name = _thumbnail_filename(filename)
+        try:
+            thumb = make_thumbnail(content)
+            write_atomic(self.directory / thumb_name, thumb)
+        except Exception as exc:  # pragma: no cover - logged for visibility
+            LOGGER.warning("Failed to create thumbnail for %s: %s", filename, exc)
+            return
+        self._record(thumb_name, url, THUMBNAIL_VARIANT, len(thumb))
+
+    def fetch(
+        self,
+        url: str,
+        variant: str = "image",
+        *,
+        session: Optional[requests.sessions.Session] = None,
+        timeout: float = 10.0,
+    ) -> Optional[str]:
+        """Download ``url`` (or join the running download) and wait for it."""
+
+        return self.submit(url, variant, session=session, timeout=timeout).result()
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=not wait)
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = self._db_dir = None
+
+
+image_cache = ImageCache()
+
+
+def cached_path(url: Optional[str], *, variant: str = "image") -> Optional[str]:
+    """Local path of ``url`` if it is already cached; never downloads."""
+
+    if not url:
+        return None
+    value = url.strip()
+    if value.startswith(CARD_IMAGE_URL_PREFIX):
+        return value if local_file(value) else None
+    filename = image_cache.lookup(value, variant) if value else None
+    return _local_path(filename) if filename else None
+
+
 def cache_card_image(
     url: str,
     *,
@@ -70,7 +497,11 @@ def cache_card_image(
     session: Optional[requests.sessions.Session] = None,
     timeout: float = 10.0,
 ) -> Optional[str]:
-    """Download ``url`` into the cache directory and return a local path."""
+    """Download ``url`` into the cache directory and return a local path.
+
+    Blocks until the file is written; use :func:`ensure_local_path` from
+    request handlers.
+    """
 
     if not url:
         return None
@@ -81,35 +512,10 @@ def cache_card_image(
         return value
 
     ensure_directory()
-
-    filename, existing_path = _candidate_filename(value, variant)
-    if existing_path and existing_path.exists():
-        return _local_path(existing_path.name)
-
-    http = session or requests
-    try:
-        response = http.get(value, timeout=timeout)
-    except requests.RequestException as exc:  # pragma: no cover - logged in production
-        LOGGER.warning("Failed to download card image %s: %s", value, exc)
-        return None
-
-    if response.status_code != 200 or not response.content:
-        LOGGER.warning(
-            "Failed to download card image %s (status %s)", value, response.status_code
-        )
-        return None
-
-    extension = _guess_extension(value, response.headers.get("Content-Type"))
-    filename = f"{hashlib.sha1(value.encode('utf-8')).hexdigest()}-{variant}{extension}"
-    path = CARD_IMAGE_DIR / filename
-    if not path.exists():
-        try:
-            path.write_bytes(response.content)
-        except OSError as exc:  # pragma: no cover - logged for visibility
-            LOGGER.warning("Failed to write card image %s: %s", path, exc)
-            return None
-
-    return _local_path(filename)
+    existing = cached_path(value, variant=variant)
+    if existing:
+        return existing
+    return image_cache.fetch(value, variant, session=session, timeout=timeout)
 
 
 def ensure_local_path(
@@ -119,7 +525,11 @@ def ensure_local_path(
     session: Optional[requests.sessions.Session] = None,
     timeout: float = 10.0,
 ) -> Optional[str]:
-    """Return a cached local path for ``value`` if possible."""
+    """Return a cached local path for ``value``, or ``value`` while it downloads.
+
+    Uncached remote images are queued on :data:`image_cache` and the remote
+    URL is returned right away; a later call returns the local path.
+    """
 
     if not value:
         return None
@@ -127,8 +537,33 @@ def ensure_local_path(
     if not trimmed:
         return None
     if trimmed.startswith(CARD_IMAGE_URL_PREFIX):
-        return trimmed
-    return cache_card_image(trimmed, variant=variant, session=session, timeout=timeout)
+        # Listings hand out thumbnails; store the full image instead
+        return _full_size_path(trimmed)
+    existing = cached_path(trimmed, variant=variant)
+    if existing:
+        return existing
+    if _is_remote(trimmed):
+        image_cache.submit(trimmed, variant, session=session, timeout=timeout)
+    return trimmed
+
+
+def thumbnail_path(value: Optional[str]) -> Optional[str]:
+    """WebP thumbnail for a small card image when cached, else ``value``.
+
+    Accepts a cached ``/card-images/...`` path or the remote URL of a small
+    image. Never downloads.
+    """
+
+    if not value:
+        return value
+    trimmed = value.strip()
+    local = cached_path(trimmed, variant="small")
+    if not local:
+        return value
+    thumb_name = _thumbnail_filename(_filename_of(local) or "")
+    if (image_cache.directory / thumb_name).is_file():
+        return _local_path(thumb_name)
+    return local
 
 
 def cache_card_images(
@@ -137,7 +572,10 @@ def cache_card_images(
     session: Optional[requests.sessions.Session] = None,
     timeout: float = 10.0,
 ) -> dict[str, Any]:
-    """Return a copy of ``payload`` with local image paths when available."""
+    """Return a copy of ``payload`` with local image paths when available.
+
+    Missing images are queued and their remote URLs kept for now.
+    """
 
     data = dict(payload)
     small = ensure_local_path(
@@ -159,3 +597,30 @@ def cache_card_images(
     data["image_large"] = large_value
     return data
 
+
+class CardImageFiles(StaticFiles):
+    """Static mount for ``CARD_IMAGE_DIR`` that records access for LRU.
+
+    Evicted files are redirected to their source URL and queued again;
+    an evicted thumbnail queues its small image, which rebuilds it. Index
+    reads and writes run in the threadpool, as eviction holds the index lock
+    while it deletes files.
+    """
+
+    async def get_response(self, path: str, scope) -> Response:  # type: ignore[override]
+        filename = os.path.basename(path)
+        if filename.startswith("."):
+            raise HTTPException(status_code=404)
+        try:
+            response = await super().get_response(path, scope)
+        except HTTPException as exc:
+            if exc.status_code != 404:
+                raise
+            source = await run_in_threadpool(image_cache.source, filename)
+            if source is None:
+                raise
+            url, variant = source
+            image_cache.submit(url, "small" if variant == THUMBNAIL_VARIANT else variant)
+            return RedirectResponse(url, status_code=307)
+        await run_in_threadpool(image_cache.touch, filename)
+        return response
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark local card search: LIKE filters vs. the FTS5 index.
+
+Builds a throwaway SQLite catalogue with synthetic ``CardRecord`` rows and
+times the two local search paths of ``/cards/search`` for a few queries.
+
+Usage:
+    python scripts/bench_card_search.py [--rows 20000 100000] [--repeat 20]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from kartoteka_web import models
+from kartoteka_web.routes import cards
+from kartoteka_web.services import card_search
+from kartoteka_web.utils import text
+
+NAMES = [
+    "Pikachu", "Charizard", "Bulbasaur", "Squirtle", "Eevee", "Mewtwo", "Gengar",
+    "Snorlax", "Gyarados", "Dragonite", "Lucario", "Greninja", "Rayquaza", "Umbreon",
+    "Sylveon", "Garchomp", "Gardevoir", "Mimikyu", "Zoroark", "Tyranitar",
+]
+SUFFIXES = ["", " ex", " V", " VMAX", " VSTAR", " GX", " EX", " Radiant", " Shining", " Dark"]
+SETS = [
+    "Base Set", "Jungle", "Fossil", "Team Rocket", "Neo Genesis", "Evolving Skies",
+    "Brilliant Stars", "Lost Origin", "Scarlet & Violet", "Paldea Evolved",
+    "Obsidian Flames", "Paradox Rift", "Temporal Forces", "Twilight Masquerade",
+]
+SYLLABLES = ["ka", "zu", "mo", "ri", "sa", "to", "ne", "lo", "ba", "chi", "ra", "don", "mi", "gar", "vo", "ly", "pex", "ta"]
+ARTISTS = ["Ken Sugimori", "Mitsuhiro Arita", "Atsuko Nishida", "Kagemaru Himeno", "5ban Graphics"]
+
+QUERIES = [
+    ("name", "pikachu", ""),
+    ("prefix", "chari", ""),
+    ("name + set", "eevee", "evolving"),
+    ("multi-word", "charizard vmax", ""),
+    ("typo", "gyardos", ""),
+]
+
+
+def build_catalogue(path: Path, rows: int) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(rows)
+    records = []
+    seen: set[tuple[str, str, str]] = set()
+    index = 0
+    while len(records) < rows:
+        index += 1
+        if rng.random() < 0.2:
+            base = rng.choice(NAMES)
+        else:
+            # Filler species so popular names are a realistic share of the catalogue
+            base = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        name = f"{base}{rng.choice(SUFFIXES)}"
+        if rng.random() < 0.5:
+            name = f"{name} {index % 997}"
+        set_name = rng.choice(SETS)
+        number = str(rng.randint(1, 400))
+        key = (name, number, set_name)
+        if key in seen:
+            continue
+        seen.add(key)
+        records.append(
+            {
+                "name": name,
+                "name_normalized": text.normalize(name, keep_spaces=True),
+                "number": number,
+                "set_name": set_name,
+                "set_name_normalized": text.normalize(set_name, keep_spaces=True),
+                "set_code": f"s{SETS.index(set_name)}",
+                "set_code_clean": f"s{SETS.index(set_name)}",
+                "artist": rng.choice(ARTISTS),
+                "sync_status": "synced",
+                "sync_priority": 5,
+            }
+        )
+    with engine.begin() as connection:
+        connection.execute(models.CardRecord.__table__.insert(), records)
+    # Index built from existing rows, as on an upgraded database
+    started = time.perf_counter()
+    card_search.ensure_search_index(engine)
+    print(f"  index build: {(time.perf_counter() - started) * 1000:.0f} ms")
+    engine.dispose()
+
+
+def _time(fn, repeat: int) -> tuple[float, int]:
+    samples = []
+    total = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+        total = result.total
+    return statistics.median(samples), total
+
+
+def run(rows: int, repeat: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "catalogue.db"
+        print(f"\n{rows} rows")
+        build_catalogue(path, rows)
+        engine = create_engine(f"sqlite:///{path}")
+        print(f"  {'query':<12} {'LIKE ms':>9} {'hits':>7} {'FTS ms':>9} {'hits':>7}")
+        with Session(engine) as session:
+            for label, query, set_name in QUERIES:
+                kwargs = dict(
+                    number_clean="",
+                    total_clean="",
+                    set_name_norm=text.normalize(set_name, keep_spaces=True),
+                    set_code_clean="",
+                    per_page=20,
+                    result_cap=100,
+                    page=2,
+                )
+                query_norm = text.normalize(query, keep_spaces=True)
+                like_ms, like_hits = _time(
+                    lambda: cards._search_local_catalog_like(
+                        session, name_norm=query_norm, query_norm=query_norm, **kwargs
+                    ),
+                    repeat,
+                )
+                fts_ms, fts_hits = _time(
+                    lambda: cards._search_local_catalog_fts(
+                        session, name_norm=query_norm, cursor=None, **kwargs
+                    ),
+                    repeat,
+                )
+                print(f"  {label:<12} {like_ms:>9.2f} {like_hits:>7} {fts_ms:>9.2f} {fts_hits:>7}")
+        engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
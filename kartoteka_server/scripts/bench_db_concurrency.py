@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Load test: mixed read/write API traffic against the SQLite database.
+
+Compares the previous concurrency model (rollback journal, every request
+serialized behind one write lock) with the current one (WAL, no request
+lock, SQLite's own write lock held only inside write transactions).
+
+Each mode runs in a fresh child process against a throwaway database and
+drives the ``/cards`` router in-process with concurrent clients: reads are
+``GET /cards/`` and ``GET /cards/price-changes``, writes are
+``PATCH /cards/{entry_id}``, and a share of ``GET /cards/search`` requests
+misses the local catalogue and goes upstream. The RapidAPI call is replaced
+by a fixed sleep so runs are repeatable offline.
+
+Usage:
+    python scripts/bench_db_concurrency.py [--clients 16] [--seconds 5] [--write-ratio 0.2]
+        [--remote-ratio 0.05] [--remote-latency-ms 150]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+MODES = {
+    # Before: DELETE journal + global per-request lock
+    "locked": {"KARTOTEKA_SQLITE_JOURNAL_MODE": "DELETE", "lock": True},
+    # After: WAL, reads and writes run concurrently
+    "wal": {"KARTOTEKA_SQLITE_JOURNAL_MODE": "WAL", "lock": False},
+}
+
+
+def _seed(database, models, entries: int) -> list[int]:
+    with database.session_scope() as session:
+        user = models.User(username="bench", hashed_password="x")
+        session.add(user)
+        session.flush()
+        ids = []
+        for number in range(1, entries + 1):
+            card = models.Card(
+                name=f"Card {number}", number=str(number), set_name="Bench Set",
+                price=1.0 + number / 10, price_7d_average=1.0,
+            )
+            session.add(card)
+            session.flush()
+            entry = models.CollectionEntry(user_id=user.id, card_id=card.id, quantity=1)
+            session.add(entry)
+            session.flush()
+            ids.append(entry.id)
+        return ids
+
+
+async def _drive(app, entry_ids: list[int], args: argparse.Namespace) -> dict:
+    import httpx
+
+    counts = {"read": 0, "write": 0, "remote": 0, "errors": 0}
+    latencies: list[float] = []
+    deadline = time.perf_counter() + args.seconds
+
+    async def client(seed: int) -> None:
+        rng = random.Random(seed)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                roll = rng.random()
+                if roll < args.remote_ratio:
+                    kind = "remote"
+                    response = await http.get("/cards/search", params={"name": f"missing {rng.random()}"})
+                elif roll < args.remote_ratio + args.write_ratio:
+                    kind = "write"
+                    response = await http.patch(
+                        f"/cards/{rng.choice(entry_ids)}", json={"quantity": rng.randint(1, 5)}
+                    )
+                else:
+                    kind = "read"
+                    response = await http.get(rng.choice(["/cards/", "/cards/price-changes"]))
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    counts["errors"] += 1
+                else:
+                    counts[kind] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(seed) for seed in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        **counts,
+        "rps": (counts["read"] + counts["write"] + counts["remote"]) / elapsed,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+    }
+
+
+def run_mode(mode: str, args: argparse.Namespace) -> dict:
+    """Child process body: configure, seed and load one mode."""
+
+    from contextlib import asynccontextmanager
+
+    from fastapi import FastAPI
+    from sqlmodel import Session
+
+    from kartoteka_web import auth, database, models
+    from kartoteka_web.routes import cards
+    from kartoteka_web.services import tcg_api
+
+    def upstream_search(**_kwargs):
+        time.sleep(args.remote_latency_ms / 1000)
+        return [], 0, 0
+
+    tcg_api.search_cards = upstream_search
+
+    database.init_db()
+    entry_ids = _seed(database, models, entries=20)
+
+    app = FastAPI()
+    app.include_router(cards.router)
+
+    with database.session_scope() as session:
+        user = session.get(models.User, 1)
+        session.expunge(user)
+    app.dependency_overrides[auth.get_current_user] = lambda: user
+
+    if MODES[mode]["lock"]:
+        lock = asyncio.Lock()
+
+        @asynccontextmanager
+        async def _locked():
+            async with lock:
+                yield
+
+        async def locked_session():
+            async with _locked():
+                with Session(database.engine) as session:
+                    yield session
+
+        app.dependency_overrides[database.get_session] = locked_session
+        app.dependency_overrides[database.get_read_session] = locked_session
+
+    return asyncio.run(_drive(app, entry_ids, args))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--remote-ratio", type=float, default=0.05)
+    parser.add_argument("--remote-latency-ms", type=float, default=150.0)
+    parser.add_argument("--child", choices=sorted(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_mode(args.child, args)
+        print(json.dumps(result))
+        return
+
+    print(
+        f"{args.clients} clients, {args.seconds:.0f}s, {args.write_ratio:.0%} writes,"
+        f" {args.remote_ratio:.0%} upstream searches ({args.remote_latency_ms:.0f} ms)"
+    )
+    print(f"  {'mode':<8} {'req/s':>8} {'reads':>7} {'writes':>7} {'remote':>7} {'errors':>7} {'p95 ms':>8}")
+    for mode, settings in MODES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                KARTOTEKA_DATABASE_URL=f"sqlite:///{Path(tmp) / 'bench.db'}",
+                KARTOTEKA_SQLITE_JOURNAL_MODE=settings["KARTOTEKA_SQLITE_JOURNAL_MODE"],
+            )
+            output = subprocess.run(
+                [
+                    sys.executable, __file__, "--child", mode,
+                    "--clients", str(args.clients),
+                    "--seconds", str(args.seconds),
+                    "--write-ratio", str(args.write_ratio),
+                    "--remote-ratio", str(args.remote_ratio),
+                    "--remote-latency-ms", str(args.remote_latency_ms),
+                ],
+                env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"  {mode:<8} {result['rps']:>8.1f} {result['read']:>7} {result['write']:>7}"
+            f" {result['remote']:>7} {result['errors']:>7} {result['p95_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
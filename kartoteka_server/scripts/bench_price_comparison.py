@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Polish shop price comparison over saved HTML fixtures.
+
+Serves ``tests/fixtures/price_comparison`` pages through an in-process
+transport with simulated network latency and times:
+
+* parsing search and product pages the old way (full soup, plus the
+  page-wide ``get_text()`` heuristic on product pages) against the
+  strained parsers :func:`parse_search_results` / :func:`parse_product_price`;
+* a comparison across all shops with sequential product pages (the old
+  per-shop flow) against concurrent product pages and a warm cache.
+
+``--misses`` makes the first N candidates of every shop return no price,
+as happens when the best search hits are out of stock or removed.
+
+Usage:
+    python scripts/bench_price_comparison.py [--latency 0.08] [--misses 2] [--repeat 200]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from bs4 import BeautifulSoup
+
+from kartoteka_web import price_comparison
+
+FIXTURES = Path(__file__).parent.parent / "tests" / "fixtures" / "price_comparison"
+SEARCH_HTML = (FIXTURES / "boosterpoint_search.html").read_bytes()
+PRODUCT_HTML = (FIXTURES / "boosterpoint_product.html").read_bytes()
+QUERY = "evolving skies booster"
+
+
+def legacy_parse_product(shop, content: bytes) -> float:
+    """Product page parsing as done before the async engine."""
+
+    soup = BeautifulSoup(content.decode('utf-8', 'ignore'), 'html.parser')
+    soup.get_text().lower()
+    price_el = None
+    for sel in shop['price_selector'].split(','):
+        price_el = soup.select_one(sel.strip())
+        if price_el: break
+    return price_comparison.clean_price(price_el.get_text(strip=True)) if price_el else 0.0
+
+
+def legacy_parse_search(shop, content: bytes) -> int:
+    """Search page parsing as done before the async engine."""
+
+    soup = BeautifulSoup(content.decode('utf-8', 'ignore'), 'html.parser')
+    return len(soup.select(shop['item_selector']))
+
+
+def _time(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def bench_parsers(repeat: int) -> None:
+    shop = price_comparison.DEFAULT_SHOPS[0]
+    legacy = _time(lambda: legacy_parse_product(shop, PRODUCT_HTML), repeat)
+    current = _time(
+        lambda: price_comparison.parse_product_price(shop, PRODUCT_HTML.decode('utf-8', 'ignore')),
+        repeat,
+    )
+    legacy_search = _time(lambda: legacy_parse_search(shop, SEARCH_HTML), repeat)
+    search = _time(
+        lambda: price_comparison.parse_search_results(shop, SEARCH_HTML.decode('utf-8', 'ignore'), QUERY),
+        repeat,
+    )
+    print(f"Product page parse: legacy {legacy:7.2f} ms   current {current:7.2f} ms   ({legacy / current:.1f}x)")
+    print(f"Search page parse:  legacy {legacy_search:7.2f} ms   current {search:7.2f} ms   ({legacy_search / search:.1f}x)")
+
+
+def _shops() -> list[dict]:
+    # Every shop serves the BoosterPoint fixtures so the same parser applies
+    base = price_comparison.DEFAULT_SHOPS[0]
+    return [
+        {**base, "name": shop["name"], "domain": shop["domain"],
+         "search_url": f"https://{shop['domain']}/wszystkie-produkty/?s={{query}}"}
+        for shop in price_comparison.DEFAULT_SHOPS
+    ]
+
+
+def _transport(latency: float, misses: int) -> httpx.MockTransport:
+    missing = {
+        "/produkt/evolving-skies-booster-wyprzedany/",
+        "/produkt/evolving-skies-booster/",
+        "/produkt/evolving-skies-sleeved-booster/",
+    }
+    missing = set(sorted(missing, key=lambda path: "wyprzedany" not in path)[:misses])
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        if request.url.path.startswith("/wszystkie-produkty"):
+            return httpx.Response(200, content=SEARCH_HTML)
+        if request.url.path in missing:
+            return httpx.Response(404)
+        return httpx.Response(200, content=PRODUCT_HTML)
+
+    return httpx.MockTransport(handler)
+
+
+async def _compare(engine: price_comparison.PriceComparisonEngine) -> float:
+    started = time.perf_counter()
+    results = await engine.search(QUERY)
+    elapsed = (time.perf_counter() - started) * 1000
+    assert all(result["found"] for result in results), results
+    return elapsed
+
+
+async def bench_comparison(latency: float, misses: int) -> None:
+    transport = _transport(latency, misses)
+    sequential = price_comparison.PriceComparisonEngine(
+        _shops(), product_concurrency=1, cache_ttl=0, transport=transport
+    )
+    concurrent = price_comparison.PriceComparisonEngine(_shops(), transport=transport)
+    try:
+        before = await _compare(sequential)
+        cold = await _compare(concurrent)
+        warm = await _compare(concurrent)
+    finally:
+        await sequential.aclose()
+        await concurrent.aclose()
+    print(
+        f"Comparison ({len(_shops())} shops, {latency * 1000:.0f} ms latency, {misses} misses): "
+        f"sequential {before:7.1f} ms   concurrent {cold:7.1f} ms   cached {warm:7.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.08, help="simulated seconds per request")
+    parser.add_argument("--misses", type=int, default=2, choices=range(0, 3))
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    bench_parsers(args.repeat)
+    asyncio.run(bench_comparison(args.latency, args.misses))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark the authentication rate limiter under a spray of unique IPs.
+
+Every request comes from a new address (as with rotated or spoofed
+``X-Forwarded-For`` values), mixed with a small set of repeat clients that
+keep hitting their limit. Compares the previous limiter (a timestamp list
+per key, rebuilt on every check and never evicted) with the current one in
+memory and SQLite-backed mode, reporting the cost per check, the keys still
+tracked at the end and the memory they hold.
+
+Usage:
+    python scripts/bench_rate_limit.py [--requests 200000] [--repeat-clients 50]
+        [--max-keys 10000] [--sqlite-requests 20000]
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from threading import Lock
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from kartoteka_web.rate_limit import RateLimiter
+
+
+class LegacyRateLimiter:
+    """The limiter as it was before the bounded implementation."""
+
+    def __init__(self, max_requests=10, window_seconds=60, block_seconds=60, clock=time.time):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.block_seconds = block_seconds
+        self._requests = defaultdict(list)
+        self._blocked = {}
+        self._lock = Lock()
+        self._clock = clock
+
+    def check(self, key):
+        now = self._clock()
+        with self._lock:
+            if key in self._blocked:
+                if now < self._blocked[key]:
+                    return False, max(0, int(self._blocked[key] - now))
+                del self._blocked[key]
+            cutoff = now - self.window_seconds
+            self._requests[key] = [t for t in self._requests[key] if t > cutoff]
+            if len(self._requests[key]) >= self.max_requests:
+                self._blocked[key] = now + self.block_seconds
+                return False, self.block_seconds
+            self._requests[key].append(now)
+            return True, None
+
+    def tracked_keys(self):
+        return len(self._requests) + len(self._blocked)
+
+
+class SimulatedClock:
+    """Advances 10 ms per request so windows roll over during the run."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _keys(requests: int, repeat_clients: int):
+    for n in range(requests):
+        if repeat_clients and n % 4 == 0:
+            yield f"192.168.0.{n % repeat_clients}"
+        else:
+            yield f"10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
+
+
+def _run(name: str, make_limiter, requests: int, repeat_clients: int) -> None:
+    clock = SimulatedClock()
+    samples = [0.0] * requests  # allocated before tracing so only the limiter is measured
+    blocked = 0
+    tracemalloc.start()
+    limiter = make_limiter(clock)
+    for index, key in enumerate(_keys(requests, repeat_clients)):
+        clock.now += 0.01
+        started = time.perf_counter()
+        allowed, _ = limiter.check(key)
+        samples[index] = time.perf_counter() - started
+        blocked += not allowed
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99)]
+    print(
+        f"{name:<8} {requests:>8} checks   median {statistics.median(samples) * 1e6:7.2f} us   "
+        f"p99 {p99 * 1e6:7.2f} us   keys {limiter.tracked_keys():>8}   "
+        f"memory {current / 1024 / 1024:7.1f} MiB   blocked {blocked}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--repeat-clients", type=int, default=50)
+    parser.add_argument("--max-keys", type=int, default=10_000)
+    parser.add_argument("--sqlite-requests", type=int, default=20_000)
+    args = parser.parse_args()
+
+    _run("legacy", lambda clock: LegacyRateLimiter(clock=clock), args.requests, args.repeat_clients)
+    _run(
+        "memory",
+        lambda clock: RateLimiter(max_requests=10, window_seconds=60, block_seconds=60,
+                                  max_keys=args.max_keys, clock=clock),
+        args.requests,
+        args.repeat_clients,
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        _run(
+            "sqlite",
+            lambda clock: RateLimiter(max_requests=10, window_seconds=60, block_seconds=60,
+                                      max_keys=args.max_keys, db_path=str(Path(tmp) / "limits.db"),
+                                      clock=clock),
+            args.sqlite_requests,
+            args.repeat_clients,
+        )
+
+
+if __name__ == "__main__":
+    main()
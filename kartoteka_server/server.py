@@ -14,24 +14,22 @@ from typing import Any, Optional
 
 import anyio
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, Header, Request, Response, HTTPException
+from fastapi import FastAPI, Header, Request, Response, HTTPException
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
-from sqlalchemy.orm import selectinload
-from sqlmodel import Session, select
+from sqlmodel import select
 
 load_dotenv(Path(__file__).resolve().with_name(".env"))
 
-from kartoteka_web import models, scheduler
+from kartoteka_web import models, price_comparison, scheduler
 from kartoteka_web.auth import get_current_user, oauth2_scheme
-from kartoteka_web.database import init_db, session_scope, get_session
+from kartoteka_web.database import init_db, read_session, session_scope
 from kartoteka_web.routes import cards, users, products, collections, scanner
-from kartoteka_web.services import set_icons, tcg_api
-from kartoteka_web.services.tcg_api import get_latest_products
+from kartoteka_web.services import home_feed, price_fill, price_history_jobs, set_catalog, set_icons, tcg_api
 from kartoteka_web.utils import images as image_utils, sets as set_utils, text
 
 logging.basicConfig(
@@ -47,6 +45,12 @@ async def lifespan(app: FastAPI):
     logger.info("Starting application...")
     print("🚀 Kartoteka: Starting application...")
     init_db()
+    try:
+        set_catalog.catalog.invalidate()
+        with read_session() as session:
+            set_catalog.catalog.response(session)
+    except Exception as e:
+        logger.warning(f"Set catalog warm-up failed: {e}")
     try:
         print("🔧 Kartoteka: Starting scheduler...")
         scheduler.start_scheduler()
@@ -64,6 +68,10 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️  Kartoteka: Error stopping scheduler: {e}")
         logger.warning(f"Error stopping scheduler: {e}")
+    price_history_jobs.backfill_queue.stop()
+    price_fill.fill_queue.stop()
+    image_utils.image_cache.shutdown()
+    await price_comparison.engine.aclose()
 
 
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
@@ -120,7 +128,7 @@ if not card_image_mount.startswith("/"):
     card_image_mount = f"/{card_image_mount}"
 app.mount(
     card_image_mount,
-    StaticFiles(directory=str(image_utils.CARD_IMAGE_DIR)),
+    image_utils.CardImageFiles(directory=str(image_utils.CARD_IMAGE_DIR)),
     name="card-images",
 )
 
@@ -128,141 +136,33 @@ templates = Jinja2Templates(directory="kartoteka_web/templates")
 
 
 @app.get("/", response_class=HTMLResponse)
-async def home_page(
-    request: Request,
-    db: Session = Depends(get_session),
-):
-    rapidapi_key = os.getenv("RAPIDAPI_KEY")
-    rapidapi_host = os.getenv("RAPIDAPI_HOST")
-
-    latest_products = get_latest_products(
-        rapidapi_key=rapidapi_key, rapidapi_host=rapidapi_host
-    )
-
+async def home_page(request: Request):
     username, invalid_credentials, avatar_url, is_admin = await _resolve_request_user(request)
-
-    # Get user data if logged in
-    collection_stats = None
-    recently_added = []
-    price_changes = []
-
-    if username and not invalid_credentials:
-        try:
-            # Get current user
-            token = await oauth2_scheme(request)
-            with session_scope() as session:
-                user = await get_current_user(session=session, token=token)
-
-                # Get collection stats
-                from kartoteka_web.routes.cards import get_collection_stats, get_recently_added_cards, get_price_changes
-
-                # Temporarily set user for function calls
-                # Note: These functions expect Depends(get_current_user) but we'll call them directly
-                entries = session.exec(
-                    select(models.CollectionEntry)
-                    .where(models.CollectionEntry.user_id == user.id)
-                    .options(
-                        selectinload(models.CollectionEntry.card),
-                        selectinload(models.CollectionEntry.product)
-                    )
-                ).all()
-
-                # Calculate stats manually
-                total_cards = sum(entry.quantity or 0 for entry in entries)
-                unique_cards = len(entries)
-                total_value = 0.0
-
-                for entry in entries:
-                    if entry.card and entry.card.price:
-                        total_value += entry.card.price
-                    elif entry.product and entry.product.price:
-                        total_value += entry.product.price
-
-                collection_stats = {
-                    "total_cards": total_cards,
-                    "unique_cards": unique_cards,
-                    "total_value": round(total_value, 2),
-                }
-
-                # Get recently added (last 5)
-                recent_entries = session.exec(
-                    select(models.CollectionEntry)
-                    .where(models.CollectionEntry.user_id == user.id)
-                    .options(
-                        selectinload(models.CollectionEntry.card),
-                        selectinload(models.CollectionEntry.product)
-                    )
-                    .order_by(models.CollectionEntry.id.desc())
-                    .limit(5)
-                ).all()
-
-                for entry in recent_entries:
-                    if entry.card:
-                        recently_added.append({
-                            "type": "card",
-                            "name": entry.card.name,
-                            "image_small": entry.card.image_small,
-                            "set_name": entry.card.set_name,
-                            "price": entry.card.price,
-                        })
-                    elif entry.product:
-                        recently_added.append({
-                            "type": "product",
-                            "name": entry.product.name,
-                            "image_small": entry.product.image_small,
-                            "set_name": entry.product.set_name,
-                            "price": entry.product.price,
-                        })
-
-                # Get price changes (top 5)
-                for entry in entries[:50]:  # Limit to first 50 to avoid performance issues
-                    if entry.card:
-                        current_price = entry.card.price or 0.0
-                        avg_price = entry.card.price_7d_average or 0.0
-
-                        if current_price > 0 and avg_price > 0:
-                            change = current_price - avg_price
-                            change_percent = (change / avg_price) * 100
-
-                            price_changes.append({
-                                "name": entry.card.name,
-                                "image_small": entry.card.image_small,
-                                "current_price": current_price,
-                                "change_percent": round(change_percent, 2),
-                            })
-                    elif entry.product:
-                        current_price = entry.product.price or 0.0
-                        avg_price = entry.product.price_7d_average or 0.0
-
-                        if current_price > 0 and avg_price > 0:
-                            change = current_price - avg_price
-                            change_percent = (change / avg_price) * 100
-
-                            price_changes.append({
-                                "name": entry.product.name,
-                                "image_small": entry.product.image_small,
-                                "current_price": current_price,
-                                "change_percent": round(change_percent, 2),
-                            })
-
-                # Sort by absolute change percent
-                price_changes.sort(key=lambda x: abs(x["change_percent"]), reverse=True)
-                price_changes = price_changes[:5]
-
-        except HTTPException:
-            pass
+    signed_in = bool(username) and not invalid_credentials
+
+    def load() -> dict[str, Any]:
+        # Local tables only: the products feed is refreshed by the scheduler
+        with read_session() as session:
+            user_id = None
+            if signed_in:
+                user_id = session.exec(
+                    select(models.User.id).where(models.User.username == username)
+                ).first()
+            return {
+                "latest_products": home_feed.latest_products(session),
+                **home_feed.user_widgets(session, user_id),
+            }
+
+    context = await anyio.to_thread.run_sync(load)
 
     return templates.TemplateResponse(
         "home.html",
         {
             "request": request,
-            "latest_products": latest_products,
             "username": username if not invalid_credentials else "",
             "avatar_url": avatar_url if not invalid_credentials else "",
             "is_admin": is_admin if not invalid_credentials else False,
-            "collection_stats": collection_stats,
-            "recently_added": recently_added,
-            "price_changes": price_changes,
+            **context,
         },
     )
 
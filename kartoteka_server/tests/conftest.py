@@ -5,12 +5,12 @@ from __future__ import annotations
 import importlib
 import sys
 import threading
-from contextlib import suppress
+from contextlib import contextmanager, suppress
 from pathlib import Path
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import create_engine
+from sqlmodel import Session, SQLModel, create_engine
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
@@ -77,3 +77,62 @@ def api_client(app_environment):
 
     with TestClient(app_environment.app) as client:
         yield client
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    """Return an engine for a fresh SQLite file with every table created."""
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def session(engine):
+    with Session(engine) as session:
+        yield session
+
+
+def _replace_in_app_modules(monkeypatch, name: str, replacement) -> None:
+    """Swap ``database.<name>`` for ``replacement`` wherever it was imported."""
+
+    # Matched by origin rather than identity: reloading the database module
+    # leaves earlier importers holding the previous function object
+    for module_name, module in list(sys.modules.items()):
+        if module_name != "server" and not module_name.startswith("kartoteka_web"):
+            continue
+        current = getattr(module, name, None)
+        if getattr(current, "__module__", None) == "kartoteka_web.database":
+            monkeypatch.setattr(module, name, replacement)
+
+
+@pytest.fixture()
+def scope(engine, monkeypatch):
+    """Committing ``session_scope`` bound to ``engine``, patched into the loaded modules."""
+
+    @contextmanager
+    def scope():
+        with Session(engine) as session:
+            yield session
+            session.commit()
+
+    _replace_in_app_modules(monkeypatch, "session_scope", scope)
+    return scope
+
+
+@pytest.fixture()
+def read_scope(engine, monkeypatch):
+    """``read_session`` bound to ``engine``, patched into the loaded modules."""
+
+    @contextmanager
+    def read_scope():
+        with Session(engine) as session:
+            yield session
+
+    _replace_in_app_modules(monkeypatch, "read_session", read_scope)
+    return read_scope
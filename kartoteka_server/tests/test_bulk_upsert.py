@@ -0,0 +1,88 @@
+"""Tests for bulk catalogue and price history ingestion."""
+
+from __future__ import annotations
+
+import datetime as dt
+
+import pytest
+from sqlmodel import Session, select
+
+from kartoteka_web import models
+from kartoteka_web.services import card_search, catalog_sync, crud
+
+
+@pytest.fixture()
+def session(engine):
+    card_search.ensure_search_index(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def _payload(number: int, **extra) -> dict[str, object]:
+    return {
+        "id": f"sv1-{number}",
+        "name": f"Sprigatito {number}",
+        "number": str(number),
+        "set_name": "Scarlet & Violet",
+        "set_code": "sv1",
+        "price": "1,50",
+        **extra,
+    }
+
+
+def test_card_records_bulk_counts_match_single_upserts(session):
+    assert catalog_sync.upsert_card_records(session, [_payload(n) for n in range(1, 6)]) == (5, 0)
+    session.commit()
+
+    # One changed, one new, three unchanged
+    batch = [_payload(n) for n in range(1, 6)] + [_payload(6)]
+    batch[0] = _payload(1, rarity="Common")
+    assert catalog_sync.upsert_card_records(session, batch) == (1, 1)
+    session.commit()
+    assert catalog_sync.upsert_card_records(session, batch) == (0, 0)
+
+    records = session.exec(select(models.CardRecord).order_by(models.CardRecord.id)).all()
+    assert len(records) == 6
+    assert records[0].rarity == "Common"
+    assert records[0].price == 1.5
+    assert records[0].sync_status == "pending"
+
+    # Search triggers fire for upserted rows
+    match = card_search.prefix_query(["sprigatito"])
+    assert card_search.search(session, match, per_page=10, cap=100).total == 6
+
+
+def test_card_records_compare_payloads_as_column_types(session):
+    payload = _payload(1, release_date=dt.date(2023, 3, 31), rarity=3, total=198)
+    assert catalog_sync.upsert_card_records(session, [payload]) == (1, 0)
+    session.commit()
+
+    # Read back as strings; the same payload is not a change
+    assert catalog_sync.upsert_card_records(session, [payload]) == (0, 0)
+    record = session.exec(select(models.CardRecord)).one()
+    assert (record.release_date, record.rarity, record.total) == ("2023-03-31", "3", "198")
+
+
+def test_price_history_bulk_upsert(session):
+    catalog_sync.upsert_card_records(session, [_payload(1)])
+    session.commit()
+    record_id = session.exec(select(models.CardRecord.id)).one()
+    start = dt.date(2026, 1, 1)
+    points = [
+        {"date": (start + dt.timedelta(days=day)).isoformat(), "price": 1.0 + day, "currency": "PLN"}
+        for day in range(10)
+    ]
+    assert crud.upsert_price_history(session, record_id, points) == (10, 0)
+    session.commit()
+
+    points[3] = {**points[3], "price": 99.0}
+    points.append({"date": "2026-02-01", "price": 5.0, "currency": "PLN"})
+    points.append({"date": "not-a-date", "price": 5.0, "currency": "PLN"})
+    assert crud.upsert_price_history(session, record_id, points) == (1, 1)
+    session.commit()
+
+    prices = session.exec(
+        select(models.PriceHistory.price).order_by(models.PriceHistory.date)
+    ).all()
+    assert len(prices) == 11
+    assert prices[3] == 99.0
@@ -0,0 +1,98 @@
+"""Tests for the FTS5 card search index."""
+
+from __future__ import annotations
+
+import pytest
+from sqlmodel import Session, select
+
+from kartoteka_web import models
+from kartoteka_web.services import card_search, catalog_sync
+
+
+@pytest.fixture()
+def engine(engine):
+    assert card_search.ensure_search_index(engine)
+    return engine
+
+
+def _add_card(session: Session, name: str, number: str, set_name: str, **extra) -> None:
+    catalog_sync.upsert_card_record(
+        session,
+        {"name": name, "number": number, "set_name": set_name, **extra},
+    )
+
+
+def _names(page: card_search.SearchPage) -> list[str]:
+    return [record.name for record in page.records]
+
+
+def test_prefix_search_ranks_name_matches_first(engine):
+    with Session(engine) as session:
+        _add_card(session, "Pikachu", "58", "Base Set", set_code="base1")
+        _add_card(session, "Pikachu ex", "63", "Scarlet & Violet", set_code="sv1")
+        _add_card(session, "Raichu", "14", "Base Set", set_code="base1", artist="Pika Artist")
+        session.commit()
+
+        match = card_search.prefix_query(card_search.tokenize("pika"), ("name_normalized",))
+        page = card_search.search(session, match, per_page=10, cap=100)
+        assert page.total == 2
+        assert set(_names(page)) == {"Pikachu", "Pikachu ex"}
+
+        # Matching all columns also finds the artist hit, ranked after name hits.
+        page = card_search.search(session, card_search.prefix_query(["pika"]), per_page=10, cap=100)
+        assert _names(page)[-1] == "Raichu"
+
+
+def test_index_follows_updates_and_deletes(engine):
+    with Session(engine) as session:
+        _add_card(session, "Charmander", "46", "Base Set")
+        session.commit()
+
+        record = session.exec(select(models.CardRecord)).one()
+        record.name_normalized = "charmeleon"
+        session.add(record)
+        session.commit()
+
+        def _hits(term: str) -> int:
+            return card_search.search(
+                session, card_search.prefix_query([term]), per_page=10, cap=100
+            ).total
+
+        assert _hits("charmander") == 0
+        assert _hits("charmeleon") == 1
+
+        session.delete(record)
+        session.commit()
+        assert _hits("charmeleon") == 0
+
+
+def test_keyset_cursor_walks_all_results_once(engine):
+    with Session(engine) as session:
+        for number in range(1, 8):
+            _add_card(session, "Eevee", str(number), "Jungle")
+        session.commit()
+
+        match = card_search.prefix_query(["eevee"])
+        seen: list[int] = []
+        cursor = None
+        for _ in range(10):
+            page = card_search.search(session, match, per_page=3, cap=100, cursor=cursor)
+            seen.extend(record.id for record in page.records)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert len(seen) == 7
+        assert len(set(seen)) == 7
+
+
+def test_fuzzy_search_tolerates_typos(engine):
+    with Session(engine) as session:
+        _add_card(session, "Gyarados", "6", "Base Set")
+        _add_card(session, "Magikarp", "35", "Base Set")
+        session.commit()
+
+        match = card_search.prefix_query(["gyardos"])
+        assert card_search.search(session, match, per_page=10, cap=100).total == 0
+
+        results = card_search.fuzzy_search(session, "gyardos", cap=10)
+        assert [record.name for record in results] == ["Gyarados"]
@@ -0,0 +1,284 @@
+"""Tests for the incremental catalogue sync."""
+
+from __future__ import annotations
+
+import datetime as dt
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import pytest
+import requests
+from sqlmodel import Session, select
+
+from kartoteka_web import models
+from kartoteka_web.services import catalog_delta, fetch_engine, tcg_api
+
+PAGE_SIZE = 2
+
+
+class _Response:
+    def __init__(self, status_code: int, data: Any = None, etag: str | None = None) -> None:
+        self.status_code = status_code
+        self._data = data
+        self.headers = {"ETag": etag} if etag else {}
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self) -> None:
+        assert self.status_code < 400
+
+
+class _FakeApi:
+    """Episodes and their cards, paged by ``PAGE_SIZE``, with optional ETags."""
+
+    def __init__(self, *, etags: bool = True) -> None:
+        self.etags = etags
+        self.headers = {"User-Agent": "pytest-agent"}
+        self.episodes: dict[int, dict[str, Any]] = {}
+        self.cards: dict[int, list[dict[str, Any]]] = {}
+        self.calls: list[tuple[str, str]] = []
+
+    def add_episode(self, api_id: int, code: str, count: int, **extra: Any) -> None:
+        self.episodes[api_id] = {"id": api_id, "code": code, "name": f"Set {code}", "cards_total": count, **extra}
+        self.cards[api_id] = [
+            {"id": api_id * 100 + n, "name": f"Card {n}", "card_number": n,
+             "episode": {"name": f"Set {code}", "code": code}}
+            for n in range(1, count + 1)
+        ]
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        path = url.split(".com/", 1)[1]
+        page = int(params["page"])
+        self.calls.append((path, str(page)))
+        if path == "episodes":
+            return _Response(200, {"data": list(self.episodes.values()), "paging": {"total": 1}})
+        api_id = int(path.split("/")[1])
+        cards = self.cards[api_id]
+        data = cards[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+        etag = f'"{tcg_api.content_hash(data)[:12]}"' if self.etags else None
+        if etag and (headers or {}).get("If-None-Match") == etag:
+            return _Response(304)
+        total_pages = max(1, -(-len(cards) // PAGE_SIZE))
+        return _Response(200, {"data": data, "results": len(cards), "paging": {"total": total_pages}}, etag)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = dt.datetime(2026, 3, 1, 12, tzinfo=dt.timezone.utc)
+
+    def __call__(self) -> dt.datetime:
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def delta_state(scope, read_scope, monkeypatch):
+    monkeypatch.setattr(catalog_delta, "budget", catalog_delta.DailyBudget(100, session_factory=scope))
+    monkeypatch.setattr(tcg_api, "_SET_CODE_TO_API_CACHE", {"legacy": {"api_id": 1}})
+
+
+@pytest.fixture()
+def api(monkeypatch):
+    api = _FakeApi()
+    runner = fetch_engine.FetchEngine(requests_per_second=1000, burst=100, session=api)
+    monkeypatch.setattr(fetch_engine, "get_fetch_engine", lambda: runner)
+    return api
+
+
+def _set_info(engine, code: str) -> models.SetInfo:
+    with Session(engine) as session:
+        return session.exec(select(models.SetInfo).where(models.SetInfo.code == code)).one()
+
+
+def test_discovery_adds_new_sets_and_reopens_only_changed_ones(engine, api):
+    with Session(engine) as session:
+        session.add(models.SetInfo(code="old", name="Old Set", sync_status="complete"))
+        session.commit()
+    api.add_episode(11, "OLD", 3, updated_at="2026-01-01")
+    api.add_episode(12, "NEW", 2, updated_at="2026-02-01", released_at="2026-02-14")
+
+    summary = catalog_delta.discover_sets()
+    assert (summary.sets_added, summary.sets_reopened) == (1, 1)  # "old" was never walked
+    new = _set_info(engine, "NEW")
+    assert (new.sync_status, new.sync_priority, new.total_cards) == ("pending", 1, 2)
+    assert new.release_date == dt.date(2026, 2, 14)
+    assert tcg_api.get_set_api_info("NEW")["api_id"] == 12
+
+    catalog_delta.sync_sets()
+    assert {_set_info(engine, code).sync_status for code in ("old", "NEW")} == {"complete"}
+
+    summary = catalog_delta.discover_sets()
+    assert (summary.sets_added, summary.sets_reopened) == (0, 0)
+
+    api.episodes[11]["updated_at"] = "2026-03-01"
+    assert catalog_delta.discover_sets().sets_reopened == 1
+    assert _set_info(engine, "old").sync_status == "partial"
+
+
+@pytest.mark.parametrize("etags", [True, False])
+def test_walk_upserts_only_changed_pages(engine, api, etags):
+    api.etags = etags
+    api.add_episode(21, "TST", 5)
+    catalog_delta.discover_sets()
+
+    summary = catalog_delta.sync_sets()
+    assert (summary.pages_changed, summary.cards_added, summary.sets_completed) == (3, 5, 1)
+    info = _set_info(engine, "TST")
+    assert (info.sync_status, info.synced_cards, info.total_cards) == ("complete", 5, 5)
+
+    # Complete sets are not walked again
+    api.calls.clear()
+    assert catalog_delta.sync_sets().sets_walked == 0
+    assert api.calls == []
+
+    api.cards[21][2]["name"] = "Card 3 (errata)"
+    api.episodes[21]["updated_at"] = "2026-03-02"
+    catalog_delta.discover_sets()
+    api.calls.clear()
+    summary = catalog_delta.sync_sets()
+
+    assert len(api.calls) == 3
+    assert (summary.pages_changed, summary.pages_unchanged) == (1, 2)
+    assert (summary.cards_added, summary.cards_updated) == (1, 0)  # identity includes the name
+    with Session(engine) as session:
+        names = set(session.exec(select(models.CardRecord.name)).all())
+        assert "Card 3 (errata)" in names
+
+
+def test_daily_budget_stops_walk_and_resumes_next_day(engine, api, monkeypatch):
+    clock = _Clock()
+    with Session(engine) as session:
+        session.add(models.SetInfo(code="TST", name="Set TST"))
+        session.commit()
+    budget = catalog_delta.DailyBudget(2, session_factory=catalog_delta.session_scope, clock=clock)
+    monkeypatch.setattr(catalog_delta, "budget", budget)
+    api.add_episode(31, "TST", 5)
+    tcg_api.register_set_api_info("TST", {"api_id": 31})
+
+    summary = catalog_delta.sync_sets()
+    assert summary.budget_exhausted
+    assert len(api.calls) == 2
+    assert _set_info(engine, "TST").sync_status == "partial"
+    assert budget.usage() == {"day": "2026-03-01", "limit": 2, "used": 2, "remaining": 0}
+
+    # Spent budget: no request goes out
+    assert catalog_delta.sync_sets().budget_exhausted
+    assert len(api.calls) == 2
+
+    clock.now += dt.timedelta(days=1)
+    summary = catalog_delta.sync_sets()
+    assert api.calls[2:] == [("episodes/31/cards", "3")]  # resumes after the fetched pages
+    assert summary.sets_completed == 1
+    assert _set_info(engine, "TST").synced_cards == 5
+
+
+def test_refresh_fetches_pages_of_the_stalest_cards(engine, api):
+    api.add_episode(41, "TST", 5)
+    catalog_delta.discover_sets()
+    catalog_delta.sync_sets()
+
+    long_ago = dt.datetime(2020, 1, 1)
+    with Session(engine) as session:
+        card = session.exec(select(models.CardRecord).where(models.CardRecord.remote_id == "4105")).one()
+        card.last_synced = long_ago
+        session.add(card)
+        session.commit()
+
+    status = catalog_delta.status()
+    assert status["cards"] == {"total": 5, "stale": 1}
+    assert status["sets"] == {"complete": 1}
+    assert status["quota"]["used"] == 4  # episode list + three pages
+
+    api.calls.clear()
+    summary = catalog_delta.refresh_stale_cards()
+    assert api.calls == [("episodes/41/cards", "3")]
+    assert (summary.pages_unchanged, summary.cards_confirmed) == (1, 1)
+    assert catalog_delta.status()["cards"]["stale"] == 0
+
+
+def test_refresh_places_cards_of_pages_stored_before_the_card_index(engine, api):
+    api.add_episode(51, "TST", 5)
+    catalog_delta.discover_sets()
+    catalog_delta.sync_sets()
+
+    with Session(engine) as session:
+        assert len(session.exec(select(models.SetSyncCard)).all()) == 5
+        for placed in session.exec(select(models.SetSyncCard)).all():
+            session.delete(placed)
+        card = session.exec(select(models.CardRecord).where(models.CardRecord.remote_id == "5103")).one()
+        card.last_synced = dt.datetime(2020, 1, 1)
+        session.add(card)
+        session.commit()
+
+    api.calls.clear()
+    catalog_delta.refresh_stale_cards()
+    assert api.calls == [("episodes/51/cards", "2")]
+    with Session(engine) as session:
+        assert session.get(models.SetSyncCard, "5103").page == 2
+
+
+def test_budget_charges_a_day_row_created_elsewhere(engine, scope):
+    clock = _Clock()
+    budget = catalog_delta.DailyBudget(3, session_factory=scope, clock=clock)
+    with Session(engine) as session:
+        session.add(models.ApiQuota(day=clock.now.date(), requests=2))
+        session.commit()
+
+    assert budget.take()
+    assert not budget.take()
+    assert budget.used() == 3
+
+
+class _FlakySearch:
+    """Search fallback that returns the first page of a 300-card set, then drops the connection."""
+
+    headers = {"User-Agent": "pytest-agent"}
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        if params["page"] != "1":
+            raise requests.ConnectionError("connection reset")
+        cards = [{"id": f"srch-{n}", "name": f"Card {n}", "number": str(n)} for n in range(1, 251)]
+        return _Response(200, {"data": cards, "totalCount": 300})
+
+
+def test_search_fallback_cut_short_leaves_set_partial(engine, monkeypatch):
+    with Session(engine) as session:
+        session.add(models.SetInfo(code="SRCH", name="Search set"))
+        session.commit()
+    runner = fetch_engine.FetchEngine(requests_per_second=1000, burst=100, session=_FlakySearch())
+    monkeypatch.setattr(fetch_engine, "get_fetch_engine", lambda: runner)
+
+    summary = catalog_delta.sync_sets()
+    assert summary.sets_completed == 0
+    assert _set_info(engine, "SRCH").sync_status == "partial"
+
+
+class _RetryOnceHandler(BaseHTTPRequestHandler):
+    hits = 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        self.send_response(503 if type(self).hits == 1 else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_budget_charges_adapter_retries(engine, scope):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RetryOnceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    http = fetch_engine.build_session(fetch_engine.TokenBucket(1000, 100), 1)
+    budget = catalog_delta.DailyBudget(10, session_factory=scope)
+    try:
+        response = catalog_delta.BudgetedSession(http, budget).get(f"http://127.0.0.1:{server.server_port}/")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.status_code == 200
+    assert _RetryOnceHandler.hits == 2
+    assert budget.used() == 2
+    assert http.request_count == 2
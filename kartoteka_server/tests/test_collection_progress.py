@@ -0,0 +1,155 @@
+"""Tests for set collection creation, progress statistics and card search."""
+
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from kartoteka_web import models, schemas
+from kartoteka_web.routes import collections
+from kartoteka_web.services import card_search
+
+
+def _seed(session: Session, prices: list[float | None]) -> models.User:
+    user = models.User(username="ash", hashed_password="x")
+    session.add(user)
+    for number, price in enumerate(prices, start=1):
+        session.add(
+            models.CardRecord(
+                name=f"Card {number}",
+                name_normalized=f"card {number}",
+                number=str(number),
+                total=str(len(prices)),
+                set_name="Base Set",
+                set_code="base1",
+                set_code_clean="base1",
+                price=price,
+            )
+        )
+    session.commit()
+    session.refresh(user)
+    return user
+
+
+def _count_statements(engine):
+    statements: list[str] = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before)
+    return statements
+
+
+def test_set_collection_is_populated_with_one_insert(engine):
+    with Session(engine) as session:
+        user = _seed(session, [1.0] * 250)
+        statements = _count_statements(engine)
+
+        created = collections.create_collection(
+            schemas.CollectionCreate(
+                name="Base", collection_type="set", set_code="base1", set_type="masterset"
+            ),
+            current_user=user,
+            session=session,
+        )
+
+        inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT INTO COLLECTIONCARD")]
+        assert len(inserts) == 1
+        assert created.total_cards == 250
+        stored = session.exec(
+            select(models.CollectionCard).where(models.CollectionCard.collection_id == created.id)
+        ).all()
+        assert len(stored) == 250
+        assert not any(card.is_owned for card in stored)
+
+        collection = session.get(models.Collection, created.id)
+        records = session.exec(select(models.CardRecord)).all()
+        # Cards already in the collection are skipped by the anti-join
+        assert collections._populate_collection_cards(collection, records, session) == 0
+
+
+def test_progress_is_computed_with_aggregates(engine):
+    with Session(engine) as session:
+        user = _seed(session, [5.0, 20.0, None, 2.0, 8.0, 0.0])
+        created = collections.create_collection(
+            schemas.CollectionCreate(
+                name="Base", collection_type="set", set_code="base1", set_type="masterset"
+            ),
+            current_user=user,
+            session=session,
+        )
+        cards = {
+            cc.card_record.number: cc
+            for cc in session.exec(
+                select(models.CollectionCard).where(models.CollectionCard.collection_id == created.id)
+            ).all()
+        }
+        collections.toggle_card_ownership(created.id, cards["1"].id, current_user=user, session=session)
+        collections.update_collection_card(
+            created.id,
+            cards["2"].id,
+            schemas.CollectionCardUpdate(quantity=3),
+            current_user=user,
+            session=session,
+        )
+
+        progress = collections.get_collection_progress(created.id, current_user=user, session=session)
+
+    assert progress.owned_cards == 2
+    assert progress.missing_cards == 4
+    assert progress.owned_value == 65.0  # 5 + 20 * 3
+    assert progress.missing_value == 10.0  # 2 + 8
+    assert progress.total_value == 75.0
+    assert progress.cards_with_price == 4
+    assert progress.cards_without_price == 2
+    assert progress.avg_card_price == 18.75
+    assert progress.most_expensive_owned.name == "Card 2"
+    assert progress.most_expensive_missing.name == "Card 5"
+    assert progress.cheapest_missing.name == "Card 4"
+    assert progress.cheapest_missing.price == 2.0
+
+
+def _custom_collection(session: Session, user: models.User) -> schemas.CollectionRead:
+    return collections.create_collection(
+        schemas.CollectionCreate(name="Favourites", collection_type="custom"),
+        current_user=user,
+        session=session,
+    )
+
+
+@pytest.mark.parametrize("with_fts", [True, False])
+def test_card_search_uses_one_query_for_any_collection_size(engine, with_fts):
+    if with_fts:
+        card_search.ensure_search_index(engine)
+    with Session(engine) as session:
+        user = _seed(session, [1.0] * 60)
+        card = models.Card(name="Card 7", number="7", set_name="Base Set")
+        session.add(card)
+        session.flush()
+        session.add(models.CollectionEntry(user_id=user.id, card_id=card.id, quantity=2))
+        session.add(models.CollectionEntry(user_id=user.id, card_id=card.id, quantity=1, is_reverse=True))
+        session.commit()
+        created = _custom_collection(session, user)
+        records = session.exec(select(models.CardRecord).order_by(models.CardRecord.id)).all()
+        for record in records[:40]:
+            if record.number != "7":
+                session.add(models.CollectionCard(collection_id=created.id, card_record_id=record.id))
+        session.commit()
+
+        statements = _count_statements(engine)
+        results = collections.search_cards_for_collection(
+            created.id, q="card", only_owned=False, limit=5, current_user=user, session=session
+        )
+        searches = [s for s in statements if "FROM cardrecord" in s]
+        assert len(searches) == 1
+        assert len(results) == 5
+        assert all(int(r["number"]) == 7 or int(r["number"]) > 40 for r in results)
+
+        owned = collections.search_cards_for_collection(
+            created.id, q="card 7", only_owned=True, limit=5, current_user=user, session=session
+        )
+    assert [(r["number"], r["quantity_owned"], r["is_in_main_collection"]) for r in owned] == [
+        ("7", 3, True)
+    ]
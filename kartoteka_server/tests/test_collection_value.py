@@ -0,0 +1,179 @@
+"""Tests for the per-user daily collection value rollup."""
+
+from __future__ import annotations
+
+import datetime as dt
+
+from sqlalchemy import delete, event
+from sqlmodel import Session, select
+
+from kartoteka_web import models
+from kartoteka_web.services import collection_value, crud
+
+TODAY = dt.date.today()
+
+
+def _setup(
+    session: Session, quantity: int = 2, *, seed: bool = True
+) -> tuple[models.User, models.Card, models.CardRecord]:
+    user = models.User(username="ash", hashed_password="x")
+    card = models.Card(name="Pikachu", number="58", set_name="Base Set", price=10.0)
+    record = models.CardRecord(
+        name="Pikachu",
+        name_normalized="pikachu",
+        number="58",
+        set_name="Base Set",
+        set_name_normalized="base set",
+    )
+    session.add_all([user, card, record])
+    session.flush()
+    session.add(models.CollectionEntry(user_id=user.id, card_id=card.id, quantity=quantity))
+    session.commit()
+    if seed:
+        collection_value.rebuild_series(session, user.id)
+        session.commit()
+    return user, card, record
+
+
+def _history(days_ago: int, price: float) -> dict[str, object]:
+    return {"date": (TODAY - dt.timedelta(days=days_ago)).isoformat(), "price": price, "currency": "PLN"}
+
+
+def _values(session: Session, user_id: int, days: int = 10) -> list[float]:
+    return [value for _, value in collection_value.read_series(session, user_id, days=days, today=TODAY)]
+
+
+def test_build_series_walks_price_history(session):
+    user, _, record = _setup(session, quantity=2)
+    crud.upsert_price_history(session, record.id, [_history(5, 4.0), _history(2, 6.0)])
+    session.commit()
+
+    values = _values(session, user.id)
+    assert len(values) == 11
+    # Card.price is the fallback before the first history point
+    assert values[:5] == [20.0] * 5
+    assert values[5:8] == [8.0] * 3
+    assert values[8:] == [12.0] * 3
+
+
+def _stored(session: Session, user_id: int) -> list[float]:
+    return list(
+        session.exec(
+            select(models.CollectionValueDaily.cards_value)
+            .where(models.CollectionValueDaily.user_id == user_id)
+            .order_by(models.CollectionValueDaily.date)
+        ).all()
+    )
+
+
+def _built(session: Session, user_id: int) -> list[float]:
+    date_from, date_to = collection_value.history_window()
+    return [value for _, value in sorted(collection_value.build_series(session, user_id, date_from, date_to).items())]
+
+
+def test_read_series_does_not_write(session):
+    user, _, record = _setup(session, quantity=2)
+    session.execute(
+        delete(models.CollectionValueDaily).where(models.CollectionValueDaily.date > TODAY - dt.timedelta(days=3))
+    )
+    session.commit()
+
+    values = _values(session, user.id)
+    assert values == [20.0] * 11  # the last three days are computed in memory
+    assert not session.new and not session.dirty
+    assert len(_stored(session, user.id)) == collection_value.HISTORY_DAYS - 2
+
+    assert collection_value.roll_forward(session, user.id) == 3
+    session.commit()
+    assert _stored(session, user.id) == _built(session, user.id)
+
+
+def test_price_history_ingestion_updates_stored_rows(session):
+    user, _, record = _setup(session, quantity=3)
+    crud.upsert_price_history(session, record.id, [_history(4, 5.0)])
+    session.commit()
+    assert _stored(session, user.id)[-1] == 15.0
+
+    crud.upsert_price_history(session, record.id, [_history(1, 7.0)])
+    session.commit()
+
+    assert _stored(session, user.id) == _built(session, user.id)
+    assert _stored(session, user.id)[-2:] == [21.0, 21.0]
+
+
+def test_entry_changes_update_stored_rows(session):
+    user, card, record = _setup(session, quantity=1)
+    crud.upsert_price_history(session, record.id, [_history(3, 2.0)])
+    session.commit()
+    assert _stored(session, user.id)[-1] == 2.0
+
+    entry = session.exec(select(models.CollectionEntry)).one()
+    entry.quantity = 5
+    session.add(entry)
+    session.commit()
+
+    rows = _stored(session, user.id)
+    assert rows[-1] == 10.0
+    assert rows[0] == 50.0  # Card.price 10.0 before the history starts
+
+    session.delete(entry)
+    session.commit()
+    assert set(_stored(session, user.id)) == {0.0}
+
+
+def test_card_price_changes_never_drift(session):
+    # Card.price is the fallback before the first history point; the price
+    # fill queue changing it between entry edits used to skew the deltas
+    user, card, record = _setup(session, quantity=1)
+    card.price = None
+    session.add(card)
+    session.commit()
+    crud.upsert_price_history(session, record.id, [_history(3, 2.0)])
+    session.commit()
+
+    entry = session.exec(select(models.CollectionEntry)).one()
+    for price, quantity in ((10.0, 4), (1.0, 2), (None, 1)):
+        card.price = price
+        session.add(card)
+        session.commit()
+        entry.quantity = quantity
+        session.add(entry)
+        session.commit()
+        assert _stored(session, user.id) == _built(session, user.id)
+
+    assert min(_stored(session, user.id)) == 0.0
+    assert _stored(session, user.id)[-1] == 2.0
+
+
+def test_roll_forward_all_seeds_users_without_rows(session, scope):
+    user, _, record = _setup(session, quantity=2, seed=False)
+    crud.upsert_price_history(session, record.id, [_history(2, 6.0)])
+    session.commit()
+    assert _stored(session, user.id) == []  # no rows, no deltas
+
+    assert collection_value.roll_forward_all() == collection_value.HISTORY_DAYS + 1
+    session.expire_all()
+    assert _stored(session, user.id) == _built(session, user.id)
+    assert collection_value.roll_forward_all() == 0
+
+
+def test_price_history_updates_only_days_from_the_change(session):
+    user, _, record = _setup(session, quantity=1)
+    crud.upsert_price_history(session, record.id, [_history(3, 2.0)])
+    session.commit()
+    statements: list[str] = []
+
+    @event.listens_for(session.get_bind(), "before_cursor_execute")
+    def _log(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE collectionvaluedaily"):
+            statements.append(statement)
+
+    try:
+        crud.upsert_price_history(session, record.id, [_history(1, 5.0)])
+        session.commit()
+    finally:
+        event.remove(session.get_bind(), "before_cursor_execute", _log)
+
+    assert len(statements) == 1  # one range update from the changed day on
+    assert _stored(session, user.id)[-3:] == [2.0, 5.0, 5.0]
+    assert _stored(session, user.id) == _built(session, user.id)
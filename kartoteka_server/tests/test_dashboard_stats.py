@@ -0,0 +1,91 @@
+"""Tests for the dashboard statistics snapshot."""
+
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session
+
+from kartoteka_web import models
+from kartoteka_web.routes import users
+from kartoteka_web.services import dashboard_stats
+
+
+pytestmark = pytest.mark.usefixtures("scope")
+
+
+@pytest.fixture()
+def requests_seen(monkeypatch):
+    seen: list[int] = []
+    dashboard_stats.on_change(lambda: seen.append(1))
+    yield seen
+    dashboard_stats.on_change(None)
+
+
+def _seed(session: Session) -> None:
+    user = models.User(username="brock", hashed_password="x")
+    cards = [
+        models.Card(name="Onix", number="1", set_name="Base", set_code="base1", price=3.0),
+        models.Card(name="Geodude", number="2", set_name="Base", set_code="base1", price=9.0),
+    ]
+    session.add_all([user, *cards])
+    session.flush()
+    session.add_all(
+        [
+            models.CollectionEntry(user_id=user.id, card_id=cards[0].id),
+            models.CollectionEntry(user_id=user.id, card_id=cards[0].id, is_reverse=True),
+            models.CollectionEntry(user_id=user.id, card_id=cards[1].id),
+            models.CardRecord(name="Onix", name_normalized="onix", number="1", set_name="Base", price=2.0),
+            models.CardRecord(name="Geodude", name_normalized="geodude", number="2", set_name="Base", price=4.0),
+        ]
+    )
+    session.commit()
+
+
+def test_endpoint_reads_the_snapshot_row(engine):
+    with Session(engine) as session:
+        _seed(session)
+    snapshot = dashboard_stats.refresh()
+    assert snapshot.refresh_ms >= 0
+    assert dashboard_stats.metrics()["last_refresh_ms"] == snapshot.refresh_ms
+
+    statements: list[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with Session(engine) as session:
+        stats = users.get_dashboard_stats(session=session)
+
+    assert len(statements) == 1
+    assert "dashboardstats" in statements[0]
+    assert stats["total_users"] == 1
+    assert stats["total_cards"] == 2
+    assert stats["average_card_price"] == 3.0
+    assert stats["most_popular_card"] == {"name": "Onix", "set_code": "base1", "number": "1", "count": 2}
+    assert stats["most_valuable_card"]["name"] == "Geodude"
+    assert [card["name"] for card in stats["top_cards"]] == ["Onix", "Geodude"]
+    assert stats["updated_at"] is not None
+
+
+def test_endpoint_computes_when_no_snapshot_exists(engine):
+    with Session(engine) as session:
+        _seed(session)
+        stats = users.get_dashboard_stats(session=session)
+    assert stats["total_users"] == 1
+    assert stats["updated_at"] is None
+
+
+def test_tracked_commits_request_a_refresh(engine, requests_seen):
+    with Session(engine) as session:
+        session.add(models.User(username="misty", hashed_password="x"))
+        session.rollback()
+    assert requests_seen == []
+
+    with Session(engine) as session:
+        session.add(models.LatestProduct(position=0, name="ETB"))
+        session.commit()
+    assert requests_seen == []
+
+    with Session(engine) as session:
+        session.add(models.User(username="misty", hashed_password="x"))
+        session.add(models.Collection(user_id=1, name="Water"))
+        session.commit()
+    assert requests_seen == [1]
@@ -0,0 +1,102 @@
+"""Tests for the SQLite concurrency settings of the database module."""
+
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from kartoteka_web import database, models
+
+
+@pytest.fixture()
+def engine(engine, monkeypatch):
+    # Pooled connections predate the pragma listener
+    engine.dispose()
+    database._configure_engine(engine)
+    monkeypatch.setattr(database, "engine", engine)
+    return engine
+
+
+def test_connections_use_wal(engine):
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar().lower() == "wal"
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+
+
+def test_read_session_rejects_writes(engine):
+    with database.session_scope() as session:
+        session.add(models.User(username="misty", hashed_password="x"))
+
+    with database.read_session() as session:
+        assert session.exec(select(models.User.username)).all() == ["misty"]
+        session.add(models.User(username="brock", hashed_password="x"))
+        with pytest.raises(OperationalError):
+            session.flush()
+
+
+def test_run_write_retries_busy_errors(engine, monkeypatch):
+    monkeypatch.setattr(database.time, "sleep", lambda _seconds: None)
+    attempts: list[int] = []
+
+    def write(session, username):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        session.add(models.User(username=username, hashed_password="x"))
+        return username
+
+    assert database.run_write(write, "gary") == "gary"
+    assert len(attempts) == 3
+
+    with database.read_session() as session:
+        assert session.exec(select(models.User.username)).all() == ["gary"]
+
+
+def test_commit_waits_out_a_held_write_lock(engine, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_BUSY_TIMEOUT_MS", 10)
+    engine.dispose()
+    with engine.connect():
+        pass  # pooled connection with the short busy_timeout
+
+    # Another connection holds the write lock past busy_timeout; the first
+    # backoff sleep releases it
+    blocker = sqlite3.connect(engine.url.database, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    sleeps: list[float] = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        blocker.execute("ROLLBACK")
+
+    monkeypatch.setattr(database.time, "sleep", sleep)
+
+    with database.session_scope() as session:
+        session.add(models.User(username="erika", hashed_password="x"))
+    blocker.close()
+
+    assert len(sleeps) == 1
+    with database.read_session() as session:
+        assert session.exec(select(models.User.username)).all() == ["erika"]
+
+
+def test_plain_sessions_only_wait_for_busy_timeout(engine, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_BUSY_TIMEOUT_MS", 10)
+    engine.dispose()
+    sleeps: list[float] = []
+    monkeypatch.setattr(database.time, "sleep", sleeps.append)
+
+    blocker = sqlite3.connect(engine.url.database, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        with Session(engine) as session:
+            session.add(models.User(username="koga", hashed_password="x"))
+            with pytest.raises(OperationalError):
+                session.commit()
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+
+    assert sleeps == []
@@ -73,3 +73,38 @@ def test_init_db_adds_missing_price_columns(monkeypatch, tmp_path):
     assert refreshed.price == 9.99
     assert refreshed.price_7d_average == 8.75
 
+
+
+def test_init_db_adds_phash_column(monkeypatch, tmp_path):
+    """`init_db` should add the visual search hash to legacy catalogue tables."""
+
+    db_url = f"sqlite:///{tmp_path / 'legacy_catalogue.db'}"
+
+    legacy_engine = create_engine(db_url, connect_args={"check_same_thread": False})
+    with legacy_engine.begin() as connection:
+        connection.exec_driver_sql(
+            """
+            CREATE TABLE cardrecord (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name VARCHAR NOT NULL,
+                name_normalized VARCHAR NOT NULL,
+                number VARCHAR NOT NULL,
+                set_name VARCHAR NOT NULL,
+                image_small VARCHAR
+            );
+            """
+        )
+    legacy_engine.dispose()
+
+    monkeypatch.setenv("KARTOTEKA_DATABASE_URL", db_url)
+
+    import kartoteka_web.database as database
+
+    database.engine.dispose()
+    database = importlib.reload(database)
+
+    database._ensure_card_record_columns()
+
+    inspector = inspect(database.engine)
+    assert "phash" in {column["name"] for column in inspector.get_columns("cardrecord")}
+    assert "ix_cardrecord_phash" in {index["name"] for index in inspector.get_indexes("cardrecord")}
@@ -0,0 +1,138 @@
+"""Tests for the streaming collection and set print exports."""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from kartoteka_web import models
+from kartoteka_web.routes import cards, collections
+from kartoteka_web.services import export
+
+
+pytestmark = pytest.mark.usefixtures("read_scope")
+
+
+@pytest.fixture()
+def user(engine) -> models.User:
+    with Session(engine) as session:
+        user = models.User(username="sabrina", hashed_password="x")
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        return user
+
+
+@pytest.fixture()
+def client(engine, user):
+    app = FastAPI()
+    app.include_router(cards.router)
+    app.include_router(collections.router)
+
+    def session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[collections.get_read_session] = session_override
+    app.dependency_overrides[collections.get_session] = session_override
+    app.dependency_overrides[collections.get_current_user] = lambda: user
+    app.dependency_overrides[cards.get_current_user] = lambda: user
+    return TestClient(app)
+
+
+def _records(session: Session) -> list[models.CardRecord]:
+    records = [
+        models.CardRecord(
+            name=name, name_normalized=name.lower(), number=number, total="100",
+            set_name="Fusion Strike", set_name_normalized="fusion strike", set_code="swsh8",
+        )
+        for name, number in [("Mew", "10"), ("Alakazam", "2"), ("Gengar", "TG05"), ("Mew VMAX", "200")]
+    ]
+    session.add_all(records)
+    session.add(models.SetInfo(code="swsh8", name="Fusion Strike", series="Sword & Shield"))
+    session.commit()
+    return records
+
+
+def test_collection_entries_stream_in_chunks(engine, user, client, monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_SIZE", 50)
+    with Session(engine) as session:
+        card_models = [
+            models.Card(name=f"Abra {n}", number=str(n), set_name="Base", price=n / 10)
+            for n in range(120)
+        ]
+        product = models.Product(name="Base Booster", set_name="Base", price=25.0)
+        session.add_all([*card_models, product])
+        session.flush()
+        session.add_all(
+            [models.CollectionEntry(user_id=user.id, card_id=card.id, quantity=2) for card in card_models]
+            + [models.CollectionEntry(user_id=user.id, product_id=product.id, purchase_price=20.0)]
+        )
+        session.commit()
+
+    with Session(engine) as session:
+        pieces = list(export.encode(export.collection_entries(session, user.id), export.ENTRY_FIELDS, "ndjson"))
+        assert [piece.count("\n") for piece in pieces] == [50, 50, 21]
+        assert len(session.identity_map) == 0
+
+    response = client.get("/cards/export", params={"format": "ndjson"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert response.text == "".join(pieces)
+    assert len(rows) == 121
+    assert rows[0] == {
+        "id": 1, "kind": "card", "name": "Abra 0", "number": "0", "set_name": "Base",
+        "set_code": None, "rarity": None, "quantity": 2, "is_reverse": False,
+        "is_holo": False, "purchase_price": None, "price": 0.0, "price_7d_average": None,
+    }
+    assert rows[-1]["kind"] == "product"
+    assert rows[-1]["price"] == 25.0
+
+    response = client.get("/cards/export")
+    assert 'filename="kartoteka-collection.csv"' in response.headers["content-disposition"]
+    csv_rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["name"] for row in csv_rows] == [row["name"] for row in rows]
+
+
+def test_set_export_matches_print_data(engine, client):
+    with Session(engine) as session:
+        _records(session)
+
+    print_data = client.get("/collections/sets/swsh8/print-data").json()
+    exported = client.get("/collections/sets/swsh8/export", params={"format": "ndjson"})
+
+    assert [card["number"] for card in print_data["cards"]] == ["2", "TG05", "10"]
+    assert [json.loads(line) for line in exported.text.splitlines()] == print_data["cards"]
+    assert client.get("/collections/sets/nope/export").status_code == 404
+
+
+def test_collection_export_keeps_album_order_and_filters(engine, user, client):
+    with Session(engine) as session:
+        records = _records(session)
+        collection = models.Collection(user_id=user.id, name="Psychic")
+        other = models.Collection(user_id=user.id + 1, name="Not mine")
+        session.add_all([collection, other])
+        session.flush()
+        session.add_all(
+            [
+                models.CollectionCard(collection_id=collection.id, card_record_id=record.id, is_owned=index % 2 == 0)
+                for index, record in enumerate(records)
+            ]
+        )
+        session.commit()
+        collection_id, other_id = collection.id, other.id
+
+    owned = client.get(f"/collections/{collection_id}/export", params={"cards_filter": "owned"})
+    rows = list(csv.DictReader(io.StringIO(owned.text)))
+    assert [(row["name"], row["is_owned"]) for row in rows] == [("Gengar", "True"), ("Mew", "True")]
+
+    print_data = client.get(f"/collections/{collection_id}/print-data").json()
+    assert [card["name"] for card in print_data["cards"]] == ["Alakazam", "Gengar", "Mew", "Mew VMAX"]
+
+    assert client.get(f"/collections/{other_id}/export").status_code == 404
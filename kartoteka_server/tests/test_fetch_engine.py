@@ -0,0 +1,54 @@
+"""Tests for the scheduler fetch engine."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from kartoteka_web.services import fetch_engine
+
+
+def test_token_bucket_caps_rate_after_burst():
+    bucket = fetch_engine.TokenBucket(rate=50, capacity=5)
+    started = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+    # 5 tokens are free, the other 10 arrive at 50/s
+    assert time.monotonic() - started >= 0.18
+
+
+def test_engine_runs_concurrently_and_records_metrics():
+    engine = fetch_engine.FetchEngine(requests_per_second=1000, burst=100, concurrency=4)
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fetch(http, item):
+        nonlocal active, peak
+        assert http is engine.http
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+        if item == 3:
+            raise RuntimeError("boom")
+        return item * 2
+
+    results = list(engine.run("demo", range(8), fetch))
+
+    assert sorted(result for _, result, error in results if error is None) == [0, 2, 4, 8, 10, 12, 14]
+    assert [item for item, _, error in results if error is not None] == [3]
+    assert 1 < peak <= 4
+
+    metrics = engine.metrics()["demo"]
+    assert metrics["items"] == 8
+    assert metrics["succeeded"] == 7
+    assert metrics["failed"] == 1
+    assert metrics["finished_at"] is not None
+    assert metrics["items_per_minute"] > 0
+
+
+def test_chunked_groups_results():
+    assert list(fetch_engine.chunked(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
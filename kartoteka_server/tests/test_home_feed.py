@@ -0,0 +1,98 @@
+"""Tests for the locally served home page data."""
+
+from __future__ import annotations
+
+import datetime as dt
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from kartoteka_web import models
+from kartoteka_web.services import home_feed, tcg_api
+
+
+def _product(name: str, release_date: str = "2026-09-01") -> dict[str, object]:
+    return {"id": name.lower(), "name": name, "set_name": "Mega Evolution", "release_date": release_date, "price": 199.0}
+
+
+def test_refresh_replaces_cached_feed_and_keeps_it_on_failure(engine, scope, monkeypatch):
+    feeds = [[_product("Old ETB")], [_product("New ETB"), _product("New Booster")], []]
+    monkeypatch.setattr(tcg_api, "get_latest_products", lambda **kwargs: feeds.pop(0))
+
+    assert home_feed.refresh_latest_products() == 1
+    assert home_feed.refresh_latest_products() == 2
+    assert home_feed.refresh_latest_products() == 0
+
+    with Session(engine) as session:
+        products = home_feed.latest_products(session)
+    assert [p["name"] for p in products] == ["New ETB", "New Booster"]
+    assert products[0]["id"] == "new etb"
+    assert products[0]["price"] == 199.0
+
+
+def _seed(session: Session) -> int:
+    user = models.User(username="misty", hashed_password="x")
+    session.add(user)
+    session.flush()
+    cards = [
+        models.Card(name="Starmie", number="1", set_name="Base", price=10.0, price_7d_average=8.0),
+        models.Card(name="Staryu", number="2", set_name="Base", price=1.0, price_7d_average=2.0),
+        models.Card(name="Psyduck", number="3", set_name="Base"),
+    ]
+    product = models.Product(name="Base Booster", set_name="Base", price=50.0, price_7d_average=40.0)
+    session.add_all([*cards, product])
+    session.flush()
+    for card, quantity in zip(cards, (2, 1, 1)):
+        session.add(models.CollectionEntry(user_id=user.id, card_id=card.id, quantity=quantity))
+    session.add(models.CollectionEntry(user_id=user.id, product_id=product.id, quantity=1))
+    session.commit()
+    return user.id
+
+
+def test_user_widgets_use_aggregates(engine):
+    with Session(engine) as session:
+        user_id = _seed(session)
+        widgets = home_feed.user_widgets(session, user_id)
+
+    assert widgets["collection_stats"] == {"total_cards": 4, "unique_cards": 3, "total_value": 71.0}
+    assert [item["name"] for item in widgets["recently_added"]] == [
+        "Base Booster", "Psyduck", "Staryu", "Starmie"
+    ]
+    assert widgets["recently_added"][0]["type"] == "product"
+    assert [(item["name"], item["change_percent"]) for item in widgets["price_changes"]] == [
+        ("Staryu", -50.0), ("Starmie", 25.0), ("Base Booster", 25.0)
+    ]
+
+
+def test_collection_value_comes_from_rollup(engine):
+    with Session(engine) as session:
+        user_id = _seed(session)
+        today = dt.date.today()
+        session.execute(delete(models.CollectionValueDaily))
+        session.add(models.CollectionValueDaily(user_id=user_id, date=today - dt.timedelta(days=1), cards_value=5.0))
+        session.add(models.CollectionValueDaily(user_id=user_id, date=today, cards_value=30.0))
+        session.commit()
+
+        stats = home_feed.user_widgets(session, user_id)["collection_stats"]
+
+    assert stats["total_value"] == 80.0  # rollup cards value + sealed products
+
+
+def test_home_page_makes_no_outbound_calls(engine, read_scope, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "read_session", read_scope)
+    monkeypatch.setattr(
+        tcg_api, "get_latest_products", lambda **kwargs: pytest.fail("RapidAPI called")
+    )
+    with Session(engine) as session:
+        session.add(models.LatestProduct(position=0, name="Cached ETB"))
+        session.commit()
+
+    response = TestClient(server.app).get("/")
+
+    assert response.status_code == 200
+    with Session(engine) as session:
+        assert session.exec(select(models.LatestProduct.name)).all() == ["Cached ETB"]
@@ -0,0 +1,150 @@
+"""Tests for the background card image cache."""
+
+from __future__ import annotations
+
+import io
+import threading
+
+import pytest
+import requests
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from kartoteka_web.utils import images as image_utils
+
+
+def _png(color=(200, 30, 30), size=(245, 342)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FakeSession:
+    def __init__(self, content: bytes, gate: threading.Event | None = None) -> None:
+        self.content = content
+        self.gate = gate
+        self.calls: list[str] = []
+
+    def get(self, url, timeout=None):
+        self.calls.append(url)
+        if self.gate is not None:
+            self.gate.wait(5)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.content
+        response.headers["Content-Type"] = "image/png"
+        return response
+
+
+@pytest.fixture()
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_utils, "CARD_IMAGE_DIR", tmp_path)
+    cache = image_utils.ImageCache(concurrency=2, session=FakeSession(_png()))
+    monkeypatch.setattr(image_utils, "image_cache", cache)
+    yield cache
+    cache.shutdown(wait=True)
+
+
+def test_ensure_local_path_returns_remote_url_then_cached_path(cache, tmp_path):
+    url = "https://images.example/base1/4.png"
+
+    assert image_utils.ensure_local_path(url, variant="small") == url
+    cache.submit(url, "small").result(5)
+
+    local = image_utils.ensure_local_path(url, variant="small")
+    assert local.startswith(image_utils.CARD_IMAGE_URL_PREFIX)
+    assert image_utils.local_file(local).read_bytes() == _png()
+    assert not [path for path in tmp_path.iterdir() if path.name.startswith(".tmp-")]
+
+
+def test_concurrent_requests_share_one_download(cache):
+    gate = threading.Event()
+    cache._session = FakeSession(_png(), gate)
+    url = "https://images.example/base1/5.png"
+
+    futures = [cache.submit(url, "large") for _ in range(5)]
+    assert len({id(future) for future in futures}) == 1
+    assert cache.pending() == 1
+    gate.set()
+
+    assert futures[0].result(5).endswith("-large.png")
+    assert cache._session.calls == [url]
+
+
+def test_small_images_get_webp_thumbnails(cache):
+    url = "https://images.example/base1/6.png"
+    local = cache.fetch(url, "small")
+
+    thumb = image_utils.thumbnail_path(url)
+    assert thumb.endswith("-small-thumb.webp")
+    with Image.open(image_utils.local_file(thumb)) as image:
+        assert image.format == "WEBP"
+        assert image.width <= image_utils.THUMBNAIL_SIZE[0]
+    assert image_utils.thumbnail_path(local) == thumb
+    # A thumbnail sent back by a form is stored as the full image
+    assert image_utils.ensure_local_path(thumb, variant="small") == local
+
+
+def test_eviction_removes_least_recently_used_files(cache, monkeypatch):
+    monkeypatch.setattr(image_utils, "_TOUCH_INTERVAL", 0.0)
+    size = len(_png())
+    first = cache.fetch("https://images.example/a.png", "large")
+    second = cache.fetch("https://images.example/b.png", "large")
+    cache.touch(first.rsplit("/", 1)[1])
+
+    freed = cache.evict(max_bytes=size + size // 2)
+
+    assert freed == size
+    assert image_utils.local_file(first) is not None
+    assert image_utils.local_file(second) is None
+    assert cache.size() == size
+    assert cache.source(second.rsplit("/", 1)[1]) == ("https://images.example/b.png", "large")
+
+
+def test_static_mount_redirects_evicted_files(cache, tmp_path):
+    url = "https://images.example/c.png"
+    local = cache.fetch(url, "large")
+    app = FastAPI()
+    app.mount(
+        image_utils.CARD_IMAGE_URL_PREFIX,
+        image_utils.CardImageFiles(directory=str(tmp_path)),
+    )
+    client = TestClient(app)
+
+    assert client.get(local).content == _png()
+    assert client.get(f"{image_utils.CARD_IMAGE_URL_PREFIX}/.cache-index.sqlite").status_code == 404
+
+    cache.evict(max_bytes=0)
+    response = client.get(local, follow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers["location"] == url
+
+
+def test_evicted_thumbnail_redirects_and_is_rebuilt(cache, tmp_path):
+    url = "https://images.example/d.png"
+    cache.fetch(url, "small")
+    thumb = image_utils.thumbnail_path(url)
+    thumb_file = image_utils.local_file(thumb)
+    app = FastAPI()
+    app.mount(
+        image_utils.CARD_IMAGE_URL_PREFIX,
+        image_utils.CardImageFiles(directory=str(tmp_path)),
+    )
+    client = TestClient(app)
+
+    thumb_file.unlink()
+    response = client.get(thumb, follow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers["location"] == url
+
+    cache.submit(url, "small").result(5)
+    assert thumb_file.is_file()
+    assert cache._session.calls == [url]
+
+
+def test_touch_throttle_state_is_bounded(cache, monkeypatch):
+    monkeypatch.setattr(image_utils, "_TOUCHED_MAX", 3)
+    for n in range(10):
+        cache.touch(f"{n}.png")
+    assert list(cache._touched) == ["7.png", "8.png", "9.png"]
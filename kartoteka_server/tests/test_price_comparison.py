@@ -0,0 +1,108 @@
+"""Tests for the asynchronous Polish shop price comparison."""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+import httpx
+
+from kartoteka_web import price_comparison
+
+FIXTURES = Path(__file__).parent / "fixtures" / "price_comparison"
+SEARCH_HTML = (FIXTURES / "boosterpoint_search.html").read_bytes()
+PRODUCT_HTML = (FIXTURES / "boosterpoint_product.html").read_bytes()
+
+SHOP = price_comparison.DEFAULT_SHOPS[0]
+QUERY = "evolving skies booster"
+
+
+def _engine(handler, **kwargs) -> price_comparison.PriceComparisonEngine:
+    return price_comparison.PriceComparisonEngine(
+        [SHOP], transport=httpx.MockTransport(handler), **kwargs
+    )
+
+
+def _run(engine, query: str = QUERY):
+    async def run():
+        try:
+            return await engine.search(query)
+        finally:
+            await engine.aclose()
+
+    return asyncio.run(run())
+
+
+def test_parse_search_results_filters_and_resolves_links():
+    candidates = price_comparison.parse_search_results(SHOP, SEARCH_HTML.decode(), QUERY)
+
+    assert [(c.url, c.available) for c in candidates] == [
+        ("https://boosterpoint.pl/produkt/evolving-skies-booster-wyprzedany/", False),
+        ("https://boosterpoint.pl/produkt/evolving-skies-booster/", True),
+        ("https://boosterpoint.pl/produkt/evolving-skies-sleeved-booster/", True),
+    ]
+
+
+def test_parse_product_price_prefers_sale_price():
+    assert price_comparison.parse_product_price(SHOP, PRODUCT_HTML.decode()) == (29.99, True)
+
+
+def test_first_priced_candidate_wins_and_results_are_cached():
+    requested: list[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        if request.url.path.startswith("/wszystkie-produkty"):
+            return httpx.Response(200, content=SEARCH_HTML)
+        if request.url.path.endswith("wyprzedany/"):
+            return httpx.Response(404)
+        if request.url.path.endswith("sleeved-booster/"):
+            await asyncio.sleep(5)  # cancelled once an earlier candidate has a price
+        return httpx.Response(200, content=PRODUCT_HTML)
+
+    engine = _engine(handler)
+    (result,) = _run(engine)
+
+    assert result["found"] is True
+    assert result["price"] == 29.99
+    assert result["link"] == "https://boosterpoint.pl/produkt/evolving-skies-booster/"
+    assert result["available"] is True
+    assert result["error"] is None
+
+    requested.clear()
+    assert _run(engine, "  Evolving SKIES booster ") == [result]
+    assert requested == []
+
+
+def test_deadline_returns_partial_results():
+    slow_shop = {**SHOP, "name": "Slow", "domain": "slow.example",
+                 "search_url": "https://slow.example/?s={query}"}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "slow.example":
+            await asyncio.sleep(5)
+        if "s=" in str(request.url) or request.url.path.startswith("/wszystkie-produkty"):
+            return httpx.Response(200, content=SEARCH_HTML)
+        return httpx.Response(200, content=PRODUCT_HTML)
+
+    engine = price_comparison.PriceComparisonEngine(
+        [slow_shop, SHOP], deadline=0.5, transport=httpx.MockTransport(handler)
+    )
+    slow, fast = _run(engine)
+
+    assert slow["shop_name"] == "Slow"
+    assert slow["error"] == price_comparison.TIMEOUT_ERROR
+    assert fast["price"] == 29.99
+
+
+def test_transient_errors_are_not_cached():
+    statuses = [503, 200]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.startswith("/wszystkie-produkty"):
+            return httpx.Response(statuses.pop(0), content=SEARCH_HTML)
+        return httpx.Response(200, content=PRODUCT_HTML)
+
+    engine = _engine(handler)
+    assert _run(engine)[0]["error"] == "Błąd HTTP 503"
+    assert _run(engine)[0]["price"] == 29.99
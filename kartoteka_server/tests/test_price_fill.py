@@ -0,0 +1,85 @@
+"""Tests for the background collection price fill."""
+
+from __future__ import annotations
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from kartoteka_web import models
+from kartoteka_web.routes import cards
+from kartoteka_web.services import price_fill
+
+
+def _seed(session: Session) -> models.User:
+    user = models.User(username="erika", hashed_password="x")
+    priced = models.Card(name="Oddish", number="43", set_name="Jungle", price=1.5)
+    unpriced = models.Card(name="Gloom", number="37", set_name="Jungle")
+    product = models.Product(name="Jungle Booster", set_name="Jungle")
+    session.add_all([user, priced, unpriced, product])
+    session.flush()
+    session.add_all(
+        [
+            models.CollectionEntry(user_id=user.id, card_id=priced.id, quantity=2),
+            models.CollectionEntry(user_id=user.id, card_id=unpriced.id, quantity=1),
+            models.CollectionEntry(user_id=user.id, product_id=product.id, quantity=1),
+            models.CardRecord(
+                name="Gloom", name_normalized="gloom", number="37",
+                set_name="Jungle", set_name_normalized="jungle", price=4.0, price_7d_average=3.5,
+            ),
+            models.ProductRecord(
+                name="Jungle Booster", name_normalized="jungle booster",
+                set_name="Jungle", set_name_normalized="jungle", price=20.0,
+            ),
+        ]
+    )
+    session.commit()
+    session.refresh(user)
+    return user
+
+
+def test_stats_use_stored_prices_and_queue_missing_ones(engine, monkeypatch):
+    queued: list[price_fill.Job] = []
+    monkeypatch.setattr(price_fill.fill_queue, "enqueue", lambda jobs: queued.extend(jobs) or 0)
+
+    with Session(engine) as session:
+        user = _seed(session)
+
+    writes: list[str] = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: writes.append(statement)
+        if not statement.lstrip().upper().startswith("SELECT") else None,
+    )
+    with Session(engine) as session:
+        stats = cards.get_collection_stats(use_history=False, current_user=user, session=session)
+
+    assert writes == []
+    assert stats.cards_value == 3.0
+    assert stats.products_value == 0.0
+    assert sorted(queued) == [(price_fill.CARD, 2), (price_fill.PRODUCT, 1)]
+
+
+def test_queue_fills_prices_from_the_catalogue(engine, scope):
+    with Session(engine) as session:
+        _seed(session)
+        session.add(models.Card(name="Missingno", number="0", set_name="Glitch"))
+        session.commit()
+
+    jobs = price_fill.PriceFillQueue(session_factory=scope)
+    try:
+        assert jobs.enqueue([(price_fill.CARD, 2), (price_fill.PRODUCT, 1), (price_fill.CARD, 3)]) == 3
+        assert jobs.enqueue([(price_fill.CARD, 2)]) == 0  # already queued
+        jobs.join()
+    finally:
+        jobs.stop()
+
+    with Session(engine) as session:
+        gloom = session.get(models.Card, 2)
+        assert (gloom.price, gloom.price_7d_average) == (4.0, 3.5)
+        assert session.get(models.Product, 1).price == 20.0
+        assert session.get(models.Card, 3).price is None
+
+    # No catalogue price yet: not retried straight away
+    assert jobs.enqueue([(price_fill.CARD, 3)]) == 0
+    assert jobs.pending() == 0
@@ -0,0 +1,76 @@
+"""Tests for the background price history backfill queue."""
+
+from __future__ import annotations
+
+import datetime as dt
+import threading
+import time
+
+from sqlmodel import Session, select
+
+from kartoteka_web import models
+from kartoteka_web.services import price_history_jobs
+
+
+def _record(session: Session, remote_id: str, last_synced: dt.datetime | None = None) -> int:
+    record = models.CardRecord(
+        remote_id=remote_id,
+        name=remote_id,
+        name_normalized=remote_id,
+        number="1",
+        set_name="Base Set",
+        set_name_normalized="base set",
+        last_price_synced=last_synced,
+    )
+    session.add(record)
+    session.commit()
+    return record.id
+
+
+def test_jobs_are_deduplicated_and_rate_limited(engine, scope):
+    calls: list[tuple[str, float]] = []
+    release = threading.Event()
+
+    def fetch(remote_id: str):
+        release.wait(5)
+        calls.append((remote_id, time.monotonic()))
+        return [{"date": dt.date.today().isoformat(), "price": 3.5, "currency": "PLN"}]
+
+    jobs = price_history_jobs.BackfillQueue(
+        min_interval=0.2, fetch=fetch, session_factory=scope
+    )
+    with Session(engine) as session:
+        first = _record(session, "base1-1")
+        second = _record(session, "base1-2")
+
+    try:
+        assert jobs.enqueue([first, second]) == 2
+        # Another user asking for the same cards does not add work
+        assert jobs.enqueue([second, first]) == 0
+        assert jobs.pending([first, second]) == 2
+        release.set()
+        jobs.join()
+    finally:
+        jobs.stop()
+
+    assert [remote_id for remote_id, _ in calls] == ["base1-1", "base1-2"]
+    assert calls[1][1] - calls[0][1] >= 0.2
+    assert jobs.pending() == 0
+
+    with Session(engine) as session:
+        assert len(session.exec(select(models.PriceHistory)).all()) == 2
+        records = session.exec(select(models.CardRecord)).all()
+        assert all(not price_history_jobs.is_stale(record) for record in records)
+
+
+def test_fresh_records_are_not_fetched(engine, scope):
+    calls: list[str] = []
+    jobs = price_history_jobs.BackfillQueue(
+        min_interval=0, fetch=lambda remote_id: calls.append(remote_id) or [],
+        session_factory=scope,
+    )
+    with Session(engine) as session:
+        record_id = _record(session, "base1-3", last_synced=dt.datetime.now(dt.timezone.utc))
+
+    assert jobs.process(record_id) == (0, 0)
+    assert calls == []
@@ -0,0 +1,108 @@
+"""Tests for the authentication rate limiter."""
+
+from __future__ import annotations
+
+import pytest
+
+from kartoteka_web.rate_limit import RateLimiter
+
+
+class Clock:
+    def __init__(self, now: float = 1_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_limiter(request, tmp_path):
+    db_path = str(tmp_path / "limits.db") if request.param == "sqlite" else None
+
+    def make(clock: Clock, **kwargs) -> RateLimiter:
+        kwargs.setdefault("max_requests", 3)
+        kwargs.setdefault("window_seconds", 60)
+        kwargs.setdefault("block_seconds", 120)
+        return RateLimiter(db_path=db_path, clock=clock, **kwargs)
+
+    return make
+
+
+def test_blocks_after_limit_and_reset_clears(make_limiter):
+    clock = Clock()
+    limiter = make_limiter(clock)
+
+    assert [limiter.check("1.2.3.4")[0] for _ in range(3)] == [True, True, True]
+    assert limiter.check("1.2.3.4") == (False, 120)
+    assert limiter.check("5.6.7.8") == (True, None)
+
+    clock.now += 30
+    assert limiter.check("1.2.3.4") == (False, 90)
+
+    limiter.reset("1.2.3.4")
+    assert limiter.check("1.2.3.4") == (True, None)
+
+
+def test_previous_window_is_weighted_by_overlap(make_limiter):
+    clock = Clock(now=60.0 * 100 + 50)  # late in a window
+    limiter = make_limiter(clock)
+    for _ in range(3):
+        assert limiter.check("ip")[0]
+
+    clock.now += 15  # 5 s into the next window: previous still counts 2.75 requests
+    assert limiter.check("ip")[0] is True
+    assert limiter.check("ip")[0] is False
+
+    other = make_limiter(Clock(now=60.0 * 200 + 50), scope="other")
+    for _ in range(3):
+        other.check("ip")
+    other._clock.now += 55  # 45 s into the next window: previous counts 0.75 requests
+    assert [other.check("ip")[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_idle_keys_are_swept_and_tracking_is_capped(make_limiter):
+    clock = Clock()
+    limiter = make_limiter(clock, max_keys=50, sweep_interval=30)
+
+    for n in range(200):
+        limiter.check(f"10.0.{n // 256}.{n % 256}")
+    clock.now += 31
+    limiter.check("10.9.9.9")
+    assert limiter.tracked_keys() <= 51
+
+    clock.now += 200  # every earlier window has elapsed
+    limiter.check("10.9.9.10")
+    assert limiter.tracked_keys() == 1
+    assert limiter.evicted >= 200
+
+
+def test_cap_never_evicts_a_blocked_key(make_limiter):
+    clock = Clock()
+    limiter = make_limiter(clock, max_keys=5, sweep_interval=0)
+
+    for _ in range(4):
+        limiter.check("attacker")
+    assert limiter.check("attacker") == (False, 120)
+
+    # A spray of fresh addresses pushes the blocked key to the LRU end
+    for n in range(50):
+        clock.now += 0.1
+        limiter.check(f"10.0.0.{n}")
+    assert limiter.tracked_keys() <= 5
+    assert limiter.check("attacker")[0] is False
+
+    clock.now += 121
+    assert limiter.check("attacker") == (True, None)
+
+
+def test_sqlite_mode_shares_limits_between_instances(tmp_path):
+    clock = Clock()
+    db_path = str(tmp_path / "shared.db")
+    first = RateLimiter(max_requests=2, db_path=db_path, scope="login", clock=clock)
+    second = RateLimiter(max_requests=2, db_path=db_path, scope="login", clock=clock)
+    register = RateLimiter(max_requests=2, db_path=db_path, scope="register", clock=clock)
+
+    assert first.check("ip")[0]
+    assert second.check("ip")[0]
+    assert first.check("ip")[0] is False
+    assert register.check("ip")[0]
@@ -0,0 +1,166 @@
+"""Tests for the cached /collections/sets/list response."""
+
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from kartoteka_web import models
+from kartoteka_web.routes import collections
+from kartoteka_web.services import catalog_sync, set_catalog
+
+
+@pytest.fixture()
+def catalog(tmp_path, monkeypatch):
+    sets_path = tmp_path / "tcg_sets.json"
+    sets_path.write_text(
+        json.dumps(
+            {
+                "Scarlet & Violet": [
+                    {"name": "Scarlet & Violet", "code": "sv01", "abbr": "SVI"},
+                    {"name": "Paldea Evolved", "code": "sv02", "abbr": "PAL"},
+                ],
+                "Sword & Shield": [{"name": "Sword & Shield", "code": "swsh1", "abbr": "SSH"}],
+            }
+        ),
+        encoding="utf-8",
+    )
+    logo_dir = tmp_path / "logos"
+    logo_dir.mkdir()
+    (logo_dir / "sv01_logo.png").write_bytes(b"png")
+    catalog = set_catalog.SetCatalog(sets_path=sets_path, logo_dir=logo_dir)
+    monkeypatch.setattr(set_catalog, "catalog", catalog)
+    return catalog
+
+
+@pytest.fixture()
+def client(engine, catalog):
+    app = FastAPI()
+    app.include_router(collections.router)
+
+    def session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[collections.get_read_session] = session_override
+    return TestClient(app)
+
+
+def _payload(number: int, set_code: str = "sv01", release_date: str = "2023-03-31") -> dict[str, object]:
+    return {
+        "id": f"{set_code}-{number}",
+        "name": f"Card {number}",
+        "number": str(number),
+        "set_name": f"Set {set_code}",
+        "set_code": set_code,
+        "series": "Scarlet & Violet",
+        "release_date": release_date,
+    }
+
+
+def _add(engine, payloads) -> None:
+    with Session(engine) as session:
+        catalog_sync.upsert_card_records(session, payloads)
+        session.commit()
+
+
+def test_sets_list_is_sorted_and_enriched(engine, client):
+    _add(engine, [_payload(1), _payload(2), _payload(1, "sv02", "2023-06-09")])
+
+    response = client.get("/collections/sets/list")
+
+    assert response.status_code == 200
+    sets = response.json()
+    assert [(s["code"], s["total_cards"]) for s in sets] == [("sv02", 1), ("sv01", 2), ("swsh1", 0)]
+    assert sets[1]["logo_url"] == "/static/img/sets/sv01_logo.png"
+    assert sets[0]["logo_url"] == "https://images.pokemontcg.io/sv02/logo.png"
+    assert sets[0]["name"] == "Paldea Evolved"
+
+
+def test_moving_a_card_between_sets_regroups_counts(engine, catalog):
+    _add(engine, [_payload(1), _payload(2)])
+    with Session(engine) as session:
+        catalog.response(session)
+
+    _add(engine, [{**_payload(2), "set_code": "sv02"}])
+
+    with Session(engine) as session:
+        sets = {s["code"]: s["total_cards"] for s in json.loads(catalog.response(session)[0])}
+    assert sets["sv01"] == 1
+    assert sets["sv02"] == 1
+
+
+def test_sets_list_supports_conditional_requests(engine, client):
+    _add(engine, [_payload(1)])
+    first = client.get("/collections/sets/list")
+    etag = first.headers["etag"]
+
+    cached = client.get("/collections/sets/list", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    _add(engine, [_payload(2)])
+    changed = client.get("/collections/sets/list", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_counts_follow_committed_sync_without_regrouping(engine, catalog, monkeypatch):
+    _add(engine, [_payload(1)])
+    with Session(engine) as session:
+        catalog.response(session)
+    monkeypatch.setattr(catalog, "load_counts", lambda session: pytest.fail("counts regrouped"))
+
+    _add(engine, [_payload(2), _payload(3), _payload(1, "sv02", "2023-06-09")])
+    with Session(engine) as session:
+        catalog_sync.upsert_card_records(session, [_payload(4)])
+        session.rollback()
+
+    with Session(engine) as session:
+        sets = {s["code"]: s["total_cards"] for s in json.loads(catalog.response(session)[0])}
+    assert sets["sv01"] == 3
+    assert sets["sv02"] == 1
+
+
+def test_counts_written_by_other_workers_show_up_after_the_ttl(engine, catalog):
+    _add(engine, [_payload(1)])
+    with Session(engine) as session:
+        body, etag = catalog.response(session)
+
+        # Another worker's sync never reaches this process's commit hooks
+        session.add(models.CardRecord(
+            name="Card 2",
+            name_normalized="card 2",
+            number="2",
+            set_name="Set sv01",
+            set_name_normalized="set sv01",
+            set_code="sv01",
+        ))
+        session.commit()
+
+        loaded_at = catalog._counts_loaded_at
+        assert catalog.response(session, now=loaded_at + 1)[1] == etag
+        body, new_etag = catalog.response(session, now=loaded_at + catalog.counts_ttl)
+    assert new_etag != etag
+    assert {s["code"]: s["total_cards"] for s in json.loads(body)}["sv01"] == 2
+
+
+def test_sets_json_is_reloaded_when_modified(engine, catalog):
+    with Session(engine) as session:
+        body, etag = catalog.response(session)
+        assert catalog.response(session)[1] == etag
+
+        data = json.loads(catalog.sets_path.read_text(encoding="utf-8"))
+        data["Sword & Shield"].append({"name": "Rebel Clash", "code": "swsh2", "abbr": "RCL"})
+        catalog.sets_path.write_text(json.dumps(data), encoding="utf-8")
+        stat = catalog.sets_path.stat()
+        os.utime(catalog.sets_path, (stat.st_atime, stat.st_mtime + 5))
+
+        body, new_etag = catalog.response(session)
+    assert new_etag != etag
+    assert "swsh2" in {s["code"] for s in json.loads(body)}
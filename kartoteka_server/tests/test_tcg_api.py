@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import datetime as dt
+import json
 from typing import Any
 
 import pytest
@@ -649,4 +650,31 @@ def test_get_latest_products_falls_back_to_latest_if_no_current_products(monkeyp
     latest_products = tcg_api.get_latest_products(session=session, limit=1)
 
     assert len(latest_products) == 1
-    assert latest_products[0]["name"] == "Past Product 1"
\ No newline at end of file
+    assert latest_products[0]["name"] == "Past Product 1"
+
+
+def test_shared_session_caches_repeated_searches(monkeypatch):
+    tcg_api.clear_cache()
+    calls: list[dict] = []
+
+    def fake_get(self, url, params=None, headers=None, **kwargs):
+        calls.append(dict(params or {}))
+        response = tcg_api.requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(
+            {"data": [{"name": "Pikachu", "number": "58", "episode": {"name": "Base Set"}}]}
+        ).encode()
+        return response
+
+    monkeypatch.setattr(tcg_api.requests.Session, "get", fake_get)
+    monkeypatch.setattr(tcg_api, "get_eur_pln_rate", lambda: None)
+
+    for name in ("Pikachu", "pikachu ", "PIKACHU"):
+        records, _, _ = tcg_api.search_cards(name=name, rapidapi_host=DEFAULT_HOST)
+        assert records
+
+    assert len(calls) == 1
+    stats = tcg_api.cache_stats()
+    assert stats["hits"] >= 2
+    assert stats["entries"] >= 1
+    tcg_api.clear_cache()
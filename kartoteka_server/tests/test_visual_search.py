@@ -0,0 +1,195 @@
+"""Tests for pHash visual search."""
+
+from __future__ import annotations
+
+import io
+import random
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+from sqlmodel import Session, select
+
+from kartoteka_web import models
+from kartoteka_web.services import visual_search
+from kartoteka_web.utils import images as image_utils
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    index = visual_search.PhashIndex()
+    monkeypatch.setattr(visual_search, "phash_index", index)
+    monkeypatch.setattr(visual_search, "_unhashable", set())
+    monkeypatch.setattr(visual_search, "_cursor", 0)
+    return index
+
+
+def _artwork(seed: int, size=(245, 342)) -> bytes:
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(20, 120), y0 + rng.randrange(20, 120)
+        draw.rectangle((x0, y0, x1, y1), fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _photo_of(artwork: bytes) -> bytes:
+    """Resized, re-encoded copy, as a phone photo of the card would be."""
+
+    image = Image.open(io.BytesIO(artwork)).resize((490, 684))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=70)
+    return buffer.getvalue()
+
+
+def _record(session: Session, name: str, **values) -> models.CardRecord:
+    record = models.CardRecord(
+        name=name,
+        name_normalized=name.lower(),
+        number="1",
+        set_name="Base Set",
+        set_name_normalized="base set",
+        **values,
+    )
+    session.add(record)
+    session.commit()
+    session.refresh(record)
+    return record
+
+
+def test_signed_round_trip():
+    for value in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        stored = visual_search.to_signed(value)
+        assert -(1 << 63) <= stored < (1 << 63)
+        assert visual_search.to_unsigned(stored) == value
+
+
+def test_hamming_distances_match_python_popcount():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(200)]
+    target = rng.getrandbits(64)
+    distances = visual_search.hamming_distances(np.array(values, dtype=np.uint64), target)
+    assert distances.tolist() == [bin(value ^ target).count("1") for value in values]
+
+
+def test_index_top_k_orders_by_distance_and_replaces_entries(fresh_index):
+    target = 0
+    fresh_index.add_many([(1, 0b1111), (2, 0b1), (3, (1 << 64) - 1), (4, 0b111)])
+    matches = fresh_index.search(target, k=3, max_distance=12)
+    assert [(m.record_id, m.distance) for m in matches] == [(2, 1), (4, 3), (1, 4)]
+
+    fresh_index.add(1, 0)
+    assert fresh_index.search(target, k=1)[0].record_id == 1
+    assert len(fresh_index) == 4
+
+
+def test_register_then_search_finds_card_from_photo(engine):
+    artworks = {seed: _artwork(seed) for seed in range(5)}
+    with Session(engine) as session:
+        records = {seed: _record(session, f"Card {seed}").id for seed in artworks}
+        for seed, artwork in artworks.items():
+            assert visual_search.register(session, records[seed], artwork) is not None
+
+        matches = visual_search.search(session, _photo_of(artworks[3]))
+
+        assert matches
+        record, distance = matches[0]
+        assert record.id == records[3]
+        assert distance <= visual_search.CONFIDENT_DISTANCE
+        assert session.get(models.CardRecord, records[3]).phash is None
+        assert len(session.exec(select(models.LearnedPhash)).all()) == 5
+
+
+def test_learned_photos_sit_beside_the_catalogue_hash(engine, fresh_index):
+    artwork, photo = _artwork(31), _photo_of(_artwork(32))
+    catalogue_hash = visual_search.to_signed(visual_search.phash_image(artwork))
+    with Session(engine) as session:
+        record = _record(session, "Learned", phash=catalogue_hash)
+        other = _record(session, "Other", phash=visual_search.to_signed(visual_search.phash_image(_artwork(33))))
+        visual_search.register(session, record.id, photo)
+        visual_search.register(session, record.id, photo)
+
+        assert session.get(models.CardRecord, record.id).phash == catalogue_hash
+        assert len(session.exec(select(models.LearnedPhash)).all()) == 1
+
+        # Artwork and photo both match the record, which is reported once
+        best, distance = visual_search.search(session, artwork)[0]
+        assert (best.id, distance) == (record.id, 0)
+        assert visual_search.search(session, photo)[0][0].id == record.id
+        assert [m.record_id for m in fresh_index.search(0, k=2, max_distance=64)] in (
+            [record.id, other.id], [other.id, record.id]
+        )
+
+    # A reload keeps both hashes of the record
+    reloaded = visual_search.PhashIndex()
+    with Session(engine) as session:
+        assert reloaded.load(session) == 3
+    assert reloaded.search(visual_search.phash_image(photo), k=1)[0].record_id == record.id
+
+
+def test_search_loads_index_from_database(engine, fresh_index):
+    artwork = _artwork(11)
+    with Session(engine) as session:
+        record = _record(
+            session,
+            "Stored",
+            phash=visual_search.to_signed(visual_search.phash_image(artwork)),
+        )
+
+        matches = visual_search.search(session, artwork)
+
+        assert fresh_index.loaded
+        assert [(match.id, distance) for match, distance in matches] == [(record.id, 0)]
+
+
+def test_index_reloads_hashes_stored_by_other_processes(engine, fresh_index):
+    artwork = _artwork(41)
+    with Session(engine) as session:
+        fresh_index.ensure_loaded(session)
+        assert len(fresh_index) == 0
+
+        # Another worker hashes a record; this index never saw the write
+        record = _record(session, "Elsewhere", phash=visual_search.to_signed(visual_search.phash_image(artwork)))
+        checked_at = fresh_index._checked_at
+        fresh_index.ensure_loaded(session, now=checked_at + 1)
+        assert len(fresh_index) == 0
+
+        fresh_index.ensure_loaded(session, now=checked_at + visual_search.RELOAD_CHECK_INTERVAL)
+        assert len(fresh_index) == 1
+        assert fresh_index.search(visual_search.phash_image(artwork), k=1)[0].record_id == record.id
+
+
+def test_search_ignores_invalid_images(engine):
+    with Session(engine) as session:
+        assert visual_search.search(session, b"not an image") == []
+
+
+def test_hash_cached_images(engine, scope, tmp_path, monkeypatch, fresh_index):
+    monkeypatch.setattr(image_utils, "CARD_IMAGE_DIR", tmp_path)
+    queued = []
+    monkeypatch.setattr(
+        image_utils.image_cache, "submit", lambda url, variant, **_: queued.append((url, variant))
+    )
+
+    artwork = _artwork(21)
+    (tmp_path / "abc-small.png").write_bytes(artwork)
+    prefix = image_utils.CARD_IMAGE_URL_PREFIX
+    with Session(engine) as session:
+        cached = _record(session, "Cached", image_small=f"{prefix}/abc-small.png").id
+        missing = _record(session, "Missing", image_small=f"{prefix}/gone-small.png").id
+        _record(session, "Remote", image_small="https://images.example/remote.png")
+
+    assert visual_search.hash_cached_images() == 1
+    assert visual_search.hash_cached_images() == 0
+
+    with Session(engine) as session:
+        assert visual_search.to_unsigned(session.get(models.CardRecord, cached).phash) == (
+            visual_search.phash_image(artwork)
+        )
+        assert session.get(models.CardRecord, missing).phash is None
+    assert fresh_index.search(visual_search.phash_image(artwork), k=1)[0].record_id == cached
+    assert queued == [("https://images.example/remote.png", "small")] * 2
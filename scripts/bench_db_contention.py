@@ -0,0 +1,119 @@
+"""
+Mixed read/write contention benchmark for the backend SQLite database.
+
+Runs the same workload (writer threads inserting scans, reader threads
+running the /stats aggregations) once per journal mode against a
+throwaway database and prints throughput and "database is locked" errors.
+
+Usage:
+    python scripts/bench_db_contention.py [--seconds 10] [--readers 4] [--writers 2]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Add backend directory to path so we can import 'app'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+# Check if we are in scripts/ and backend is ../backend (Local dev)
+if os.path.isdir(os.path.join(current_dir, '../backend')):
+    sys.path.append(os.path.join(current_dir, '../backend'))
+# Check if we are in /app (docker) and app/ exists
+elif os.path.isdir(os.path.join(current_dir, 'app')):
+    sys.path.append(current_dir)
+
+
+def run_workload(seconds: float, readers: int, writers: int) -> dict:
+    # Imported here: DATABASE_URL / SQLITE_JOURNAL_MODE are set by the parent process
+    from app import db as dbmod
+    from app import reporting
+
+    dbmod.init_db()
+    stats = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0, "locked": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def bump(key: str, locked: bool = False) -> None:
+        with lock:
+            stats[key] += 1
+            if locked:
+                stats["locked"] += 1
+
+    def writer(n: int) -> None:
+        i = 0
+        while time.monotonic() < stop:
+            db = dbmod.SessionLocal()
+            try:
+                db.add(dbmod.Scan(filename=f"bench-{n}-{i}.jpg", detected_name=f"Card {i}"))
+                db.commit()
+                bump("writes")
+            except Exception as e:
+                db.rollback()
+                bump("write_errors", "locked" in str(e))
+            finally:
+                db.close()
+            i += 1
+
+    def reader() -> None:
+        while time.monotonic() < stop:
+            db = dbmod.ReadSessionLocal()
+            try:
+                reporting.scan_counts(db)
+                reporting.daily_series(db, reporting.SCANS_METRIC, reporting.day_keys(30))
+                bump("reads")
+            except Exception as e:
+                bump("read_errors", "locked" in str(e))
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats["journal_mode"] = dbmod.journal_mode
+    stats["seconds"] = seconds
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--modes", default="DELETE,WAL")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_workload(args.seconds, args.readers, args.writers)))
+        return
+
+    print(f"{'mode':<8} {'reads/s':>10} {'writes/s':>10} {'errors':>8} {'locked':>8}")
+    for mode in [m.strip().upper() for m in args.modes.split(",") if m.strip()]:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            env["UPLOAD_DIR"] = os.path.join(tmp, "uploads")
+            env["SQLITE_JOURNAL_MODE"] = mode
+            # Each mode runs in a fresh process so the engine picks up the settings
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child",
+                 "--seconds", str(args.seconds), "--readers", str(args.readers), "--writers", str(args.writers)],
+                env=env, capture_output=True, text=True, check=True,
+            )
+            res = json.loads(out.stdout.strip().splitlines()[-1])
+        errors = res["read_errors"] + res["write_errors"]
+        print(
+            f"{res['journal_mode'] or mode:<8} {res['reads'] / res['seconds']:>10.1f} "
+            f"{res['writes'] / res['seconds']:>10.1f} {errors:>8} {res['locked']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
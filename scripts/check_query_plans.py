@@ -0,0 +1,57 @@
+"""
+Check the query plans of the hot backend queries.
+
+Creates the schema (including the index migration) in the configured
+database, runs EXPLAIN QUERY PLAN on every query in app.query_plan and
+exits with status 1 if any of them does an unexpected full table scan.
+
+Usage:
+    DATABASE_URL=sqlite:////tmp/plan-check.db python scripts/check_query_plans.py [-v]
+"""
+import sys
+import os
+
+# Add backend directory to path so we can import 'app'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+# Check if we are in scripts/ and backend is ../backend (Local dev)
+if os.path.isdir(os.path.join(current_dir, '../backend')):
+    sys.path.append(os.path.join(current_dir, '../backend'))
+# Check if we are in /app (docker) and app/ exists
+elif os.path.isdir(os.path.join(current_dir, 'app')):
+    sys.path.append(current_dir)
+
+from app.db import init_db, ReadSessionLocal
+from app.query_plan import check_query_plans
+
+
+def main() -> int:
+    verbose = "-v" in sys.argv[1:]
+    init_db()
+    db = ReadSessionLocal()
+    try:
+        report = check_query_plans(db)
+    finally:
+        db.close()
+
+    failed = 0
+    for entry in report:
+        if entry["ok"]:
+            status = "OK  " if not entry["full_scans"] else "SCAN"
+        else:
+            status = "FAIL"
+            failed += 1
+        print(f"[{status}] {entry['name']}")
+        if entry.get("error"):
+            print(f"       error: {entry['error']}")
+        if verbose or not entry["ok"]:
+            for step in entry["plan"]:
+                print(f"       {step}")
+        if entry["full_scans"] and entry["note"]:
+            print(f"       expected: {entry['note']}")
+
+    print(f"\n{len(report) - failed}/{len(report)} queries OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "cenyPolska"))
+import crawler
+
+SHOP = {
+    "name": "BoosterPoint",
+    "domain": "boosterpoint.pl",
+    "search_url": "https://boosterpoint.pl/wszystkie-produkty/?s={query}&post_type=product&ct_product_price=1",
+    "item_selector": ".product",
+    "title_selector": ".woocommerce-loop-product__title",
+    "link_selector": ".woocommerce-loop-product__link",
+    "price_selector": ".price ins .amount bdi, .price .amount bdi",
+    "price_type": "text",
+    "stock_check_class": "outofstock",
+}
+QUERY = "evolving skies booster"
+
+
+def _crawler(tmp_path, fetcher=None):
+    store = crawler.ProductStore(str(tmp_path / "ceny.sqlite"))
+    return crawler.Crawler(
+        store,
+        lambda: [SHOP],
+        fetcher=fetcher or crawler.FixtureFetcher(),
+        throttle=crawler.DomainThrottle(0),
+    )
+
+
+def test_offline_crawl_is_served_from_the_store(tmp_path):
+    engine = _crawler(tmp_path)
+    engine.request(QUERY)
+    assert engine.run_once() == 1
+
+    (item,) = engine.store.lookup("  Evolving SKIES booster ")
+    assert item["found"] is True
+    assert item["price"] == 29.99
+    assert item["link"] == "https://boosterpoint.pl/produkt/evolving-skies-booster/"
+    assert item["available"] is True
+    assert item["stale"] is False
+
+    later = item["checked_at"] + crawler.STALE_AFTER + 1
+    assert engine.store.lookup(QUERY, now=later)[0]["stale"] is True
+    assert engine.store.due_queries(now=item["checked_at"]) == []
+    assert engine.store.due_queries(now=later) == [QUERY]
+
+    assert [r["product_name"] for r in engine.store.search_products("pokemon tcg evol")] == [
+        "Pokemon TCG Evolving Skies Booster"
+    ]
+
+
+def test_transient_errors_keep_the_last_good_offer(tmp_path):
+    engine = _crawler(tmp_path)
+    engine.crawl_query(QUERY)
+    good = engine.store.lookup(QUERY)[0]
+
+    engine.fetch = lambda url, timeout: (503, b"")
+    engine.crawl_query(QUERY)
+
+    assert engine.store.lookup(QUERY)[0] == good
+
+
+def test_product_prefix_search_uses_the_name_index(tmp_path):
+    store = crawler.ProductStore(str(tmp_path / "ceny.sqlite"))
+    plan = store._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM offer WHERE product_name_norm >= ? AND product_name_norm < ?",
+        ("a", "b"),
+    ).fetchall()
+    assert any("ix_offer_product_name_norm" in row[-1] for row in plan)
+
+
+def test_throttle_spaces_requests_per_domain():
+    clock = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    throttle = crawler.DomainThrottle(2.0, clock=lambda: clock[0], sleep=sleep)
+    with throttle.slot("boosterpoint.pl"):
+        pass
+    with throttle.slot("tcglove.pl"):
+        pass
+    clock[0] += 0.5
+    with throttle.slot("boosterpoint.pl"):
+        pass
+
+    assert sleeps == [1.5]
+
+
+def test_legacy_import_keeps_domains_and_tracks_nothing(tmp_path):
+    legacy = tmp_path / "produkty_db.json"
+    legacy.write_text(
+        '[{"shop": "Loot Quest", "url": "https://www.lootquest.pl/produkt/evolving-skies-booster/",'
+        ' "price": 31.5, "last_check": "09:14:06"}]',
+        encoding="utf-8",
+    )
+    store = crawler.ProductStore(str(tmp_path / "ceny.sqlite"))
+
+    assert store.import_legacy_json(str(legacy)) == 1
+    (item,) = store.lookup("evolving skies booster")
+    assert (item["shop_name"], item["domain"], item["price"]) == ("Loot Quest", "lootquest.pl", 31.5)
+    assert store.tracked() == []
+    assert store.due_queries() == []
+
+
+def test_queries_nobody_searches_stop_being_tracked(tmp_path):
+    store = crawler.ProductStore(str(tmp_path / "ceny.sqlite"))
+    store.track(QUERY, now=1000.0)
+    store.track("celebrations booster", now=1000.0)
+    store.track(QUERY, now=1000.0 + crawler.FORGET_AFTER)
+
+    later = 1001.0 + crawler.FORGET_AFTER
+    assert store.due_queries(now=later) == [QUERY]
+    assert store.forget_idle(now=later) == 1
+    assert store.tracked() == [QUERY]
@@ -0,0 +1,168 @@
+import asyncio
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+from app import db as app_db
+from app.db import Base, ReportDailyCount
+
+
+class _Cursor:
+    """Cursor double answering ``PRAGMA journal_mode`` like a volume without WAL."""
+
+    def __init__(self, executed, journal_modes):
+        self.executed = executed
+        self.journal_modes = journal_modes
+        self._row = None
+
+    def execute(self, sql):
+        self.executed.append(sql)
+        if sql.startswith("PRAGMA journal_mode"):
+            mode = self.journal_modes.get(sql, "delete")
+            if isinstance(mode, Exception):
+                raise mode
+            self._row = (mode,)
+        return self
+
+    def fetchone(self):
+        return self._row
+
+    def close(self):
+        pass
+
+
+class _Connection:
+    def __init__(self, journal_modes):
+        self.executed = []
+        self.journal_modes = journal_modes
+
+    def cursor(self):
+        return _Cursor(self.executed, self.journal_modes)
+
+
+@pytest.fixture()
+def fresh_journal_mode(monkeypatch):
+    monkeypatch.setattr(app_db, "journal_mode", None)
+    monkeypatch.setattr(app_db.settings, "sqlite_journal_mode", "WAL")
+
+
+@pytest.fixture()
+def engines(tmp_path):
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    write_engine = create_engine(url, future=True)
+    read_engine = create_engine(url, future=True)
+    event.listen(write_engine, "connect", lambda conn, record: app_db._apply_sqlite_pragmas(conn))
+    event.listen(read_engine, "connect", lambda conn, record: app_db._apply_sqlite_pragmas(conn, read_only=True))
+    Base.metadata.create_all(write_engine)
+    yield write_engine, read_engine
+    write_engine.dispose()
+    read_engine.dispose()
+
+
+def test_wal_is_used_when_the_volume_supports_it(tmp_path, fresh_journal_mode):
+    conn = sqlite3.connect(tmp_path / "wal.db")
+    try:
+        app_db._apply_sqlite_pragmas(conn)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    finally:
+        conn.close()
+    assert app_db.journal_mode == "wal"
+
+
+def test_unsupported_wal_falls_back_to_delete(fresh_journal_mode):
+    conn = _Connection({"PRAGMA journal_mode=WAL": "memory", "PRAGMA journal_mode=DELETE": "delete"})
+    app_db._apply_sqlite_pragmas(conn)
+
+    assert conn.executed[:2] == ["PRAGMA journal_mode=WAL", "PRAGMA journal_mode=DELETE"]
+    assert app_db.journal_mode == "delete"
+    # The remaining pragmas are still applied
+    assert any(sql.startswith("PRAGMA busy_timeout=") for sql in conn.executed)
+
+
+def test_failing_wal_pragma_falls_back_to_delete(fresh_journal_mode):
+    conn = _Connection({
+        "PRAGMA journal_mode=WAL": sqlite3.OperationalError("disk I/O error"),
+        "PRAGMA journal_mode": "memory",
+        "PRAGMA journal_mode=DELETE": "delete",
+    })
+    app_db._apply_sqlite_pragmas(conn)
+
+    assert conn.executed[:3] == ["PRAGMA journal_mode=WAL", "PRAGMA journal_mode", "PRAGMA journal_mode=DELETE"]
+    assert app_db.journal_mode == "delete"
+
+
+def test_read_engine_is_query_only(engines, fresh_journal_mode):
+    write_engine, read_engine = engines
+    with sessionmaker(bind=write_engine, future=True)() as db:
+        db.add(ReportDailyCount(metric="scans", day="2026-01-01", count=3))
+        db.commit()
+
+    with sessionmaker(bind=read_engine, future=True)() as db:
+        assert db.query(ReportDailyCount.count).scalar() == 3
+        db.add(ReportDailyCount(metric="scans", day="2026-01-02", count=1))
+        with pytest.raises(OperationalError, match="readonly"):
+            db.commit()
+        db.rollback()
+
+    # Reads on the read engine do not hold up the writer
+    with read_engine.connect() as reader:
+        reader.exec_driver_sql("BEGIN")
+        reader.exec_driver_sql("SELECT COUNT(*) FROM report_daily_counts").fetchall()
+        with sessionmaker(bind=write_engine, future=True)() as db:
+            db.query(ReportDailyCount).update({ReportDailyCount.count: 4})
+            db.commit()
+        reader.exec_driver_sql("ROLLBACK")
+
+
+def test_run_write_serializes_jobs_on_one_writer_thread(engines, fresh_journal_mode, monkeypatch):
+    write_engine, _ = engines
+    factory = sessionmaker(bind=write_engine, autocommit=False, autoflush=False, future=True)
+    monkeypatch.setattr(app_db, "SessionLocal", factory)
+    with factory() as db:
+        db.add(ReportDailyCount(metric="scans", day="2026-01-01", count=0))
+        db.commit()
+
+    active = []
+    overlaps = []
+    threads = set()
+    lock = threading.Lock()
+
+    def increment(db):
+        with lock:
+            active.append(1)
+            overlaps.append(len(active))
+            threads.add(threading.current_thread().name)
+        row = db.query(ReportDailyCount).one()
+        count = row.count
+        time.sleep(0.005)  # read-modify-write would lose updates if jobs interleaved
+        row.count = count + 1
+        with lock:
+            active.pop()
+        return row.count
+
+    def fail(db):
+        db.query(ReportDailyCount).update({ReportDailyCount.count: -1})
+        raise RuntimeError("job failed")
+
+    async def run():
+        jobs = [app_db.run_write(increment) for _ in range(20)]
+        jobs.insert(10, app_db.run_write(fail))
+        return await asyncio.gather(*jobs, return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert isinstance(results.pop(10), RuntimeError)
+    assert sorted(results) == list(range(1, 21))
+    assert max(overlaps) == 1
+    assert len(threads) == 1 and threads.pop().startswith("db-writer")
+    with factory() as db:
+        # The failed job was rolled back and every increment was kept
+        assert db.query(ReportDailyCount.count).scalar() == 20
@@ -0,0 +1,248 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+from app import main, order_store
+from app.db import Base
+
+
+@pytest.fixture()
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'orders.db'}", future=True)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+    engine.dispose()
+
+
+def _write(session_factory, fn, *args):
+    db = session_factory()
+    try:
+        result = fn(db, *args)
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+
+def _ranges(session_factory):
+    db = session_factory()
+    try:
+        return sorted((r.lo_id, r.hi_id) for r in db.query(order_store.ShoperOrderCoverage).all())
+    finally:
+        db.close()
+
+
+def test_fetched_range_bounds():
+    # Full page: only down to its oldest order
+    assert order_store.fetched_range([30, 29, 28], 3) == (28, order_store.NEWEST)
+    # Short page reaches the filter bound (or the oldest order)
+    assert order_store.fetched_range([30, 29], 3, below=31) == (0, 30)
+    assert order_store.fetched_range([], 3, below=31) == (0, 30)
+    assert order_store.fetched_range([12], 5, above=10) == (11, order_store.NEWEST)
+
+
+def test_note_coverage_merges_touching_ranges(session_factory):
+    _write(session_factory, order_store.note_coverage, 91, order_store.NEWEST)
+    _write(session_factory, order_store.note_coverage, 0, 40)
+    assert _ranges(session_factory) == [(0, 40), (91, order_store.NEWEST)]
+
+    _write(session_factory, order_store.note_coverage, 41, 60)
+    assert _ranges(session_factory) == [(0, 60), (91, order_store.NEWEST)]
+
+    _write(session_factory, order_store.note_coverage, 55, 90)
+    assert _ranges(session_factory) == [(0, order_store.NEWEST)]
+
+    db = session_factory()
+    try:
+        assert order_store.covered_from(db, 75) == 0
+    finally:
+        db.close()
+
+
+def test_covered_from_and_count_between(session_factory):
+    def _seed(db):
+        for oid in (5, 6, 7, 20):
+            order_store.upsert_order(db, {"id": oid, "total": "1.00", "items_count": 1})
+        order_store.note_coverage(db, 5, 7)
+
+    _write(session_factory, _seed)
+    db = session_factory()
+    try:
+        assert order_store.covered_from(db, 6) == 5
+        assert order_store.covered_from(db, 20) is None
+        assert order_store.count_between(db, 5, 20) == 4
+    finally:
+        db.close()
+
+
+class _FakeShoper:
+    """Shoper orders with the given IDs, served newest first."""
+
+    def __init__(self, ids):
+        self.ids = sorted(ids, reverse=True)
+        self.calls = []
+
+    def _raw(self, ids):
+        return [{"order_id": oid, "sum": "10.00", "status": {"status_id": 1}} for oid in ids]
+
+    async def fetch_recent_orders(self, limit=50):
+        self.calls.append(("recent", limit))
+        return self._raw(self.ids[:limit])
+
+    async def fetch_orders_before(self, before_id, limit=50):
+        self.calls.append(("before", before_id, limit))
+        return self._raw([i for i in self.ids if i < before_id][:limit])
+
+
+@pytest.fixture()
+def orders_api(session_factory, monkeypatch):
+    shoper = _FakeShoper(range(1, 101))
+
+    async def run_write(fn, *args, **kwargs):
+        return _write(session_factory, lambda db, *a: fn(db, *a, **kwargs), *args)
+
+    monkeypatch.setattr(main, "SessionLocal", session_factory)
+    monkeypatch.setattr(main, "ReadSessionLocal", session_factory)
+    monkeypatch.setattr(main, "run_write", run_write)
+    monkeypatch.setattr(main, "ShoperClient", lambda *a, **k: shoper)
+    monkeypatch.setattr(main.settings, "shoper_base_url", "https://shop.example")
+    monkeypatch.setattr(main.settings, "shoper_access_token", "token")
+    return shoper
+
+
+def _page(limit, page=None, cursor=None):
+    resp = asyncio.run(main.list_orders(
+        limit=limit, page=page, cursor=cursor, detailed=False, auto_sync_furgonetka=False,
+    ))
+    ids = [o["id"] for o in json.loads(resp.body)]
+    cursor = resp.headers.get("X-Next-Cursor")
+    return ids, int(cursor) if cursor else None
+
+
+def test_cursor_paging_fills_gap_behind_poller(orders_api, session_factory):
+    # Old history was backfilled once; the poller then stored the newest
+    # orders after a downtime, leaving 41..90 unseen
+    asyncio.run(main._store_fetched_orders(orders_api, orders_api._raw(range(40, 0, -1)), limit=50, below=41))
+    asyncio.run(main._store_fetched_orders(orders_api, orders_api._raw(range(100, 90, -1)), limit=50, above=90))
+
+    seen = []
+    ids, cursor = _page(limit=20)
+    seen += ids
+    while cursor:
+        ids, cursor = _page(limit=20, cursor=cursor)
+        seen += ids
+    assert seen == list(range(100, 0, -1))
+    assert _ranges(session_factory) == [(0, order_store.NEWEST)]
+
+    # Everything is covered now: paging again stays local
+    orders_api.calls.clear()
+    assert _page(limit=20, cursor=51)[0] == list(range(50, 30, -1))
+    assert orders_api.calls == []
+
+
+def test_offset_paging_backfills_cold_store(orders_api):
+    assert _page(limit=10, page=3)[0] == list(range(80, 70, -1))
+    assert orders_api.calls == [("recent", 30)]
+
+    assert _page(limit=10, page=1)[0] == list(range(100, 90, -1))
+    assert orders_api.calls == [("recent", 30)]
+
+
+def test_sales_deltas_from_concurrent_sessions_add_up(session_factory):
+    _write(session_factory, order_store.upsert_order, {"id": 1, "total": "10.00", "items_count": 1})
+
+    first, second = session_factory(), session_factory()
+    try:
+        # ``first`` holds a stale copy of the totals while ``second`` commits
+        stale = first.get(order_store.SalesMetrics, 1)
+        assert stale.sold_count == 1
+        order_store.upsert_order(second, {"id": 3, "total": "2.50", "items_count": 3})
+        second.commit()
+        order_store.upsert_order(first, {"id": 2, "total": "5.00", "items_count": 2})
+        first.commit()
+    finally:
+        first.close()
+        second.close()
+
+    db = session_factory()
+    try:
+        assert order_store.get_sales_metrics(db) == {"sold_count": 6, "sold_value_pln": 17.5, "users_count": None}
+    finally:
+        db.close()
+
+
+def test_reconcile_reads_only_recent_orders(orders_api, session_factory, monkeypatch):
+    async def fetch_all_orders(limit=100):
+        raise AssertionError("reconcile must not walk the whole order history")
+
+    async def fetch_users_page(page=1, limit=100):
+        return {"pages": 7}
+
+    orders_api.fetch_all_orders = fetch_all_orders
+    orders_api.fetch_users_page = fetch_users_page
+    monkeypatch.setattr(main.settings, "sales_metrics_reconcile_orders", 30)
+
+    asyncio.run(main._reconcile_sales_metrics())
+    assert orders_api.calls == [("recent", 30)]
+    db = session_factory()
+    try:
+        assert order_store.get_sales_metrics(db)["users_count"] == 7
+        assert order_store.covered_from(db, 100) == 71
+    finally:
+        db.close()
+
+
+def test_detailed_page_fetches_missing_details_concurrently(orders_api, session_factory, monkeypatch, capsys):
+    asyncio.run(main._store_fetched_orders(orders_api, orders_api._raw(range(100, 90, -1)), limit=10, detailed=False))
+    monkeypatch.setattr(main, "ORDER_DETAIL_CONCURRENCY", 3)
+    in_flight = []
+
+    async def fetch_order_detail(order_id):
+        in_flight.append(order_id)
+        await asyncio.sleep(0.01)
+        assert len(in_flight) <= 3
+        in_flight.remove(order_id)
+        if order_id == 95:
+            raise RuntimeError("timeout")
+        return {"order_id": order_id, "sum": "10.00", "status": {"status_id": 1}, "products": []}
+
+    orders_api.fetch_order_detail = fetch_order_detail
+    resp = asyncio.run(main.list_orders(limit=10, page=None, cursor=None, detailed=True, auto_sync_furgonetka=False))
+
+    assert len(json.loads(resp.body)) == 10
+    assert "order #95" in capsys.readouterr().out
+    db = session_factory()
+    try:
+        missing = [r.order_id for r in order_store.list_rows(db, limit=10) if not r.detail_json]
+    finally:
+        db.close()
+    assert missing == [95]
+
+
+def test_status_change_stores_the_refetched_status_object(orders_api, session_factory):
+    asyncio.run(main._store_fetched_orders(orders_api, orders_api._raw([7]), limit=10, detailed=False))
+    shipped = {"status_id": 4, "type": 3, "color": "#00aa00", "translations": {"pl_PL": {"name": "Wysłane"}}}
+
+    async def update_order_status(order_id, status_id):
+        return {"ok": True, "order_id": order_id, "status_id": status_id}
+
+    async def fetch_order_detail(order_id):
+        return {"order_id": order_id, "sum": "10.00", "status": shipped, "products": []}
+
+    orders_api.update_order_status = update_order_status
+    orders_api.fetch_order_detail = fetch_order_detail
+    asyncio.run(main.update_order_status(7, {"status_id": 4}))
+
+    db = session_factory()
+    try:
+        rec = order_store.get_row(db, 7)
+        assert rec.status_id == 4
+        assert order_store.load(rec)["status"] == {"type": 3, "id": 4, "color": "#00aa00", "name": "Wysłane"}
+    finally:
+        db.close()
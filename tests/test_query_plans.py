@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+from app import query_plan
+from app.db import Base
+
+
+@pytest.fixture()
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}", future=True)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_every_hot_query_uses_an_index(db):
+    report = query_plan.check_query_plans(db)
+    assert [r["name"] for r in report] == [hq.name for hq in query_plan.HOT_QUERIES]
+    bad = {r["name"]: r.get("error") or r["full_scans"] for r in report if not r["ok"]}
+    assert bad == {}
+
+
+def test_dropped_index_is_reported(db):
+    db.connection().exec_driver_sql("DROP INDEX ix_products_code")
+    report = {r["name"]: r for r in query_plan.check_query_plans(db)}
+    assert not report["product by code"]["ok"]
+    assert report["product by code"]["full_scans"]
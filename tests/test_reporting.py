@@ -0,0 +1,306 @@
+import asyncio
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+from app import main, reporting
+from app.db import (
+    Base,
+    BatchScan,
+    BatchScanItem,
+    CardCatalog,
+    Product,
+    ReportDailyCount,
+    Scan,
+    ScanCandidate,
+)
+
+DAYS = 14
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'reports.db'}", future=True)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def session_factory(engine):
+    return sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+
+
+@pytest.fixture()
+def seeded(session_factory):
+    """A store with scans, candidates, batch items, catalog entries and products."""
+    rng = random.Random(27)
+    now = datetime.utcnow()
+    db = session_factory()
+    try:
+        rarities = [None, "Common", "Uncommon", "Rare", "Rare Holo", "Illustration Rare", "Special Illustration Rare"]
+        catalog = [
+            CardCatalog(provider_id=f"cat-{i}", name=f"Card {i}", rarity=rarities[i % len(rarities)])
+            for i in range(12)
+        ]
+        db.add_all(catalog)
+        db.flush()
+
+        products = []
+        for i in range(40):
+            products.append(Product(
+                shoper_id=1000 + i,
+                code=f"P{i:03d}",
+                name=f"Product {i}",
+                price=rng.choice([None, 0.0, round(rng.uniform(0.5, 400), 2)]),
+                purchase_price=rng.choice([None, 0.0, round(rng.uniform(0.1, 200), 2)]),
+                stock=rng.choice([None, 0, 1, 2, 5]),
+                updated_at=rng.choice([None, now - timedelta(days=rng.randrange(DAYS + 10), hours=rng.randrange(24))]),
+                catalog_id=rng.choice([None, catalog[i % len(catalog)].id]),
+                category_id=rng.choice([1, 2, 3]),
+                permalink=f"https://shop.example/p{i}",
+            ))
+        db.add_all(products)
+
+        for i in range(60):
+            scan = Scan(
+                created_at=now - timedelta(days=rng.randrange(DAYS + 5), hours=rng.randrange(24)),
+                detected_name=f"Scan {i}",
+                stored_path=f"/data/uploads/scan_{i}.jpg",
+            )
+            db.add(scan)
+            db.flush()
+            candidates = [
+                ScanCandidate(scan_id=scan.id, provider_id=f"prov-{i}-{c}", name=f"Cand {c}",
+                              image=rng.choice([None, f"https://img.example/{i}/{c}.png"]))
+                for c in range(rng.randrange(3))
+            ]
+            db.add_all(candidates)
+            db.flush()
+            if candidates and rng.random() < 0.6:
+                scan.selected_candidate_id = rng.choice(candidates).id
+            if rng.random() < 0.5:
+                scan.publish_status = "published"
+                scan.published_shoper_id = rng.choice([None, 1000 + rng.randrange(45)])
+                scan.price_pln_final = rng.choice([None, 12.5])
+
+        batch = BatchScan()
+        db.add(batch)
+        db.flush()
+        for i in range(20):
+            db.add(BatchScanItem(
+                batch_id=batch.id,
+                filename=f"batch_{i}.jpg",
+                stored_path=f"/data/uploads/batch_{i}.jpg",
+                status="success",
+                processed_at=now - timedelta(hours=rng.randrange(200)),
+                matched_name=f"Match {i}",
+                matched_image=rng.choice([None, f"https://img.example/b{i}.png"]),
+                publish_status=rng.choice(["published", None]),
+                published_shoper_id=rng.choice([None, 1000 + rng.randrange(45)]),
+            ))
+        db.commit()
+    finally:
+        db.close()
+    return session_factory
+
+
+# --- Baseline: the per-row Python computations the endpoints used before ---
+
+def _baseline_per_day(values, keys):
+    counts = {k: 0 for k in keys}
+    for value in values:
+        if value is None:
+            continue
+        day = value.date().isoformat()
+        if day in counts:
+            counts[day] += 1
+    return [{"date": k, "count": counts[k]} for k in keys]
+
+
+def _baseline_inventory(db, purchase_cost_fn):
+    cost = value = 0.0
+    counted = without = 0
+    for product in db.query(Product).filter(Product.stock > 0).all():
+        stock = int(product.stock or 0)
+        price = float(product.price or 0.0)
+        purchase_price = float(product.purchase_price or 0.0)
+        if not purchase_price and price:
+            without += 1
+            rarity = None
+            if product.catalog_id:
+                entry = db.get(CardCatalog, product.catalog_id)
+                if entry:
+                    rarity = entry.rarity
+            purchase_price = purchase_cost_fn(rarity, price)
+        if purchase_price > 0:
+            counted += 1
+        cost += stock * purchase_price
+        value += stock * price
+    return {
+        "total_inventory_cost": cost,
+        "total_inventory_value": value,
+        "products_counted": counted,
+        "products_without_purchase_price": without,
+    }
+
+
+def _baseline_recent(db, limit):
+    combined = []
+    for s in db.query(Scan).filter(Scan.publish_status == "published").order_by(Scan.id.desc()).limit(limit):
+        image = None
+        if s.selected_candidate_id:
+            image = db.get(ScanCandidate, s.selected_candidate_id).image
+        if not image:
+            first = db.query(ScanCandidate).filter(ScanCandidate.scan_id == s.id).order_by(ScanCandidate.id).first()
+            image = first.image if first else None
+        if not image and s.stored_path:
+            image = f"/uploads/{Path(s.stored_path).name}"
+        product = db.query(Product).filter(Product.shoper_id == s.published_shoper_id).first() if s.published_shoper_id else None
+        combined.append((s.created_at, "scan", s.id, image, product.permalink if product else None))
+    items = (
+        db.query(BatchScanItem)
+        .filter(BatchScanItem.publish_status == "published")
+        .order_by(BatchScanItem.processed_at.desc())
+        .limit(limit)
+    )
+    for b in items:
+        image = b.matched_image or (f"/uploads/{Path(b.stored_path).name}" if b.stored_path else None)
+        product = db.query(Product).filter(Product.shoper_id == b.published_shoper_id).first() if b.published_shoper_id else None
+        combined.append((b.processed_at, "batch_item", b.id, image, product.permalink if product else None))
+    combined.sort(key=lambda row: row[0], reverse=True)
+    return [row[1:] for row in combined[:limit]]
+
+
+def _rounded(values):
+    # SQL SUM and the Python loop add floats in different orders
+    if isinstance(values, dict):
+        return {k: round(v, 6) for k, v in values.items()}
+    return [round(v, 6) for v in values]
+
+
+def _rollup(db):
+    keys = reporting.day_keys(DAYS)
+    return reporting.daily_series(db, reporting.SCANS_METRIC, keys)
+
+
+def _scans_per_day(db):
+    keys = reporting.day_keys(DAYS)
+    return _baseline_per_day([c for (c,) in db.query(Scan.created_at).all()], keys)
+
+
+def test_scans_rollup_follows_inserts_and_deletes(seeded):
+    db = seeded()
+    try:
+        assert _rollup(db) == _scans_per_day(db)
+        assert sum(row["count"] for row in _rollup(db)) > 0
+
+        for scan in db.query(Scan).order_by(Scan.id).limit(7).all():
+            db.query(ScanCandidate).filter(ScanCandidate.scan_id == scan.id).delete()
+            scan.selected_candidate_id = None
+            db.flush()
+            db.delete(scan)
+        db.add(Scan(created_at=datetime.utcnow()))
+        db.commit()
+
+        assert _rollup(db) == _scans_per_day(db)
+    finally:
+        db.close()
+
+
+def test_backfill_daily_counts_builds_the_rollup_once(seeded, engine, monkeypatch):
+    monkeypatch.setattr(reporting, "engine", engine)
+    db = seeded()
+    try:
+        db.query(ReportDailyCount).delete()
+        db.commit()
+        assert sum(row["count"] for row in _rollup(db)) == 0
+
+        reporting.backfill_daily_counts()
+        assert _rollup(db) == _scans_per_day(db)
+        total = db.query(func.sum(ReportDailyCount.count)).scalar()
+        assert total == db.query(func.count(Scan.id)).scalar()
+
+        # Already populated: a second run leaves the rollup alone
+        reporting.backfill_daily_counts()
+        assert db.query(func.sum(ReportDailyCount.count)).scalar() == total
+    finally:
+        db.close()
+
+
+def test_sql_aggregations_match_python_baseline(seeded):
+    db = seeded()
+    try:
+        scans = db.query(Scan).all()
+        assert reporting.scan_counts(db) == {
+            "total_scans": len(scans),
+            "scans_ready": sum(1 for s in scans if s.selected_candidate_id is not None),
+            "scans_published": sum(1 for s in scans if s.publish_status == "published"),
+        }
+
+        products = db.query(Product).all()
+        totals = reporting.inventory_totals(db)
+        assert totals["total_products"] == len(products)
+        assert totals["inventory_units"] == sum(int(p.stock or 0) for p in products)
+        assert round(totals["inventory_value_pln"], 6) == round(
+            sum(int(p.stock or 0) * float(p.price or 0.0) for p in products), 6
+        )
+
+        inv = reporting.inventory_cost_value(db, main._calculate_purchase_cost)
+        expected = _baseline_inventory(db, main._calculate_purchase_cost)
+        assert _rounded(inv) == _rounded(expected)
+        assert expected["products_without_purchase_price"] > 0
+
+        keys = reporting.day_keys(DAYS)
+        assert reporting.products_per_day(db, keys) == _baseline_per_day([p.updated_at for p in products], keys)
+
+        values = sorted((int(p.stock or 0) * float(p.price or 0.0) for p in products), reverse=True)
+        top = reporting.top_value_products(db, 10)
+        assert _rounded([int(p.stock or 0) * float(p.price or 0.0) for p in top]) == _rounded(values[:10])
+
+        recent = reporting.recent_published(db, limit=10)
+        assert [(r["type"], r["id"], r["image"], r["permalink"]) for r in recent] == _baseline_recent(db, 10)
+    finally:
+        db.close()
+
+
+def test_stats_and_reports_endpoints_match_python_baseline(seeded, monkeypatch):
+    async def no_sales_metrics():
+        return {}
+
+    monkeypatch.setattr(main, "ReadSessionLocal", seeded)
+    monkeypatch.setattr(main, "_get_sales_metrics", no_sales_metrics)
+    monkeypatch.setattr(main.settings, "shoper_base_url", "")
+
+    stats = asyncio.run(main.stats())
+    report = asyncio.run(main.reports(range_days=DAYS, top_n=5))
+
+    db = seeded()
+    try:
+        scans = db.query(Scan).all()
+        products = db.query(Product).all()
+        inv = _baseline_inventory(db, main._calculate_purchase_cost)
+        keys = reporting.day_keys(DAYS)
+
+        assert stats["total_scans"] == len(scans)
+        assert stats["total_products"] == len(products)
+        assert stats["total_inventory_cost"] == round(inv["total_inventory_cost"], 2)
+        assert stats["total_inventory_value"] == round(inv["total_inventory_value"], 2)
+        assert [(r["type"], r["id"], r["image"], r["permalink"]) for r in stats["recent_scans"]] == _baseline_recent(db, 10)
+
+        metrics = report["metrics"]
+        assert metrics["total_scans"] == len(scans)
+        assert metrics["scans_published"] == sum(1 for s in scans if s.publish_status == "published")
+        assert metrics["inventory_units"] == sum(int(p.stock or 0) for p in products)
+        assert report["scans_per_day"] == _baseline_per_day([s.created_at for s in scans], keys)
+        assert report["products_per_day"] == _baseline_per_day([p.updated_at for p in products], keys)
+        values = sorted((int(p.stock or 0) * float(p.price or 0.0) for p in products), reverse=True)
+        assert _rounded([row["value"] for row in report["top_value"]]) == _rounded(values[:5])
+    finally:
+        db.close()